@@ -0,0 +1,727 @@
+#!/usr/bin/env python3
+"""fixtures.py
+为基准测试合成固件状态：efivarfs 目录树、`efibootmgr [-v]` 文本输出、
+`bcdedit /v /enum all` 文本输出（英文与中文），以及放在 PATH 上的假命令。
+
+生成器只依赖标准库，设备路径的二进制与文本两种形式在这里各自构造，
+不借用被测代码（解析器的错误不会被“抄”进预期结果）。
+
+用法：
+  benchmarks/fixtures.py efivars 1000 /tmp/efi          # efivarfs 目录树
+  benchmarks/fixtures.py efibootmgr-v 5000 -            # 输出到 stdout
+  benchmarks/fixtures.py bcdedit-zh 100 /tmp/bcd.txt
+  benchmarks/fixtures.py bcd-hive 100 /tmp/BCD           # 同一存储的注册表 hive（bcdedit /export 格式）
+  benchmarks/fixtures.py shims 100 /tmp/shimroot        # bin/ 下的 efibootmgr/bcdedit/cmd.exe
+  benchmarks/fixtures.py blockdev 100 /tmp/blk          # sysfs/dev/udev/mountinfo 树（SYS_SWITCH_BLOCKDEV_ROOT）
+  benchmarks/fixtures.py systemd-boot 100 /tmp/sdb      # esp/（loader/entries、EFI/Linux UKI）与 efivars/
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import re
+import stat
+import struct
+import sys
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+EFI_GLOBAL_GUID = '8be4df61-93ca-11d2-aa0d-00e098032b8c'
+FWBOOTMGR_GUID = '{a5a30fa2-3d06-4e9f-b5f4-a01df9d1fcba}'
+BOOTMGR_GUID = '{9dea862c-5cdd-4e70-acc1-f32b344d4795}'
+_ATTRS = struct.pack('<I', 0x7)  # NV | BS | RT
+LOAD_OPTION_ACTIVE = 0x1
+
+
+# --- EFI device path nodes: (bytes, efibootmgr text) ---
+def _node(t: int, st: int, data: bytes) -> bytes:
+    return struct.pack('<BBH', t, st, 4 + len(data)) + data
+
+
+def _hd(part: int, start: int, size: int, sig: uuid.UUID) -> tuple:
+    data = struct.pack('<IQQ', part, start, size) + sig.bytes_le + bytes([2, 2])
+    return _node(4, 1, data), f'HD({part},GPT,{sig},0x{start:x},0x{size:x})'
+
+
+def _file(path: str) -> tuple:
+    return _node(4, 4, (path + '\0').encode('utf-16-le')), f'File({path})'
+
+
+def _pci_root(uid: int) -> tuple:
+    return _node(2, 1, struct.pack('<II', 0x0a0341d0, uid)), f'PciRoot(0x{uid:x})'
+
+
+def _pci(dev: int, fn: int) -> tuple:
+    return _node(1, 1, bytes([fn, dev])), f'Pci(0x{dev:x},0x{fn:x})'
+
+
+def _usb(port: int, iface: int) -> tuple:
+    return _node(3, 5, bytes([port, iface])), f'USB({port},{iface})'
+
+
+def _mac(mac: bytes) -> tuple:
+    return _node(3, 11, mac + bytes(26) + b'\x01'), f'MAC({mac.hex()},1)'
+
+
+def _ipv4() -> tuple:
+    return _node(3, 12, bytes(4) + bytes([0, 0, 0, 0]) + bytes(11)), 'IPv4(0.0.0.0)'
+
+
+_END = _node(0x7f, 0xff, b'')
+
+
+@dataclass
+class FakeOption:
+    id: str
+    description: str
+    active: bool
+    path_bytes: bytes
+    path_text: str
+    optional: bytes = b''
+
+    def load_option(self) -> bytes:
+        attrs = LOAD_OPTION_ACTIVE if self.active else 0
+        fp = self.path_bytes + _END
+        desc = (self.description + '\0').encode('utf-16-le')
+        return struct.pack('<IH', attrs, len(fp)) + desc + fp + self.optional
+
+
+@dataclass
+class FakeFirmware:
+    """A synthetic NVRAM: N load options, BootOrder, BootCurrent/BootNext, Timeout."""
+    options: List[FakeOption]
+    order: List[str]
+    current: str
+    next: Optional[str] = None
+    timeout: int = 1
+
+
+def _path(parts: List[tuple]) -> tuple:
+    return b''.join(p[0] for p in parts), '/'.join(p[1] for p in parts)
+
+
+def make_firmware(n: int, seed: int = 0) -> FakeFirmware:
+    """`n` load options shaped like a real mixed machine: OS loaders, USB, PXE, vendor apps.
+
+    A few descriptions carry Chinese text, and an occasional one contains a
+    tab. Some options are inactive, and BootOrder leaves a handful out.
+    """
+    rng = random.Random(seed)
+    esp = uuid.UUID(int=rng.getrandbits(128))
+    options: List[FakeOption] = []
+    for i in range(n):
+        bid = f'{i:04X}'
+        kind = i % 8 if i else 0
+        active = rng.random() > 0.05
+        optional = b''
+        if i == 0:
+            desc = 'Windows Boot Manager'
+            parts = [_hd(1, 0x800, 0x100000, esp), _file('\\EFI\\Microsoft\\Boot\\bootmgfw.efi')]
+            optional = b'WINDOWS\x00\x01\x00\x00\x00\x88\x00\x00\x00x\x00\x00\x00' + \
+                ('BCDOBJECT=' + BOOTMGR_GUID + '\0').encode('utf-16-le')
+        elif kind in (1, 2):
+            desc = 'ubuntu' if kind == 1 else f'Fedora Linux {30 + i % 10}'
+            loader = 'ubuntu\\shimx64.efi' if kind == 1 else 'fedora\\shimx64.efi'
+            parts = [_hd(1, 0x800, 0x100000, esp), _file('\\EFI\\' + loader)]
+        elif kind == 3:
+            desc = f'UEFI: SanDisk Cruzer Blade 1.00，分区 {i % 4 + 1}'
+            parts = [_pci_root(0), _pci(0x14, 0), _usb(i % 8, 0),
+                     _hd(i % 4 + 1, 0x800, 0x3a00000, uuid.UUID(int=rng.getrandbits(128)))]
+        elif kind == 4:
+            mac = bytes([0x52, 0x54, 0x00, (i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff])
+            desc = f'UEFI PXEv4 (MAC:{mac.hex().upper()})'
+            parts = [_pci_root(0), _pci(0x3, 0), _mac(mac), _ipv4()]
+        elif kind == 5:
+            desc = f'Linux 启动管理器 {i}'
+            parts = [_hd(2, 0x100800, 0x200000, uuid.UUID(int=rng.getrandbits(128))),
+                     _file('\\EFI\\systemd\\systemd-bootx64.efi')]
+        elif kind == 6:
+            # Some firmware stores tabs in descriptions; scanners must not split on them
+            desc = f'Vendor\tDiagnostics {i}'
+            parts = [_hd(1, 0x800, 0x100000, esp), _file(f'\\EFI\\vendor\\diag{i}.efi')]
+        else:
+            desc = f'Linux Firmware Updater {i}'
+            parts = [_hd(1, 0x800, 0x100000, esp), _file('\\EFI\\ubuntu\\fwupdx64.efi')]
+            optional = b'\x01\x00\x00\x00' + bytes(rng.getrandbits(8) for _ in range(12))
+        path_bytes, path_text = _path(parts)
+        options.append(FakeOption(bid, desc, active, path_bytes, path_text, optional))
+    ids = [o.id for o in options]
+    order = [b for b in ids if rng.random() > 0.03] or ids[:1]
+    rng.shuffle(order)
+    current = order[0] if order else '0000'
+    nxt = order[len(order) // 2] if len(order) > 2 else None
+    return FakeFirmware(options=options, order=order, current=current, next=nxt)
+
+
+# --- efivarfs ---
+def write_efivars(fw: FakeFirmware, root: str) -> str:
+    os.makedirs(root, exist_ok=True)
+
+    def put(name: str, data: bytes) -> None:
+        with open(os.path.join(root, f'{name}-{EFI_GLOBAL_GUID}'), 'wb') as f:
+            f.write(_ATTRS + data)
+
+    for opt in fw.options:
+        put(f'Boot{opt.id}', opt.load_option())
+    put('BootOrder', struct.pack(f'<{len(fw.order)}H', *(int(b, 16) for b in fw.order)))
+    put('BootCurrent', struct.pack('<H', int(fw.current, 16)))
+    if fw.next:
+        put('BootNext', struct.pack('<H', int(fw.next, 16)))
+    put('Timeout', struct.pack('<H', fw.timeout))
+    # Unrelated variables every real efivarfs has
+    put('ConIn', b'\x00' * 32)
+    put('Lang', b'eng\x00')
+    return root
+
+
+# --- systemd-boot (ESP with loader entries and UKIs, loader variables) ---
+LOADER_GUID = '4a67b082-0a4c-41cf-b6c7-440b29bb8c4f'
+_VOLATILE_ATTRS = struct.pack('<I', 0x6)  # BS | RT
+_UKI_KERNEL_BYTES = 16 << 20  # sparse: the .linux section a header-only reader must never touch
+
+
+def _uki(path: str, osrel: str, uname: str) -> None:
+    """Minimal PE32+ image with .osrel/.uname and a large sparse .linux section."""
+    sections = [('.osrel', osrel.encode('utf-8')), ('.uname', uname.encode('utf-8'))]
+    opt_size = 240
+    pe_off = 0x80
+    table = pe_off + 24 + opt_size
+    offset = 0x400
+    headers = []
+    for name, data in sections:
+        headers.append((name, len(data), offset, (len(data) + 0x1ff) & ~0x1ff))
+        offset += headers[-1][3]
+    headers.append(('.linux', _UKI_KERNEL_BYTES, offset, _UKI_KERNEL_BYTES))
+    head = bytearray(0x400)
+    head[0:2] = b'MZ'
+    struct.pack_into('<I', head, 0x3c, pe_off)
+    head[pe_off:pe_off + 4] = b'PE\0\0'
+    struct.pack_into('<HHIIIHH', head, pe_off + 4, 0x8664, len(headers), 0, 0, 0, opt_size, 0x22)
+    struct.pack_into('<H', head, pe_off + 24, 0x20b)
+    for i, (name, size, off, raw) in enumerate(headers):
+        struct.pack_into('<8sIIIIIIHHI', head, table + 40 * i, name.encode('ascii'), size, off, raw, off,
+                         0, 0, 0, 0, 0x40000040)
+    with open(path, 'wb') as f:
+        f.write(head)
+        for (_name, data), (_n, _size, off, _raw) in zip(sections, headers):
+            f.seek(off)
+            f.write(data)
+        f.truncate(offset + _UKI_KERNEL_BYTES)
+
+
+def write_systemd_boot(n: int, root: str, seed: int = 0) -> tuple:
+    """`root/esp` with n entries (type #1 .conf and UKIs alternating) and `root/efivars`; returns both paths."""
+    rng = random.Random(f'systemd-boot-{seed}')
+    esp = os.path.join(root, 'esp')
+    efivars = os.path.join(root, 'efivars')
+    entries_dir = os.path.join(esp, 'loader', 'entries')
+    uki_dir = os.path.join(esp, 'EFI', 'Linux')
+    for d in (entries_dir, uki_dir, efivars, os.path.join(esp, 'EFI', 'systemd')):
+        os.makedirs(d, exist_ok=True)
+    _put(os.path.join(esp, 'loader', 'loader.conf'), 'timeout 3\ndefault @saved\n')
+    distros = [('fedora', 'Fedora Linux 40 (Workstation Edition)', '40'), ('arch', 'Arch Linux', None),
+               ('debian', 'Debian GNU/Linux 12 (bookworm)', '12'), ('opensuse-tumbleweed', 'openSUSE Tumbleweed', None)]
+    machine_ids = [uuid.UUID(int=rng.getrandbits(128)).hex for _ in distros]
+    ids = []
+    for i in range(n):
+        k = i % len(distros)
+        os_id, pretty, version_id = distros[k]
+        kver = f'6.{i // len(distros) % 20}.{i % 13}-{100 + i}'
+        stem = f'{machine_ids[k]}-{kver}'
+        # Some files carry a boot counter (`+3-0`), which is not part of the id
+        counter = '+3-0' if i % 5 == 3 else ''
+        if i % 2 == 0:
+            name = f'{stem}.conf'
+            _put(os.path.join(entries_dir, f'{stem}{counter}.conf'),
+                 f'# Boot Loader Specification type#1 entry\n'
+                 f'title      {pretty}\nversion    {kver}\nmachine-id {machine_ids[k]}\nsort-key   {os_id}\n'
+                 f'linux      /{machine_ids[k]}/{kver}/linux\ninitrd     /{machine_ids[k]}/{kver}/initrd\n'
+                 f'options    root=UUID={uuid.UUID(int=rng.getrandbits(128))} rw quiet\n')
+        else:
+            name = f'{stem}.efi'
+            osrel = f'NAME="{pretty.split(" (")[0]}"\nPRETTY_NAME="{pretty}"\nID={os_id}\n'
+            if version_id:
+                osrel += f'VERSION_ID={version_id}\n'
+            _uki(os.path.join(uki_dir, f'{stem}{counter}.efi'), osrel, kver)
+        ids.append(name)
+
+    def put(name: str, text: str, attrs: bytes = _ATTRS) -> None:
+        with open(os.path.join(efivars, f'{name}-{LOADER_GUID}'), 'wb') as f:
+            f.write(attrs + (text + '\0').encode('utf-16-le'))
+
+    seen = ids + ['auto-windows', 'auto-reboot-to-firmware-setup']
+    with open(os.path.join(efivars, f'LoaderEntries-{LOADER_GUID}'), 'wb') as f:
+        f.write(_VOLATILE_ATTRS + ''.join(x + '\0' for x in seen).encode('utf-16-le'))
+    put('LoaderInfo', 'systemd-boot 256.4', _VOLATILE_ATTRS)
+    if ids:
+        put('LoaderEntrySelected', ids[0], _VOLATILE_ATTRS)
+        put('LoaderEntryDefault', ids[0])
+    if len(ids) > 2:
+        put('LoaderEntryOneShot', ids[len(ids) // 2])
+    return esp, efivars
+
+
+# --- block devices (sysfs, /dev/disk/by-partuuid, udev database, mountinfo) ---
+_GPT_RE = re.compile(r'HD\(\d+,GPT,([0-9a-f-]{36})')
+
+
+def _put(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+# Registry value types written by the hive generator
+_REG_SZ = 1
+_REG_BINARY = 3
+_REG_DWORD = 4
+_REG_MULTI_SZ = 7
+
+
+def _regf(root: tuple) -> bytes:
+    """A minimal regf registry hive.
+
+    A key is `(subkeys, values)`: `subkeys` maps names to keys of the same
+    shape, `values` maps names to `(type, data bytes)`.
+    """
+    # Cell offsets are relative to the first hbin (file offset 0x1000), whose 32-byte header comes first
+    hbin = bytearray(b'hbin' + bytes(28))
+    none = 0xFFFFFFFF
+
+    def cell(payload: bytes) -> int:
+        offset = len(hbin)
+        size = (len(payload) + 4 + 7) & ~7
+        hbin.extend(struct.pack('<i', -size) + payload + bytes(size - 4 - len(payload)))
+        return offset
+
+    def key(name: str, node: tuple) -> int:
+        subkeys, values = node
+        children = [(sub, key(sub, child)) for sub, child in subkeys.items()]
+        lf = cell(b'lf' + struct.pack('<H', len(children)) + b''.join(
+            struct.pack('<I', off) + sub[:4].encode('latin-1').ljust(4, b'\0') for sub, off in children)) if children else none
+        vks = []
+        for vname, (vtype, data) in values.items():
+            raw = vname.encode('latin-1')
+            data_off = cell(data) if data else none
+            vks.append(cell(b'vk' + struct.pack('<HIII', len(raw), len(data), data_off, vtype)
+                            + struct.pack('<HH', 1, 0) + raw))
+        value_list = cell(b''.join(struct.pack('<I', v) for v in vks)) if vks else none
+        raw = name.encode('latin-1')
+        return cell(b'nk' + struct.pack('<H', 0x0020) + bytes(12) + struct.pack('<I', 0)
+                    + struct.pack('<II', len(children), 0) + struct.pack('<II', lf, none)
+                    + struct.pack('<II', len(vks), value_list)
+                    + bytes(28) + struct.pack('<HH', len(raw), 0) + raw)
+
+    root_offset = key('ROOT', root)
+    struct.pack_into('<II', hbin, 4, 0, len(hbin))
+    header = b'regf' + bytes(16) + struct.pack('<II', 1, 5) + bytes(8) + struct.pack('<I', root_offset)
+    return header.ljust(0x1000, b'\0') + bytes(hbin)
+
+
+def _sz(text: str) -> bytes:
+    return (text + '\0').encode('utf-16-le')
+
+
+def _multi_sz(items: List[str]) -> bytes:
+    return ('\0'.join(items) + '\0\0').encode('utf-16-le')
+
+
+def _qword(value: int) -> bytes:
+    return struct.pack('<Q', value)
+
+
+def _hive(path: List[str], values: Dict[str, str]) -> bytes:
+    """A minimal regf registry hive: one key chain `path` whose last key holds REG_SZ `values`."""
+    node: tuple = ({}, {name: (_REG_SZ, _sz(value)) for name, value in values.items()})
+    for name in reversed(path):
+        node = ({name: node}, {})
+    return _regf(node)
+
+
+def _fs_uuid(rng: random.Random, fstype: str) -> str:
+    if fstype == 'vfat':
+        return f'{rng.getrandbits(16):04X}-{rng.getrandbits(16):04X}'
+    if fstype == 'ntfs':
+        return f'{rng.getrandbits(64):016X}'
+    return str(uuid.UUID(int=rng.getrandbits(128)))
+
+
+def write_blockdev(fw: FakeFirmware, root: str, extra_disks: int = 24, seed: int = 0) -> str:
+    """A block-device tree under `root` holding every GPT partition `fw` refers to, plus spare disks.
+
+    The first partition is the ESP (vfat, label `ESP`, mounted at /boot/efi)
+    with GRUB configs for ubuntu and fedora, a Windows loader and a
+    systemd-boot entry. One extra disk carries the installs they point to: an
+    Ubuntu root mounted at `/` (i.e. `root` itself), Fedora with a separate
+    /boot, and Windows with a SOFTWARE hive. Other partitions are empty; one
+    label contains a space to exercise udev's `\\x20` escaping.
+    """
+    rng = random.Random(f'blockdev-{seed}')  # not make_firmware's stream: its GUIDs would repeat
+    referenced = list(dict.fromkeys(m.group(1) for o in fw.options for m in _GPT_RE.finditer(o.path_text)))
+    disks: List[List[str]] = [referenced[i:i + 4] for i in range(0, len(referenced), 4)]
+    os_disk = len(disks)
+    disks += [[str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(4)] for _ in range(extra_disks + 1)]
+    # (disk, partition) -> (fstype, mountpoint) for the partitions that carry something
+    special = {
+        (0, 1): ('vfat', '/boot/efi'),
+        (os_disk, 1): ('ext4', '/'),  # Ubuntu
+        (os_disk, 2): ('ext4', '/mnt/fedora-boot'),
+        (os_disk, 3): ('btrfs', '/mnt/fedora'),
+        (os_disk, 4): ('ntfs', '/mnt/windows'),
+    }
+    fs_uuids: Dict[tuple, str] = {}
+    mountinfo = ['22 1 0:21 / /proc rw,nosuid - proc proc rw']
+    mount_id = 30
+    for d, parts in enumerate(disks):
+        disk = f'nvme{d}n1'
+        major = 259
+        disk_minor = d * 16
+        sysdir = os.path.join(root, 'sys/devices/pci0000:00/nvme', disk)
+        _put(os.path.join(sysdir, 'dev'), f'{major}:{disk_minor}\n')
+        _put(os.path.join(sysdir, 'size'), f'{(len(parts) + 1) * 0x200000}\n')
+        os.makedirs(os.path.join(root, 'sys/class/block'), exist_ok=True)
+        os.symlink(f'../../devices/pci0000:00/nvme/{disk}', os.path.join(root, 'sys/class/block', disk))
+        _put(os.path.join(root, f'run/udev/data/b{major}:{disk_minor}'),
+             f'E:ID_PART_TABLE_TYPE=gpt\nE:ID_PART_TABLE_UUID={uuid.UUID(int=rng.getrandbits(128))}\n')
+        for p, partuuid in enumerate(parts, 1):
+            name = f'{disk}p{p}'
+            minor = disk_minor + p
+            _put(os.path.join(sysdir, name, 'dev'), f'{major}:{minor}\n')
+            _put(os.path.join(sysdir, name, 'size'), '2097152\n')
+            _put(os.path.join(sysdir, name, 'partition'), f'{p}\n')
+            os.symlink(f'../../devices/pci0000:00/nvme/{disk}/{name}', os.path.join(root, 'sys/class/block', name))
+            fstype, target = special.get((d, p), ('ext4', f'/srv/disk\\040{d}' if p == 2 else None))
+            esp = (d, p) == (0, 1)
+            label, label_enc = ('ESP', 'ESP') if esp else (f'数据 {d}-{p}', '\\xe6\\x95\\xb0\\xe6\\x8d\\xae\\x20' + f'{d}-{p}')
+            fs_uuids[d, p] = fs_uuid = _fs_uuid(rng, fstype)
+            _put(os.path.join(root, f'run/udev/data/b{major}:{minor}'),
+                 f'E:ID_FS_TYPE={fstype}\nE:ID_FS_UUID={fs_uuid}\nE:ID_FS_LABEL={label.replace(" ", "_")}\n'
+                 f'E:ID_FS_LABEL_ENC={label_enc}\nE:ID_PART_ENTRY_UUID={partuuid}\nE:ID_PART_ENTRY_NUMBER={p}\n')
+            os.makedirs(os.path.join(root, 'dev/disk/by-partuuid'), exist_ok=True)
+            os.symlink(f'../../{name}', os.path.join(root, 'dev/disk/by-partuuid', partuuid))
+            if target:
+                mountinfo.append(f'{mount_id} 1 {major}:{minor} / {target} rw,relatime - {fstype} /dev/{name} rw')
+                mount_id += 1
+    _put(os.path.join(root, 'proc/self/mountinfo'), '\n'.join(mountinfo) + '\n')
+
+    # Filesystem contents, at each mountpoint relative to `root`
+    esp = os.path.join(root, 'boot/efi')
+    _put(os.path.join(esp, 'EFI/ubuntu/grub.cfg'),
+         f"search.fs_uuid {fs_uuids[os_disk, 1]} root hd1,gpt1\nset prefix=($root)'/boot/grub'\n"
+         "configfile $prefix/grub.cfg\n")
+    _put(os.path.join(esp, 'EFI/fedora/grub.cfg'),
+         f'search --no-floppy --fs-uuid --set=dev {fs_uuids[os_disk, 2]}\nset prefix=($dev)/grub2\n'
+         'export $prefix\nconfigfile $prefix/grub.cfg\n')
+    _put(os.path.join(esp, 'EFI/Microsoft/Boot/BCD'), '')
+    _put(os.path.join(esp, 'loader/entries/fedora.conf'),
+         f'title Fedora Linux\nlinux /vmlinuz\noptions root=PARTUUID={disks[os_disk][2]} rw\n')
+    _put(os.path.join(root, 'etc/os-release'),
+         'PRETTY_NAME="Ubuntu 24.04.1 LTS"\nNAME="Ubuntu"\nVERSION_ID="24.04"\nID=ubuntu\n')
+    _put(os.path.join(root, 'mnt/fedora-boot/grub2/grub.cfg'),
+         f"menuentry 'Fedora Linux (6.8.5-301.fc40.x86_64) 40 (Workstation Edition)' {{\n"
+         f"\tlinux /vmlinuz-6.8.5-301.fc40.x86_64 root=UUID={fs_uuids[os_disk, 3]} ro rhgb quiet\n}}\n")
+    _put(os.path.join(root, 'mnt/fedora/usr/lib/os-release'),
+         'NAME="Fedora Linux"\nVERSION_ID=40\nID=fedora\nPRETTY_NAME="Fedora Linux 40 (Workstation Edition)"\n')
+    hive = _hive(['Microsoft', 'Windows NT', 'CurrentVersion'],
+                 {'ProductName': 'Windows 10 Pro', 'EditionID': 'Professional', 'DisplayVersion': '23H2',
+                  'CurrentBuild': '22631'})
+    os.makedirs(os.path.join(root, 'mnt/windows/Windows/System32/config'), exist_ok=True)
+    with open(os.path.join(root, 'mnt/windows/Windows/System32/config/SOFTWARE'), 'wb') as f:
+        f.write(hive)
+    return root
+
+
+# --- efibootmgr ---
+def _optional_text(data: bytes) -> str:
+    # efibootmgr 17 prints optional data as text with dots for unprintable bytes
+    return ''.join(chr(b) if 0x20 <= b < 0x7f else '.' for b in data)
+
+
+def efibootmgr_text(fw: FakeFirmware, verbose: bool = False) -> str:
+    lines = [f'BootCurrent: {fw.current}']
+    if fw.next:
+        lines.append(f'BootNext: {fw.next}')
+    lines.append(f'Timeout: {fw.timeout} seconds')
+    lines.append('BootOrder: ' + ','.join(fw.order))
+    for opt in fw.options:
+        head = f'Boot{opt.id}{"*" if opt.active else " "} {opt.description}'
+        if verbose:
+            head += '\t' + opt.path_text + _optional_text(opt.optional)
+        lines.append(head)
+    return '\n'.join(lines) + '\n'
+
+
+# --- bcdedit ---
+_BCD_LABELS = {
+    'en': {
+        'fw': 'Firmware Boot Manager', 'bootmgr': 'Windows Boot Manager',
+        'app': 'Firmware Application (101fffff)', 'loader': 'Windows Boot Loader',
+        'identifier': 'identifier', 'yes': 'Yes', 'locale': 'en-US',
+        'recovery': 'Windows Recovery Environment',
+    },
+    # zh-CN bcdedit localizes headers and `identifier`; the other element names stay English
+    'zh': {
+        'fw': '固件启动管理器', 'bootmgr': 'Windows 启动管理器',
+        'app': '固件应用程序 (101fffff)', 'loader': 'Windows 启动加载器',
+        'identifier': '标识符', 'yes': '是', 'locale': 'zh-CN',
+        'recovery': 'Windows 恢复环境',
+    },
+}
+
+
+def _bcd_block(header: str, rows: List[tuple]) -> str:
+    out = [header, '-' * len(header)]
+    for name, value in rows:
+        values = value if isinstance(value, list) else [value]
+        for i, v in enumerate(values):
+            out.append(f'{name if i == 0 else "":<24}{v}')
+    return '\n'.join(out)
+
+
+def _bcd_layout(n: int, seed: int) -> tuple:
+    """(guid factory, firmware application ids, Windows loader ids); the last loader is WinRE."""
+    rng = random.Random(seed)
+
+    def guid() -> str:
+        return '{' + str(uuid.UUID(int=rng.getrandbits(128))) + '}'
+
+    apps = [guid() for _ in range(max(0, n - 1))]
+    loaders = [guid() for _ in range(max(2, n // 50))]
+    return guid, apps, loaders
+
+
+def _bcd_app_description(i: int) -> str:
+    return ('ubuntu', 'UEFI: SanDisk Cruzer Blade 1.00，分区 1', f'UEFI PXEv4 (MAC:525400{i:06X})',
+            f'Linux 启动管理器 {i}', f'EFI USB Device {i}')[i % 5]
+
+
+def bcdedit_text(n: int, locale: str = 'en', seed: int = 0) -> str:
+    """`bcdedit /v /enum all` for `n` firmware entries plus a few Windows loaders."""
+    lab = _BCD_LABELS[locale]
+    guid, apps, loaders = _bcd_layout(n, seed)
+    recovery = loaders[-1]
+    display = [BOOTMGR_GUID] + apps
+    blocks = []
+    fw_rows = [(lab['identifier'], FWBOOTMGR_GUID), ('displayorder', display)]
+    if len(apps) > 1:
+        fw_rows.append(('bootsequence', apps[len(apps) // 2]))
+    fw_rows.append(('timeout', '1'))
+    blocks.append(_bcd_block(lab['fw'], fw_rows))
+    blocks.append(_bcd_block(lab['bootmgr'], [
+        (lab['identifier'], BOOTMGR_GUID),
+        ('device', 'partition=\\Device\\HarddiskVolume1'),
+        ('path', '\\EFI\\Microsoft\\Boot\\bootmgfw.efi'),
+        ('description', 'Windows Boot Manager'),
+        ('locale', lab['locale']),
+        ('inherit', '{7ea2e1ac-2e61-4728-aaa3-896d9d0a9f0e}'),
+        ('default', loaders[0]),
+        ('resumeobject', guid()),
+        ('displayorder', loaders[:-1]),
+        ('toolsdisplayorder', '{b2721d73-1db4-4c62-bf78-c548a880142d}'),
+        ('timeout', '30'),
+    ]))
+    for i, g in enumerate(apps):
+        blocks.append(_bcd_block(lab['app'], [(lab['identifier'], g), ('description', _bcd_app_description(i))]))
+    for i, g in enumerate(loaders):
+        if g == recovery:
+            blocks.append(_bcd_block(lab['loader'], [
+                (lab['identifier'], g),
+                ('device', f'ramdisk=[\\Device\\HarddiskVolume4]\\Recovery\\WindowsRE\\Winre.wim,{guid()}'),
+                ('path', '\\windows\\system32\\winload.efi'),
+                ('description', lab['recovery']),
+                ('locale', lab['locale']),
+                ('osdevice', f'ramdisk=[\\Device\\HarddiskVolume4]\\Recovery\\WindowsRE\\Winre.wim,{guid()}'),
+                ('systemroot', '\\windows'),
+                ('nx', 'OptIn'),
+                ('winpe', lab['yes']),
+            ]))
+            continue
+        blocks.append(_bcd_block(lab['loader'], [
+            (lab['identifier'], g),
+            ('device', 'partition=C:'),
+            ('path', '\\Windows\\system32\\winload.efi'),
+            ('description', 'Windows 11' if i == 0 else f'Windows 10 ({i})'),
+            ('locale', lab['locale']),
+            ('recoverysequence', recovery),
+            ('displaymessageoverride', 'Recovery'),
+            ('recoveryenabled', lab['yes']),
+            ('isolatedcontext', lab['yes']),
+            ('allowedinmemorysettings', '0x15000075'),
+            ('osdevice', 'partition=C:'),
+            ('systemroot', '\\Windows'),
+            ('resumeobject', guid()),
+            ('nx', 'OptIn'),
+            ('bootmenupolicy', 'Standard'),
+        ]))
+    return '\n\n'.join(blocks) + '\n'
+
+
+def _bcd_element(vtype: int, data: bytes) -> tuple:
+    return {}, {'Element': (vtype, data)}
+
+
+def _bcd_device(wim: Optional[str] = None, options: Optional[str] = None) -> bytes:
+    """Device element: 16-byte options GUID, fixed header, then the UTF-16 WIM path for ramdisks."""
+    head = uuid.UUID(options.strip('{}')).bytes_le if options else bytes(16)
+    body = bytes(56)
+    if wim:
+        body += _sz(wim)
+    return head + body
+
+
+def bcd_hive(n: int, seed: int = 0) -> bytes:
+    """The store `bcdedit_text(n, seed=seed)` prints, as the BCD registry hive `bcdedit /export` writes."""
+    guid, apps, loaders = _bcd_layout(n, seed)
+    recovery = loaders[-1]
+    objects: Dict[str, tuple] = {}
+
+    def add(ident: str, obj_type: int, elements: Dict[int, tuple]) -> None:
+        objects[ident] = ({
+            'Description': ({}, {'Type': (_REG_DWORD, struct.pack('<I', obj_type))}),
+            'Elements': ({f'{t:08X}': _bcd_element(*v) for t, v in elements.items()}, {}),
+        }, {})
+
+    fw = {0x24000001: (_REG_MULTI_SZ, _multi_sz([BOOTMGR_GUID] + apps))}
+    if len(apps) > 1:
+        fw[0x24000002] = (_REG_MULTI_SZ, _multi_sz([apps[len(apps) // 2]]))
+    fw[0x25000004] = (_REG_BINARY, _qword(1))
+    add(FWBOOTMGR_GUID, 0x10100001, fw)
+    add(BOOTMGR_GUID, 0x10100002, {
+        0x11000001: (_REG_BINARY, _bcd_device()),
+        0x12000002: (_REG_SZ, _sz('\\EFI\\Microsoft\\Boot\\bootmgfw.efi')),
+        0x12000004: (_REG_SZ, _sz('Windows Boot Manager')),
+        0x12000005: (_REG_SZ, _sz('en-US')),
+        0x14000006: (_REG_MULTI_SZ, _multi_sz(['{7ea2e1ac-2e61-4728-aaa3-896d9d0a9f0e}'])),
+        0x23000003: (_REG_SZ, _sz(loaders[0])),
+        0x23000006: (_REG_SZ, _sz(guid())),
+        0x24000001: (_REG_MULTI_SZ, _multi_sz(loaders[:-1])),
+        0x24000010: (_REG_MULTI_SZ, _multi_sz(['{b2721d73-1db4-4c62-bf78-c548a880142d}'])),
+        0x25000004: (_REG_BINARY, _qword(30)),
+    })
+    for i, g in enumerate(apps):
+        add(g, 0x101fffff, {0x12000004: (_REG_SZ, _sz(_bcd_app_description(i)))})
+    for i, g in enumerate(loaders):
+        if g == recovery:
+            wim = '\\Recovery\\WindowsRE\\Winre.wim'
+            add(g, 0x10200003, {
+                0x11000001: (_REG_BINARY, _bcd_device(wim, guid())),
+                0x12000002: (_REG_SZ, _sz('\\windows\\system32\\winload.efi')),
+                0x12000004: (_REG_SZ, _sz('Windows Recovery Environment')),
+                0x12000005: (_REG_SZ, _sz('en-US')),
+                0x21000001: (_REG_BINARY, _bcd_device(wim, guid())),
+                0x22000002: (_REG_SZ, _sz('\\windows')),
+                0x15000065: (_REG_BINARY, _qword(0)),
+                0x26000022: (_REG_BINARY, b'\x01'),
+            })
+            continue
+        add(g, 0x10200003, {
+            0x11000001: (_REG_BINARY, _bcd_device()),
+            0x12000002: (_REG_SZ, _sz('\\Windows\\system32\\winload.efi')),
+            0x12000004: (_REG_SZ, _sz('Windows 11' if i == 0 else f'Windows 10 ({i})')),
+            0x12000005: (_REG_SZ, _sz('en-US')),
+            0x14000008: (_REG_MULTI_SZ, _multi_sz([recovery])),
+            0x16000009: (_REG_BINARY, b'\x01'),
+            0x16000060: (_REG_BINARY, b'\x01'),
+            0x21000001: (_REG_BINARY, _bcd_device()),
+            0x22000002: (_REG_SZ, _sz('\\Windows')),
+            0x23000003: (_REG_SZ, _sz(guid())),
+            0x15000065: (_REG_BINARY, _qword(0)),
+            0x250000C2: (_REG_BINARY, _qword(0)),
+        })
+    return _regf(({'Description': ({}, {'KeyName': (_REG_SZ, _sz('BCD00000000'))}), 'Objects': (objects, {})}, {}))
+
+
+# --- fake commands on PATH (POSIX only) ---
+_EFIBOOTMGR_SH = '''#!/bin/sh
+# Fake efibootmgr: prints the pre-generated listing; mutations succeed silently
+d="$(dirname "$0")/.."
+for a in "$@"; do
+  case "$a" in
+    -n|-N|-o|-b|-B|-a|-A) exit 0 ;;
+    -v|--verbose) exec cat "$d/efibootmgr-v.txt" ;;
+  esac
+done
+exec cat "$d/efibootmgr.txt"
+'''
+
+_BCDEDIT_SH = '''#!/bin/sh
+# Fake bcdedit: no /export (forces the text path), /enum prints the fixture
+d="$(dirname "$0")/.."
+case "$1" in
+  /export) echo "The export operation has failed." >&2; exit 1 ;;
+  /set|/deletevalue) exit 0 ;;
+esac
+exec cat "$d/bcdedit.txt"
+'''
+
+# `WindowsBootManager` runs `cmd.exe /d /c bcdedit ...`
+_CMD_SH = '''#!/bin/sh
+while [ $# -gt 0 ]; do
+  case "$1" in /d|/D) shift ;; /c|/C) shift; break ;; *) break ;; esac
+done
+exec "$@"
+'''
+
+
+def _script(path: str, body: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(body)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def install_shims(root: str, n: int, locale: str = 'en', seed: int = 0) -> str:
+    """Fixture files plus `bin/` with the fake commands; returns the bin directory for PATH."""
+    fw = make_firmware(n, seed)
+    bindir = os.path.join(root, 'bin')
+    os.makedirs(bindir, exist_ok=True)
+    for name, text in (('efibootmgr.txt', efibootmgr_text(fw)),
+                       ('efibootmgr-v.txt', efibootmgr_text(fw, verbose=True)),
+                       ('bcdedit.txt', bcdedit_text(n, locale, seed))):
+        with open(os.path.join(root, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+    _script(os.path.join(bindir, 'efibootmgr'), _EFIBOOTMGR_SH)
+    _script(os.path.join(bindir, 'bcdedit'), _BCDEDIT_SH)
+    _script(os.path.join(bindir, 'cmd.exe'), _CMD_SH)
+    return bindir
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('kind', choices=['efivars', 'efibootmgr', 'efibootmgr-v', 'bcdedit', 'bcdedit-zh', 'shims', 'blockdev',
+                                      'systemd-boot', 'bcd-hive'])
+    p.add_argument('size', type=int, help='引导项数量')
+    p.add_argument('dest', help='输出目录或文件（文本类可用 - 表示 stdout）')
+    p.add_argument('--seed', type=int, default=0)
+    args = p.parse_args()
+
+    if args.kind == 'efivars':
+        write_efivars(make_firmware(args.size, args.seed), args.dest)
+        return 0
+    if args.kind == 'blockdev':
+        write_blockdev(make_firmware(args.size, args.seed), args.dest, seed=args.seed)
+        return 0
+    if args.kind == 'systemd-boot':
+        write_systemd_boot(args.size, args.dest, seed=args.seed)
+        return 0
+    if args.kind == 'bcd-hive':
+        with open(args.dest, 'wb') as f:
+            f.write(bcd_hive(args.size, args.seed))
+        return 0
+    if args.kind == 'shims':
+        print(install_shims(args.dest, args.size, seed=args.seed))
+        return 0
+    if args.kind.startswith('efibootmgr'):
+        text = efibootmgr_text(make_firmware(args.size, args.seed), verbose=args.kind.endswith('-v'))
+    else:
+        text = bcdedit_text(args.size, 'zh' if args.kind.endswith('-zh') else 'en', args.seed)
+    if args.dest == '-':
+        sys.stdout.write(text)
+    else:
+        with open(args.dest, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
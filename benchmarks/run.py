@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""run.py
+引导项后端的基准与规模测试：在 10~5000 个引导项的合成固件状态上测量
+list_entries / set_next / format_entries 以及 CLI 冷启动的耗时、外部进程数与峰值内存，
+输出 JSON，并可与上一次结果比较、超过阈值时以退出码 1 报告回归。
+
+用法：
+  benchmarks/run.py                                   # 全部后端，规模 10,100,1000,5000
+  benchmarks/run.py --backends efivars --sizes 100,5000 --repeat 9
+  benchmarks/run.py --output new.json --compare baseline.json --threshold 0.25
+
+后端：
+  efivars      efivarfs 目录树（SYS_SWITCH_EFIVARS 指向临时目录）；另测块设备索引扫描、带 device 列的 JSON 输出与操作系统识别（冷/有缓存）
+  efibootmgr   PATH 上的假 efibootmgr（efivarfs 不可用时的回退路径）；另测 `efibootmgr -v` 解析本身
+  systemd-boot ESP 上的 loader/entries 与 UKI（SYS_SWITCH_ESP）加 LoaderEntry* 变量；UKI 内核段为 16 MiB 稀疏数据
+  bcdedit      PATH 上的假 cmd.exe + bcdedit，英文 `/v /enum all` 输出；另测同一存储的文本解析
+               与 `bcdedit /export` 格式注册表 hive（load_bcd_snapshot）解析
+  bcdedit-zh   同上，中文输出
+
+每个（后端，规模）在独立子进程中测量，峰值内存（ru_maxrss）互不影响；外部进程数
+来自追踪器记录的 exec span。假命令是 /bin/sh 脚本，仅支持 Linux/macOS。
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+REPO_SRC = os.path.join(REPO_ROOT, 'src')
+sys.path.insert(0, BENCH_DIR)
+
+from fixtures import (bcd_hive, install_shims, make_firmware, write_blockdev, write_efivars,  # noqa: E402
+                      write_systemd_boot)
+
+BACKENDS = ('efivars', 'efibootmgr', 'systemd-boot', 'bcdedit', 'bcdedit-zh')
+DEFAULT_SIZES = '10,100,1000,5000'
+# Tells the worker where the generated listings live
+FIXTURE_ENV = 'SYS_SWITCH_BENCH_FIXTURES'
+# Metrics compared against a baseline; subprocess counts must never grow
+_TIMED = ('wall_ms',)
+
+
+def _maxrss_kb() -> int:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+# --- fixtures ---
+def _prepare(backend: str, size: int, root: str, seed: int) -> Dict[str, str]:
+    """Build the fixture for one backend under `root`; returns the environment to run in."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_SRC, env.get('PYTHONPATH')]))
+    env['SYS_SWITCH_DAEMON'] = '0'
+    env['SYS_SWITCH_BROKER'] = '0'
+    env['SYS_SWITCH_CACHE_DIR'] = os.path.join(root, 'cache')
+    env[FIXTURE_ENV] = root
+    if backend == 'efivars':
+        fw = make_firmware(size, seed)
+        env['SYS_SWITCH_EFIVARS'] = write_efivars(fw, os.path.join(root, 'efivars'))
+        env['SYS_SWITCH_BLOCKDEV_ROOT'] = write_blockdev(fw, os.path.join(root, 'blockdev'), seed=seed)
+        return env
+    if backend == 'systemd-boot':
+        env['SYS_SWITCH_ESP'], env['SYS_SWITCH_EFIVARS'] = write_systemd_boot(size, root, seed=seed)
+        return env
+    bindir = install_shims(root, size, locale='zh' if backend == 'bcdedit-zh' else 'en', seed=seed)
+    if backend.startswith('bcdedit'):
+        with open(os.path.join(root, 'BCD'), 'wb') as f:
+            f.write(bcd_hive(size, seed))
+    env['PATH'] = bindir + os.pathsep + env.get('PATH', '')
+    # Empty efivarfs: LinuxBootManager falls back to efibootmgr
+    empty = os.path.join(root, 'no-efivars')
+    os.makedirs(empty, exist_ok=True)
+    env['SYS_SWITCH_EFIVARS'] = empty
+    return env
+
+
+# --- measurements (child process) ---
+def _worker(backend: str, size: int, repeat: int) -> dict:
+    rss_start = _maxrss_kb()
+    from sys_switch.cli import format_entries
+    from sys_switch.trace import tracer
+    if backend.startswith('bcdedit'):
+        from sys_switch.platforms.windows import WindowsBootManager
+        mgr = WindowsBootManager()
+    elif backend == 'systemd-boot':
+        from sys_switch.platforms.systemdboot import SystemdBootManager
+        mgr = SystemdBootManager()
+    else:
+        from sys_switch.platforms.linux import LinuxBootManager
+        mgr = LinuxBootManager()
+    rss_import = _maxrss_kb()
+    invalidate = getattr(mgr, 'invalidate', lambda: None)
+    tracer.enable()
+    rows: List[dict] = []
+
+    def measure(op: str, fn: Callable, fresh: bool = True):
+        walls = []
+        procs = 0
+        out = None
+        for _ in range(repeat):
+            if fresh:
+                invalidate()  # no reuse of a previous capture between rounds
+            tracer.clear()
+            t0 = time.perf_counter()
+            out = fn()
+            walls.append((time.perf_counter() - t0) * 1000)
+            procs = sum(1 for s in tracer.spans() if s.name == 'exec')
+        rows.append({
+            'op': op,
+            'wall_ms': round(statistics.median(walls), 3),
+            'min_ms': round(min(walls), 3),
+            'subprocesses': procs,
+            'peak_rss_kb': _maxrss_kb(),
+        })
+        return out
+
+    entries = measure('list_entries', mgr.list_entries)
+    rows[-1]['entries'] = len(entries)
+    measure('format_text', lambda: format_entries(entries, 'text'), fresh=False)
+    measure('format_json', lambda: format_entries(entries, 'json'), fresh=False)
+    target = next((e.id for e in entries[len(entries) // 2:] if not e.is_next), entries[0].id if entries else '0000')
+    ok, _msg = measure('set_next', lambda: mgr.set_next(target))
+    rows[-1]['ok'] = ok
+    if backend == 'efibootmgr':
+        # Parser alone on the NVRAM dump, without the process start
+        from sys_switch.platforms.linux import scan_efibootmgr
+        with open(os.path.join(os.environ[FIXTURE_ENV], 'efibootmgr-v.txt'), encoding='utf-8') as f:
+            dump = f.read()
+        state = measure('scan_efibootmgr', lambda: scan_efibootmgr(dump), fresh=False)
+        rows[-1]['entries'] = len(state.options)
+    if backend.startswith('bcdedit'):
+        # Both parsers on the same store: the localized text fallback and the exported hive
+        from sys_switch.platforms.bcd import BcdSnapshot
+        from sys_switch.platforms.bcdhive import load_bcd_snapshot
+        with open(os.path.join(os.environ[FIXTURE_ENV], 'bcdedit.txt'), encoding='utf-8') as f:
+            dump = f.read()
+        snap = measure('bcd_parse_text', lambda: BcdSnapshot.parse(dump), fresh=False)
+        rows[-1]['entries'] = len(snap)
+        hive_path = os.path.join(os.environ[FIXTURE_ENV], 'BCD')
+        snap = measure('bcd_load_hive', lambda: load_bcd_snapshot(hive_path), fresh=False)
+        rows[-1]['entries'] = len(snap)
+    if backend == 'efivars':
+        from sys_switch.cli import device_lookup
+        from sys_switch.platforms.blockdev import BlockDeviceIndex
+        index = measure('blockdev_scan', BlockDeviceIndex.scan, fresh=False)
+        rows[-1]['entries'] = len(index)
+        joins = {'device': device_lookup()}
+        measure('format_json_devices', lambda: format_entries(entries, 'json', joins=joins), fresh=False)
+        from sys_switch.platforms.osdetect import OsDetector
+        cache_path = os.path.join(os.environ['SYS_SWITCH_CACHE_DIR'], 'osdetect.json')
+
+        def detect_cold():
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(cache_path)
+            return OsDetector(index, cache_path=cache_path).detect(entries)
+        found = measure('os_detect_cold', detect_cold, fresh=False)
+        rows[-1]['entries'] = len(found)
+        measure('os_detect_cached', lambda: OsDetector(index, cache_path=cache_path).detect(entries), fresh=False)
+    return {'rss_start_kb': rss_start, 'rss_import_kb': rss_import, 'rows': rows}
+
+
+def _run_worker(backend: str, size: int, repeat: int, env: Dict[str, str]) -> dict:
+    cp = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', backend, str(size),
+                         '--repeat', str(repeat)], env=env, capture_output=True, text=True)
+    if cp.returncode != 0:
+        raise RuntimeError(f'{backend}/{size} 测量失败:\n{cp.stderr}')
+    return json.loads(cp.stdout)
+
+
+def _cold_start(env: Dict[str, str], repeat: int, root: str) -> dict:
+    """`sys-switch --cli --no-cache list` from process start to exit, as a monitoring script sees it."""
+    argv = [sys.executable, '-m', 'sys_switch.main', '--cli', '--no-cache', 'list']
+    walls = []
+    rss = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(argv, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        _pid, status, usage = os.wait4(proc.pid, 0)
+        walls.append((time.perf_counter() - t0) * 1000)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        rss = max(rss, usage.ru_maxrss)
+    # One traced run for the external command count
+    trace_path = os.path.join(root, 'cold-start-trace.json')
+    subprocess.run(argv[:3] + ['--cli', '--no-cache', '--profile', '--profile-format', 'chrome',
+                               '--profile-output', trace_path, 'list'],
+                   env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with open(trace_path, encoding='utf-8') as f:
+            procs = sum(1 for ev in json.load(f)['traceEvents'] if ev['name'] == 'exec')
+    except (OSError, ValueError, KeyError):
+        procs = None
+    return {
+        'op': 'cli_cold_start',
+        'wall_ms': round(statistics.median(walls), 3),
+        'min_ms': round(min(walls), 3),
+        'subprocesses': procs,
+        'peak_rss_kb': rss // 1024 if sys.platform == 'darwin' else rss,
+        'ok': proc.returncode == 0,
+    }
+
+
+# --- comparison ---
+def compare(old: dict, new: dict, threshold: float, min_delta_ms: float) -> List[str]:
+    """Regressions of `new` against `old`; results missing from either side are ignored."""
+    base = {(r['backend'], r['size'], r['op']): r for r in old.get('results', [])}
+    out = []
+    for r in new['results']:
+        key = (r['backend'], r['size'], r['op'])
+        b = base.get(key)
+        if b is None:
+            continue
+        label = '{}/{}/{}'.format(*key)
+        for metric in _TIMED:
+            was, now = b.get(metric), r.get(metric)
+            if was is None or now is None:
+                continue
+            if now > was * (1 + threshold) and now - was > min_delta_ms:
+                out.append(f'{label}: {metric} {was} -> {now} (+{(now / was - 1) * 100:.0f}%)')
+        was, now = b.get('subprocesses'), r.get('subprocesses')
+        if was is not None and now is not None and now > was:
+            out.append(f'{label}: subprocesses {was} -> {now}')
+        was, now = b.get('peak_rss_kb'), r.get('peak_rss_kb')
+        if was and now and now > was * (1 + threshold):
+            out.append(f'{label}: peak_rss_kb {was} -> {now} (+{(now / was - 1) * 100:.0f}%)')
+    return out
+
+
+def _git_rev() -> str | None:
+    try:
+        cp = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return cp.stdout.strip() or None
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--backends', default=','.join(BACKENDS), help='逗号分隔的后端列表')
+    p.add_argument('--sizes', default=DEFAULT_SIZES, help='逗号分隔的引导项数量')
+    p.add_argument('--repeat', type=int, default=5, help='每项测量的轮数，取中位数（默认 5）')
+    p.add_argument('--seed', type=int, default=0, help='合成数据的随机种子')
+    p.add_argument('--no-cold-start', action='store_true', help='跳过 CLI 冷启动测量')
+    p.add_argument('--output', metavar='PATH', help='结果 JSON 写入文件（默认 stdout）')
+    p.add_argument('--compare', metavar='BASELINE', help='与之前的结果 JSON 比较')
+    p.add_argument('--threshold', type=float, default=0.25, help='耗时/内存允许的相对增长（默认 0.25）')
+    p.add_argument('--min-delta-ms', type=float, default=1.0, help='小于该绝对差值的耗时变化不算回归（默认 1.0）')
+    p.add_argument('--worker', nargs=2, metavar=('BACKEND', 'SIZE'), help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.worker:
+        print(json.dumps(_worker(args.worker[0], int(args.worker[1]), args.repeat)))
+        return 0
+
+    backends = [b.strip() for b in args.backends.split(',') if b.strip()]
+    unknown = [b for b in backends if b not in BACKENDS]
+    if unknown:
+        p.error(f'未知后端: {", ".join(unknown)}')
+    sizes = [int(x) for x in args.sizes.split(',') if x.strip()]
+
+    report = {
+        'meta': {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'commit': _git_rev(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'results': [],
+    }
+    for backend in backends:
+        for size in sizes:
+            root = tempfile.mkdtemp(prefix=f'sys_switch-bench-{backend}-{size}-')
+            try:
+                env = _prepare(backend, size, root, args.seed)
+                res = _run_worker(backend, size, args.repeat, env)
+                rows = res['rows']
+                # The CLI picks the Linux backend on this host; BCD cold start needs Windows
+                if not args.no_cold_start and not backend.startswith('bcdedit'):
+                    rows.append(_cold_start(env, args.repeat, root))
+            finally:
+                shutil.rmtree(root, ignore_errors=True)
+            for row in rows:
+                row = {'backend': backend, 'size': size, **row}
+                report['results'].append(row)
+                print(f"{backend:<12} {size:>5}  {row['op']:<19} {row['wall_ms']:>10.3f}ms  "
+                      f"procs={row['subprocesses']}  rss={row['peak_rss_kb'] / 1024:.1f}MB", file=sys.stderr)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold, args.min_delta_ms)
+        for line in regressions:
+            print('回归: ' + line, file=sys.stderr)
+        if regressions:
+            return 1
+        print(f'与 {args.compare} 相比无回归（阈值 {args.threshold:.0%}）', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
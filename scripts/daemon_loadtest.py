@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""daemon_loadtest.py
+`sys-switch serve` 守护进程压测：N 个并发客户端在固定时长内不断发送查询，
+输出每秒查询数与延迟分位数；可选对比每次直接枚举（无守护进程）的耗时。
+
+用法：
+  scripts/daemon_loadtest.py --spawn --clients 1,4,16 --duration 5
+  scripts/daemon_loadtest.py --socket /run/sys_switch/daemon.sock --op get --id 0001
+  SYS_SWITCH_EFIVARS=/path/to/fixture scripts/daemon_loadtest.py --spawn --baseline
+
+  --spawn      在临时套接字上启动一个守护进程（继承当前环境变量），结束后关闭
+  --reconnect  每个请求新建连接（模拟每次调用一次 CLI）；默认每个客户端复用一个连接
+  --baseline   额外测量直接调用 list_entries()（不使用缓存）的单次耗时
+"""
+from __future__ import annotations
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+
+def _client(path: str, request: bytes, duration: float, reconnect: bool) -> list:
+    latencies = []
+    deadline = time.perf_counter() + duration
+    sock = None
+    rfile = None
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(path)
+            rfile = sock.makefile('rb')
+        sock.sendall(request)
+        line = rfile.readline()
+        if not line:
+            raise RuntimeError('daemon closed the connection')
+        json.loads(line)
+        latencies.append(time.perf_counter() - t0)
+        if reconnect:
+            rfile.close()
+            sock.close()
+            sock = None
+    if sock is not None:
+        rfile.close()
+        sock.close()
+    return latencies
+
+
+def _run_level(path: str, request: bytes, clients: int, duration: float, reconnect: bool) -> dict:
+    with multiprocessing.Pool(clients) as pool:
+        t0 = time.perf_counter()
+        results = pool.starmap(_client, [(path, request, duration, reconnect)] * clients)
+        wall = time.perf_counter() - t0
+    lat = sorted(x for r in results for x in r)
+    return {
+        'clients': clients,
+        'requests': len(lat),
+        'qps': round(len(lat) / duration, 1),
+        'p50_ms': round(lat[len(lat) // 2] * 1000, 3) if lat else None,
+        'p99_ms': round(lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1000, 3) if lat else None,
+        'wall_s': round(wall, 2),
+    }
+
+
+def _spawn(path: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_SRC, env.get('PYTHONPATH')]))
+    proc = subprocess.Popen([sys.executable, '-m', 'sys_switch.main', '--cli', 'serve', '--socket', path],
+                            env=env, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit('守护进程启动失败（无可用的引导管理后端？）')
+        if os.path.exists(path):
+            return proc
+        time.sleep(0.05)
+    proc.kill()
+    raise SystemExit('守护进程启动超时')
+
+
+def _baseline(rounds: int) -> dict:
+    sys.path.insert(0, REPO_SRC)
+    from sys_switch.cli import get_manager
+    mgr = get_manager(use_cache=False)
+    times = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        mgr.list_entries()
+        times.append(time.perf_counter() - t0)
+    return {'direct_list_entries_ms': round(statistics.median(times) * 1000, 3), 'rounds': rounds}
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--socket', help='已运行守护进程的套接字路径')
+    p.add_argument('--spawn', action='store_true', help='启动一个临时守护进程')
+    p.add_argument('--clients', default='1,4,16', help='并发客户端数列表（逗号分隔）')
+    p.add_argument('--duration', type=float, default=5.0, help='每档持续秒数')
+    p.add_argument('--op', choices=['list', 'get', 'status'], default='list')
+    p.add_argument('--id', help='--op get 查询的引导项 ID')
+    p.add_argument('--reconnect', action='store_true', help='每个请求新建连接')
+    p.add_argument('--baseline', action='store_true', help='同时测量直接枚举的耗时')
+    args = p.parse_args()
+
+    req = {'op': args.op}
+    if args.op == 'get':
+        req['id'] = args.id or '0000'
+    request = (json.dumps(req) + '\n').encode('utf-8')
+
+    proc = None
+    tmp = None
+    path = args.socket
+    if args.spawn:
+        tmp = tempfile.mkdtemp(prefix='sys_switch-loadtest-')
+        path = os.path.join(tmp, 'daemon.sock')
+        proc = _spawn(path)
+    if not path:
+        p.error('需要 --socket 或 --spawn')
+
+    try:
+        report = {'op': args.op, 'reconnect': args.reconnect, 'levels': []}
+        for n in [int(x) for x in args.clients.split(',') if x.strip()]:
+            level = _run_level(path, request, n, args.duration, args.reconnect)
+            report['levels'].append(level)
+            print(f"clients={level['clients']:<4} qps={level['qps']:<10} p50={level['p50_ms']}ms p99={level['p99_ms']}ms",
+                  file=sys.stderr)
+        if args.baseline:
+            report['baseline'] = _baseline(rounds=20)
+        print(json.dumps(report, indent=2))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+        if tmp is not None:
+            try:
+                os.rmdir(tmp)
+            except OSError:
+                pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
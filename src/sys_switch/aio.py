@@ -0,0 +1,397 @@
+"""asyncio front-end for the boot managers.
+
+Reads are native coroutines: external commands run through
+`asyncio.create_subprocess_exec` with a deadline and a bounded semaphore,
+and the efivarfs variables behind a listing are read concurrently. Mutations
+(`set_next`, `clear_next`, `set_order`, `reboot_now`) run the synchronous
+manager in a worker thread; they are rare, must not be torn apart by a
+cancellation half-way, and already carry the executor's deadline.
+
+    mgr = get_async_manager()
+    entries = await mgr.list_entries()
+"""
+from __future__ import annotations
+import asyncio
+import functools
+import locale
+import os
+import platform
+import signal
+import subprocess
+import tempfile
+import time
+import weakref
+from typing import Dict, List, Optional
+
+from .models import BootEntry
+from .platforms.executor import DEFAULT_MAX_CONCURRENCY, DEFAULT_TIMEOUT, TIMEOUT_RETURNCODE
+from .trace import tracer
+
+_IS_WINDOWS = platform.system() == 'Windows'
+
+# Concurrent efivarfs reads per listing; each one is a firmware GetVariable() call.
+DEFAULT_READ_CONCURRENCY = 8
+
+
+class _Flight:
+    """One in-flight read-only command that identical callers await together."""
+    __slots__ = ('task', 'waiters', 'abandoned')
+
+    def __init__(self, task: asyncio.Future) -> None:
+        self.task = task
+        self.waiters = 0
+        self.abandoned = False
+
+
+class _LoopState:
+    """What an executor keeps for one event loop: its slots and its in-flight reads."""
+    __slots__ = ('slots', 'inflight')
+
+    def __init__(self, slots: asyncio.Semaphore) -> None:
+        self.slots = slots
+        self.inflight: Dict[tuple, _Flight] = {}
+
+
+class AsyncExecutor:
+    """Async counterpart of `platforms.executor.Executor`.
+
+    Every command gets a deadline after which its process group is killed and
+    returncode 124 is returned; cancelling the awaiting task kills it as well
+    (once no other caller shares it). Read-only commands with identical
+    argv/env that overlap in time share one process, and any mutating command
+    clears the coalescing table, as in the synchronous executor.
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, default_timeout: float = DEFAULT_TIMEOUT) -> None:
+        self.max_concurrency = max_concurrency
+        self.default_timeout = default_timeout
+        # Semaphores and tasks belong to one loop, while default_executor() outlives any
+        # single asyncio.run(); keep both per loop.
+        self._loops: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _loop_state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = self._loops[loop] = _LoopState(asyncio.Semaphore(self.max_concurrency))
+        return state
+
+    async def run(self, cmd: List[str], timeout: float | None = None, env: dict | None = None,
+                  readonly: bool = False) -> subprocess.CompletedProcess:
+        timeout = self.default_timeout if timeout is None else timeout
+        if not tracer.enabled:
+            return await self._run(cmd, timeout, env, readonly)
+        with tracer.span('exec', argv=list(cmd), readonly=readonly) as sp:
+            cp = await self._run(cmd, timeout, env, readonly)
+            sp.set(exit_code=cp.returncode,
+                   stdout_bytes=len((cp.stdout or '').encode('utf-8')),
+                   stderr_bytes=len((cp.stderr or '').encode('utf-8')),
+                   timed_out=getattr(cp, 'timed_out', False),
+                   coalesced=getattr(cp, 'coalesced', False))
+        return cp
+
+    async def _run(self, cmd: List[str], timeout: float, env: dict | None,
+                   readonly: bool) -> subprocess.CompletedProcess:
+        if not readonly:
+            # Reads issued after a mutation must not reuse output captured before it,
+            # whichever loop they run on
+            for state in list(self._loops.values()):
+                state.inflight.clear()
+            return await self._execute(cmd, timeout, env)
+
+        inflight = self._loop_state().inflight
+        key = (tuple(cmd), tuple(sorted(env.items())) if env else None)
+        flight = inflight.get(key)
+        leader = flight is None or flight.abandoned or flight.task.done()
+        if leader:
+            flight = _Flight(asyncio.ensure_future(self._execute(cmd, timeout, env)))
+            inflight[key] = flight
+            flight.task.add_done_callback(functools.partial(_forget, inflight, key, flight))
+        flight.waiters += 1
+        try:
+            cp = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done() and flight.waiters == 1:
+                # Last one waiting: stop the process instead of letting it run unobserved
+                flight.abandoned = True
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+        if leader:
+            return cp
+        shared = subprocess.CompletedProcess(cp.args, cp.returncode, cp.stdout, cp.stderr)
+        shared.timed_out = getattr(cp, 'timed_out', False)
+        shared.coalesced = True
+        return shared
+
+    async def _execute(self, cmd: List[str], timeout: float, env: dict | None) -> subprocess.CompletedProcess:
+        kwargs: dict = {'stdout': subprocess.PIPE, 'stderr': subprocess.PIPE, 'env': env}
+        if _IS_WINDOWS:
+            kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW
+        else:
+            kwargs['start_new_session'] = True
+        async with self._loop_state().slots:
+            try:
+                proc = await asyncio.create_subprocess_exec(*cmd, **kwargs)
+            except OSError as e:
+                # Same shape as a shell's "command not found"
+                return subprocess.CompletedProcess(cmd, 127, '', str(e))
+            try:
+                out, err = await asyncio.wait_for(proc.communicate(), timeout)
+            except asyncio.TimeoutError:
+                await _kill_group(proc)
+                cp = subprocess.CompletedProcess(cmd, TIMEOUT_RETURNCODE, '',
+                                                 f'命令超时（{timeout:g} 秒）已终止: {" ".join(cmd)}')
+                cp.timed_out = True
+                return cp
+            except BaseException:
+                # Cancelled: do not leave the child (and its children) running
+                await _kill_group(proc)
+                raise
+        return subprocess.CompletedProcess(cmd, proc.returncode, _decode(out), _decode(err))
+
+
+def _forget(inflight: Dict[tuple, _Flight], key: tuple, flight: _Flight, _task: asyncio.Future) -> None:
+    if inflight.get(key) is flight:
+        del inflight[key]
+
+
+def _decode(b: bytes | None) -> str:
+    return (b or b'').decode(locale.getpreferredencoding(False), errors='replace')
+
+
+async def _kill_group(proc: asyncio.subprocess.Process) -> None:
+    if proc.returncode is not None:
+        return
+    try:
+        if _IS_WINDOWS:
+            killer = await asyncio.create_subprocess_exec(
+                'taskkill', '/T', '/F', '/PID', str(proc.pid),
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                creationflags=subprocess.CREATE_NO_WINDOW)
+            await killer.wait()
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except OSError:
+            pass
+    # Shielded so a second cancellation cannot leave a zombie behind
+    await asyncio.shield(proc.wait())
+
+
+_default: AsyncExecutor | None = None
+
+
+def default_executor() -> AsyncExecutor:
+    global _default
+    if _default is None:
+        _default = AsyncExecutor()
+    return _default
+
+
+class AsyncLinuxBootManager:
+    """Async view of a `LinuxBootManager`; the sync manager stays the source of truth."""
+
+    def __init__(self, manager=None, executor: AsyncExecutor | None = None,
+                 read_concurrency: int = DEFAULT_READ_CONCURRENCY, **kwargs) -> None:
+        if manager is None:
+            from .platforms.linux import LinuxBootManager
+            manager = LinuxBootManager(**kwargs)
+        self.sync = manager
+        self.executor = executor or default_executor()
+        self.read_concurrency = read_concurrency
+
+    def cache_key(self) -> str:
+        return self.sync.cache_key()
+
+    def fingerprint(self) -> str | None:
+        return self.sync.fingerprint()
+
+    async def available(self) -> bool:
+        # Only stat()/which() results; nothing worth a thread
+        return self.sync.available()
+
+    async def list_entries(self) -> List[BootEntry]:
+        # Same fallbacks as LinuxBootManager.list_entries; only the I/O differs
+        with tracer.span('AsyncLinuxBootManager.list_entries'):
+            mgr = self.sync
+            if mgr.efivars.available():
+                try:
+                    return (await self._read_efi_state()).to_entries()
+                except OSError:
+                    pass  # unreadable variable; fall back to efibootmgr
+            if mgr.efibootmgr:
+                from .platforms.linux import parse_efibootmgr
+                cp = await self.executor.run(mgr._efibootmgr_listing_argv(), readonly=True)
+                return parse_efibootmgr(cp.stdout)
+            if mgr.grub_reboot or mgr.grubenv.exists():
+                return await asyncio.to_thread(mgr._grub_entries)
+            return []
+
+    async def _read_efi_state(self):
+        """`EfiVarStore.read_state` with its independent variable reads run concurrently."""
+        from .platforms.efivars import build_state
+        store = self.sync.efivars
+        sem = asyncio.Semaphore(self.read_concurrency)
+
+        async def read(fn, *args):
+            async with sem:
+                return await asyncio.to_thread(fn, *args)
+
+        ids = await asyncio.to_thread(store.boot_option_ids)
+        results = await asyncio.gather(*(read(*call) for call in store.state_reads(ids)))
+        return build_state(ids, results)
+
+    async def set_next(self, entry_id: str) -> tuple[bool, str]:
+        return await asyncio.to_thread(self.sync.set_next, entry_id)
+
+    async def clear_next(self) -> tuple[bool, str]:
+        return await asyncio.to_thread(self.sync.clear_next)
+
+    async def set_order(self, order: List[str]) -> tuple[bool, str]:
+        return await asyncio.to_thread(self.sync.set_order, order)
+
+    async def reboot_now(self) -> tuple[bool, str]:
+        return await asyncio.to_thread(self.sync.reboot_now)
+
+
+class AsyncWindowsBootManager:
+    """Async view of a `WindowsBootManager`.
+
+    A listing is a single store capture (`bcdedit /export`, or `/v /enum all`
+    as a fallback), so there is nothing to fan out per entry; the point is
+    not tying up a thread while bcdedit runs.
+    """
+
+    def __init__(self, manager=None, executor: AsyncExecutor | None = None, **kwargs) -> None:
+        if manager is None:
+            from .platforms.windows import WindowsBootManager
+            manager = WindowsBootManager(**kwargs)
+        self.sync = manager
+        self.executor = executor or default_executor()
+        self._capture: asyncio.Task | None = None
+
+    def cache_key(self) -> str:
+        return self.sync.cache_key()
+
+    def fingerprint(self) -> str | None:
+        return self.sync.fingerprint()
+
+    def invalidate(self) -> None:
+        self.sync.invalidate()
+
+    async def available(self) -> bool:
+        from .platforms.common import which
+        if self.sync.store is None and which(self.sync.bcdedit) is None:
+            return False
+        return len(await self.snapshot(max_age=0)) > 0
+
+    async def snapshot(self, max_age: float | None = None):
+        """Same reuse window as the sync manager, which shares the captured snapshot."""
+        from .platforms.windows import _SNAPSHOT_REUSE_SECONDS
+        mgr = self.sync
+        max_age = _SNAPSHOT_REUSE_SECONDS if max_age is None else max_age
+        if mgr._snapshot is not None and max_age > 0 and time.monotonic() - mgr._snapshot_at <= max_age:
+            return mgr._snapshot
+        # Concurrent callers share one capture
+        if self._capture is None or self._capture.done():
+            self._capture = asyncio.ensure_future(self._capture_snapshot())
+        snap = await asyncio.shield(self._capture)
+        mgr._snapshot, mgr._snapshot_at = snap, time.monotonic()
+        return snap
+
+    async def _capture_snapshot(self):
+        from .platforms.bcd import BcdSnapshot
+        from .platforms.bcdhive import HiveError, load_bcd_snapshot
+        mgr = self.sync
+        if mgr.store:
+            try:
+                return await asyncio.to_thread(load_bcd_snapshot, mgr.store)
+            except (OSError, HiveError):
+                return BcdSnapshot([])
+        with tempfile.TemporaryDirectory(prefix='sys_switch-') as tmp:
+            path = os.path.join(tmp, 'BCD')
+            cp = await self.executor.run(mgr._bcd_argv(['/export', path]))
+            if cp.returncode == 0:
+                try:
+                    return await asyncio.to_thread(load_bcd_snapshot, path)
+                except (OSError, HiveError):
+                    pass
+        cp = await self.executor.run(mgr._bcd_argv(['/v', '/enum', 'all']), readonly=True)
+        if cp.returncode != 0:
+            return BcdSnapshot([])
+        return BcdSnapshot.parse(cp.stdout or '')
+
+    async def list_entries(self) -> List[BootEntry]:
+        with tracer.span('AsyncWindowsBootManager.list_entries'):
+            return self.sync._entries_from_snapshot(await self.snapshot())
+
+    async def set_next(self, entry_id: str) -> tuple[bool, str]:
+        await self.snapshot()  # set_next reuses it for the {fwbootmgr} GUID
+        return await asyncio.to_thread(self.sync.set_next, entry_id)
+
+    async def clear_next(self) -> tuple[bool, str]:
+        await self.snapshot()
+        return await asyncio.to_thread(self.sync.clear_next)
+
+    async def reboot_now(self) -> tuple[bool, str]:
+        return await asyncio.to_thread(self.sync.reboot_now)
+
+
+class AsyncSystemdBootManager:
+    """Async view of a `SystemdBootManager`.
+
+    A listing is a directory scan plus a few small file and variable reads,
+    so it runs in one worker thread rather than being fanned out.
+    """
+
+    def __init__(self, manager=None, **kwargs) -> None:
+        if manager is None:
+            from .platforms.systemdboot import SystemdBootManager
+            manager = SystemdBootManager(**kwargs)
+        self.sync = manager
+
+    def cache_key(self) -> str:
+        return self.sync.cache_key()
+
+    def fingerprint(self) -> str | None:
+        return self.sync.fingerprint()
+
+    async def available(self) -> bool:
+        return self.sync.available()
+
+    async def list_entries(self) -> List[BootEntry]:
+        with tracer.span('AsyncSystemdBootManager.list_entries'):
+            return await asyncio.to_thread(self.sync.list_entries)
+
+    async def set_next(self, entry_id: str) -> tuple[bool, str]:
+        return await asyncio.to_thread(self.sync.set_next, entry_id)
+
+    async def set_default(self, entry_id: str) -> tuple[bool, str]:
+        return await asyncio.to_thread(self.sync.set_default, entry_id)
+
+    async def clear_next(self) -> tuple[bool, str]:
+        return await asyncio.to_thread(self.sync.clear_next)
+
+    async def set_order(self, order: List[str]) -> tuple[bool, str]:
+        return await asyncio.to_thread(self.sync.set_order, order)
+
+    async def reboot_now(self) -> tuple[bool, str]:
+        return await asyncio.to_thread(self.sync.reboot_now)
+
+
+def get_async_manager(show_recovery: bool = False, bcd_store: Optional[str] = None,
+                      executor: AsyncExecutor | None = None):
+    """Async manager for this platform (an offline BCD store selects the Windows one)."""
+    from .platforms.common import current_platform
+    if bcd_store or current_platform() == 'Windows':
+        return AsyncWindowsBootManager(executor=executor, show_recovery=show_recovery, store=bcd_store)
+    from .platforms.systemdboot import booted_with_systemd_boot
+    if booted_with_systemd_boot():
+        return AsyncSystemdBootManager()
+    return AsyncLinuxBootManager(executor=executor)
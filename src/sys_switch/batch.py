@@ -0,0 +1,170 @@
+"""`sys-switch batch`: many operations in one process, JSON lines in and out.
+
+One request per input line (blank lines and `#` comments are skipped):
+
+    {"op": "list"}
+    {"op": "get", "id": "0003"}
+    {"op": "set", "match": "Windows Boot Manager"}
+    {"op": "verify", "match": "Windows Boot Manager"}
+    {"op": "clear_next"}
+    {"op": "reboot"}
+
+`get`, `set` and `verify` take one selector: `id`, `match` (as `set --match`)
+or `partuuid`; `set` with `"default": true` sets the persistent default
+where the backend has one (systemd-boot). `verify` succeeds when the
+selected entry is the pending next boot, or, without a selector, when
+nothing is pending. An optional `tag` is echoed back.
+
+Every request gets exactly one response line, in order, written as soon as
+it is done: `{"op": ..., "ok": ..., ...}` with `error` on failure. One
+manager and one listing serve the whole run; the listing is dropped only
+after a mutation, so `set` followed by `verify` reads the new state while a
+run of `get`s costs a single enumeration.
+"""
+from __future__ import annotations
+import json
+import sys
+import time
+from typing import IO, Iterable, Optional
+
+from .models import BootEntry, EntryIndex, EntryLookupError
+
+OPS = ('list', 'get', 'set', 'clear_next', 'verify', 'reboot')
+
+
+class BatchError(Exception):
+    pass
+
+
+class BatchRunner:
+    def __init__(self, manager) -> None:
+        self.manager = manager
+        self._index: EntryIndex | None = None
+
+    def entries(self) -> EntryIndex:
+        if self._index is None:
+            self._index = EntryIndex(self.manager.list_entries())
+        return self._index
+
+    def _mutate(self, fn, *args) -> tuple[bool, str]:
+        # Even a failed mutation may have changed something; re-read on the next request
+        self._index = None
+        return fn(*args)
+
+    @staticmethod
+    def _selector(req: dict, required: bool = True) -> Optional[dict]:
+        given = {k: req[k] for k in ('id', 'match', 'partuuid') if req.get(k) is not None}
+        if not given and not required:
+            return None
+        if len(given) != 1 or not all(isinstance(v, str) and v for v in given.values()):
+            raise BatchError('需要且只需要以下之一: id、match、partuuid（非空字符串）')
+        return given
+
+    def _select(self, req: dict) -> BootEntry:
+        sel = self._selector(req)
+        try:
+            return self.entries().resolve(entry_id=sel.get('id'), match=sel.get('match'),
+                                          partuuid=sel.get('partuuid'))
+        except EntryLookupError as e:
+            raise BatchError(str(e)) from None
+
+    def handle(self, req: dict) -> dict:
+        op = req.get('op')
+        if op == 'list':
+            return {'ok': True, 'entries': [e.to_dict() for e in self.entries()]}
+        if op == 'get':
+            return {'ok': True, 'entry': self._select(req).to_dict()}
+        if op == 'set':
+            # A plain id goes straight to the manager, like `sys-switch set <id>`
+            sel = self._selector(req)
+            entry_id = sel['id'] if 'id' in sel else self._select(req).id
+            if req.get('default'):
+                set_default = getattr(self.manager, 'set_default', None)
+                if set_default is None:
+                    raise BatchError('当前引导管理器不支持设置默认启动项')
+                ok, msg = self._mutate(set_default, entry_id)
+            else:
+                ok, msg = self._mutate(self.manager.set_next, entry_id)
+            return _result(ok, msg, id=entry_id)
+        if op == 'clear_next':
+            clear_next = getattr(self.manager, 'clear_next', None)
+            if clear_next is None:
+                raise BatchError('当前引导管理器不支持清除下次启动项')
+            return _result(*self._mutate(clear_next))
+        if op == 'verify':
+            pending = [e.id for e in self.entries() if e.is_next]
+            nxt = pending[0] if pending else None
+            if self._selector(req, required=False) is None:
+                if nxt is None:
+                    return {'ok': True, 'next': None}
+                return {'ok': False, 'next': nxt, 'error': f'仍有待生效的下次启动项: {nxt}'}
+            target = self._select(req).id
+            if target in pending:
+                return {'ok': True, 'next': target}
+            error = f'下次启动项为 {nxt}，不是 {target}' if nxt else f'没有待生效的下次启动项（期望 {target}）'
+            return {'ok': False, 'next': nxt, 'error': error}
+        if op == 'reboot':
+            return _result(*self.manager.reboot_now())
+        raise BatchError(f'未知操作: {op!r}（可用: {", ".join(OPS)}）')
+
+
+def _result(ok: bool, msg: str, **extra) -> dict:
+    msg = (msg or '').strip()
+    return {'ok': ok, **extra, ('message' if ok else 'error'): msg}
+
+
+def _requests(lines: Iterable[str]) -> Iterable[tuple[dict | None, str | None]]:
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            req = json.loads(line)
+        except ValueError as e:
+            yield None, f'第 {lineno} 行不是合法的 JSON: {e}'
+            continue
+        if not isinstance(req, dict):
+            yield None, f'第 {lineno} 行应为 JSON 对象'
+            continue
+        yield req, None
+
+
+def run_batch(manager, args, inp: IO[str] | None = None, out: IO[str] | None = None) -> int:
+    """Answer every request from `inp`; 0 if all succeeded, 1 otherwise."""
+    opened = None
+    if inp is None:
+        path = getattr(args, 'input', None)
+        inp = opened = open(path, encoding='utf-8') if path not in (None, '-') else sys.stdin
+    out = out or sys.stdout
+    runner = BatchRunner(manager)
+    total = failed = 0
+    t_start = time.monotonic()
+    try:
+        for req, problem in _requests(inp):
+            t0 = time.monotonic()
+            total += 1
+            if problem is not None:
+                reply = {'op': None, 'ok': False, 'error': problem}
+            else:
+                try:
+                    reply = {'op': req.get('op'), **runner.handle(req)}
+                except BatchError as e:
+                    reply = {'op': req.get('op'), 'ok': False, 'error': str(e)}
+                except Exception as e:  # one bad request must not end the run
+                    reply = {'op': req.get('op'), 'ok': False, 'error': f'{type(e).__name__}: {e}'}
+                if 'tag' in req:
+                    reply['tag'] = req['tag']
+            reply['elapsed_ms'] = round((time.monotonic() - t0) * 1000, 1)
+            out.write(json.dumps(reply, ensure_ascii=False) + '\n')
+            out.flush()
+            if not reply['ok']:
+                failed += 1
+                if getattr(args, 'stop_on_error', False):
+                    break
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if opened is not None and opened is not sys.stdin:
+            opened.close()
+    print(f'{total - failed}/{total} 个请求成功，用时 {time.monotonic() - t_start:.2f} 秒', file=sys.stderr)
+    return 0 if failed == 0 else 1
@@ -0,0 +1,394 @@
+"""Privileged helper that the unprivileged GUI/CLI talk to.
+
+Instead of re-running the whole interpreter (and Qt) as root/administrator,
+a small helper is started once per session through pkexec/runas. It keeps
+its managers and their snapshots warm and answers JSON requests over an
+authenticated `multiprocessing.connection` channel (a Unix socket in a
+private directory, or a named pipe on Windows). It exits after
+`idle_timeout` seconds without clients.
+
+The authkey reaches the helper through a 0600 file that it deletes after
+reading; clients find a running helper through `broker.json` (0600) in the
+per-user runtime directory.
+"""
+from __future__ import annotations
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict, List, Optional
+
+from .models import BootEntry
+from .platforms.common import is_admin, runtime_dir, which
+
+DEFAULT_IDLE_TIMEOUT = 600.0
+# Long enough for the user to answer the polkit/UAC prompt
+STARTUP_TIMEOUT = 120.0
+
+_IS_WINDOWS = platform.system() == 'Windows'
+_FAMILY = 'AF_PIPE' if _IS_WINDOWS else 'AF_UNIX'
+_STATE_FILE = 'broker.json'
+
+
+class BrokerError(OSError):
+    pass
+
+
+# --- helper side ---
+class _Broker:
+    def __init__(self, listener: Listener, authkey: bytes, idle_timeout: float) -> None:
+        self.listener = listener
+        self.authkey = authkey
+        self.idle_timeout = idle_timeout
+        self.stop = threading.Event()
+        self._lock = threading.Lock()  # managers are not thread-safe
+        self._state = threading.Lock()
+        self._clients = 0
+        self._last = time.monotonic()
+        self._managers: Dict[bool, Any] = {}
+
+    def manager(self, show_recovery: bool):
+        mgr = self._managers.get(show_recovery)
+        if mgr is None:
+            from .cli import get_manager
+            mgr = self._managers[show_recovery] = get_manager(show_recovery=show_recovery)
+        return mgr
+
+    def serve(self) -> None:
+        threading.Thread(target=self._watchdog, daemon=True).start()
+        while not self.stop.is_set():
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                continue  # wrong key or a client that went away mid-handshake
+            if self.stop.is_set():
+                conn.close()
+                break
+            with self._state:
+                self._clients += 1
+            threading.Thread(target=self._client, args=(conn,), daemon=True).start()
+        self.listener.close()
+
+    def _wake(self) -> None:
+        # accept() cannot be interrupted portably; a self-connection unblocks it
+        try:
+            Client(self.listener.address, family=_FAMILY, authkey=self.authkey).close()
+        except (OSError, EOFError, multiprocessing.AuthenticationError):
+            pass
+
+    def _watchdog(self) -> None:
+        while not self.stop.wait(min(5.0, self.idle_timeout)):
+            with self._state:
+                idle = self._clients == 0 and time.monotonic() - self._last > self.idle_timeout
+            if idle:
+                self.stop.set()
+                self._wake()
+
+    def _client(self, conn: Connection) -> None:
+        try:
+            while not self.stop.is_set():
+                try:
+                    raw = conn.recv_bytes(1 << 20)
+                except (EOFError, OSError):
+                    break
+                try:
+                    req = json.loads(raw)
+                    result = self.handle(req.get('op'), req.get('args') or {})
+                    reply = {'ok': True, 'result': result}
+                except Exception as e:  # reported to the client, never kills the helper
+                    reply = {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+                conn.send_bytes(json.dumps(reply, ensure_ascii=False).encode('utf-8'))
+                with self._state:
+                    self._last = time.monotonic()
+        finally:
+            conn.close()
+            with self._state:
+                self._clients -= 1
+                self._last = time.monotonic()
+
+    def handle(self, op: str, args: dict) -> Any:
+        if op == 'ping':
+            return {'pid': os.getpid(), 'admin': is_admin()}
+        if op == 'shutdown':
+            self.stop.set()
+            threading.Thread(target=self._wake, daemon=True).start()
+            return True
+        mgr = self.manager(bool(args.get('show_recovery', False)))
+        with self._lock:
+            if op == 'available':
+                return mgr.available()
+            if op == 'list':
+                return [e.to_dict() for e in mgr.list_entries()]
+            if op == 'fingerprint':
+                fp = getattr(mgr, 'fingerprint', None)
+                return fp() if fp else None
+            if op == 'watch_paths':
+                paths = getattr(mgr, 'watch_paths', None)
+                return [[d, list(p)] for d, p in paths()] if paths else None
+            if op == 'invalidate':
+                mgr.invalidate()
+                return True
+            if op == 'set_next':
+                return list(mgr.set_next(_str(args.get('id'))))
+            if op == 'clear_next':
+                return list(mgr.clear_next())
+            if op == 'set_order':
+                order = args.get('order')
+                if not isinstance(order, list):
+                    raise ValueError('order must be a list')
+                return list(mgr.set_order([_str(x) for x in order]))
+            if op == 'reboot':
+                return list(mgr.reboot_now())
+        raise ValueError(f'unknown op: {op!r}')
+
+
+def _str(v: Any) -> str:
+    if not isinstance(v, str) or not v:
+        raise ValueError('expected a non-empty string')
+    return v
+
+
+def helper_main(argv: List[str] | None = None) -> int:
+    p = argparse.ArgumentParser(prog='sys-switch-broker')
+    p.add_argument('--address', required=True)
+    p.add_argument('--key-file', required=True)
+    p.add_argument('--idle-timeout', type=float, default=DEFAULT_IDLE_TIMEOUT)
+    args = p.parse_args(argv)
+    with open(args.key_file, 'rb') as f:
+        authkey = f.read()
+    os.unlink(args.key_file)
+    listener = Listener(args.address, family=_FAMILY, authkey=authkey)
+    if not _IS_WINDOWS:
+        # Hand the socket to the user who owns the private directory it lives in
+        owner = os.stat(os.path.dirname(args.address)).st_uid
+        os.chown(args.address, owner, -1)
+        os.chmod(args.address, 0o600)
+    _Broker(listener, authkey, args.idle_timeout).serve()
+    if not _IS_WINDOWS:
+        try:
+            os.rmdir(os.path.dirname(args.address))
+        except OSError:
+            pass
+    return 0
+
+
+# --- client side ---
+def _state_path() -> str | None:
+    base = runtime_dir()
+    return os.path.join(base, _STATE_FILE) if base else None
+
+
+def _read_state() -> dict | None:
+    path = _state_path()
+    if not path:
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_state(address: str, authkey: bytes) -> None:
+    path = _state_path()
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'address': address, 'authkey': authkey.hex()}, f)
+    except OSError:
+        pass
+
+
+def _connect(address: str, authkey: bytes) -> Connection:
+    try:
+        return Client(address, family=_FAMILY, authkey=authkey)
+    except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+        raise BrokerError(f'无法连接特权助手: {e}') from e
+
+
+def _helper_argv() -> List[str]:
+    exe = sys.executable or sys.argv[0]
+    if getattr(sys, 'frozen', False):
+        return [exe, '--broker-helper']
+    return [exe, '-m', 'sys_switch.broker']
+
+
+def start_broker(mode: str = 'elevate', idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+                 timeout: float = STARTUP_TIMEOUT) -> Connection:
+    """Launch a helper (elevated unless `mode == 'local'`) and connect to it."""
+    authkey = secrets.token_bytes(32)
+    private = tempfile.mkdtemp(prefix='broker-', dir=_private_parent())
+    if _IS_WINDOWS:
+        address = r'\\.\pipe\sys_switch-' + secrets.token_hex(8)
+    else:
+        address = os.path.join(private, 'broker.sock')
+    key_file = os.path.join(private, 'key')
+    fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(authkey)
+
+    argv = [*_helper_argv(), '--address', address, '--key-file', key_file, '--idle-timeout', str(idle_timeout)]
+    proc = _launch(argv, elevate=(mode != 'local' and not is_admin()))
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() not in (None, 0):
+            break  # authentication refused/cancelled
+        try:
+            conn = Client(address, family=_FAMILY, authkey=authkey)
+        except (OSError, EOFError):
+            time.sleep(0.1)
+            continue
+        except multiprocessing.AuthenticationError as e:
+            raise BrokerError(f'特权助手认证失败: {e}') from e
+        _write_state(address, authkey)
+        return conn
+    if os.path.exists(key_file):
+        os.unlink(key_file)
+    raise BrokerError('特权助手未能启动（授权被取消或超时）')
+
+
+def _private_parent() -> str | None:
+    base = runtime_dir()
+    if not base:
+        return None
+    try:
+        os.makedirs(base, mode=0o700, exist_ok=True)
+    except OSError:
+        return None
+    return base
+
+
+def _launch(argv: List[str], elevate: bool) -> Optional[subprocess.Popen]:
+    """Start the helper detached from our stdio, so `sys-switch ... | cat` does not wait for it."""
+    if elevate and _IS_WINDOWS:
+        import ctypes
+        params = subprocess.list2cmdline(argv[1:])
+        ret = ctypes.windll.shell32.ShellExecuteW(None, 'runas', argv[0], params, None, 0)
+        if int(ret) <= 32:
+            raise BrokerError('无法以管理员身份启动特权助手')
+        return None
+    if elevate:
+        pk = which('pkexec')
+        if not pk:
+            raise BrokerError('未找到 pkexec，无法启动特权助手')
+        argv = [pk, *argv]
+    kwargs: dict = {'stdin': subprocess.DEVNULL, 'stdout': subprocess.DEVNULL, 'stderr': subprocess.DEVNULL}
+    if _IS_WINDOWS:
+        kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW
+    else:
+        kwargs['start_new_session'] = True
+    return subprocess.Popen(argv, **kwargs)
+
+
+def connect(mode: str = 'elevate', idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> Connection:
+    """Connect to the session's helper, starting one if none is running."""
+    state = _read_state()
+    if state:
+        try:
+            return _connect(state['address'], bytes.fromhex(state['authkey']))
+        except (BrokerError, KeyError, ValueError):
+            pass  # stale: helper idled out or the machine rebooted
+    return start_broker(mode, idle_timeout=idle_timeout)
+
+
+class RemoteBootManager:
+    """Boot manager interface backed by the privileged helper.
+
+    Connects lazily on first use and reconnects (starting a new helper if
+    needed) when the previous one has exited.
+    """
+
+    def __init__(self, mode: str = 'elevate', show_recovery: bool = False,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> None:
+        self.mode = mode
+        self.show_recovery = show_recovery
+        self.idle_timeout = idle_timeout
+        self._conn: Connection | None = None
+        self._lock = threading.Lock()
+
+    def _request(self, conn: Connection, payload: bytes) -> dict:
+        conn.send_bytes(payload)
+        return json.loads(conn.recv_bytes())
+
+    def _call(self, op: str, **args) -> Any:
+        args['show_recovery'] = self.show_recovery
+        payload = json.dumps({'op': op, 'args': args}).encode('utf-8')
+        with self._lock:
+            for attempt in (0, 1):
+                if self._conn is None:
+                    self._conn = connect(self.mode, self.idle_timeout)
+                try:
+                    reply = self._request(self._conn, payload)
+                    break
+                except (EOFError, OSError):
+                    self._conn.close()
+                    self._conn = None
+                    if attempt:
+                        raise BrokerError('与特权助手的连接已断开')
+        if not reply.get('ok'):
+            raise BrokerError(reply.get('error') or 'broker error')
+        return reply.get('result')
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def ping(self) -> dict:
+        return self._call('ping')
+
+    def shutdown(self) -> None:
+        self._call('shutdown')
+        self.close()
+
+    def available(self) -> bool:
+        return bool(self._call('available'))
+
+    def list_entries(self) -> List[BootEntry]:
+        return [BootEntry.from_dict(d) for d in self._call('list')]
+
+    def fingerprint(self) -> str | None:
+        return self._call('fingerprint')
+
+    def watch_paths(self) -> List[tuple]:
+        # The watched directories are world-readable; inotify runs in the caller
+        return [(d, tuple(p)) for d, p in (self._call('watch_paths') or [])]
+
+    def invalidate(self) -> None:
+        self._call('invalidate')
+
+    def _mutation(self, op: str, **args) -> tuple[bool, str]:
+        try:
+            ok, msg = self._call(op, **args)
+        except BrokerError as e:
+            return False, str(e)
+        return bool(ok), msg
+
+    def set_next(self, entry_id: str) -> tuple[bool, str]:
+        return self._mutation('set_next', id=entry_id)
+
+    def clear_next(self) -> tuple[bool, str]:
+        return self._mutation('clear_next')
+
+    def set_order(self, order: List[str]) -> tuple[bool, str]:
+        return self._mutation('set_order', order=list(order))
+
+    def reboot_now(self) -> tuple[bool, str]:
+        return self._mutation('reboot')
+
+
+if __name__ == '__main__':
+    sys.exit(helper_main())
@@ -0,0 +1,198 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from .models import BootEntry
+from .platforms.common import boot_id, runtime_dir
+from .trace import traced
+
+
+# Records are reused for this long when the manager cannot fingerprint its
+# state; with a fingerprint the TTL only bounds how stale a miss-detection can be.
+DEFAULT_MAX_AGE = 60.0
+_FORMAT_VERSION = 1
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+
+    def as_dict(self) -> dict:
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+        }
+
+
+@dataclass
+class _Record:
+    fingerprint: Optional[str]
+    created: float  # wall clock, comparable across processes
+    entries: List[BootEntry]
+
+
+class CachedBootManager:
+    """Caches `list_entries()` of a boot manager in memory and in a per-boot snapshot file.
+
+    A record is served while it is younger than `max_age` and the manager's
+    `fingerprint()` (if it has one) is unchanged. Successful mutations
+    (`set_next`, `clear_next`, `set_order`) drop both tiers.
+    """
+
+    def __init__(self, manager, max_age: float = DEFAULT_MAX_AGE, disk: bool = True,
+                 disk_dir: str | None = None) -> None:
+        self.manager = manager
+        self.max_age = max_age
+        self.disk_dir = (disk_dir or runtime_dir()) if disk else None
+        self.stats = CacheStats()
+        self._mem: _Record | None = None
+
+    def __getattr__(self, name):
+        return getattr(self.manager, name)
+
+    # --- helpers ---
+    def _fingerprint(self) -> str | None:
+        fp = getattr(self.manager, 'fingerprint', None)
+        return fp() if fp else None
+
+    def _disk_path(self) -> str | None:
+        if not self.disk_dir:
+            return None
+        key_fn = getattr(self.manager, 'cache_key', None)
+        key = key_fn() if key_fn else type(self.manager).__name__
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.disk_dir, f'entries-{digest}.json')
+
+    def _fresh(self, rec: _Record | None, fp: str | None) -> bool:
+        if rec is None or self.max_age <= 0:
+            return False
+        if time.time() - rec.created > self.max_age:
+            return False
+        return rec.fingerprint == fp
+
+    def _read_disk(self) -> _Record | None:
+        path = self._disk_path()
+        if not path:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != _FORMAT_VERSION or data.get('boot_id') != boot_id():
+                return None
+            return _Record(
+                fingerprint=data.get('fingerprint'),
+                created=float(data['created']),
+                entries=[BootEntry.from_dict(e) for e in data['entries']],
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_disk(self, rec: _Record) -> None:
+        path = self._disk_path()
+        if not path:
+            return
+        data = {
+            'version': _FORMAT_VERSION,
+            'boot_id': boot_id(),
+            'fingerprint': rec.fingerprint,
+            'created': rec.created,
+            'entries': [e.to_dict() for e in rec.entries],
+        }
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(self.disk_dir, mode=0o755, exist_ok=True)
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def _lookup(self) -> tuple[List[BootEntry] | None, str | None]:
+        """Return `(entries, fingerprint)`; entries is None on a miss."""
+        if self.max_age <= 0:
+            return None, None
+        fp = self._fingerprint()
+        if self._fresh(self._mem, fp):
+            self.stats.hits += 1
+            return self._mem.entries, fp
+        rec = self._read_disk()
+        if self._fresh(rec, fp):
+            self.stats.disk_hits += 1
+            self._mem = rec
+            return rec.entries, fp
+        return None, fp
+
+    # --- manager interface ---
+    def available(self) -> bool:
+        # A valid snapshot proves a backend worked; skip the probe (bcdedit on Windows).
+        if self._lookup()[0] is not None:
+            return True
+        return self.manager.available()
+
+    @traced('CachedBootManager.list_entries')
+    def list_entries(self) -> List[BootEntry]:
+        entries, fp = self._lookup()
+        if entries is None:
+            self.stats.misses += 1
+            if self.max_age <= 0:
+                fp = self._fingerprint()
+            entries = self.manager.list_entries()
+            rec = _Record(fingerprint=fp, created=time.time(), entries=entries)
+            self._mem = rec
+            self._write_disk(rec)
+        # Hand out copies so callers cannot mutate the cached records.
+        return [BootEntry.from_dict(e.to_dict()) for e in entries]
+
+    def seed(self, entries: List[BootEntry], fingerprint: str | None) -> None:
+        """Adopt entries listed elsewhere (the unelevated parent) as a fresh record for `fingerprint`."""
+        rec = _Record(fingerprint=fingerprint, created=time.time(), entries=list(entries))
+        self._mem = rec
+        self._write_disk(rec)
+
+    def invalidate(self) -> None:
+        self.stats.invalidations += 1
+        self._mem = None
+        path = self._disk_path()
+        if path:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        inner = getattr(self.manager, 'invalidate', None)
+        if inner:
+            inner()
+
+    def _mutate(self, name: str, *args) -> tuple[bool, str]:
+        ok, msg = getattr(self.manager, name)(*args)
+        if ok:
+            self.invalidate()
+        return ok, msg
+
+    def set_next(self, entry_id: str) -> tuple[bool, str]:
+        return self._mutate('set_next', entry_id)
+
+    def clear_next(self) -> tuple[bool, str]:
+        return self._mutate('clear_next')
+
+    def set_order(self, order: List[str]) -> tuple[bool, str]:
+        return self._mutate('set_order', order)
+
+    def set_default(self, entry_id: str) -> tuple[bool, str]:
+        if not hasattr(self.manager, 'set_default'):
+            return False, '当前引导管理器不支持设置默认启动项'
+        return self._mutate('set_default', entry_id)
+
+    def reboot_now(self) -> tuple[bool, str]:
+        return self.manager.reboot_now()
@@ -1,34 +1,213 @@
 from __future__ import annotations
 import argparse
 import json
-from typing import List
+import os
+import sys
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence
 
 from .platforms.common import current_platform
-from .platforms.linux import LinuxBootManager
-from .platforms.windows import WindowsBootManager
-from .models import BootEntry
+from .models import BootEntry, EntryIndex, EntryLookupError, entry_partuuid
 
 
-def get_manager(show_recovery: bool = False):
+BROKER_ENV = 'SYS_SWITCH_BROKER'
+
+
+def broker_mode(flag: bool = False) -> str | None:
+    """'elevate', 'local' (helper without elevation, for tests) or None for in-process managers."""
+    env = (os.environ.get(BROKER_ENV) or '').strip().lower()
+    if env == 'local':
+        return 'local'
+    if flag or env in ('1', 'yes', 'true', 'elevate'):
+        return 'elevate'
+    return None
+
+
+def get_manager(show_recovery: bool = False, bcd_store: str | None = None,
+                use_cache: bool = True, max_age: float | None = None, broker: str | None = None,
+                handoff=None):
+    # Privileged helper ('elevate' or the unelevated 'local' stand-in); an offline store needs no privileges
+    if broker and not bcd_store:
+        from .broker import RemoteBootManager
+        return RemoteBootManager(mode=broker, show_recovery=show_recovery)
+    # Import only the backend this platform needs; keeps CLI start-up cheap.
     plat = current_platform()
-    return WindowsBootManager(show_recovery=show_recovery) if plat == 'Windows' else LinuxBootManager()
-
-
-def format_entries(entries: List[BootEntry], output: str) -> str:
-    if output == 'json':
-        return json.dumps([
-            {
-                'id': e.id,
-                'description': e.description,
-                'is_current': e.is_current,
-                'is_next': e.is_next,
-            } for e in entries
-        ], ensure_ascii=False, indent=2)
-    # default: table-like text
-    lines = ["ID\tCURRENT\tNEXT\tDESCRIPTION"]
-    for e in entries:
-        lines.append(f"{e.id}\t{int(e.is_current)}\t{int(e.is_next)}\t{e.description}")
-    return "\n".join(lines)
+    if bcd_store or plat == 'Windows':
+        from .platforms.windows import WindowsBootManager
+        # An offline BCD hive is readable on any platform
+        mgr = WindowsBootManager(show_recovery=show_recovery, store=bcd_store)
+    else:
+        # The unelevated parent's choice (`--handoff`) saves probing again
+        backend = handoff.backend if handoff is not None else None
+        if backend is None:
+            from .platforms.systemdboot import booted_with_systemd_boot
+            backend = 'SystemdBootManager' if booted_with_systemd_boot() else 'LinuxBootManager'
+        if backend == 'SystemdBootManager':
+            from .platforms.systemdboot import SystemdBootManager
+            # LoaderEntryOneShot rather than BootNext: systemd-boot picks among its own entries
+            mgr = SystemdBootManager()
+        else:
+            from .platforms.linux import LinuxBootManager
+            mgr = LinuxBootManager(tool_paths=handoff.trusted_tools() if handoff is not None else None)
+    if not use_cache:
+        return mgr
+    from .cache import DEFAULT_MAX_AGE, CachedBootManager
+    cached = CachedBootManager(mgr, max_age=DEFAULT_MAX_AGE if max_age is None else max_age)
+    if handoff is not None:
+        handoff.adopt(cached, show_recovery=show_recovery)
+    return cached
+
+
+# Default columns per output format; `--fields` picks any of BootEntry.FIELDS
+_DEFAULT_FIELDS = {
+    'text': ('id', 'is_current', 'is_next', 'description'),
+    'json': ('id', 'description', 'is_current', 'is_next'),
+    'ndjson': ('id', 'description', 'is_current', 'is_next'),
+}
+_TEXT_HEADERS = {'id': 'ID', 'description': 'DESCRIPTION', 'is_current': 'CURRENT', 'is_next': 'NEXT', 'extra': 'EXTRA',
+                 'device': 'DEVICE', 'os': 'OS'}
+# Joined at output time rather than stored on BootEntry: the block device and the OS behind it
+OUTPUT_FIELDS = BootEntry.FIELDS + ('device', 'os')
+Join = Callable[[BootEntry], object]
+
+
+def _text_value(v) -> str:
+    if isinstance(v, bool):
+        return str(int(v))
+    if isinstance(v, dict):
+        return v.get('path') or v.get('name') or ''
+    return '' if v is None else str(v)
+
+
+def _field_value(e: BootEntry, f: str, joins: Dict[str, Join]):
+    if f in BootEntry.FIELDS:
+        return getattr(e, f)
+    join = joins.get(f)
+    return join(e) if join else None
+
+
+def iter_entries(entries: Iterable[BootEntry], output: str, fields: Sequence[str] | None = None,
+                 joins: Dict[str, Join] | None = None) -> Iterator[str]:
+    """Output in chunks (a line, or one JSON element) so a large listing is never built as one string.
+
+    `joins` supplies the joined columns (`device`, `os`); they appear only when named in `fields`.
+    """
+    joins = joins or {}
+    if not fields:
+        fields = _DEFAULT_FIELDS[output]
+
+    if output == 'text':
+        yield '\t'.join(_TEXT_HEADERS[f] for f in fields)
+        for e in entries:
+            yield '\t'.join(_text_value(_field_value(e, f, joins)) for f in fields)
+        return
+    rows = ({f: _field_value(e, f, joins) for f in fields} for e in entries)
+    if output == 'ndjson':
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False)
+        return
+    # Same text as json.dumps(list, indent=2), one element at a time
+    pending = None
+    for row in rows:
+        if pending is None:
+            yield '['
+        else:
+            yield pending + ','
+        pending = '  ' + json.dumps(row, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+    if pending is None:
+        yield '[]'
+    else:
+        yield pending
+        yield ']'
+
+
+def format_entries(entries: List[BootEntry], output: str, fields: Sequence[str] | None = None,
+                   joins: Dict[str, Join] | None = None) -> str:
+    return '\n'.join(iter_entries(entries, output, fields, joins))
+
+
+def parse_fields(spec: str | None) -> tuple | None:
+    """`--fields id,description` -> tuple; ValueError naming unknown fields."""
+    if not spec:
+        return None
+    fields = tuple(f.strip() for f in spec.split(',') if f.strip())
+    unknown = [f for f in fields if f not in OUTPUT_FIELDS]
+    if not fields:
+        raise ValueError(f'--fields 为空（可用: {", ".join(OUTPUT_FIELDS)}）')
+    if unknown:
+        raise ValueError(f'未知字段: {", ".join(unknown)}（可用: {", ".join(OUTPUT_FIELDS)}）')
+    return fields
+
+
+def device_lookup() -> Callable[[BootEntry], dict | None] | None:
+    """`entry -> partition info`, scanning block devices only once an entry with a partition asks (Linux only)."""
+    if current_platform() != 'Linux':
+        return None
+    index = None
+
+    def lookup(entry: BootEntry) -> dict | None:
+        nonlocal index
+        if entry_partuuid(entry) is None:
+            return None
+        if index is None:
+            from .platforms.blockdev import device_index
+            index = device_index()
+        dev = index.for_entry(entry)
+        return dev.to_dict() if dev else None
+    return lookup
+
+
+def os_lookup(entries: List[BootEntry], mount: bool = False) -> Join | None:
+    """`entry -> OS info`, detected once for all `entries` (Linux only)."""
+    if current_platform() != 'Linux' or not any(entry_partuuid(e) for e in entries):
+        return None
+    from .platforms.osdetect import detect_os
+    found = detect_os(entries, mount=mount)
+    return lambda e: found[e.id].to_dict() if e.id in found else None
+
+
+def _joins(entries: List[BootEntry], args: argparse.Namespace, wanted: Sequence[str]) -> Dict[str, Join]:
+    joins: Dict[str, Join] = {}
+    if 'device' in wanted:
+        devices = device_lookup()
+        if devices:
+            joins['device'] = devices
+    if 'os' in wanted:
+        systems = os_lookup(entries, mount=getattr(args, 'probe_mounts', False))
+        if systems:
+            joins['os'] = systems
+    return joins
+
+
+def _print_entries(entries: Iterable[BootEntry], args: argparse.Namespace) -> int:
+    try:
+        fields = parse_fields(getattr(args, 'fields', None))
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    output = getattr(args, 'output', 'text')
+    # The joins scan block devices / probe partitions, so only an explicit --fields pays for them
+    wanted = fields or ()
+    if 'os' in wanted:
+        entries = list(entries)  # OS detection probes all partitions at once
+    write = sys.stdout.write
+    for chunk in iter_entries(entries, output, fields, _joins(entries, args, wanted)):
+        write(chunk + '\n')
+    return 0
+
+
+def _print_entry(entry: BootEntry, args: argparse.Namespace) -> int:
+    try:
+        fields = parse_fields(getattr(args, 'fields', None))
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    if not fields:
+        data = entry.to_dict()
+    else:
+        joins = _joins([entry], args, fields)
+        data = {f: _field_value(entry, f, joins) for f in fields}
+    print(json.dumps(data, ensure_ascii=False, indent=2))
+    return 0
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -37,32 +216,203 @@ def build_parser() -> argparse.ArgumentParser:
 
     p.add_argument('--cli', action='store_true', help='Run in CLI mode (no GUI)')
     p.add_argument('--show-recovery', action='store_true', help='Show Windows Recovery Environment entries (Windows only)')
+    p.add_argument('--bcd-store', metavar='PATH', help='Read an offline BCD hive (e.g. from `bcdedit /export`) instead of the system store')
+    p.add_argument('--no-cache', action='store_true', help='Always enumerate; do not use or update the entry snapshot cache')
+    p.add_argument('--max-age', type=float, metavar='SECONDS', help='Maximum age of a cached snapshot (default: 60; 0 forces a refresh)')
+    p.add_argument('--cache-stats', action='store_true', help='Print cache hit/miss counters to stderr')
+    p.add_argument('--no-daemon', action='store_true', help='Do not ask a running `serve` daemon; enumerate directly')
+    p.add_argument('--broker', action='store_true',
+                   help='Run boot operations in a privileged helper that is started once and reused (also SYS_SWITCH_BROKER=1)')
+    p.add_argument('--profile', action='store_true', help='Trace manager calls and external commands; print a report on exit')
+    p.add_argument('--profile-format', choices=['summary', 'chrome'], default='summary',
+                   help='Report as a summary table or Chrome trace-event JSON (default: summary)')
+    p.add_argument('--profile-output', metavar='PATH', help='Write the profile report to PATH instead of stderr')
+    # Passed by the unelevated GUI to its elevated relaunch (see handoff.py)
+    p.add_argument('--handoff', metavar='PATH', help=argparse.SUPPRESS)
 
     list_p = sub.add_parser('list', help='List available boot entries')
-    list_p.add_argument('-o', '--output', choices=['text', 'json'], default='text')
+    list_p.add_argument('-o', '--output', choices=['text', 'json', 'ndjson'], default='text',
+                        help='text table, a JSON array, or one JSON object per line (default: text)')
+
+    get_p = sub.add_parser('get', help='Show one boot entry as JSON')
+    get_p.add_argument('id', help='Entry ID')
+    for sp in (list_p, get_p):
+        sp.add_argument('--fields', metavar='FIELDS',
+                        help='Comma-separated columns: ' + ','.join(OUTPUT_FIELDS) + ' (device/os only when listed)')
+        sp.add_argument('--probe-mounts', action='store_true',
+                        help='Briefly mount unmounted partitions read-only to identify their OS (root only)')
 
     set_p = sub.add_parser('set', help='Set next boot entry (one-time)')
-    set_p.add_argument('id', help='Entry ID (Linux: 0000..; Windows: {GUID})')
+    set_p.add_argument('id', nargs='?', help='Entry ID (Linux: 0000..; Windows: {GUID})')
+    set_p.add_argument('--match', metavar='PATTERN',
+                       help='Pick the entry by description: exact (case-insensitive), else regex or substring; must be unique')
+    set_p.add_argument('--by-partuuid', metavar='GUID', help='Pick the entry booting from this GPT partition')
+    set_p.add_argument('--default', action='store_true',
+                       help='Make the entry the persistent default instead (systemd-boot LoaderEntryDefault)')
 
     reboot_p = sub.add_parser('reboot', help='Reboot immediately')
 
+    serve_p = sub.add_parser('serve', help='Keep the entry snapshot in memory and answer queries on a Unix socket')
+    serve_p.add_argument('--socket', metavar='PATH', help='Socket path (default: $XDG_RUNTIME_DIR/sys_switch/daemon.sock, /run/sys_switch/daemon.sock for root)')
+    serve_p.add_argument('--debounce', type=float, metavar='SECONDS', help='Quiet period before re-reading after a change (default: 0.2)')
+
+    fleet_p = sub.add_parser('fleet', help='Run list/set/reboot on many hosts concurrently (one JSON line per host)')
+    fleet_p.add_argument('fleet_action', choices=['list', 'set', 'reboot'], metavar='{list,set,reboot}')
+    fleet_p.add_argument('target', nargs='?', help='Entry ID for `set` (or use --match)')
+    fleet_p.add_argument('-i', '--inventory', default='-', metavar='PATH',
+                         help='Hosts, one per line with optional key=value pairs (default: stdin)')
+    fleet_p.add_argument('--match', metavar='DESCRIPTION',
+                         help='For `set`: pick the entry by description on each host (e.g. "Windows Boot Manager")')
+    fleet_p.add_argument('--reboot', action='store_true', help='For `set`: reboot each host after setting')
+    fleet_p.add_argument('--transport', choices=['ssh', 'local'], default='ssh',
+                         help='How hosts are reached; `local` runs every host as a local process (testing)')
+    fleet_p.add_argument('--workers', type=int, default=16, help='Hosts processed concurrently (default: 16)')
+    fleet_p.add_argument('--timeout', type=float, default=30.0, metavar='SECONDS', help='Deadline per attempt (default: 30)')
+    fleet_p.add_argument('--retries', type=int, default=2, help='Retries after connection failures/timeouts (default: 2)')
+    fleet_p.add_argument('--ssh', default='ssh', metavar='PROGRAM', help='ssh client to use')
+    fleet_p.add_argument('--ssh-option', action='append', default=[], metavar='OPT',
+                         help='Extra ssh argument (repeatable), e.g. --ssh-option=-F --ssh-option=lab_config')
+    fleet_p.add_argument('--remote-command', default='sys-switch', metavar='CMD',
+                         help='Program to run on each host (default: sys-switch; e.g. "sudo -n sys-switch")')
+
+    batch_p = sub.add_parser('batch', help='Answer JSON-lines requests (list/get/set/clear_next/verify/reboot) '
+                                           'with one manager; one JSON line out per request')
+    batch_p.add_argument('-i', '--input', default='-', metavar='PATH', help='Requests file (default: stdin)')
+    batch_p.add_argument('--stop-on-error', action='store_true', help='Stop at the first failed request')
+
+    watch_p = sub.add_parser('watch', help='Stream boot entry changes as JSON lines')
+    watch_p.add_argument('--initial', action='store_true', help='Emit the current entries as a first "snapshot" event')
+    watch_p.add_argument('--debounce', type=float, default=0.2, metavar='SECONDS',
+                         help='Quiet period that ends a burst of changes (default: 0.2)')
+    watch_p.add_argument('--max-interval', type=float, default=30.0, metavar='SECONDS',
+                         help='Longest poll interval where change notification is unavailable (default: 30)')
+    watch_p.add_argument('--duration', type=float, metavar='SECONDS', help='Stop after SECONDS (default: run until interrupted)')
+
     return p
 
 
 def run_cli(args: argparse.Namespace) -> int:
-    mgr = get_manager(show_recovery=getattr(args, 'show_recovery', False))
+    if not getattr(args, 'profile', False):
+        return _run_cli(args)
+    from .trace import tracer
+    tracer.enable()
+    try:
+        with tracer.span(f'cli.{args.cmd or "list"}'):
+            return _run_cli(args)
+    finally:
+        _write_profile(tracer.dump(getattr(args, 'profile_format', 'summary')), getattr(args, 'profile_output', None))
+
+
+def _write_profile(report: str, path: str | None) -> None:
+    if path:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+    else:
+        print(report, file=sys.stderr)
+
+
+def _run_cli(args: argparse.Namespace) -> int:
+    if args.cmd == 'fleet':
+        # Remote hosts do the work; no local boot manager needed
+        from .fleet import run_fleet
+        return run_fleet(args)
+    broker = broker_mode(getattr(args, 'broker', False))
+    if broker is None:
+        code = _from_daemon(args)
+        if code is not None:
+            return code
+    mgr = get_manager(
+        show_recovery=getattr(args, 'show_recovery', False),
+        bcd_store=getattr(args, 'bcd_store', None),
+        use_cache=not getattr(args, 'no_cache', False),
+        max_age=getattr(args, 'max_age', None),
+        broker=broker,
+    )
+    try:
+        return _dispatch(mgr, args)
+    except OSError as e:
+        if broker is None:
+            raise
+        # BrokerError: helper could not be started or reached
+        print(str(e), file=sys.stderr)
+        return 2
+    finally:
+        stats = getattr(mgr, 'stats', None)
+        if getattr(args, 'cache_stats', False) and stats is not None:
+            print(json.dumps(stats.as_dict()), file=sys.stderr)
+
+
+def _from_daemon(args: argparse.Namespace) -> int | None:
+    """Answer list/get from a running `serve` daemon; None to enumerate directly."""
+    if args.cmd not in (None, 'list', 'get'):
+        return None
+    if (getattr(args, 'no_daemon', False) or getattr(args, 'no_cache', False) or getattr(args, 'bcd_store', None)
+            or getattr(args, 'show_recovery', False) or getattr(args, 'max_age', None) is not None):
+        return None
+    from .daemon import query
+    if args.cmd == 'get':
+        reply = query({'op': 'get', 'id': args.id})
+        if reply is None:
+            return None
+        if not reply.get('ok'):
+            print(reply.get('error'), file=sys.stderr)
+            return 1
+        return _print_entry(BootEntry.from_dict(reply['entry']), args)
+    reply = query({'op': 'list'})
+    if reply is None or not reply.get('ok'):
+        return None
+    return _print_entries((BootEntry.from_dict(d) for d in reply['entries']), args)
+
+
+def _dispatch(mgr, args: argparse.Namespace) -> int:
     if not mgr.available():
         print('No supported boot manager found on this platform. Install required tools or run as admin/root.')
         return 2
     if args.cmd in (None, 'list'):
-        entries = mgr.list_entries()
-        out = format_entries(entries, getattr(args, 'output', 'text'))
-        print(out)
-        return 0
+        return _print_entries(mgr.list_entries(), args)
+    if args.cmd == 'get':
+        entry = EntryIndex(mgr.list_entries()).get(args.id)
+        if entry is None:
+            print(f'未找到引导项: {args.id}', file=sys.stderr)
+            return 1
+        return _print_entry(entry, args)
+    if args.cmd == 'serve':
+        from .daemon import run_serve
+        return run_serve(mgr, path=args.socket, debounce=args.debounce)
     if args.cmd == 'set':
-        ok, msg = mgr.set_next(args.id)
+        selectors = [x for x in (args.id, args.match, args.by_partuuid) if x is not None]
+        if len(selectors) != 1:
+            print('set 需要且只需要以下之一: 引导项 ID、--match、--by-partuuid', file=sys.stderr)
+            return 2
+        entry_id = args.id
+        if entry_id is None:
+            # Resolve against one listing in this process; no second enumeration
+            try:
+                entry_id = EntryIndex(mgr.list_entries()).resolve(match=args.match, partuuid=args.by_partuuid).id
+            except EntryLookupError as e:
+                print(str(e), file=sys.stderr)
+                return 1
+        if args.default:
+            set_default = getattr(mgr, 'set_default', None)
+            if set_default is None:
+                print('当前引导管理器不支持设置默认启动项', file=sys.stderr)
+                return 2
+            ok, msg = set_default(entry_id)
+        else:
+            ok, msg = mgr.set_next(entry_id)
         print(msg)
         return 0 if ok else 1
+    if args.cmd == 'batch':
+        from .batch import run_batch
+        try:
+            return run_batch(mgr, args)
+        except OSError as e:  # unreadable --input
+            print(str(e), file=sys.stderr)
+            return 2
+    if args.cmd == 'watch':
+        from .watch import run_watch
+        return run_watch(mgr, debounce=args.debounce, max_interval=args.max_interval,
+                         initial=args.initial, duration=args.duration)
     if args.cmd == 'reboot':
         ok, msg = mgr.reboot_now()
         print(msg)
@@ -0,0 +1,316 @@
+"""`sys-switch serve`: keep the boot entry snapshot in memory and answer queries.
+
+Clients send one JSON object per line over a Unix socket and get one JSON
+line back per request; a connection may carry any number of requests.
+
+    {"op": "list"}             -> {"ok": true, "generation": 3, "updated": ..., "entries": [...]}
+    {"op": "get", "id": "0001"} -> {"ok": true, "generation": 3, "entry": {...}}
+    {"op": "status"}           -> {"ok": true, "pid": ..., "mode": "inotify", ...}
+
+All operations are read-only; the snapshot is refreshed by a `Watcher`
+(inotify on the efivarfs/GRUB paths, or a fingerprint poll). Queries that
+arrive while inotify changes are still queued re-read first, so a `list`
+right after a `set` never sees the old state.
+
+A daemon running as root opens its socket to every user, since efivarfs
+exposes the same data to them anyway. Only root and the daemon's own user
+(checked with SO_PEERCRED) may make it re-read on demand; everyone else is
+answered from the snapshot the refresher last published.
+"""
+from __future__ import annotations
+import json
+import os
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+from typing import List, Optional
+
+from .models import BootEntry, EntryIndex
+from .platforms.common import is_admin, runtime_dir
+
+SOCKET_NAME = 'daemon.sock'
+SYSTEM_SOCKET = '/run/sys_switch/' + SOCKET_NAME
+DAEMON_ENV = 'SYS_SWITCH_DAEMON'
+# The fast path must never make the CLI slower than enumerating itself
+CLIENT_TIMEOUT = 1.0
+_MAX_REQUEST = 64 * 1024
+
+
+def default_socket_path() -> str | None:
+    base = runtime_dir()
+    return os.path.join(base, SOCKET_NAME) if base else None
+
+
+def candidate_sockets() -> List[str]:
+    """Where a client looks: an explicit override, the per-user daemon, then the system one."""
+    override = os.environ.get(DAEMON_ENV)
+    if override:
+        return [] if override == '0' else [override]
+    out = []
+    own = default_socket_path()
+    if own:
+        out.append(own)
+    if SYSTEM_SOCKET not in out:
+        out.append(SYSTEM_SOCKET)
+    return out
+
+
+class _Snapshot:
+    __slots__ = ('entries', 'index', 'generation', 'updated', 'list_reply')
+
+    def __init__(self, entries: List[BootEntry], generation: int) -> None:
+        self.entries = entries
+        # Same case-insensitive id lookup as `sys-switch get` without the daemon
+        self.index = EntryIndex(entries)
+        self.generation = generation
+        self.updated = time.time()
+        # `list` is the hot query; serialize it once per change, not per request
+        self.list_reply = (json.dumps({
+            'ok': True,
+            'generation': generation,
+            'updated': round(self.updated, 3),
+            'entries': [e.to_dict() for e in entries],
+        }, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+class StateDaemon:
+    def __init__(self, manager, path: str, debounce: float | None = None) -> None:
+        from .watch import DEFAULT_DEBOUNCE, Watcher
+        self.manager = manager
+        self.path = path
+        self.watcher = Watcher(manager, debounce=DEFAULT_DEBOUNCE if debounce is None else debounce)
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self._snap: _Snapshot | None = None
+        self._dirty = False
+        self._lock = threading.Lock()  # watcher drain/check and manager calls
+        self._stop = threading.Event()
+        self._server = None
+        self._shared = False  # socket opened to other users
+
+    # --- snapshot ---
+    def _publish(self, entries: List[BootEntry]) -> None:
+        gen = self._snap.generation + 1 if self._snap else 1
+        self._snap = _Snapshot(list(entries), gen)
+
+    def _pending(self) -> bool:
+        """Changes the snapshot has not seen yet: queued inotify events, or a moved fingerprint when polling."""
+        fd = self.watcher.fileno()
+        if fd is not None:
+            return self._dirty or bool(select.select([fd], [], [], 0)[0])
+        with self._lock:
+            if self.watcher.fingerprint_changed():
+                self._dirty = True
+        return self._dirty
+
+    def _sync(self) -> None:
+        """Bring the snapshot up to date with every change queued so far."""
+        with self._lock:
+            if self.watcher.drain():
+                self._dirty = True
+            if not self._dirty:
+                return
+            self._dirty = False
+            if self.watcher.check():
+                self._publish(self.watcher.entries)
+
+    def _refresh_loop(self) -> None:
+        fd = self.watcher.fileno()
+        while not self._stop.is_set():
+            try:
+                if fd is not None:
+                    if not select.select([fd], [], [], 1.0)[0]:
+                        continue
+                    self._stop.wait(self.watcher.debounce)  # let the burst finish
+                    self._sync()
+                else:
+                    self._stop.wait(self.watcher.interval)
+                    with self._lock:
+                        changed = self.watcher.poll()
+                    if changed:
+                        self._dirty = True
+                        self._sync()
+            except Exception as e:  # keep serving the last good snapshot
+                self.errors += 1
+                print(f'刷新引导项失败: {e}', file=sys.stderr)
+                self._stop.wait(5.0)
+
+    # --- requests ---
+    def may_refresh(self, conn: socket.socket) -> bool:
+        """Whether the peer on `conn` may make this process re-read the firmware state."""
+        if not self._shared:
+            return True
+        uid = _peer_uid(conn)
+        return uid is not None and uid in (0, os.geteuid())
+
+    def handle(self, req: dict, refresh: bool = True) -> bytes:
+        self.requests += 1
+        op = req.get('op')
+        # A query right after `sys-switch set` must not see the old state while
+        # the refresher is still waiting out the burst
+        if refresh and op in ('list', 'get') and self._pending():
+            self._sync()
+        snap = self._snap
+        if op == 'list':
+            return snap.list_reply
+        if op == 'get':
+            entry_id = req.get('id')
+            e = snap.index.get(entry_id) if isinstance(entry_id, str) else None
+            if e is None:
+                reply = {'ok': False, 'error': f'未找到引导项: {req.get("id")}', 'generation': snap.generation}
+            else:
+                reply = {'ok': True, 'generation': snap.generation, 'entry': e.to_dict()}
+        elif op == 'status':
+            reply = {
+                'ok': True,
+                'pid': os.getpid(),
+                'mode': 'inotify' if self.watcher.event_driven else 'poll',
+                'generation': snap.generation,
+                'updated': round(snap.updated, 3),
+                'entries': len(snap.entries),
+                'uptime': round(time.time() - self.started, 3),
+                'requests': self.requests,
+                'refresh_errors': self.errors,
+            }
+        else:
+            reply = {'ok': False, 'error': f'unknown op: {op!r}'}
+        return (json.dumps(reply, ensure_ascii=False) + '\n').encode('utf-8')
+
+    # --- server ---
+    def _prepare_socket(self) -> None:
+        if os.path.exists(self.path):
+            if _probe(self.path):
+                raise OSError(f'已有守护进程在运行: {self.path}')
+            os.unlink(self.path)  # left over from a crashed daemon
+        os.makedirs(os.path.dirname(self.path) or '.', mode=0o755, exist_ok=True)
+
+    def serve_forever(self) -> None:
+        import socketserver
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                refresh = daemon.may_refresh(self.request)
+                for line in self.rfile:
+                    if len(line) > _MAX_REQUEST:
+                        break
+                    try:
+                        req = json.loads(line)
+                        if not isinstance(req, dict):
+                            raise ValueError('request must be an object')
+                        out = daemon.handle(req, refresh=refresh)
+                    except ValueError as e:
+                        out = _error_reply(str(e))
+                    except Exception as e:  # one bad query must not drop the connection
+                        out = _error_reply(f'{type(e).__name__}: {e}')
+                    self.wfile.write(out)
+                    self.wfile.flush()
+
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+
+        self._prepare_socket()
+        self._publish(self.watcher.start())
+        refresher = threading.Thread(target=self._refresh_loop, name='sys_switch-refresh', daemon=True)
+        refresher.start()
+        self._server = Server(self.path, Handler)
+        try:
+            if is_admin():
+                # Read-only data that efivarfs exposes to every user anyway; see may_refresh()
+                os.chmod(self.path, 0o666)
+                self._shared = True
+            self._server.serve_forever(poll_interval=0.5)
+        finally:
+            self._stop.set()
+            self._server.server_close()
+            self.watcher.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+
+
+def _error_reply(error: str) -> bytes:
+    return (json.dumps({'ok': False, 'error': error}, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def _peer_uid(conn: socket.socket) -> int | None:
+    """Uid of the process at the other end of a Unix socket; None where SO_PEERCRED is missing."""
+    opt = getattr(socket, 'SO_PEERCRED', None)
+    if opt is None:
+        return None
+    try:
+        creds = conn.getsockopt(socket.SOL_SOCKET, opt, struct.calcsize('3i'))
+    except OSError:
+        return None
+    return struct.unpack('3i', creds)[1]  # pid, uid, gid
+
+
+def _probe(path: str) -> bool:
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(CLIENT_TIMEOUT)
+    try:
+        s.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        s.close()
+
+
+def query(req: dict, path: str | None = None, timeout: float = CLIENT_TIMEOUT) -> Optional[dict]:
+    """One request to a running daemon; None when none answers (caller enumerates itself)."""
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    for candidate in ([path] if path else candidate_sockets()):
+        if not os.path.exists(candidate):
+            continue
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.settimeout(timeout)
+        try:
+            s.connect(candidate)
+            s.sendall((json.dumps(req) + '\n').encode('utf-8'))
+            buf = b''
+            while not buf.endswith(b'\n'):
+                chunk = s.recv(65536)
+                if not chunk:
+                    break
+                buf += chunk
+            return json.loads(buf)
+        except (OSError, ValueError):
+            continue
+        finally:
+            s.close()
+    return None
+
+
+def run_serve(manager, path: str | None = None, debounce: float | None = None) -> int:
+    if not hasattr(socket, 'AF_UNIX'):
+        print('当前平台不支持 Unix 套接字，无法运行守护进程', file=sys.stderr)
+        return 2
+    path = path or default_socket_path()
+    if not path:
+        print('无法确定套接字路径（请设置 XDG_RUNTIME_DIR 或使用 --socket）', file=sys.stderr)
+        return 2
+    d = StateDaemon(manager, path, debounce=debounce)
+    import signal
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=d.shutdown, daemon=True).start())
+    try:
+        print(f'sys-switch 守护进程已启动: {path}', file=sys.stderr)
+        d.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,309 @@
+"""`sys-switch fleet`: list/set/reboot on many hosts at once.
+
+Each host runs its own `sys-switch --cli ...`, reached through a transport
+(`ssh`, or `local` subprocesses as a single-machine stand-in). Hosts are
+processed by a bounded thread pool; every attempt has a deadline, transport
+failures are retried with backoff, and one JSON line per host is written as
+soon as that host finishes.
+
+Inventory: one host per line, optionally followed by `key=value` pairs;
+`#` starts a comment.
+
+    lab01
+    lab02 user=root port=2222
+    lab03 command="sudo -n /opt/sys-switch/sys-switch" env.SYS_SWITCH_CMD_TIMEOUT=10
+
+`user`/`port` apply to ssh, `command` replaces the remote program, and
+`env.NAME=value` sets an environment variable for that host's command.
+"""
+from __future__ import annotations
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, IO, Iterable, List, Optional
+
+from .models import BootEntry, EntryIndex, EntryLookupError
+from .platforms.executor import TIMEOUT_RETURNCODE, Executor
+
+DEFAULT_WORKERS = 16
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_RETRIES = 2
+_BACKOFF = 0.5
+# ssh reports its own failures (connect, auth, host key) as 255
+SSH_FAILURE = 255
+
+
+@dataclass
+class Host:
+    name: str
+    attrs: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def env(self) -> Dict[str, str]:
+        return {k[4:]: v for k, v in self.attrs.items() if k.startswith('env.')}
+
+
+def parse_inventory(lines: Iterable[str]) -> List[Host]:
+    hosts: List[Host] = []
+    seen = set()
+    for lineno, line in enumerate(lines, 1):
+        try:
+            parts = shlex.split(line, comments=True)
+        except ValueError as e:
+            raise ValueError(f'清单第 {lineno} 行无法解析: {e}') from None
+        if not parts:
+            continue
+        attrs = {}
+        for item in parts[1:]:
+            key, sep, value = item.partition('=')
+            if not sep or not key:
+                raise ValueError(f'清单第 {lineno} 行: 应为 key=value，实际为 {item!r}')
+            attrs[key] = value
+        if parts[0] in seen:
+            raise ValueError(f'清单第 {lineno} 行: 主机 {parts[0]} 重复')
+        seen.add(parts[0])
+        hosts.append(Host(parts[0], attrs))
+    return hosts
+
+
+def load_inventory(path: str) -> List[Host]:
+    if path == '-':
+        return parse_inventory(sys.stdin)
+    with open(path, encoding='utf-8') as f:
+        return parse_inventory(f)
+
+
+# --- transports ---
+class Transport:
+    """Runs `sys-switch --cli <args>` for one host and returns the finished process."""
+    name = ''
+
+    def __init__(self, executor: Executor) -> None:
+        self.executor = executor
+
+    def argv(self, host: Host, args: List[str]) -> List[str]:
+        raise NotImplementedError
+
+    def env(self, host: Host) -> Optional[Dict[str, str]]:
+        return None
+
+    def run(self, host: Host, args: List[str], timeout: float) -> subprocess.CompletedProcess:
+        # Not `readonly`: identical argv for two hosts (local transport) must not share a process
+        return self.executor.run(self.argv(host, args), env=self.env(host), timeout=timeout)
+
+    def transient(self, cp: subprocess.CompletedProcess) -> bool:
+        """Whether a failed attempt says nothing about the host's boot state (worth retrying)."""
+        return cp.returncode == TIMEOUT_RETURNCODE and getattr(cp, 'timed_out', False)
+
+
+class SshTransport(Transport):
+    name = 'ssh'
+
+    def __init__(self, executor: Executor, ssh: str = 'ssh', remote_command: str = 'sys-switch',
+                 options: Optional[List[str]] = None, connect_timeout: float = 10.0) -> None:
+        super().__init__(executor)
+        self.ssh = ssh
+        self.remote_command = remote_command
+        # Never prompt: a password or host-key question would stall a worker until its deadline
+        self.options = ['-o', 'BatchMode=yes', '-o', f'ConnectTimeout={max(1, int(connect_timeout))}',
+                        *(options or [])]
+
+    def argv(self, host: Host, args: List[str]) -> List[str]:
+        cmd = [self.ssh, *self.options]
+        if host.attrs.get('port'):
+            cmd += ['-p', host.attrs['port']]
+        target = f"{host.attrs['user']}@{host.name}" if host.attrs.get('user') else host.name
+        remote = shlex.split(host.attrs.get('command') or self.remote_command)
+        env = [f'{k}={v}' for k, v in host.env.items()]
+        if env:
+            remote = ['env', *env, *remote]
+        # ssh joins its arguments with spaces; quote so the remote shell sees them unchanged
+        return cmd + [target, '--', shlex.join(remote + ['--cli', *args])]
+
+    def transient(self, cp: subprocess.CompletedProcess) -> bool:
+        return super().transient(cp) or cp.returncode == SSH_FAILURE
+
+
+class LocalTransport(Transport):
+    """Every "host" is a local `sys-switch` process; `env.*` attributes point it at its own fixture."""
+    name = 'local'
+
+    def __init__(self, executor: Executor, command: Optional[List[str]] = None) -> None:
+        super().__init__(executor)
+        self.command = command or [sys.executable, '-m', 'sys_switch.main']
+
+    def argv(self, host: Host, args: List[str]) -> List[str]:
+        command = shlex.split(host.attrs['command']) if host.attrs.get('command') else self.command
+        return [*command, '--cli', *args]
+
+    def env(self, host: Host) -> Optional[Dict[str, str]]:
+        env = dict(os.environ)
+        # A parent CLI run's daemon/broker settings must not leak into the stand-in hosts
+        env.setdefault('SYS_SWITCH_DAEMON', '0')
+        env.update(host.env)
+        return env
+
+
+TRANSPORTS: Dict[str, Callable[..., Transport]] = {
+    'ssh': SshTransport,
+    'local': LocalTransport,
+}
+
+
+# --- per-host work ---
+class HostError(Exception):
+    def __init__(self, message: str, attempts: int = 1) -> None:
+        super().__init__(message)
+        self.attempts = attempts
+
+
+def _output(cp: subprocess.CompletedProcess) -> str:
+    return ((cp.stderr or '').strip() or (cp.stdout or '').strip() or f'退出码 {cp.returncode}').splitlines()[-1]
+
+
+def resolve_target(entries: List[dict], match: str) -> dict:
+    """The single entry `match` selects, with the same rules as `sys-switch set --match`."""
+    index = EntryIndex(BootEntry.from_dict(e) for e in entries)
+    try:
+        return index.resolve(match=match).to_dict()
+    except EntryLookupError as e:
+        raise HostError(str(e)) from None
+
+
+class FleetRunner:
+    def __init__(self, transport: Transport, timeout: float = DEFAULT_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES, backoff: float = _BACKOFF) -> None:
+        self.transport = transport
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._stop = threading.Event()
+
+    def _call(self, host: Host, args: List[str], retry: bool = True) -> subprocess.CompletedProcess:
+        attempts = 1 + (self.retries if retry else 0)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                cp = self.transport.run(host, args, timeout=self.timeout)
+            except OSError as e:  # ssh (or the local command) itself is missing
+                raise HostError(f'无法执行 {e.filename or ""}: {e.strerror or e}', attempt) from None
+            if cp.returncode == 0:
+                return cp
+            if attempt >= attempts or not self.transport.transient(cp) or self._stop.is_set():
+                raise HostError(_output(cp), attempt)
+            self._stop.wait(self.backoff * 2 ** (attempt - 1))
+
+    def _list(self, host: Host) -> List[dict]:
+        cp = self._call(host, ['list', '-o', 'json'])
+        try:
+            entries = json.loads(cp.stdout)
+        except ValueError:
+            raise HostError('无法解析远端 list 输出') from None
+        if not isinstance(entries, list):
+            raise HostError('无法解析远端 list 输出')
+        return entries
+
+    def host_list(self, host: Host) -> dict:
+        return {'entries': self._list(host)}
+
+    def host_set(self, host: Host, entry_id: Optional[str] = None, match: Optional[str] = None,
+                 reboot: bool = False) -> dict:
+        out: dict = {}
+        if match is not None:
+            entry = resolve_target(self._list(host), match)
+            entry_id = entry['id']
+            out['description'] = entry.get('description')
+        cp = self._call(host, ['set', entry_id])
+        out.update(id=entry_id, message=(cp.stdout or '').strip())
+        if reboot:
+            out.update(self.host_reboot(host))
+        return out
+
+    def host_reboot(self, host: Host) -> dict:
+        # Never retried: the first attempt may have gone through before the connection dropped
+        cp = self._call(host, ['reboot'], retry=False)
+        return {'rebooted': True, 'reboot_message': (cp.stdout or '').strip()}
+
+    def run(self, hosts: List[Host], action: Callable[[Host], dict], workers: int,
+            emit: Callable[[dict], None]) -> int:
+        """Run `action` on every host; returns the number of failed hosts."""
+        failed = 0
+
+        def one(host: Host) -> dict:
+            t0 = time.monotonic()
+            try:
+                result = {'host': host.name, 'ok': True, **action(host)}
+            except HostError as e:
+                result = {'host': host.name, 'ok': False, 'error': str(e), 'attempts': e.attempts}
+            except Exception as e:  # a bug for one host must not take the others down
+                result = {'host': host.name, 'ok': False, 'error': f'{type(e).__name__}: {e}'}
+            result['elapsed_ms'] = round((time.monotonic() - t0) * 1000, 1)
+            return result
+
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='sys_switch-fleet') as pool:
+            futures = [pool.submit(one, h) for h in hosts]
+            try:
+                for fut in as_completed(futures):
+                    result = fut.result()
+                    failed += not result['ok']
+                    emit(result)
+            except KeyboardInterrupt:
+                self._stop.set()
+                for f in futures:
+                    f.cancel()
+                raise
+        return failed
+
+
+def run_fleet(args, out: IO[str] | None = None) -> int:
+    out = out or sys.stdout
+    if args.fleet_action == 'set' and (args.target is None) == (args.match is None):
+        print('fleet set 需要引导项 ID 或 --match 之一', file=sys.stderr)
+        return 2
+    try:
+        hosts = load_inventory(args.inventory)
+    except (OSError, ValueError) as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    if not hosts:
+        print('清单中没有主机', file=sys.stderr)
+        return 2
+
+    workers = min(args.workers, len(hosts))
+    # A private executor: the shared one caps concurrent processes at 4
+    executor = Executor(max_concurrency=workers, default_timeout=args.timeout)
+    if args.transport == 'ssh':
+        transport = SshTransport(executor, ssh=args.ssh, remote_command=args.remote_command,
+                                 options=args.ssh_option, connect_timeout=min(10.0, args.timeout))
+    else:
+        transport = TRANSPORTS[args.transport](executor)
+    runner = FleetRunner(transport, timeout=args.timeout, retries=args.retries)
+
+    if args.fleet_action == 'list':
+        action = runner.host_list
+    elif args.fleet_action == 'set':
+        action = lambda h: runner.host_set(h, entry_id=args.target, match=args.match, reboot=args.reboot)
+    else:
+        action = runner.host_reboot
+    lock = threading.Lock()
+
+    def emit(result: dict) -> None:
+        line = json.dumps({'action': args.fleet_action, **result}, ensure_ascii=False)
+        with lock:
+            out.write(line + '\n')
+            out.flush()
+
+    t0 = time.monotonic()
+    try:
+        failed = runner.run(hosts, action, workers, emit)
+    except KeyboardInterrupt:
+        return 130
+    print(f'{len(hosts) - failed}/{len(hosts)} 台主机成功，用时 {time.monotonic() - t0:.1f} 秒', file=sys.stderr)
+    return 0 if failed == 0 else 1
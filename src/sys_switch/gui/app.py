@@ -1,33 +1,92 @@
 from __future__ import annotations
 import platform
 
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer, QSocketNotifier
 from PySide6.QtWidgets import (
-    QWidget, QVBoxLayout, QLabel, QListWidget, QListWidgetItem,
-    QPushButton, QMessageBox, QHBoxLayout, QTextEdit, QCheckBox
+    QWidget, QVBoxLayout, QLabel, QListView, QLineEdit, QAbstractItemView,
+    QPushButton, QMessageBox, QHBoxLayout, QTextEdit, QCheckBox, QFileDialog,
+    QProgressBar
 )
 
+from sys_switch.cli import get_manager
 from sys_switch.platforms.common import current_platform
-from sys_switch.platforms.linux import LinuxBootManager
-from sys_switch.platforms.windows import WindowsBootManager
-from sys_switch.models import BootEntry
+from sys_switch.models import BootEntry, entry_partuuid
+from sys_switch.trace import tracer
+from sys_switch.gui.model import BootEntryFilter, BootEntryModel
+from sys_switch.gui.workers import TaskRunner
+from sys_switch.watch import Watcher
+
+# Rapid toggles of the recovery checkbox collapse into one rebuild/refresh.
+_TOGGLE_DEBOUNCE_MS = 300
 
 
 class BootSwitchApp(QWidget):
-    def __init__(self):
+    def __init__(self, manager_factory=get_manager):
         super().__init__()
         self.setWindowTitle('下一次启动系统选择器')
         self.resize(640, 420)
 
         self.platform = current_platform()
-        if self.platform == 'Windows':
-            self.manager = WindowsBootManager(show_recovery=False)  # 默认隐藏恢复环境
-        else:
-            self.manager = LinuxBootManager()
+        # `manager_factory(show_recovery=...)`; replaceable with a fake manager in tests
+        self.manager_factory = manager_factory
+        self.manager = manager_factory(show_recovery=False)  # 默认隐藏恢复环境
+
+        # All manager calls run on a worker thread; the UI only reacts to results
+        self.runner = TaskRunner(self)
+        self.runner.busy_changed.connect(self._set_busy)
+        self._refresh_token: int | None = None
+        self._toggle_timer = QTimer(self)
+        self._toggle_timer.setSingleShot(True)
+        self._toggle_timer.setInterval(_TOGGLE_DEBOUNCE_MS)
+        self._toggle_timer.timeout.connect(self._apply_show_recovery)
 
         self._build_ui()
+        self._start_watcher()
         self.refresh()
 
+    def _start_watcher(self):
+        """Auto-refresh when boot state changes outside the app (inotify, or a fingerprint poll).
+
+        Arming and polling may need the manager (an IPC round trip through the
+        broker), so they run on the worker like every other manager call.
+        """
+        self.watcher = Watcher(self.manager)
+        self._notifier = None
+        self._change_timer = QTimer(self)
+        self._change_timer.setSingleShot(True)
+        self._change_timer.setInterval(int(self.watcher.debounce * 1000))
+        self._change_timer.timeout.connect(self._on_external_change)
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setSingleShot(True)
+        self._poll_timer.timeout.connect(self._on_poll)
+        self.runner.submit(self.watcher.arm, on_done=self._on_watcher_armed,
+                           on_error=lambda msg: None, background=True)
+
+    def _on_watcher_armed(self, _result):
+        fd = self.watcher.fileno()
+        if fd is not None:
+            self._notifier = QSocketNotifier(fd, QSocketNotifier.Read, self)
+            self._notifier.activated.connect(self._on_fs_event)
+        else:
+            self._poll_timer.start(int(self.watcher.interval * 1000))
+
+    def _on_fs_event(self):
+        if self.watcher.drain():
+            self._change_timer.start()  # restarted by every event of a burst
+
+    def _on_poll(self):
+        self.runner.submit(self.watcher.poll, on_done=self._on_polled,
+                           on_error=lambda msg: self._on_polled(False), background=True)
+
+    def _on_polled(self, changed):
+        if changed:
+            self._on_external_change()
+        self._poll_timer.start(int(self.watcher.interval * 1000))
+
+    def _on_external_change(self):
+        self.log_line('检测到引导配置变化，自动刷新')
+        self.refresh(invalidate=True)
+
     def _build_ui(self):
         layout = QVBoxLayout(self)
         layout.addWidget(QLabel(f'当前平台: {self.platform}'))
@@ -39,56 +98,135 @@ class BootSwitchApp(QWidget):
             self.show_recovery_cb.stateChanged.connect(self.on_show_recovery_changed)
             layout.addWidget(self.show_recovery_cb)
 
-        self.list = QListWidget()
+        self.search = QLineEdit()
+        self.search.setPlaceholderText('按描述或 ID 筛选')
+        self.search.setClearButtonEnabled(True)
+        layout.addWidget(self.search)
+
+        # Model/view: refreshes diff into the model instead of rebuilding the list
+        self.model = BootEntryModel(self)
+        self.proxy = BootEntryFilter(self)
+        self.proxy.setSourceModel(self.model)
+        self.list = QListView()
+        self.list.setModel(self.proxy)
+        self.list.setUniformItemSizes(True)
+        self.list.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.list.setEditTriggers(QAbstractItemView.NoEditTriggers)
         layout.addWidget(self.list)
+        self.search.textChanged.connect(self.proxy.setFilterFixedString)
 
         btn_row = QHBoxLayout()
         self.btn_refresh = QPushButton('刷新')
         self.btn_apply = QPushButton('设置为下次启动')
         self.btn_reboot = QPushButton('立即重启')
+        self.btn_diag = QPushButton('导出诊断')
         btn_row.addWidget(self.btn_refresh)
         btn_row.addWidget(self.btn_apply)
         btn_row.addWidget(self.btn_reboot)
+        btn_row.addWidget(self.btn_diag)
         layout.addLayout(btn_row)
 
+        # Indeterminate progress while a worker is running
+        self.busy_bar = QProgressBar()
+        self.busy_bar.setRange(0, 0)
+        self.busy_bar.setTextVisible(False)
+        self.busy_bar.setMaximumHeight(6)
+        self.busy_bar.hide()
+        layout.addWidget(self.busy_bar)
+
         layout.addWidget(QLabel('日志'))
         self.log = QTextEdit()
         self.log.setReadOnly(True)
         layout.addWidget(self.log, 1)
 
-        self.btn_refresh.clicked.connect(self.refresh)
+        self.btn_refresh.clicked.connect(self.force_refresh)
         self.btn_apply.clicked.connect(self.apply_selection)
         self.btn_reboot.clicked.connect(self.reboot_now)
+        self.btn_diag.clicked.connect(self.export_diagnostics)
 
     def on_show_recovery_changed(self):
-        """当恢复环境显示选项改变时重新创建管理器并刷新"""
+        """恢复环境显示选项改变：防抖后再重新创建管理器并刷新"""
+        self._toggle_timer.start()
+
+    def _apply_show_recovery(self):
         if self.platform == 'Windows':
             show_recovery = self.show_recovery_cb.isChecked()
-            self.manager = WindowsBootManager(show_recovery=show_recovery)
+            self.manager = self.manager_factory(show_recovery=show_recovery)
+            self.watcher.manager = self.manager
             self.refresh()
 
+    def _set_busy(self, busy: bool):
+        self.busy_bar.setVisible(busy)
+        for btn in (self.btn_refresh, self.btn_apply, self.btn_reboot):
+            btn.setEnabled(not busy)
+
+    def _on_error(self, msg: str):
+        QMessageBox.critical(self, '失败', msg)
+        self.log_line('错误: ' + msg)
+
+    def closeEvent(self, event):
+        self._toggle_timer.stop()
+        self._poll_timer.stop()
+        if self._notifier is not None:
+            self._notifier.setEnabled(False)
+        self.watcher.close()
+        self.runner.shutdown()
+        super().closeEvent(event)
+
+    def export_diagnostics(self):
+        """导出性能追踪（Chrome trace JSON），用户可直接发送给开发者"""
+        path, _ = QFileDialog.getSaveFileName(self, '导出诊断信息', 'sys_switch-trace.json', 'JSON (*.json)')
+        if not path:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(tracer.dump('chrome'))
+        except OSError as e:
+            QMessageBox.critical(self, '失败', f'无法写入诊断文件: {e}')
+            return
+        self.log_line('耗时统计:\n' + tracer.summary())
+        self.log_line(f'诊断信息已保存到 {path}')
+
     def log_line(self, text: str):
         self.log.append(text)
 
-    def refresh(self):
-        self.list.clear()
-        if not self.manager.available():
+    def force_refresh(self):
+        """刷新按钮：丢弃缓存的快照后重新枚举"""
+        self.refresh(invalidate=True)
+
+    def refresh(self, invalidate: bool = False):
+        """Enumerate on the worker; a newer refresh supersedes one still pending."""
+        if self._refresh_token is not None:
+            self.runner.cancel(self._refresh_token)
+        self._refresh_token = self.runner.submit(
+            _load_entries, self.manager, invalidate,
+            on_done=self._on_entries, on_error=self._on_refresh_error)
+
+    def _on_refresh_error(self, msg: str):
+        self._refresh_token = None
+        self._on_error(msg)
+
+    def _on_entries(self, result):
+        self._refresh_token = None
+        if result is None:
+            self.model.set_entries([])
             QMessageBox.warning(self, '不可用', '未检测到可用的引导管理工具，请在该平台安装所需工具或以管理员/Root运行。')
             return
-        entries = self.manager.list_entries()
-        for e in entries:
-            item = QListWidgetItem(f"{e.description}  [{e.id}]" + ("  (当前)" if e.is_current else "") + ("  (下次)" if e.is_next else ""))
-            item.setData(Qt.UserRole, e)
-            self.list.addItem(item)
-        self.log_line(f'检测到 {self.list.count()} 个引导项')
+        entries, details = result
+        self.model.set_entries(entries, details)
+        self.log_line(f'检测到 {self.model.rowCount()} 个引导项')
 
     def apply_selection(self):
-        item = self.list.currentItem()
-        if not item:
+        index = self.list.currentIndex()
+        if not index.isValid() or not self.list.selectionModel().isSelected(index):
             QMessageBox.information(self, '提示', '请选择一个引导项')
             return
-        entry: BootEntry = item.data(Qt.UserRole)
-        ok, msg = self.manager.set_next(entry.id)
+        entry: BootEntry = index.data(Qt.UserRole)
+        self.runner.submit(self.manager.set_next, entry.id,
+                           on_done=self._on_applied, on_error=self._on_error)
+
+    def _on_applied(self, result):
+        ok, msg = result
         if ok:
             QMessageBox.information(self, '成功', msg)
             self.log_line(msg)
@@ -101,7 +239,42 @@ class BootSwitchApp(QWidget):
         ret = QMessageBox.question(self, '确认重启', '确定要立即重启吗？请保存工作。')
         if ret != QMessageBox.Yes:
             return
-        ok, msg = self.manager.reboot_now()
+        self.runner.submit(self.manager.reboot_now, on_done=self._on_reboot, on_error=self._on_error)
+
+    def _on_reboot(self, result):
+        ok, msg = result
         if not ok:
             QMessageBox.critical(self, '失败', msg)
             self.log_line('错误: ' + msg)
+
+
+def _load_entries(manager, invalidate: bool):
+    """Worker side of a refresh: `(entries, {entry id: OS/device summary})`, None when no backend is usable."""
+    if invalidate:
+        inv = getattr(manager, 'invalidate', None)
+        if inv:
+            inv()
+    if not manager.available():
+        return None
+    entries = manager.list_entries()
+    return entries, _entry_details(entries)
+
+
+def _entry_details(entries) -> dict:
+    if current_platform() != 'Linux' or not any(entry_partuuid(e) for e in entries):
+        return {}
+    from sys_switch.platforms.blockdev import describe, device_index
+    from sys_switch.platforms.osdetect import detect_os
+    index = device_index()  # cached; rescanned only after udev changes
+    systems = detect_os(entries)  # never mounts from the GUI; cached per filesystem
+    out = {}
+    for e in entries:
+        lines = []
+        if e.id in systems:
+            lines.append('系统: ' + systems[e.id].label)
+        dev = index.for_entry(e)
+        if dev is not None:
+            lines.append(describe(dev))
+        if lines:
+            out[e.id] = '\n'.join(lines)
+    return out
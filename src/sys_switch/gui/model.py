@@ -0,0 +1,97 @@
+from __future__ import annotations
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional
+
+from PySide6.QtCore import QAbstractListModel, QModelIndex, QSortFilterProxyModel, Qt
+
+from sys_switch.models import BootEntry
+
+# Text the search box matches against (description, ID, OS and block device)
+FilterRole = Qt.UserRole + 1
+
+
+def entry_label(e: BootEntry) -> str:
+    return f"{e.description}  [{e.id}]" + ("  (当前)" if e.is_current else "") + ("  (下次)" if e.is_next else "")
+
+
+class BootEntryModel(QAbstractListModel):
+    """Boot entries keyed by ID; `set_entries` only touches rows that changed.
+
+    Rows are diffed against the new snapshot by entry ID, so unchanged rows
+    keep their selection and the view repaints only inserted, removed or
+    modified rows.
+    """
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self._entries: List[BootEntry] = []
+        self._details: Dict[str, str] = {}  # entry ID -> OS / block-device summary
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._entries)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._entries):
+            return None
+        e = self._entries[index.row()]
+        if role == Qt.DisplayRole:
+            return entry_label(e)
+        if role == Qt.UserRole:
+            return e
+        if role == FilterRole:
+            return f'{e.description}\n{e.id}\n{self._details.get(e.id, "")}'
+        if role == Qt.ToolTipRole:
+            return '\n'.join(t for t in (e.extra, self._details.get(e.id)) if t) or None
+        return None
+
+    def entries(self) -> List[BootEntry]:
+        return list(self._entries)
+
+    def set_entries(self, entries: List[BootEntry], details: Optional[Dict[str, str]] = None) -> None:
+        new = list(entries)
+        details = details or {}
+        details_changed = details != self._details
+        self._details = details
+        old_keys = [e.id for e in self._entries]
+        new_keys = [e.id for e in new]
+        ops = SequenceMatcher(None, old_keys, new_keys, autojunk=False).get_opcodes()
+        # Back to front so the old row numbers of earlier blocks stay valid
+        for tag, i1, i2, j1, j2 in reversed(ops):
+            if tag == 'equal':
+                self._update_rows(i1, new[j1:j2])
+                continue
+            if i2 > i1:
+                self.beginRemoveRows(QModelIndex(), i1, i2 - 1)
+                del self._entries[i1:i2]
+                self.endRemoveRows()
+            if j2 > j1:
+                self.beginInsertRows(QModelIndex(), i1, i1 + (j2 - j1) - 1)
+                self._entries[i1:i1] = new[j1:j2]
+                self.endInsertRows()
+        if details_changed and self._entries:
+            # Tooltip/filter text only; rows themselves are unchanged
+            self.dataChanged.emit(self.index(0), self.index(len(self._entries) - 1),
+                                  [Qt.ToolTipRole, FilterRole])
+
+    def _update_rows(self, start: int, fresh: List[BootEntry]) -> None:
+        """Replace same-key rows, emitting dataChanged for contiguous changed runs."""
+        run_start = None
+        for off, e in enumerate(fresh + [None]):
+            row = start + off
+            changed = e is not None and self._entries[row] != e
+            if changed:
+                self._entries[row] = e
+                if run_start is None:
+                    run_start = row
+            elif run_start is not None:
+                self.dataChanged.emit(self.index(run_start), self.index(row - 1))
+                run_start = None
+
+
+class BootEntryFilter(QSortFilterProxyModel):
+    """Case-insensitive substring filter over description and ID."""
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.setFilterRole(FilterRole)
+        self.setFilterCaseSensitivity(Qt.CaseInsensitive)
@@ -0,0 +1,112 @@
+from __future__ import annotations
+from typing import Any, Callable
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal, Slot
+
+
+class TaskSignals(QObject):
+    """Emitted from the worker thread; receivers on the GUI thread get queued calls."""
+    finished = Signal(int, object)  # token, result
+    failed = Signal(int, str)       # token, error message
+
+
+class Task(QRunnable):
+    """Runs `fn(*args)` on a pool thread and reports back through `signals`."""
+
+    def __init__(self, token: int, fn: Callable[..., Any], *args: Any) -> None:
+        super().__init__()
+        self.setAutoDelete(False)  # the runner keeps it until its signal arrives
+        self.token = token
+        self.fn = fn
+        self.args = args
+        self.signals = TaskSignals()
+
+    def run(self) -> None:
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:  # surfaced in the GUI log, never kills the pool thread
+            self.signals.failed.emit(self.token, f'{type(e).__name__}: {e}')
+            return
+        self.signals.finished.emit(self.token, result)
+
+
+class TaskRunner(QObject):
+    """Serializes boot-manager calls on one worker thread.
+
+    The managers keep per-instance snapshots and caches and are not meant to
+    be used from two threads at once, so there is a single worker. Every
+    submission gets a token; a task that was superseded (see `cancel`) is
+    dropped from the queue if it has not started, and its result is ignored
+    if it has.
+    """
+    busy_changed = Signal(bool)
+
+    def __init__(self, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self._tokens = 0
+        self._tasks: dict[int, Task] = {}
+        self._callbacks: dict[int, tuple] = {}
+        self._cancelled: set[int] = set()
+        self._background: set[int] = set()
+
+    @property
+    def busy(self) -> bool:
+        return len(self._tasks) > len(self._background)
+
+    def submit(self, fn: Callable[..., Any], *args: Any,
+               on_done: Callable[[Any], None] | None = None,
+               on_error: Callable[[str], None] | None = None,
+               background: bool = False) -> int:
+        """Queue `fn(*args)`; `background` tasks (change polling) do not show as busy."""
+        self._tokens += 1
+        token = self._tokens
+        task = Task(token, fn, *args)
+        # Bound slots of this GUI-thread object, so delivery is queued onto the GUI thread
+        task.signals.finished.connect(self._on_finished)
+        task.signals.failed.connect(self._on_failed)
+        was_busy = self.busy
+        self._tasks[token] = task
+        self._callbacks[token] = (on_done, on_error)
+        if background:
+            self._background.add(token)
+        self.pool.start(task)
+        if not was_busy and self.busy:
+            self.busy_changed.emit(True)
+        return token
+
+    def cancel(self, token: int) -> None:
+        """Drop a queued task, or ignore the result of one already running."""
+        task = self._tasks.get(token)
+        if task is None:
+            return
+        if self.pool.tryTake(task):
+            self._finish(token, None, None)
+        else:
+            self._cancelled.add(token)
+
+    @Slot(int, object)
+    def _on_finished(self, token: int, result) -> None:
+        self._finish(token, self._callbacks.get(token, (None, None))[0], result)
+
+    @Slot(int, str)
+    def _on_failed(self, token: int, msg: str) -> None:
+        self._finish(token, self._callbacks.get(token, (None, None))[1], msg)
+
+    def _finish(self, token: int, callback, value) -> None:
+        self._callbacks.pop(token, None)
+        if self._tasks.pop(token, None) is None:
+            return
+        was_busy = self.busy or token not in self._background
+        self._background.discard(token)
+        if token in self._cancelled:
+            self._cancelled.discard(token)
+        elif callback is not None:
+            callback(value)
+        if was_busy and not self.busy:
+            self.busy_changed.emit(False)
+
+    def shutdown(self, msecs: int = 5000) -> None:
+        self.pool.clear()
+        self.pool.waitForDone(msecs)
@@ -0,0 +1,183 @@
+"""Snapshot handed from the unprivileged GUI to its elevated relaunch.
+
+When the whole GUI is relaunched through pkexec/runas (SYS_SWITCH_BROKER=0),
+the parent reserves a private directory, passes `--handoff <dir>/handoff.json`
+to the child and, while the authentication prompt is still open, writes what
+it already knows: the backend it picked, the tool paths it resolved and the
+entries it listed together with the manager's fingerprint.
+
+The child deletes the file after reading it and trusts it only as far as it
+can check cheaply: the entries seed its cache only when the backend, the
+cache key and a freshly computed fingerprint all match, and a tool path is
+used only when it is a root-owned executable in a root-owned directory.
+Anything missing or stale simply means a normal enumeration.
+"""
+from __future__ import annotations
+import json
+import os
+import stat
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List
+
+from .models import BootEntry
+from .platforms.common import boot_id, current_platform, runtime_dir
+
+HANDOFF_VERSION = 1
+HANDOFF_FILE = 'handoff.json'
+# The authentication prompt may stay open for a while; the fingerprint does the real check
+MAX_AGE = 600.0
+
+
+@dataclass
+class Handoff:
+    backend: str  # manager class name: LinuxBootManager, SystemdBootManager, WindowsBootManager
+    cache_key: str
+    fingerprint: str
+    entries: List[dict]
+    show_recovery: bool = False
+    tools: Dict[str, str] = field(default_factory=dict)
+    boot_id: str = ''
+    created: float = 0.0
+    version: int = HANDOFF_VERSION
+
+    def trusted_tools(self) -> Dict[str, str]:
+        """Tool paths safe to run as root without another PATH search."""
+        return {name: path for name, path in self.tools.items() if _trusted_tool(path)}
+
+    def adopt(self, manager, show_recovery: bool = False) -> bool:
+        """Seed `manager`'s cache (a CachedBootManager) with the entries if they still describe this system."""
+        seed = getattr(manager, 'seed', None)
+        inner = getattr(manager, 'manager', manager)
+        if seed is None or show_recovery != self.show_recovery or type(inner).__name__ != self.backend:
+            return False
+        key_fn = getattr(inner, 'cache_key', None)
+        fp_fn = getattr(inner, 'fingerprint', None)
+        if key_fn is None or fp_fn is None or key_fn() != self.cache_key:
+            return False
+        if fp_fn() != self.fingerprint:
+            return False
+        try:
+            entries = [BootEntry.from_dict(e) for e in self.entries]
+        except (KeyError, TypeError, AttributeError):
+            return False
+        seed(entries, self.fingerprint)
+        return True
+
+
+def _trusted_tool(path: str | None) -> bool:
+    if not path or not os.path.isabs(path) or current_platform() == 'Windows':
+        return False
+    try:
+        for p in (path, os.path.dirname(path)):
+            st = os.stat(p)
+            if st.st_uid != 0 or st.st_mode & 0o022:
+                return False
+        return stat.S_ISREG(os.stat(path).st_mode) and os.access(path, os.X_OK)
+    except OSError:
+        return False
+
+
+def capture(manager, show_recovery: bool = False) -> Handoff | None:
+    """What `manager` (usually a CachedBootManager) can tell right now; None if it has nothing worth handing over."""
+    inner = getattr(manager, 'manager', manager)
+    key_fn = getattr(inner, 'cache_key', None)
+    fp_fn = getattr(inner, 'fingerprint', None)
+    if key_fn is None or fp_fn is None:
+        return None
+    # Fingerprint before listing: a change in between makes the child reject the entries
+    fingerprint = fp_fn()
+    if fingerprint is None:
+        return None
+    entries = manager.list_entries()
+    if not entries:
+        return None  # e.g. bcdedit refused an unelevated caller; nothing to save the child
+    tools_fn = getattr(inner, 'tool_paths', None)
+    return Handoff(
+        backend=type(inner).__name__,
+        cache_key=key_fn(),
+        fingerprint=fingerprint,
+        entries=[e.to_dict() for e in entries],
+        show_recovery=show_recovery,
+        tools={k: v for k, v in (tools_fn() if tools_fn else {}).items() if v},
+        boot_id=boot_id(),
+        created=time.time(),
+    )
+
+
+def reserve() -> str | None:
+    """Path for the handoff file in a fresh private directory (the file itself is written later)."""
+    base = runtime_dir()
+    if base:
+        try:
+            os.makedirs(base, mode=0o700, exist_ok=True)
+        except OSError:
+            base = None
+    try:
+        return os.path.join(tempfile.mkdtemp(prefix='handoff-', dir=base), HANDOFF_FILE)
+    except OSError:
+        return None
+
+
+def publish(path: str, manager_factory: Callable, show_recovery: bool = False) -> bool:
+    """Enumerate with `manager_factory` and write the handoff atomically; False leaves the child to start cold."""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        handoff = capture(manager_factory(show_recovery=show_recovery), show_recovery)
+        if handoff is None:
+            return False
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(asdict(handoff), f, ensure_ascii=False, separators=(',', ':'))
+        # The child may already have looked and removed the directory; then this fails quietly
+        os.replace(tmp, path)
+        return True
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        return False
+
+
+def discard(path: str | None) -> None:
+    if not path:
+        return
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+    try:
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass
+
+
+def load(path: str) -> Handoff | None:
+    """Read and remove the handoff at `path`; None when it is absent, foreign, stale or malformed."""
+    directory = os.path.dirname(path) or '.'
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+    except OSError:
+        discard(path)
+        return None
+    try:
+        with os.fdopen(fd, 'r', encoding='utf-8') as f:
+            st = os.fstat(f.fileno())
+            dst = os.stat(directory)
+            if current_platform() != 'Windows' and (
+                    not stat.S_ISREG(st.st_mode) or st.st_uid != dst.st_uid
+                    or st.st_mode & 0o077 or dst.st_mode & 0o077):
+                return None
+            data = json.load(f)
+        handoff = Handoff(**data)
+    except (OSError, ValueError, TypeError):
+        return None
+    finally:
+        discard(path)
+    if handoff.version != HANDOFF_VERSION or handoff.boot_id != boot_id():
+        return None
+    if not 0 <= time.time() - handoff.created <= MAX_AGE:
+        return None
+    return handoff
@@ -1,21 +1,25 @@
 import sys
 import os
 import argparse
+import functools
 
-from PySide6.QtWidgets import QApplication
-
-# Prefer absolute imports (work with PyInstaller); fallback to relative for editors
+# Prefer absolute imports (work with PyInstaller); fallback to relative for editors.
+# Only the CLI layer is imported here: PySide6 and the GUI are loaded lazily in
+# the GUI branch so `--cli`/subcommands never pay for the Qt import.
 try:
-    from sys_switch.gui.app import BootSwitchApp
     from sys_switch.cli import build_parser, run_cli
     from sys_switch.platforms.common import elevate_if_needed
 except Exception:  # pragma: no cover
-    from .gui.app import BootSwitchApp
     from .cli import build_parser, run_cli
     from .platforms.common import elevate_if_needed
 
 
 def main():
+    # Privileged helper entry point for frozen builds (`python -m sys_switch.broker` otherwise)
+    if len(sys.argv) > 1 and sys.argv[1] == '--broker-helper':
+        from sys_switch.broker import helper_main
+        sys.exit(helper_main(sys.argv[2:]))
+
     # Parse args; if CLI requested or subcommand present, run CLI.
     parser = build_parser()
     args, unknown = parser.parse_known_args()
@@ -23,13 +27,49 @@ def main():
         code = run_cli(args)
         sys.exit(code)
 
-    # GUI mode: ensure we have admin/root to perform actions; trigger elevation with GUI prompt
-    if elevate_if_needed(want_gui=True):
-        # Elevated instance has been launched; exit current
-        return
+    try:
+        from PySide6.QtWidgets import QApplication
+        try:
+            from sys_switch.gui.app import BootSwitchApp
+        except Exception:  # pragma: no cover
+            from .gui.app import BootSwitchApp
+    except ImportError:
+        # CLI-only build (PySide6 excluded): behave like `--cli list`
+        print('PySide6 不可用，已切换到命令行模式（使用 --cli 查看子命令）', file=sys.stderr)
+        sys.exit(run_cli(args))
+
+    # GUI: keep a bounded trace so users can export diagnostics
+    from sys_switch.trace import tracer
+    tracer.enable(max_spans=5000)
+
+    # GUI mode: the window stays unprivileged and boot operations go through a
+    # privileged helper started once (pkexec/runas). SYS_SWITCH_BROKER=0 restores
+    # the old behaviour of relaunching the whole GUI elevated.
+    from sys_switch.cli import BROKER_ENV, broker_mode, get_manager
+    from sys_switch.platforms.common import is_admin
+    factory = get_manager
+    if not is_admin() and os.environ.get(BROKER_ENV, '').strip() != '0':
+        mode = broker_mode(True)
+        factory = functools.partial(get_manager, broker=mode)
+    elif not is_admin():
+        from sys_switch import handoff
+        path = handoff.reserve()
+        if elevate_if_needed(want_gui=True, extra_args=['--handoff', path] if path else None):
+            # Elevated instance has been launched; enumerate while its authentication
+            # prompt is up so it can start from our snapshot, then exit
+            if path:
+                handoff.publish(path, get_manager)
+            return
+        handoff.discard(path)
+    elif getattr(args, 'handoff', None):
+        # Elevated relaunch: start from the parent's snapshot once it is revalidated
+        from sys_switch.handoff import load
+        blob = load(args.handoff)
+        if blob is not None:
+            factory = functools.partial(get_manager, handoff=blob)
 
     app = QApplication(sys.argv)
-    w = BootSwitchApp()
+    w = BootSwitchApp(manager_factory=factory)
     w.show()
     sys.exit(app.exec())
 
@@ -1,11 +1,148 @@
-from dataclasses import dataclass
-from typing import Optional
+from __future__ import annotations
+import re
+from typing import Dict, Iterable, Iterator, List, Optional
 
 
-@dataclass
 class BootEntry:
-    id: str  # Linux: '0000' style; Windows: '{GUID}'
-    description: str
-    is_current: bool = False
-    is_next: bool = False
-    extra: Optional[str] = None  # raw line or path
+    # Plain slotted class rather than a dataclass: `slots=True` needs Python 3.10,
+    # and thousands of these are kept by the caches, daemon and GUI model.
+    __slots__ = ('id', 'description', 'is_current', 'is_next', 'extra')
+
+    FIELDS = ('id', 'description', 'is_current', 'is_next', 'extra')
+
+    def __init__(self, id: str, description: str, is_current: bool = False, is_next: bool = False,
+                 extra: Optional[str] = None) -> None:
+        self.id = id  # Linux: '0000' style; Windows: '{GUID}'
+        self.description = description
+        self.is_current = is_current
+        self.is_next = is_next
+        self.extra = extra  # raw line or path
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.id == other.id and self.description == other.description and self.is_current == other.is_current
+                and self.is_next == other.is_next and self.extra == other.extra)
+
+    __hash__ = None  # mutable, like the dataclass it replaces
+
+    def __repr__(self) -> str:
+        return (f'BootEntry(id={self.id!r}, description={self.description!r}, is_current={self.is_current!r}, '
+                f'is_next={self.is_next!r}, extra={self.extra!r})')
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'description': self.description,
+            'is_current': self.is_current,
+            'is_next': self.is_next,
+            'extra': self.extra,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'BootEntry':
+        return cls(
+            id=d['id'],
+            description=d['description'],
+            is_current=bool(d.get('is_current')),
+            is_next=bool(d.get('is_next')),
+            extra=d.get('extra'),
+        )
+
+
+_SPACE_RE = re.compile(r'\s+')
+# Partition signature inside an EFI device path: HD(part,GPT,<guid>,...) or HD(part,MBR,0x<sig>,...)
+_PARTUUID_RE = re.compile(r'HD\((\d+),(?:GPT,([0-9A-Fa-f]{8}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{12})'
+                          r'|MBR,0x([0-9A-Fa-f]{1,8}))')
+
+
+def normalize_description(text: str) -> str:
+    """Case- and whitespace-insensitive form used for matching (tabs and double spaces from firmware)."""
+    return _SPACE_RE.sub(' ', text).strip().casefold()
+
+
+def entry_partuuid(entry: BootEntry) -> str | None:
+    """PARTUUID as Linux spells it: the GPT GUID, or `<mbr signature>-<partition>` in hex."""
+    m = _PARTUUID_RE.search(entry.extra or '')
+    if not m:
+        return None
+    part, guid, sig = m.groups()
+    return guid.lower() if guid else f'{int(sig, 16):08x}-{int(part):02x}'
+
+
+class EntryLookupError(LookupError):
+    pass
+
+
+class EntryIndex:
+    """One listing with lookups by id, normalized description and partition GUID.
+
+    Built once per snapshot; selection (`set --match`, `--by-partuuid`) is then
+    resolved without another enumeration.
+    """
+
+    def __init__(self, entries: Iterable[BootEntry]) -> None:
+        self.entries: List[BootEntry] = list(entries)
+        self._by_id: Dict[str, BootEntry] = {}
+        self._by_desc: Dict[str, List[BootEntry]] = {}
+        self._by_partuuid: Dict[str, List[BootEntry]] = {}
+        self._normalized: List[str] = []
+        for e in self.entries:
+            self._by_id.setdefault(e.id.casefold(), e)
+            norm = normalize_description(e.description)
+            self._normalized.append(norm)
+            self._by_desc.setdefault(norm, []).append(e)
+            uuid = entry_partuuid(e)
+            if uuid:
+                self._by_partuuid.setdefault(uuid, []).append(e)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[BootEntry]:
+        return iter(self.entries)
+
+    def __getitem__(self, i: int) -> BootEntry:
+        return self.entries[i]
+
+    def get(self, entry_id: str) -> BootEntry | None:
+        return self._by_id.get(entry_id.casefold())
+
+    def by_description(self, text: str) -> List[BootEntry]:
+        return list(self._by_desc.get(normalize_description(text), ()))
+
+    def by_partuuid(self, uuid: str) -> List[BootEntry]:
+        return list(self._by_partuuid.get(uuid.strip('{}').lower(), ()))
+
+    def search(self, pattern: str) -> List[BootEntry]:
+        """Entries whose description equals `pattern`, else those it matches as a regex (substring if not a valid one)."""
+        exact = self.by_description(pattern)
+        if exact:
+            return exact
+        try:
+            rx = re.compile(pattern, re.IGNORECASE)
+        except re.error:
+            rx = re.compile(re.escape(pattern), re.IGNORECASE)
+        return [e for e, norm in zip(self.entries, self._normalized)
+                if rx.search(e.description) or rx.search(norm)]
+
+    def resolve(self, entry_id: str | None = None, match: str | None = None,
+                partuuid: str | None = None) -> BootEntry:
+        """Exactly one entry for the given selector; `EntryLookupError` when none or several fit."""
+        if entry_id is not None:
+            e = self.get(entry_id)
+            if e is None:
+                raise EntryLookupError(f'未找到引导项: {entry_id}')
+            return e
+        if match is not None:
+            found, what = self.search(match), f'描述 {match!r}'
+        elif partuuid is not None:
+            found, what = self.by_partuuid(partuuid), f'分区 GUID {partuuid}'
+        else:
+            raise EntryLookupError('需要引导项 ID、--match 或 --by-partuuid')
+        if not found:
+            raise EntryLookupError(f'没有与{what}匹配的引导项')
+        if len(found) > 1:
+            listing = ', '.join(f'{e.id} ({e.description})' for e in found)
+            raise EntryLookupError(f'{what}匹配多个引导项: {listing}')
+        return found[0]
@@ -0,0 +1,175 @@
+from __future__ import annotations
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+
+# Well-known BCD object identifiers. `bcdedit /v` prints these as GUIDs while
+# the non-verbose output uses the aliases, so both spellings resolve here.
+FWBOOTMGR_GUID = '{a5a30fa2-3d06-4e9f-b5f4-a01df9d1fcba}'
+BOOTMGR_GUID = '{9dea862c-5cdd-4e70-acc1-f32b344d4795}'
+WELL_KNOWN_ALIASES = {
+    '{fwbootmgr}': FWBOOTMGR_GUID,
+    '{bootmgr}': BOOTMGR_GUID,
+    '{memdiag}': '{b2721d73-1db4-4c62-bf78-c548a880142d}',
+    '{ntldr}': '{466f5a88-0af2-4f76-9038-095b170dc21c}',
+}
+
+# Localized element names mapped to the canonical (English) bcdedit names.
+_KEY_ALIASES = {
+    '标识符': 'identifier',
+    '識別碼': 'identifier',
+    '描述': 'description',
+    '说明': 'description',
+    '說明': 'description',
+    '默认': 'default',
+    '启动序列': 'bootsequence',
+    '显示顺序': 'displayorder',
+}
+
+_FW_MANAGER_KINDS = ('firmware boot manager', '固件启动管理器')
+_BOOT_MANAGER_KINDS = ('windows boot manager', 'windows 启动管理器')
+_OSLOADER_KINDS = ('windows boot loader', 'windows 启动加载器')
+
+_RECOVERY_INDICATORS = (
+    'windows recovery environment',
+    'windows 恢复环境',
+    'winre.wim',
+    'recovery',
+    '恢复',
+)
+
+_BLOCK_SPLIT_RE = re.compile(r"\r?\n[ \t]*\r?\n")
+_DASHES_RE = re.compile(r"^-{3,}\s*$")
+_KEY_VALUE_RE = re.compile(r"^(\S+)\s+(.*?)\s*$")
+_BRACE_TOKEN_RE = re.compile(r"\{[^}]+\}")
+
+
+def normalize_identifier(token: str) -> str:
+    """Lower-case an identifier and map well-known aliases to their GUIDs."""
+    t = token.strip().lower()
+    return WELL_KNOWN_ALIASES.get(t, t)
+
+
+@dataclass
+class BcdObject:
+    kind: str  # header line as printed, e.g. 'Windows Boot Manager'
+    identifier: str
+    elements: Dict[str, List[str]] = field(default_factory=dict)
+    raw: str = ''
+
+    def get(self, name: str) -> str | None:
+        values = self.elements.get(name)
+        return values[0] if values else None
+
+    def values(self, name: str) -> List[str]:
+        return self.elements.get(name, [])
+
+    def tokens(self, name: str) -> List[str]:
+        """Return the `{...}` identifiers listed by an object-list element."""
+        return _BRACE_TOKEN_RE.findall(' '.join(self.values(name)))
+
+    @property
+    def key(self) -> str:
+        return normalize_identifier(self.identifier)
+
+    @property
+    def description(self) -> str | None:
+        return self.get('description')
+
+    @property
+    def is_firmware_manager(self) -> bool:
+        return self.key == FWBOOTMGR_GUID or self.kind.lower().startswith(_FW_MANAGER_KINDS)
+
+    @property
+    def is_boot_manager(self) -> bool:
+        return self.key == BOOTMGR_GUID or self.kind.lower().startswith(_BOOT_MANAGER_KINDS)
+
+    @property
+    def is_osloader(self) -> bool:
+        if self.kind.lower().startswith(_OSLOADER_KINDS):
+            return True
+        path = (self.get('path') or '').lower()
+        return path.endswith(('winload.efi', 'winload.exe'))
+
+    def is_recovery(self) -> bool:
+        """检测是否为 Windows 恢复环境条目"""
+        if (self.get('winpe') or '').lower() in ('yes', 'true', '是'):
+            return True
+        # Only look at the description and the device/path elements: a normal
+        # loader also carries `recoverysequence`/`recoveryenabled` rows.
+        parts = [self.description or '']
+        for name in ('device', 'osdevice', 'path'):
+            parts.extend(self.values(name))
+        haystack = '\n'.join(parts).lower()
+        return any(ind in haystack for ind in _RECOVERY_INDICATORS)
+
+
+class BcdSnapshot:
+    """Parsed view of one `bcdedit /v /enum all` capture, indexed by identifier."""
+
+    def __init__(self, objects: List[BcdObject]) -> None:
+        self.objects = objects
+        self._by_id: Dict[str, BcdObject] = {}
+        for obj in objects:
+            self._by_id.setdefault(obj.key, obj)
+
+    @classmethod
+    def parse(cls, text: str) -> 'BcdSnapshot':
+        return cls(list(_iter_objects(text)))
+
+    def __len__(self) -> int:
+        return len(self.objects)
+
+    def get(self, token: str) -> BcdObject | None:
+        return self._by_id.get(normalize_identifier(token))
+
+    def firmware_manager(self) -> BcdObject | None:
+        obj = self._by_id.get(FWBOOTMGR_GUID)
+        if obj is not None:
+            return obj
+        return next((o for o in self.objects if o.is_firmware_manager), None)
+
+    def boot_manager(self) -> BcdObject | None:
+        obj = self._by_id.get(BOOTMGR_GUID)
+        if obj is not None:
+            return obj
+        return next((o for o in self.objects if o.is_boot_manager), None)
+
+    def displayorder(self) -> List[str]:
+        fw = self.firmware_manager()
+        return fw.tokens('displayorder') if fw else []
+
+    def bootsequence(self) -> List[str]:
+        fw = self.firmware_manager()
+        return fw.tokens('bootsequence') if fw else []
+
+    def osloaders(self) -> List[BcdObject]:
+        return [o for o in self.objects if o.is_osloader]
+
+
+def _iter_objects(text: str) -> Iterator[BcdObject]:
+    for block in _BLOCK_SPLIT_RE.split(text):
+        lines = [ln for ln in block.splitlines() if ln.strip()]
+        # An object block is: header, dashes, then `name  value` rows.
+        if len(lines) < 3 or not _DASHES_RE.match(lines[1].strip()):
+            continue
+        elements: Dict[str, List[str]] = {}
+        last: Optional[str] = None
+        for ln in lines[2:]:
+            if ln[:1].isspace():
+                # Continuation of a multi-valued element (displayorder etc.)
+                if last is not None:
+                    elements[last].append(ln.strip())
+                continue
+            m = _KEY_VALUE_RE.match(ln)
+            if not m:
+                continue
+            name = m.group(1)
+            name = _KEY_ALIASES.get(name, name.lower())
+            elements.setdefault(name, []).append(m.group(2))
+            last = name
+        ident = (elements.get('identifier') or [''])[0]
+        if not ident:
+            continue
+        yield BcdObject(kind=lines[0].strip(), identifier=ident, elements=elements, raw=block)
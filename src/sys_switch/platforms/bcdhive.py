@@ -0,0 +1,362 @@
+from __future__ import annotations
+import mmap
+import re
+import struct
+import uuid
+from typing import Dict, Iterator, List, Optional
+
+from .bcd import BcdObject, BcdSnapshot
+
+
+# Registry value types used by BCD.
+REG_SZ = 1
+REG_EXPAND_SZ = 2
+REG_BINARY = 3
+REG_DWORD = 4
+REG_MULTI_SZ = 7
+REG_QWORD = 11
+
+_HBIN_START = 0x1000
+_KEY_COMP_NAME = 0x0020
+_VALUE_COMP_NAME = 0x0001
+_BIG_DATA_THRESHOLD = 16344
+
+
+class HiveError(ValueError):
+    pass
+
+
+def _unpack(fmt: str, buf, pos: int = 0) -> tuple:
+    """struct.unpack_from for cell contents: a truncated or corrupt hive raises HiveError."""
+    try:
+        return struct.unpack_from(fmt, buf, pos)
+    except struct.error as e:
+        raise HiveError(f'truncated cell data at +0x{pos:x}: {e}') from None
+
+
+class RegistryHive:
+    """Read-only regf hive mapped with mmap; cells are decoded only when touched."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._file.close()
+            raise HiveError(f'{path}: empty file')
+        if self._buf[:4] != b'regf' or len(self._buf) < _HBIN_START + 32:
+            self.close()
+            raise HiveError(f'{path}: not a registry hive')
+        self.minor_version = _unpack('<I', self._buf, 0x18)[0]
+        self._root_offset = _unpack('<I', self._buf, 0x24)[0]
+
+    def close(self) -> None:
+        buf = getattr(self, '_buf', None)
+        if buf is not None:
+            buf.close()
+            self._buf = None
+        self._file.close()
+
+    def __enter__(self) -> 'RegistryHive':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def root(self) -> 'RegistryKey':
+        return RegistryKey(self, self._root_offset)
+
+    def cell(self, offset: int) -> bytes:
+        """Payload of the cell at hbin-relative `offset` (without the size header)."""
+        start = _HBIN_START + offset
+        if offset in (0, 0xFFFFFFFF) or start + 4 > len(self._buf):
+            raise HiveError(f'cell offset 0x{offset:x} out of range')
+        size = _unpack('<i', self._buf, start)[0]
+        size = -size if size < 0 else size
+        if size < 4 or start + size > len(self._buf):
+            raise HiveError(f'bad cell size at 0x{offset:x}')
+        return self._buf[start + 4:start + size]
+
+    def open(self, path: str) -> 'RegistryKey':
+        key = self.root
+        for part in filter(None, re.split(r'[\\/]', path)):
+            sub = key.subkey(part)
+            if sub is None:
+                raise HiveError(f'{self.path}: key not found: {path}')
+            key = sub
+        return key
+
+
+class RegistryKey:
+    __slots__ = ('hive', 'offset', '_cell')
+
+    def __init__(self, hive: RegistryHive, offset: int) -> None:
+        self.hive = hive
+        self.offset = offset
+        self._cell = hive.cell(offset)
+        if self._cell[:2] != b'nk':
+            raise HiveError(f'expected nk cell at 0x{offset:x}')
+
+    def _u32(self, pos: int) -> int:
+        return _unpack('<I', self._cell, pos)[0]
+
+    @property
+    def name(self) -> str:
+        flags = _unpack('<H', self._cell, 2)[0]
+        n = _unpack('<H', self._cell, 72)[0]
+        raw = self._cell[76:76 + n]
+        return raw.decode('latin-1') if flags & _KEY_COMP_NAME else raw.decode('utf-16-le', errors='replace')
+
+    @property
+    def last_written(self) -> int:
+        """FILETIME of the last write to this key."""
+        return _unpack('<Q', self._cell, 4)[0]
+
+    def subkeys(self) -> Iterator['RegistryKey']:
+        if self._u32(20) == 0:
+            return
+        for off in self._iter_list(self._u32(28)):
+            yield RegistryKey(self.hive, off)
+
+    def _iter_list(self, offset: int, nested: bool = False) -> Iterator[int]:
+        cell = self.hive.cell(offset)
+        sig = cell[:2]
+        count = _unpack('<H', cell, 2)[0]
+        if sig in (b'lf', b'lh'):
+            for i in range(count):
+                yield _unpack('<I', cell, 4 + i * 8)[0]
+        elif sig == b'li':
+            for i in range(count):
+                yield _unpack('<I', cell, 4 + i * 4)[0]
+        elif sig == b'ri' and not nested:  # index roots point at leaves, never at other roots
+            for i in range(count):
+                yield from self._iter_list(_unpack('<I', cell, 4 + i * 4)[0], nested=True)
+        else:
+            raise HiveError(f'unknown subkey list {sig!r} at 0x{offset:x}')
+
+    def subkey(self, name: str) -> Optional['RegistryKey']:
+        want = name.lower()
+        for k in self.subkeys():
+            if k.name.lower() == want:
+                return k
+        return None
+
+    def values(self) -> Iterator['RegistryValue']:
+        count = self._u32(36)
+        if count == 0:
+            return
+        lst = self.hive.cell(self._u32(40))
+        for i in range(count):
+            yield RegistryValue(self.hive, _unpack('<I', lst, i * 4)[0])
+
+    def value(self, name: str) -> Optional['RegistryValue']:
+        want = name.lower()
+        for v in self.values():
+            if v.name.lower() == want:
+                return v
+        return None
+
+
+class RegistryValue:
+    __slots__ = ('hive', '_cell')
+
+    def __init__(self, hive: RegistryHive, offset: int) -> None:
+        self.hive = hive
+        self._cell = hive.cell(offset)
+        if self._cell[:2] != b'vk':
+            raise HiveError(f'expected vk cell at 0x{offset:x}')
+
+    @property
+    def name(self) -> str:
+        n, = _unpack('<H', self._cell, 2)
+        flags, = _unpack('<H', self._cell, 16)
+        raw = self._cell[20:20 + n]
+        return raw.decode('latin-1') if flags & _VALUE_COMP_NAME else raw.decode('utf-16-le', errors='replace')
+
+    @property
+    def type(self) -> int:
+        return _unpack('<I', self._cell, 12)[0]
+
+    @property
+    def raw(self) -> bytes:
+        size, offset = _unpack('<II', self._cell, 4)
+        if size & 0x80000000:
+            # Resident data: stored in the offset field itself.
+            return self._cell[8:8 + (size & 0x7FFFFFFF)]
+        if size == 0:
+            return b''
+        data = self.hive.cell(offset)
+        if size > _BIG_DATA_THRESHOLD and data[:2] == b'db' and self.hive.minor_version > 3:
+            count, seg_list = _unpack('<HI', data, 2)
+            segs = self.hive.cell(seg_list)
+            out = bytearray()
+            for i in range(count):
+                out += self.hive.cell(_unpack('<I', segs, i * 4)[0])[:_BIG_DATA_THRESHOLD]
+            return bytes(out[:size])
+        return data[:size]
+
+    @property
+    def data(self):
+        raw, t = self.raw, self.type
+        if t in (REG_SZ, REG_EXPAND_SZ):
+            return raw.decode('utf-16-le', errors='replace').split('\x00', 1)[0]
+        if t == REG_MULTI_SZ:
+            return [s for s in raw.decode('utf-16-le', errors='replace').split('\x00') if s]
+        if t == REG_DWORD and len(raw) >= 4:
+            return _unpack('<I', raw)[0]
+        if t == REG_QWORD and len(raw) >= 8:
+            return _unpack('<Q', raw)[0]
+        return raw
+
+
+# --- BCD -----------------------------------------------------------------
+
+# Object types (Objects\{id}\Description\Type) mapped to bcdedit's English headers.
+_OBJECT_KINDS = {
+    0x10100001: 'Firmware Boot Manager',
+    0x10100002: 'Windows Boot Manager',
+    0x10200003: 'Windows Boot Loader',
+    0x10200004: 'Resume from Hibernate',
+    0x10200005: 'Windows Memory Tester',
+    0x10300006: 'Legacy OS Loader',
+    0x101fffff: 'Firmware Application (101fffff)',
+    0x20100000: 'Inherit',
+    0x20200003: 'Inherit',
+    0x30000000: 'Device options',
+}
+
+# Element types mapped to the names bcdedit prints. Some ids mean different
+# things for boot managers and OS loaders, hence the per-application tables.
+_COMMON_ELEMENTS = {
+    0x11000001: 'device',
+    0x12000002: 'path',
+    0x12000004: 'description',
+    0x12000005: 'locale',
+    0x14000006: 'inherit',
+    0x14000008: 'recoverysequence',
+    0x16000009: 'recoveryenabled',
+    0x16000060: 'isolatedcontext',
+    0x15000065: 'nx',
+    0x16000049: 'testsigning',
+}
+_MANAGER_ELEMENTS = {
+    0x23000003: 'default',
+    0x23000006: 'resumeobject',
+    0x24000001: 'displayorder',
+    0x24000002: 'bootsequence',
+    0x24000010: 'toolsdisplayorder',
+    0x25000004: 'timeout',
+    0x26000020: 'displaybootmenu',
+}
+_LOADER_ELEMENTS = {
+    0x21000001: 'osdevice',
+    0x22000002: 'systemroot',
+    0x23000003: 'resumeobject',
+    0x26000022: 'winpe',
+    0x250000c2: 'bootmenupolicy',
+}
+
+_ELEMENT_FORMAT_DEVICE = 1
+_ELEMENT_FORMAT_STRING = 2
+_ELEMENT_FORMAT_OBJECT = 3
+_ELEMENT_FORMAT_OBJECTLIST = 4
+_ELEMENT_FORMAT_INTEGER = 5
+_ELEMENT_FORMAT_BOOLEAN = 6
+_ELEMENT_FORMAT_INTEGERLIST = 7
+
+_UTF16_PATH_RE = re.compile(rb'(?:[\x20-\x7e]\x00){4,}')
+
+
+def _is_manager(obj_type: int) -> bool:
+    return obj_type in (0x10100001, 0x10100002)
+
+
+def _element_name(obj_type: int, elem_type: int) -> str:
+    table = _MANAGER_ELEMENTS if _is_manager(obj_type) else _LOADER_ELEMENTS
+    name = table.get(elem_type) or _COMMON_ELEMENTS.get(elem_type)
+    return name or f'custom:{elem_type:08x}'
+
+
+def _format_device(raw: bytes) -> str:
+    """Best-effort rendering of a BCD device element.
+
+    Volume identities cannot be mapped to drive letters offline, so only the
+    kind of device is reported, plus the embedded file for ramdisk (WIM) boots
+    which is what recovery detection needs.
+    """
+    options = raw[:16]
+    paths = [m.group(0).decode('utf-16-le') for m in _UTF16_PATH_RE.finditer(raw[16:])]
+    wim = next((p for p in paths if p.lower().endswith('.wim')), None)
+    if wim:
+        text = f'ramdisk=[partition]{wim}'
+        if len(options) == 16 and any(options):
+            text += f',{{{uuid.UUID(bytes_le=options)}}}'
+        return text
+    return 'partition'
+
+
+def _element_values(fmt: int, value: RegistryValue) -> List[str]:
+    data = value.data
+    if fmt == _ELEMENT_FORMAT_DEVICE:
+        return [_format_device(value.raw)]
+    if fmt == _ELEMENT_FORMAT_OBJECTLIST:
+        return [s.lower() for s in (data if isinstance(data, list) else [str(data)])]
+    if fmt == _ELEMENT_FORMAT_OBJECT:
+        return [str(data).lower()]
+    if fmt == _ELEMENT_FORMAT_BOOLEAN:
+        raw = value.raw
+        return ['Yes' if raw and raw[0] else 'No']
+    if fmt == _ELEMENT_FORMAT_INTEGER:
+        raw = value.raw
+        return [str(int.from_bytes(raw[:8], 'little'))] if raw else ['0']
+    if fmt == _ELEMENT_FORMAT_INTEGERLIST:
+        raw = value.raw
+        return [' '.join(str(v) for v in struct.unpack(f'<{len(raw) // 8}Q', raw[:len(raw) // 8 * 8]))]
+    if isinstance(data, list):
+        return data
+    return [data if isinstance(data, str) else bytes(data).hex()]
+
+
+def _render_block(kind: str, elements: Dict[str, List[str]]) -> str:
+    lines = [kind, '-' * len(kind)]
+    for name, values in elements.items():
+        lines.append(f'{name:<24}{values[0] if values else ""}')
+        lines.extend(f'{"":<24}{v}' for v in values[1:])
+    return '\n'.join(lines)
+
+
+def iter_bcd_objects(hive: RegistryHive) -> Iterator[BcdObject]:
+    objects = hive.root.subkey('Objects')
+    if objects is None:
+        raise HiveError(f'{hive.path}: no Objects key, not a BCD store')
+    for key in objects.subkeys():
+        ident = key.name.lower()
+        obj_type = 0
+        desc_key = key.subkey('Description')
+        if desc_key is not None:
+            tv = desc_key.value('Type')
+            if tv is not None and isinstance(tv.data, int):
+                obj_type = tv.data
+        kind = _OBJECT_KINDS.get(obj_type, f'Object ({obj_type:08x})')
+        elements: Dict[str, List[str]] = {'identifier': [ident]}
+        elems_key = key.subkey('Elements')
+        if elems_key is not None:
+            for ek in elems_key.subkeys():
+                try:
+                    elem_type = int(ek.name, 16)
+                except ValueError:
+                    continue
+                v = ek.value('Element')
+                if v is None:
+                    continue
+                fmt = (elem_type >> 24) & 0xF
+                elements[_element_name(obj_type, elem_type)] = _element_values(fmt, v)
+        yield BcdObject(kind=kind, identifier=ident, elements=elements, raw=_render_block(kind, elements))
+
+
+def load_bcd_snapshot(path: str) -> BcdSnapshot:
+    """Parse a BCD store file (or a `bcdedit /export` copy) into a BcdSnapshot."""
+    with RegistryHive(path) as hive:
+        return BcdSnapshot(list(iter_bcd_objects(hive)))
@@ -0,0 +1,266 @@
+"""Block-device index: partition UUID / disk GUID -> device, mountpoints, label, size.
+
+Built from one pass over `/sys/class/block`, `/dev/disk/by-partuuid`, the
+udev database (`/run/udev/data`) and `/proc/self/mountinfo`, without running
+blkid or lsblk. `root` (or SYS_SWITCH_BLOCKDEV_ROOT) prefixes every path so a
+fixture tree can stand in for the real system.
+"""
+from __future__ import annotations
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sys_switch.models import BootEntry, entry_partuuid
+
+BLOCKDEV_ROOT_ENV = 'SYS_SWITCH_BLOCKDEV_ROOT'
+_SECTOR = 512  # sysfs `size` is always in 512-byte units
+_UDEV_HEX_RE = re.compile(rb'\\x([0-9A-Fa-f]{2})')
+_MOUNT_ESCAPE_RE = re.compile(r'\\([0-7]{3})')
+
+
+@dataclass
+class BlockDevice:
+    name: str  # kernel name: sda1, nvme0n1p2
+    devnum: str  # 'major:minor'
+    size: int  # bytes
+    disk: Optional[str] = None  # containing disk, for partitions
+    partition: Optional[int] = None
+    partuuid: Optional[str] = None
+    disk_guid: Optional[str] = None  # partition-table UUID of the (containing) disk
+    label: Optional[str] = None
+    fstype: Optional[str] = None
+    uuid: Optional[str] = None  # filesystem UUID (root=UUID=..., GRUB search --fs-uuid)
+    mountpoints: List[str] = field(default_factory=list)
+
+    @property
+    def path(self) -> str:
+        return '/dev/' + self.name
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'path': self.path,
+            'disk': self.disk,
+            'partition': self.partition,
+            'partuuid': self.partuuid,
+            'disk_guid': self.disk_guid,
+            'label': self.label,
+            'fstype': self.fstype,
+            'uuid': self.uuid,
+            'size': self.size,
+            'mountpoints': list(self.mountpoints),
+        }
+
+
+def default_root() -> str:
+    return os.environ.get(BLOCKDEV_ROOT_ENV) or '/'
+
+
+def _read(path: str) -> str | None:
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _udev_decode(value: str) -> str:
+    # *_ENC values escape blanks and non-ASCII bytes as \xNN
+    raw = _UDEV_HEX_RE.sub(lambda m: bytes([int(m.group(1), 16)]), value.encode('utf-8', 'surrogateescape'))
+    return raw.decode('utf-8', 'replace')
+
+
+def _udev_properties(path: str) -> Dict[str, str]:
+    props: Dict[str, str] = {}
+    text = _read(path)
+    for line in (text or '').splitlines():
+        if line.startswith('E:'):
+            key, _, value = line[2:].partition('=')
+            props[key] = value
+    return props
+
+
+def _unescape_mount(path: str) -> str:
+    return _MOUNT_ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 8)), path)
+
+
+def parse_mountinfo(text: str) -> Dict[str, Tuple[List[str], str]]:
+    """`major:minor` -> (mountpoints, fstype) from /proc/self/mountinfo."""
+    out: Dict[str, Tuple[List[str], str]] = {}
+    for line in text.splitlines():
+        head, sep, tail = line.partition(' - ')
+        fields = head.split()
+        if not sep or len(fields) < 5:
+            continue
+        mounts, _ = out.setdefault(fields[2], ([], tail.split(' ', 1)[0]))
+        mounts.append(_unescape_mount(fields[4]))
+    return out
+
+
+class BlockDeviceIndex:
+    """Every block device from one scan, looked up by kernel name, PARTUUID, filesystem UUID or disk GUID."""
+
+    def __init__(self, devices: Iterable[BlockDevice]) -> None:
+        self.devices: Dict[str, BlockDevice] = {d.name: d for d in devices}
+        self._by_partuuid = {d.partuuid: d for d in self.devices.values() if d.partuuid}
+        self._by_disk_guid = {d.disk_guid: d for d in self.devices.values() if d.disk_guid and d.partition is None}
+        self._by_fs_uuid = {d.uuid: d for d in self.devices.values() if d.uuid}
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def get(self, name: str) -> BlockDevice | None:
+        return self.devices.get(name)
+
+    def by_partuuid(self, uuid: str) -> BlockDevice | None:
+        return self._by_partuuid.get(uuid.strip('{}').lower())
+
+    def by_disk_guid(self, guid: str) -> BlockDevice | None:
+        return self._by_disk_guid.get(guid.strip('{}').lower())
+
+    def by_fs_uuid(self, uuid: str) -> BlockDevice | None:
+        return self._by_fs_uuid.get(uuid.lower())
+
+    def for_entry(self, entry: BootEntry) -> BlockDevice | None:
+        """The partition an entry's device path boots from, if it is present on this machine."""
+        uuid = entry_partuuid(entry)
+        return self._by_partuuid.get(uuid) if uuid else None
+
+    def apply_mounts(self, mountinfo: str) -> None:
+        mounts = parse_mountinfo(mountinfo)
+        for d in self.devices.values():
+            points, fstype = mounts.get(d.devnum, ([], None))
+            d.mountpoints = list(points)
+            if fstype and not d.fstype:
+                d.fstype = fstype
+
+    @classmethod
+    def scan(cls, root: str | None = None) -> 'BlockDeviceIndex':
+        root = root or default_root()
+        sys_block = os.path.join(root, 'sys/class/block')
+        udev_data = os.path.join(root, 'run/udev/data')
+        try:
+            names = sorted(os.listdir(sys_block))
+        except OSError:
+            return cls([])
+        devices: Dict[str, BlockDevice] = {}
+        for name in names:
+            base = os.path.join(sys_block, name)
+            devnum = _read(os.path.join(base, 'dev'))
+            if not devnum:
+                continue
+            size = _read(os.path.join(base, 'size')) or ''
+            part = _read(os.path.join(base, 'partition'))
+            dev = BlockDevice(name=name, devnum=devnum, size=int(size) * _SECTOR if size.isdigit() else 0)
+            if part is not None:
+                dev.partition = int(part) if part.isdigit() else None
+                # /sys/class/block/sda1 -> ../../devices/.../sda/sda1
+                dev.disk = os.path.basename(os.path.dirname(os.path.realpath(base)))
+            props = _udev_properties(os.path.join(udev_data, 'b' + devnum))
+            if part is not None:
+                dev.partuuid = (props.get('ID_PART_ENTRY_UUID') or '').lower() or None
+            else:
+                dev.disk_guid = (props.get('ID_PART_TABLE_UUID') or '').lower() or None
+            label = props.get('ID_FS_LABEL_ENC')
+            dev.label = _udev_decode(label) if label else props.get('ID_FS_LABEL') or None
+            dev.fstype = props.get('ID_FS_TYPE') or None
+            dev.uuid = (props.get('ID_FS_UUID') or '').lower() or None
+            devices[name] = dev
+        # by-partuuid also works where there is no udev database (containers, minimal initrds)
+        by_partuuid = os.path.join(root, 'dev/disk/by-partuuid')
+        try:
+            links = os.listdir(by_partuuid)
+        except OSError:
+            links = []
+        for link in links:
+            try:
+                target = os.path.basename(os.readlink(os.path.join(by_partuuid, link)))
+            except OSError:
+                continue
+            if target in devices:
+                devices[target].partuuid = link.lower()
+        for dev in devices.values():
+            if dev.disk in devices:
+                dev.disk_guid = devices[dev.disk].disk_guid
+        index = cls(devices.values())
+        index.apply_mounts(_read(os.path.join(root, 'proc/self/mountinfo')) or '')
+        return index
+
+
+class BlockDeviceCache:
+    """Keeps one index; rescans only after udev changed something, re-reads mounts when they moved."""
+
+    def __init__(self, root: str | None = None) -> None:
+        self.root = root or default_root()
+        self._lock = threading.Lock()
+        self._index: BlockDeviceIndex | None = None
+        self._key: tuple | None = None
+        self._mountinfo: str | None = None
+
+    def _udev_key(self) -> tuple:
+        # udev replaces its database files and /dev/disk links by rename, bumping the directory mtimes
+        parts = []
+        for rel in ('run/udev/data', 'dev/disk/by-partuuid', 'sys/class/block'):
+            try:
+                parts.append(os.stat(os.path.join(self.root, rel)).st_mtime_ns)
+            except OSError:
+                parts.append(None)
+        try:
+            parts.append(len(os.listdir(os.path.join(self.root, 'sys/class/block'))))
+        except OSError:
+            parts.append(None)
+        return tuple(parts)
+
+    def get(self) -> BlockDeviceIndex:
+        with self._lock:
+            key = self._udev_key()
+            if self._index is None or key != self._key:
+                self._index = BlockDeviceIndex.scan(self.root)
+                self._key = key
+                self._mountinfo = None
+            mountinfo = _read(os.path.join(self.root, 'proc/self/mountinfo')) or ''
+            if mountinfo != self._mountinfo:
+                self._index.apply_mounts(mountinfo)
+                self._mountinfo = mountinfo
+            return self._index
+
+
+_caches: Dict[str, BlockDeviceCache] = {}
+_caches_lock = threading.Lock()
+
+
+def device_index(root: str | None = None) -> BlockDeviceIndex:
+    """Process-wide cached index for `root`."""
+    root = root or default_root()
+    with _caches_lock:
+        cache = _caches.get(root)
+        if cache is None:
+            cache = _caches[root] = BlockDeviceCache(root)
+    return cache.get()
+
+
+def describe(dev: BlockDevice) -> str:
+    """One-line summary for tooltips: `/dev/sda1 (sda 分区 1) vfat "ESP" 512.0 MiB 挂载于 /boot/efi`."""
+    parts = [dev.path]
+    if dev.disk:
+        parts.append(f'({dev.disk} 分区 {dev.partition})' if dev.partition else f'({dev.disk})')
+    if dev.fstype:
+        parts.append(dev.fstype)
+    if dev.label:
+        parts.append(f'"{dev.label}"')
+    if dev.size:
+        parts.append(_human_size(dev.size))
+    if dev.mountpoints:
+        parts.append('挂载于 ' + ', '.join(dev.mountpoints))
+    return ' '.join(parts)
+
+
+def _human_size(n: int) -> str:
+    size = float(n)
+    for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+        if size < 1024 or unit == 'TiB':
+            return f'{size:.1f} {unit}' if unit != 'B' else f'{n} B'
+        size /= 1024
+    return f'{n} B'
@@ -6,6 +6,8 @@ import sys
 import shlex
 from typing import List
 
+from sys_switch.trace import traced
+
 
 def is_admin() -> bool:
     system = platform.system()
@@ -23,21 +25,63 @@ def which(cmd: str) -> str | None:
     return shutil.which(cmd)
 
 
-def run(cmd: List[str], check: bool = False, shell: bool = False, env: dict | None = None, hide_window: bool = False) -> subprocess.CompletedProcess:
-    """运行命令，支持隐藏窗口选项"""
-    kwargs = {
-        'capture_output': True,
-        'text': True,
-        'check': check,
-        'shell': shell,
-        'env': env
-    }
-    
-    # 在 Windows 上隐藏窗口
-    if hide_window and platform.system() == 'Windows':
-        kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
-    
-    return subprocess.run(cmd if not shell else ' '.join(cmd), **kwargs)
+def run(cmd: List[str], check: bool = False, shell: bool = False, env: dict | None = None, hide_window: bool = False,
+        timeout: float | None = None, readonly: bool = False) -> subprocess.CompletedProcess:
+    """运行命令，支持隐藏窗口选项
+
+    All commands go through the shared executor: each gets a deadline
+    (`timeout`, default 30s) after which its whole process group is killed
+    and returncode 124 is returned. Identical concurrent `readonly` commands
+    share one process.
+    """
+    from .executor import default_executor
+    return default_executor().run(cmd, check=check, shell=shell, env=env, hide_window=hide_window,
+                                  timeout=timeout, readonly=readonly)
+
+
+def user_cache_dir() -> str:
+    """Per-user persistent cache directory (`SYS_SWITCH_CACHE_DIR` overrides)."""
+    override = os.environ.get('SYS_SWITCH_CACHE_DIR')
+    if override:
+        return override
+    if platform.system() == 'Windows':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+        return os.path.join(base, 'sys_switch', 'cache')
+    if is_admin():
+        return '/var/cache/sys_switch'
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'sys_switch')
+
+
+def runtime_dir() -> str | None:
+    """Volatile per-boot state directory for snapshots, or None if there is none."""
+    if platform.system() == 'Windows':
+        base = os.environ.get('LOCALAPPDATA')
+        return os.path.join(base, 'sys_switch') if base else None
+    if is_admin():
+        return '/run/sys_switch'
+    base = os.environ.get('XDG_RUNTIME_DIR')
+    return os.path.join(base, 'sys_switch') if base else None
+
+
+def boot_id() -> str:
+    """Identifier of the current boot, so persisted state from a previous boot is ignored."""
+    if platform.system() == 'Windows':
+        try:
+            import ctypes
+            import time
+            tick = ctypes.windll.kernel32.GetTickCount64
+            tick.restype = ctypes.c_ulonglong
+            uptime = tick() / 1000.0
+            # Boot time rounded to absorb clock jitter between calls.
+            return str(int((time.time() - uptime) // 10))
+        except Exception:
+            return ''
+    try:
+        with open('/proc/sys/kernel/random/boot_id', 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return ''
 
 
 def current_platform() -> str:
@@ -50,11 +94,13 @@ def _quote_win_args(args: List[str]) -> str:
     return _sp.list2cmdline(args)
 
 
-def elevate_if_needed(want_gui: bool = True) -> bool:
+@traced('elevate_if_needed')
+def elevate_if_needed(want_gui: bool = True, extra_args: List[str] | None = None) -> bool:
     """Ensure the process runs with admin/root.
 
     Returns True if a privileged re-launch was initiated and current process should exit.
     Returns False if already elevated or elevation could not be initiated.
+    `extra_args` go in front of the original arguments (e.g. `--handoff PATH`).
     """
     if is_admin():
         return False
@@ -66,9 +112,9 @@ def elevate_if_needed(want_gui: bool = True) -> bool:
     # always use `-m sys_switch.main` to ensure we run our entry module again.
     # Preserve any original CLI args after our program name.
     if getattr(sys, 'frozen', False):
-        relaunch_args = sys.argv[1:]
+        relaunch_args = [*(extra_args or []), *sys.argv[1:]]
     else:
-        relaunch_args = ['-m', 'sys_switch.main', *sys.argv[1:]]
+        relaunch_args = ['-m', 'sys_switch.main', *(extra_args or []), *sys.argv[1:]]
 
     if system == 'Windows':
         try:
@@ -0,0 +1,403 @@
+from __future__ import annotations
+import contextlib
+import errno
+import os
+import re
+import struct
+import sys
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from sys_switch.models import BootEntry
+
+
+EFI_GLOBAL_GUID = '8be4df61-93ca-11d2-aa0d-00e098032b8c'
+DEFAULT_EFIVARS_ROOT = '/sys/firmware/efi/efivars'
+# Lets tests, benchmarks and the CLI point the backend at a fixture tree.
+EFIVARS_ROOT_ENV = 'SYS_SWITCH_EFIVARS'
+
+LOAD_OPTION_ACTIVE = 0x00000001
+LOAD_OPTION_FORCE_RECONNECT = 0x00000002
+LOAD_OPTION_HIDDEN = 0x00000008
+
+EFI_VARIABLE_NON_VOLATILE = 0x00000001
+EFI_VARIABLE_BOOTSERVICE_ACCESS = 0x00000002
+EFI_VARIABLE_RUNTIME_ACCESS = 0x00000004
+DEFAULT_ATTRIBUTES = EFI_VARIABLE_NON_VOLATILE | EFI_VARIABLE_BOOTSERVICE_ACCESS | EFI_VARIABLE_RUNTIME_ACCESS
+
+# chattr(1) flags: efivarfs marks most variables immutable to stop accidental `rm`.
+FS_IMMUTABLE_FL = 0x00000010
+_LONG_SIZE = struct.calcsize('l')
+FS_IOC_GETFLAGS = (2 << 30) | (_LONG_SIZE << 16) | (ord('f') << 8) | 1
+FS_IOC_SETFLAGS = (1 << 30) | (_LONG_SIZE << 16) | (ord('f') << 8) | 2
+# Returned by filesystems without inode flags (tmpfs fixtures, some FUSE mounts).
+_NO_FLAGS_ERRNOS = (errno.ENOTTY, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS)
+
+_BOOT_VAR_RE = re.compile(r"^Boot([0-9A-Fa-f]{4})-" + re.escape(EFI_GLOBAL_GUID) + "$")
+
+
+class EfiVarError(OSError):
+    pass
+
+
+@dataclass
+class LoadOption:
+    """One decoded EFI_LOAD_OPTION (a `Boot####` variable)."""
+    id: str  # '0000' style, upper-case hex
+    attributes: int
+    description: str
+    device_path: str
+    optional_data: bytes = b''
+    order_index: Optional[int] = None  # position in BootOrder, None when not listed
+
+    @property
+    def active(self) -> bool:
+        return bool(self.attributes & LOAD_OPTION_ACTIVE)
+
+    @property
+    def hidden(self) -> bool:
+        return bool(self.attributes & LOAD_OPTION_HIDDEN)
+
+
+@dataclass
+class EfiBootState:
+    current: Optional[str] = None
+    next: Optional[str] = None
+    order: List[str] = field(default_factory=list)
+    options: Dict[str, LoadOption] = field(default_factory=dict)
+    timeout: Optional[int] = None
+
+    def index_order(self) -> None:
+        """Record each option's BootOrder position (first occurrence wins)."""
+        pos: Dict[str, int] = {}
+        for i, bid in enumerate(self.order):
+            pos.setdefault(bid, i)
+        for bid, opt in self.options.items():
+            opt.order_index = pos.get(bid)
+
+    def ordered(self) -> List[LoadOption]:
+        """Options in BootOrder first, then any remaining ones by number."""
+        seen = set()
+        out: List[LoadOption] = []
+        for bid in self.order:
+            opt = self.options.get(bid)
+            if opt is not None and bid not in seen:
+                seen.add(bid)
+                out.append(opt)
+        for bid in sorted(self.options):
+            if bid not in seen:
+                out.append(self.options[bid])
+        return out
+
+    def to_entries(self) -> List[BootEntry]:
+        return [
+            BootEntry(
+                id=opt.id,
+                description=opt.description,
+                is_current=(opt.id == self.current),
+                is_next=(opt.id == self.next),
+                extra=opt.device_path or None,
+            ) for opt in self.ordered()
+        ]
+
+
+def default_root() -> str:
+    return os.environ.get(EFIVARS_ROOT_ENV) or DEFAULT_EFIVARS_ROOT
+
+
+class EfiVarStore:
+    """Reads UEFI variables straight from efivarfs (or a fixture directory)."""
+
+    def __init__(self, root: str | None = None) -> None:
+        self.root = root or default_root()
+
+    def path(self, name: str, guid: str = EFI_GLOBAL_GUID) -> str:
+        return os.path.join(self.root, f'{name}-{guid}')
+
+    def available(self) -> bool:
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return False
+        return any(_BOOT_VAR_RE.match(n) for n in names)
+
+    def read(self, name: str, guid: str = EFI_GLOBAL_GUID) -> Tuple[int, bytes] | None:
+        """Return `(attributes, data)` or None if the variable does not exist."""
+        try:
+            with open(self.path(name, guid), 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        if len(raw) < 4:
+            raise EfiVarError(f'truncated EFI variable {name}-{guid}')
+        return struct.unpack_from('<I', raw)[0], raw[4:]
+
+    def read_u16(self, name: str) -> str | None:
+        var = self.read(name)
+        if var is None or len(var[1]) < 2:
+            return None
+        return f'{struct.unpack_from("<H", var[1])[0]:04X}'
+
+    def read_boot_order(self) -> List[str]:
+        var = self.read('BootOrder')
+        if var is None:
+            return []
+        data = var[1]
+        return [f'{v:04X}' for v in struct.unpack(f'<{len(data) // 2}H', data[:len(data) // 2 * 2])]
+
+    def boot_option_ids(self) -> List[str]:
+        ids = []
+        for n in os.listdir(self.root):
+            m = _BOOT_VAR_RE.match(n)
+            if m:
+                ids.append(m.group(1).upper())
+        return sorted(ids)
+
+    def read_load_option(self, bid: str) -> LoadOption | None:
+        var = self.read(f'Boot{bid}')
+        if var is None:
+            return None
+        return decode_load_option(bid, var[1])
+
+    def state_reads(self, ids: List[str]) -> List[tuple]:
+        """`(fn, *args)` reads behind a listing, in the order `build_state` expects.
+
+        They are independent of each other, so a caller may run them concurrently.
+        """
+        return [
+            (self.read_u16, 'BootCurrent'),
+            (self.read_u16, 'BootNext'),
+            (self.read_boot_order,),
+            (self.read, 'Timeout'),
+            *((self.read_load_option, bid) for bid in ids),
+        ]
+
+    def read_state(self) -> EfiBootState:
+        ids = self.boot_option_ids()
+        return build_state(ids, [fn(*args) for fn, *args in self.state_reads(ids)])
+
+    # --- writes ---
+    def write(self, name: str, data: bytes, attributes: int = DEFAULT_ATTRIBUTES, guid: str = EFI_GLOBAL_GUID) -> None:
+        """Write a variable: efivarfs wants the 4-byte attributes and the data in one write()."""
+        path = self.path(name, guid)
+        payload = struct.pack('<I', attributes) + data
+        with _mutable(path):
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                written = os.write(fd, payload)
+                if written != len(payload):
+                    raise EfiVarError(f'short write to {name}-{guid}')
+                # A plain directory keeps stale trailing bytes; efivarfs replaces the value.
+                if os.fstat(fd).st_size > len(payload):
+                    os.ftruncate(fd, len(payload))
+            finally:
+                os.close(fd)
+
+    def delete(self, name: str, guid: str = EFI_GLOBAL_GUID) -> bool:
+        path = self.path(name, guid)
+        if not os.path.exists(path):
+            return False
+        with _mutable(path, restore=False):
+            os.unlink(path)
+        return True
+
+    def set_boot_next(self, bid: str) -> None:
+        bid = _check_boot_id(bid)
+        if not os.path.exists(self.path(f'Boot{bid}')):
+            raise EfiVarError(errno.ENOENT, f'Boot{bid} 不存在')
+        self.write('BootNext', struct.pack('<H', int(bid, 16)))
+        if self.read_u16('BootNext') != bid:
+            raise EfiVarError(errno.EIO, f'BootNext 回读校验失败（期望 {bid}）')
+
+    def clear_boot_next(self) -> bool:
+        removed = self.delete('BootNext')
+        if self.read('BootNext') is not None:
+            raise EfiVarError(errno.EIO, 'BootNext 删除后仍然存在')
+        return removed
+
+    def set_boot_order(self, ids: List[str]) -> None:
+        order = [_check_boot_id(b) for b in ids]
+        self.write('BootOrder', struct.pack(f'<{len(order)}H', *(int(b, 16) for b in order)))
+        if self.read_boot_order() != order:
+            raise EfiVarError(errno.EIO, 'BootOrder 回读校验失败')
+
+
+def build_state(ids: List[str], results: List) -> EfiBootState:
+    """Combine the results of `EfiVarStore.state_reads(ids)` into one state."""
+    current, nxt, order, timeout, *options = results
+    state = EfiBootState(current=current, next=nxt, order=order)
+    if timeout is not None and len(timeout[1]) >= 2:
+        state.timeout = struct.unpack_from('<H', timeout[1])[0]
+    for bid, opt in zip(ids, options):
+        if opt is not None:
+            state.options[bid] = opt
+    state.index_order()
+    return state
+
+
+def _check_boot_id(bid: str) -> str:
+    if not re.fullmatch(r'(?:Boot)?[0-9A-Fa-f]{1,4}', bid):
+        raise EfiVarError(errno.EINVAL, f'无效的启动项编号: {bid}')
+    return f'{int(bid[4:] if bid.startswith("Boot") else bid, 16):04X}'
+
+
+def _get_flags(fd: int) -> int | None:
+    import fcntl
+    buf = bytearray(_LONG_SIZE)
+    try:
+        fcntl.ioctl(fd, FS_IOC_GETFLAGS, buf)
+    except OSError as e:
+        if e.errno in _NO_FLAGS_ERRNOS:
+            return None
+        raise
+    return int.from_bytes(buf[:4], sys.byteorder)
+
+
+def _set_flags(fd: int, flags: int) -> None:
+    import fcntl
+    buf = bytearray(flags.to_bytes(4, sys.byteorder) + bytes(_LONG_SIZE - 4))
+    fcntl.ioctl(fd, FS_IOC_SETFLAGS, buf)
+
+
+@contextlib.contextmanager
+def _mutable(path: str, restore: bool = True):
+    """Clear FS_IMMUTABLE_FL on an existing variable for the duration of the block."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        yield
+        return
+    try:
+        flags = _get_flags(fd)
+        cleared = flags is not None and bool(flags & FS_IMMUTABLE_FL)
+        if cleared:
+            _set_flags(fd, flags & ~FS_IMMUTABLE_FL)
+        try:
+            yield
+        finally:
+            if cleared and restore:
+                with contextlib.suppress(OSError):
+                    _set_flags(fd, flags)
+    finally:
+        os.close(fd)
+
+
+def decode_load_option(bid: str, data: bytes) -> LoadOption:
+    """Decode EFI_LOAD_OPTION: attributes, path list length, UCS-2 description, paths, optional data."""
+    if len(data) < 6:
+        raise EfiVarError(f'truncated load option Boot{bid}')
+    attributes, fp_len = struct.unpack_from('<IH', data)
+    pos = 6
+    end = pos
+    while end + 1 < len(data) and data[end:end + 2] != b'\x00\x00':
+        end += 2
+    description = data[pos:end].decode('utf-16-le', errors='replace')
+    pos = end + 2
+    fp = data[pos:pos + fp_len]
+    optional = data[pos + fp_len:]
+    return LoadOption(
+        id=bid.upper(),
+        attributes=attributes,
+        description=description,
+        device_path=device_path_to_text(fp),
+        optional_data=bytes(optional),
+    )
+
+
+def _guid(b: bytes) -> str:
+    return str(uuid.UUID(bytes_le=bytes(b[:16])))
+
+
+def _ucs2(b: bytes) -> str:
+    return b.decode('utf-16-le', errors='replace').split('\x00', 1)[0]
+
+
+def _node_to_text(t: int, st: int, d: bytes) -> str:
+    try:
+        if t == 1:  # Hardware
+            if st == 1:
+                fn, dev = d[0], d[1]
+                return f'Pci(0x{dev:x},0x{fn:x})'
+            if st == 4:
+                return f'VenHw({_guid(d)})'
+        elif t == 2:  # ACPI
+            if st == 1:
+                hid, uid = struct.unpack_from('<II', d)
+                if hid == 0x0a0341d0:
+                    return f'PciRoot(0x{uid:x})'
+                if hid == 0x0a0841d0:
+                    return f'PcieRoot(0x{uid:x})'
+                return f'Acpi(0x{hid:x},0x{uid:x})'
+        elif t == 3:  # Messaging
+            if st == 2:
+                pun, lun = struct.unpack_from('<HH', d)
+                return f'SCSI({pun},{lun})'
+            if st == 5:
+                return f'USB({d[0]},{d[1]})'
+            if st == 10:
+                return f'VenMsg({_guid(d)})'
+            if st == 11:
+                return f'MAC({d[:6].hex()},{d[32]})'
+            if st == 12:
+                return 'IPv4({}.{}.{}.{})'.format(*d[4:8])
+            if st == 13:
+                return 'IPv6([::])'
+            if st == 18:
+                hba, pm, lun = struct.unpack_from('<HHH', d)
+                return f'Sata({hba},{pm},{lun})'
+            if st == 23:
+                nsid = struct.unpack_from('<I', d)[0]
+                eui = '-'.join(f'{x:02x}' for x in d[4:12])
+                return f'NVMe(0x{nsid:x},{eui})'
+            if st == 24:
+                return f'Uri({d.decode("ascii", errors="replace")})'
+        elif t == 4:  # Media
+            if st == 1:
+                part, start, size = struct.unpack_from('<IQQ', d)
+                sig, fmt, sig_type = d[20:36], d[36], d[37]
+                if fmt == 2 and sig_type == 2:
+                    return f'HD({part},GPT,{_guid(sig)},0x{start:x},0x{size:x})'
+                mbr_sig = struct.unpack_from('<I', sig)[0]
+                return f'HD({part},MBR,0x{mbr_sig:x},0x{start:x},0x{size:x})'
+            if st == 2:
+                entry, start, size = struct.unpack_from('<IQQ', d)
+                return f'CDROM({entry},0x{start:x},0x{size:x})'
+            if st == 3:
+                return f'VenMedia({_guid(d)})'
+            if st == 4:
+                return f'File({_ucs2(d)})'
+            if st == 6:
+                return f'FvFile({_guid(d)})'
+            if st == 7:
+                return f'Fv({_guid(d)})'
+        elif t == 5 and st == 1:  # BIOS Boot Specification
+            dev_type = struct.unpack_from('<H', d)[0]
+            desc = d[4:].split(b'\x00', 1)[0].decode('ascii', errors='replace')
+            return f'BBS({dev_type},{desc})'
+    except (struct.error, IndexError):
+        pass
+    return f'Path({t},{st},{d.hex()})'
+
+
+def device_path_to_text(fp: bytes) -> str:
+    """Render an EFI device path list in the efibootmgr/UEFI text notation."""
+    instances: List[str] = []
+    nodes: List[str] = []
+    pos = 0
+    while pos + 4 <= len(fp):
+        t, st, ln = struct.unpack_from('<BBH', fp, pos)
+        if ln < 4 or pos + ln > len(fp):
+            break
+        if t == 0x7f:
+            if nodes:
+                instances.append('/'.join(nodes))
+            nodes = []
+            if st == 0xff:
+                break
+        else:
+            nodes.append(_node_to_text(t, st, fp[pos + 4:pos + ln]))
+        pos += ln
+    if nodes:
+        instances.append('/'.join(nodes))
+    return ','.join(instances)
@@ -0,0 +1,198 @@
+from __future__ import annotations
+import os
+import platform
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sys_switch.trace import tracer
+
+
+def _env_timeout(name: str, fallback: float) -> float:
+    try:
+        value = float(os.environ.get(name) or fallback)
+    except ValueError:
+        return fallback
+    # nan/inf/negative would turn every command into an instant timeout or none at all
+    return value if 0 < value < float('inf') else fallback
+
+
+# Every external command gets a deadline; a wedged efibootmgr/bcdedit must not hang the CLI or GUI.
+DEFAULT_TIMEOUT = _env_timeout('SYS_SWITCH_CMD_TIMEOUT', 30.0)
+DEFAULT_MAX_CONCURRENCY = 4
+# Same convention as coreutils timeout(1).
+TIMEOUT_RETURNCODE = 124
+
+_IS_WINDOWS = platform.system() == 'Windows'
+
+
+class _Flight:
+    """One in-flight read-only command that identical callers wait on."""
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[subprocess.CompletedProcess] = None
+        self.error: Optional[BaseException] = None
+
+
+class Executor:
+    """Runs commands with a deadline, bounded concurrency and single-flight dedup.
+
+    Read-only commands (``readonly=True``) with identical argv/env that overlap
+    in time share one process. Any mutating command clears the coalescing
+    table so reads issued after it never see output captured before it.
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, default_timeout: float = DEFAULT_TIMEOUT) -> None:
+        self.default_timeout = default_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._inflight: Dict[Tuple, _Flight] = {}
+
+    def run(self, cmd: List[str], check: bool = False, shell: bool = False, env: dict | None = None,
+            hide_window: bool = False, timeout: float | None = None, readonly: bool = False) -> subprocess.CompletedProcess:
+        if not tracer.enabled:
+            return self._run(cmd, check, shell, env, hide_window, timeout, readonly)
+        with tracer.span('exec', argv=list(cmd), readonly=readonly) as sp:
+            cp = self._run(cmd, False, shell, env, hide_window, timeout, readonly)
+            sp.set(exit_code=cp.returncode,
+                   stdout_bytes=len((cp.stdout or '').encode('utf-8')),
+                   stderr_bytes=len((cp.stderr or '').encode('utf-8')),
+                   timed_out=getattr(cp, 'timed_out', False),
+                   coalesced=getattr(cp, 'coalesced', False))
+        return self._checked(cp, check, self.default_timeout if timeout is None else timeout)
+
+    def _run(self, cmd: List[str], check: bool, shell: bool, env: dict | None, hide_window: bool,
+             timeout: float | None, readonly: bool) -> subprocess.CompletedProcess:
+        timeout = self.default_timeout if timeout is None else timeout
+        if not readonly:
+            with self._lock:
+                self._inflight.clear()
+            return self._checked(self._execute(cmd, shell, env, hide_window, timeout), check, timeout)
+
+        key = (tuple(cmd), shell, tuple(sorted(env.items())) if env else None, hide_window)
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+        if leader:
+            try:
+                flight.result = self._execute(cmd, shell, env, hide_window, timeout)
+            except BaseException as e:
+                flight.error = e
+            finally:
+                with self._lock:
+                    if self._inflight.get(key) is flight:
+                        del self._inflight[key]
+                flight.done.set()
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        cp = flight.result
+        if not leader:
+            shared = cp
+            cp = subprocess.CompletedProcess(shared.args, shared.returncode, shared.stdout, shared.stderr)
+            cp.timed_out = getattr(shared, 'timed_out', False)
+            cp.coalesced = True
+        return self._checked(cp, check, timeout)
+
+    @staticmethod
+    def _checked(cp: subprocess.CompletedProcess, check: bool, timeout: float) -> subprocess.CompletedProcess:
+        if check:
+            if cp.returncode == TIMEOUT_RETURNCODE and getattr(cp, 'timed_out', False):
+                raise subprocess.TimeoutExpired(cp.args, timeout, output=cp.stdout, stderr=cp.stderr)
+            cp.check_returncode()
+        return cp
+
+    def _execute(self, cmd: List[str], shell: bool, env: dict | None, hide_window: bool,
+                 timeout: float) -> subprocess.CompletedProcess:
+        args = cmd
+        if shell:
+            args = subprocess.list2cmdline(cmd) if _IS_WINDOWS else shlex.join(cmd)
+        kwargs: dict = {
+            'stdout': subprocess.PIPE,
+            'stderr': subprocess.PIPE,
+            'text': True,
+            'shell': shell,
+            'env': env,
+        }
+        if _IS_WINDOWS:
+            flags = subprocess.CREATE_NEW_PROCESS_GROUP
+            if hide_window:
+                flags |= subprocess.CREATE_NO_WINDOW
+            kwargs['creationflags'] = flags
+        else:
+            # Own process group so a timeout can take down grandchildren too.
+            kwargs['start_new_session'] = True
+
+        # The deadline covers waiting for a slot too, so a pile-up behind hung commands still ends on time
+        deadline = time.monotonic() + timeout
+        if not self._slots.acquire(timeout=timeout):
+            return _timed_out(args, '', f'命令排队超时（{timeout:g} 秒）未能执行: {" ".join(cmd)}')
+        try:
+            proc = subprocess.Popen(args, **kwargs)
+            try:
+                out, err = proc.communicate(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                _kill_tree(proc)
+                try:
+                    out, err = proc.communicate(timeout=5)
+                except subprocess.TimeoutExpired:
+                    out, err = '', ''
+                return _timed_out(args, out or '',
+                                  (err or '') + f'\n命令超时（{timeout:g} 秒）已终止: {" ".join(cmd)}')
+            except BaseException:
+                _kill_tree(proc)
+                proc.wait()
+                raise
+        finally:
+            self._slots.release()
+        return subprocess.CompletedProcess(args, proc.returncode, out, err)
+
+
+def _timed_out(args, stdout: str, stderr: str) -> subprocess.CompletedProcess:
+    cp = subprocess.CompletedProcess(args, TIMEOUT_RETURNCODE, stdout, stderr)
+    cp.timed_out = True
+    return cp
+
+
+def _kill_tree(proc: subprocess.Popen) -> None:
+    if proc.poll() is not None:
+        return
+    try:
+        if _IS_WINDOWS:
+            subprocess.run(['taskkill', '/T', '/F', '/PID', str(proc.pid)],
+                           capture_output=True, timeout=10,
+                           creationflags=subprocess.CREATE_NO_WINDOW)
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except (OSError, subprocess.SubprocessError):
+        pass
+    if proc.poll() is None:
+        try:
+            proc.kill()
+        except OSError:
+            pass
+
+
+_default = Executor()
+
+
+def default_executor() -> Executor:
+    return _default
+
+
+def configure(max_concurrency: int | None = None, default_timeout: float | None = None) -> Executor:
+    """Replace the process-wide executor (e.g. from CLI options)."""
+    global _default
+    _default = Executor(
+        max_concurrency=max_concurrency or DEFAULT_MAX_CONCURRENCY,
+        default_timeout=DEFAULT_TIMEOUT if default_timeout is None else default_timeout,
+    )
+    return _default
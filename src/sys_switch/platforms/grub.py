@@ -0,0 +1,395 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .common import user_cache_dir
+
+
+GRUB_CFG_CANDIDATES = ('/boot/grub/grub.cfg', '/boot/grub2/grub.cfg')
+GRUBENV_CANDIDATES = ('/boot/grub/grubenv', '/boot/grub2/grubenv')
+GRUBENV_SIZE = 1024
+GRUBENV_HEADER = b'# GRUB Environment Block\n'
+# GRUB writes grubenv at boot through a raw blocklist; it cannot do that on
+# these filesystems, so a next_entry set there would never be consumed.
+_GRUBENV_UNWRITABLE_FS = ('btrfs', 'zfs')
+_GRUBENV_UNWRITABLE_SOURCES = ('/dev/mapper/', '/dev/dm-', '/dev/md')
+# Bump when the cached record layout changes.
+_CACHE_VERSION = 1
+
+_ENTRY_OPTIONS_WITH_ARG = ('--class', '--users', '--hotkey', '--id', '--source')
+
+
+@dataclass(frozen=True)
+class GrubMenuEntry:
+    titles: Tuple[str, ...]  # enclosing submenu titles + entry title
+    ids: Tuple[Optional[str], ...]  # `--id`/$menuentry_id_option per level, if any
+    indexes: Tuple[int, ...]  # position within each (sub)menu
+
+    @property
+    def path(self) -> str:
+        """`>`-joined reference accepted by grub-reboot (ids where GRUB has them)."""
+        return '>'.join(i or t for t, i in zip(self.titles, self.ids))
+
+    @property
+    def title_path(self) -> str:
+        return '>'.join(self.titles)
+
+    @property
+    def index_path(self) -> str:
+        return '>'.join(str(i) for i in self.indexes)
+
+    def matches(self, ref: str | None) -> bool:
+        if not ref:
+            return False
+        return ref in (self.path, self.title_path, self.index_path)
+
+
+class GrubEnvError(OSError):
+    pass
+
+
+def find_grub_cfg() -> str | None:
+    for p in GRUB_CFG_CANDIDATES:
+        if os.path.isfile(p):
+            return p
+    return None
+
+
+def find_grubenv() -> str | None:
+    for p in GRUBENV_CANDIDATES:
+        if os.path.isfile(p):
+            return p
+    return None
+
+
+# --- lexer ---------------------------------------------------------------
+
+def _logical_lines(lines: Iterable[str]) -> Iterator[List[Tuple[str, bool]]]:
+    """Join continuation lines and split into words; yields `(word, quoted)` lists.
+
+    Follows the GRUB script lexer closely enough for grub-mkconfig output:
+    single quotes are literal, double quotes honour `\\`, `"`, `$` escapes,
+    a trailing backslash or an unterminated quote continues onto the next line,
+    `;` separates commands and `#` starts a comment at a word boundary.
+    """
+    words: List[Tuple[str, bool]] = []
+    buf: List[str] = []
+    in_word = quoted = False
+    quote: Optional[str] = None
+
+    def flush() -> None:
+        nonlocal in_word, quoted
+        if in_word:
+            words.append((''.join(buf), quoted))
+        buf.clear()
+        in_word = quoted = False
+
+    for raw in lines:
+        line = raw.rstrip('\r\n')
+        i, n = 0, len(line)
+        continued = False
+        while i < n:
+            c = line[i]
+            if quote == "'":
+                if c == "'":
+                    quote = None
+                else:
+                    buf.append(c)
+            elif quote == '"':
+                if c == '"':
+                    quote = None
+                elif c == '\\' and i + 1 < n and line[i + 1] in '"\\$':
+                    buf.append(line[i + 1])
+                    i += 1
+                elif c == '\\' and i + 1 == n:
+                    continued = True
+                else:
+                    buf.append(c)
+            elif c in ' \t':
+                flush()
+            elif c == '\\':
+                if i + 1 == n:
+                    continued = True
+                else:
+                    buf.append(line[i + 1])
+                    in_word = True
+                    i += 1
+            elif c in '\'"':
+                quote = c
+                in_word = quoted = True
+            elif c == ';':
+                flush()
+                if words:
+                    yield words
+                    words = []
+            elif c == '#' and not in_word:
+                break
+            else:
+                buf.append(c)
+                in_word = True
+            i += 1
+        if quote is not None:
+            if not continued:
+                buf.append('\n')
+            continue
+        if continued:
+            continue
+        flush()
+        if words:
+            yield words
+            words = []
+    flush()
+    if words:
+        yield words
+
+
+def _parse_entry_header(words: List[Tuple[str, bool]]) -> Tuple[str | None, str | None]:
+    """Return `(title, id)` from a `menuentry`/`submenu` command line."""
+    title: Optional[str] = None
+    ident: Optional[str] = None
+    args = words[1:]
+    i = 0
+    while i < len(args):
+        w, q = args[i]
+        if not q and w == '{':
+            break
+        if not q and w == '$menuentry_id_option':
+            w = '--id'
+        if not q and w in _ENTRY_OPTIONS_WITH_ARG:
+            if w == '--id' and i + 1 < len(args):
+                ident = args[i + 1][0]
+            i += 2
+            continue
+        if not q and w.startswith('--'):
+            i += 1
+            continue
+        if title is None:
+            title = w
+        i += 1
+    return title, ident
+
+
+def iter_menu_entries(lines: Iterable[str]) -> Iterator[GrubMenuEntry]:
+    """Stream menu entries out of grub.cfg text, descending into `submenu` blocks."""
+    # Each frame: (kind, title, id, index); kind is 'submenu', 'entry' or 'block'
+    stack: List[Tuple[str, Optional[str], Optional[str], int]] = []
+    counters: List[int] = [0]
+    for words in _logical_lines(lines):
+        cmd = words[0][0] if not words[0][1] else ''
+        opens = sum(1 for w, q in words if not q and w == '{')
+        closes = sum(1 for w, q in words if not q and w == '}')
+        in_entry = any(f[0] == 'entry' for f in stack)
+        if cmd in ('menuentry', 'submenu') and opens and not in_entry:
+            title, ident = _parse_entry_header(words)
+            title = title or ''
+            index = counters[-1]
+            counters[-1] += 1
+            if cmd == 'menuentry':
+                parents = [f for f in stack if f[0] == 'submenu']
+                yield GrubMenuEntry(
+                    titles=tuple(f[1] for f in parents) + (title,),
+                    ids=tuple(f[2] for f in parents) + (ident,),
+                    indexes=tuple(f[3] for f in parents) + (index,),
+                )
+                stack.append(('entry', title, ident, index))
+            else:
+                stack.append(('submenu', title, ident, index))
+                counters.append(0)
+            opens -= 1
+        for _ in range(opens):
+            stack.append(('block', None, None, 0))
+        for _ in range(closes):
+            if not stack:
+                break
+            if stack.pop()[0] == 'submenu':
+                counters.pop()
+
+
+def parse_grub_cfg(path: str) -> List[GrubMenuEntry]:
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return list(iter_menu_entries(f))
+
+
+# --- cache ---------------------------------------------------------------
+
+class GrubMenuCache:
+    """On-disk cache of parsed menu entries keyed by grub.cfg (mtime, size, inode)."""
+
+    def __init__(self, cache_dir: str | None = None) -> None:
+        self.cache_dir = cache_dir or user_cache_dir()
+
+    def _cache_path(self, cfg_path: str) -> str:
+        digest = hashlib.sha1(os.path.abspath(cfg_path).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f'grubcfg-{digest}.json')
+
+    @staticmethod
+    def _key(st: os.stat_result) -> List[int]:
+        return [_CACHE_VERSION, st.st_mtime_ns, st.st_size, st.st_ino]
+
+    def load(self, cfg_path: str) -> List[GrubMenuEntry]:
+        st = os.stat(cfg_path)
+        key = self._key(st)
+        cached = self._read(cfg_path, key)
+        if cached is not None:
+            return cached
+        entries = parse_grub_cfg(cfg_path)
+        self._write(cfg_path, key, entries)
+        return entries
+
+    def _read(self, cfg_path: str, key: List[int]) -> List[GrubMenuEntry] | None:
+        try:
+            with open(self._cache_path(cfg_path), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('key') != key:
+                return None
+            return [
+                GrubMenuEntry(titles=tuple(e['titles']), ids=tuple(e['ids']), indexes=tuple(e['indexes']))
+                for e in data['entries']
+            ]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write(self, cfg_path: str, key: List[int], entries: List[GrubMenuEntry]) -> None:
+        path = self._cache_path(cfg_path)
+        data = {
+            'key': key,
+            'entries': [{'titles': e.titles, 'ids': e.ids, 'indexes': e.indexes} for e in entries],
+        }
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError:
+            # The cache is an optimisation only; a read-only home must not break listing.
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+
+# --- grubenv -------------------------------------------------------------
+
+def parse_grubenv(data: bytes) -> Dict[str, str]:
+    """Parse a grubenv block; values use GRUB's backslash escaping for `\\` and newline."""
+    env: Dict[str, str] = {}
+    text = data.decode('utf-8', errors='replace')
+    lines: List[str] = []
+    cur: List[str] = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == '\\' and i + 1 < len(text):
+            cur.append(text[i + 1])
+            i += 2
+            continue
+        if c == '\n':
+            lines.append(''.join(cur))
+            cur = []
+        else:
+            cur.append(c)
+        i += 1
+    for line in lines:
+        if not line or line.startswith('#'):
+            continue
+        key, sep, value = line.partition('=')
+        if sep:
+            env[key] = value
+    return env
+
+
+def render_grubenv(env: Dict[str, str]) -> bytes:
+    body = b''.join(
+        (k + '=' + v.replace('\\', '\\\\').replace('\n', '\\\n') + '\n').encode('utf-8')
+        for k, v in env.items()
+    )
+    block = GRUBENV_HEADER + body
+    if len(block) > GRUBENV_SIZE:
+        raise GrubEnvError(f'grubenv 内容超过 {GRUBENV_SIZE} 字节')
+    return block + b'#' * (GRUBENV_SIZE - len(block))
+
+
+def _mount_for(path: str, mountinfo: str) -> Tuple[str, str] | None:
+    """Return `(fstype, source)` of the mount containing `path`, from /proc/self/mountinfo."""
+    target = os.path.realpath(path)
+    best: Tuple[int, str, str] | None = None
+    with open(mountinfo, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            pre, sep, post = line.partition(' - ')
+            fields = pre.split()
+            rest = post.split()
+            if not sep or len(fields) < 5 or len(rest) < 2:
+                continue
+            mnt = fields[4].replace('\\040', ' ')
+            if target == mnt or target.startswith(mnt.rstrip('/') + '/'):
+                if best is None or len(mnt) >= best[0]:
+                    best = (len(mnt), rest[0], rest[1])
+    return (best[1], best[2]) if best else None
+
+
+class GrubEnv:
+    """Direct reader/writer for the fixed-size 1024-byte grubenv block."""
+
+    def __init__(self, path: str | None = None, mountinfo: str = '/proc/self/mountinfo') -> None:
+        self.path = path or find_grubenv() or GRUBENV_CANDIDATES[0]
+        self.mountinfo = mountinfo
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+    def read(self) -> Dict[str, str]:
+        """All variables, e.g. `saved_entry`, `next_entry`, `prev_saved_entry`."""
+        try:
+            with open(self.path, 'rb') as f:
+                return parse_grubenv(f.read(GRUBENV_SIZE))
+        except FileNotFoundError:
+            return {}
+
+    def check_writable(self) -> str | None:
+        """Return a reason string if GRUB could not update this grubenv at boot."""
+        try:
+            mount = _mount_for(self.path, self.mountinfo)
+        except OSError:
+            return None
+        if mount is None:
+            return None
+        fstype, source = mount
+        if fstype in _GRUBENV_UNWRITABLE_FS:
+            return f'grubenv 位于 {fstype} 文件系统，GRUB 启动时无法写入'
+        if source.startswith(_GRUBENV_UNWRITABLE_SOURCES):
+            return f'grubenv 位于 LVM/RAID 设备 {source}，GRUB 启动时无法写入'
+        return None
+
+    def update(self, values: Dict[str, Optional[str]]) -> None:
+        """Set (or with None, unset) variables by rewriting the block in place and fsyncing."""
+        reason = self.check_writable()
+        if reason:
+            raise GrubEnvError(reason)
+        with open(self.path, 'r+b') as f:
+            data = f.read(GRUBENV_SIZE + 1)
+            if len(data) != GRUBENV_SIZE or not data.startswith(GRUBENV_HEADER):
+                raise GrubEnvError(f'{self.path} 不是有效的 grubenv 块')
+            env = parse_grubenv(data)
+            for k, v in values.items():
+                if v is None:
+                    env.pop(k, None)
+                else:
+                    env[k] = v
+            block = render_grubenv(env)
+            # Same size, same blocks: GRUB locates the file by its blocklist.
+            f.seek(0)
+            f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def set_next_entry(self, ref: str) -> None:
+        self.update({'next_entry': ref})
+        if self.read().get('next_entry') != ref:
+            raise GrubEnvError('next_entry 回读校验失败')
+
+    def clear_next_entry(self) -> None:
+        self.update({'next_entry': None})
@@ -1,51 +1,219 @@
 from __future__ import annotations
+import hashlib
+import os
 import re
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from .common import run, which, is_admin
+from .efivars import LOAD_OPTION_ACTIVE, EfiBootState, EfiVarStore, LoadOption
+from .grub import GrubEnv, GrubMenuCache, GrubMenuEntry, find_grub_cfg
 from sys_switch.models import BootEntry
+from sys_switch.trace import traced
+
+
+# One pass over `efibootmgr [-v]` output. Only 4-hex-digit ids are load
+# options, so `BootCurrent:`/`BootOrder:` never turn into entries.
+_EFIBOOTMGR_LINE_RE = re.compile(
+    r'^(?:Boot(?P<id>[0-9A-Fa-f]{4})(?P<active>[* ]?) ?(?P<rest>[^\n]*)'
+    r'|(?P<key>BootCurrent|BootNext|BootOrder|Timeout):[ \t]*(?P<value>[^\n]*)'
+    r'|[ \t]+(?P<cont>dp|data):[ \t]*(?P<hex>[^\n]*))$',
+    re.MULTILINE,
+)
+# Device path text: `Node(args)` nodes joined by `/` (`,` between instances);
+# efibootmgr 18 prints the file node as a bare `\EFI\...\x.efi`.
+_DP_NODE = r'(?:[A-Za-z][A-Za-z0-9]*\([^()\t]*(?:\([^()\t]*\)[^()\t]*)*\)|\\[^\t]*?\.efi)'
+_DEVICE_PATH_RE = re.compile(rf'{_DP_NODE}(?:[/,]{_DP_NODE})*', re.IGNORECASE)
+_HEX_RE = re.compile(r'(?:[0-9A-Fa-f]{2})+')
+
+
+def _split_verbose(rest: str) -> tuple[str, str, bytes]:
+    """`description<TAB>device-path[optional data]` -> parts.
+
+    Firmware may put tabs inside descriptions, so split at the last tab that is
+    followed by something shaped like a device path.
+    """
+    tab = len(rest)
+    while True:
+        tab = rest.rfind('\t', 0, tab)
+        if tab < 0:
+            return rest.rstrip(), '', b''
+        m = _DEVICE_PATH_RE.match(rest, tab + 1)
+        if m:
+            break
+    tail = rest[m.end():].rstrip()
+    if _HEX_RE.fullmatch(tail):
+        optional = bytes.fromhex(tail)  # efibootmgr 18
+    else:
+        optional = tail.encode('utf-8', 'replace')  # efibootmgr 17: printable text, dots elsewhere
+    return rest[:tab].rstrip(), m.group(0), optional
+
+
+def scan_efibootmgr(text: str) -> EfiBootState:
+    """Structured state (BootCurrent/BootNext/BootOrder/Timeout and typed load options) from `efibootmgr [-v]`."""
+    state = EfiBootState()
+    last: LoadOption | None = None
+    for m in _EFIBOOTMGR_LINE_RE.finditer(text.replace('\r\n', '\n')):
+        bid, active, rest, key, value, cont, hex_digits = m.groups()
+        if bid is not None:
+            bid = bid.upper()
+            desc, path, optional = _split_verbose(rest)
+            last = state.options[bid] = LoadOption(
+                id=bid,
+                attributes=LOAD_OPTION_ACTIVE if active == '*' else 0,
+                description=desc,
+                device_path=path,
+                optional_data=optional,
+            )
+            continue
+        if key is not None:
+            value = value.strip()
+            if key == 'BootOrder':
+                state.order = [b.strip().upper() for b in value.split(',') if b.strip()]
+            elif key == 'Timeout':
+                num = value.split(None, 1)[0] if value else ''
+                state.timeout = int(num) if num.isdigit() else None
+            elif key == 'BootCurrent':
+                state.current = value.upper() or None
+            else:
+                state.next = value.upper() or None
+            continue
+        # Indented `data:` rows (efibootmgr 18) carry the optional data as hex bytes
+        if last is not None and cont == 'data':
+            hex_digits = hex_digits.replace(' ', '')
+            if _HEX_RE.fullmatch(hex_digits):
+                last.optional_data = bytes.fromhex(hex_digits)
+    state.index_order()
+    return state
+
+
+def parse_efibootmgr(text: str) -> List[BootEntry]:
+    """Entries from `efibootmgr [-v]` output, in BootOrder like the efivarfs path."""
+    return scan_efibootmgr(text).to_entries()
 
 
 class LinuxBootManager:
-    def __init__(self) -> None:
-        self.efibootmgr = which('efibootmgr')
-        self.grub_reboot = which('grub-reboot')
-        self.grub_set_default = which('grub-set-default')
+    def __init__(self, efivars_root: Optional[str] = None, grub_cfg: Optional[str] = None,
+                 cache_dir: Optional[str] = None, grubenv: Optional[str] = None,
+                 tool_paths: Optional[Dict[str, str]] = None) -> None:
+        self.efivars = EfiVarStore(efivars_root)
+        self.grub_cfg = grub_cfg
+        self.grubenv = GrubEnv(grubenv)
+        self.grub_cache = GrubMenuCache(cache_dir)
+        # Paths already resolved (and vetted) elsewhere, e.g. by the unelevated parent
+        tool_paths = tool_paths or {}
+        self.efibootmgr = tool_paths.get('efibootmgr') or which('efibootmgr')
+        self.grub_reboot = tool_paths.get('grub-reboot') or which('grub-reboot')
+        self.grub_set_default = tool_paths.get('grub-set-default') or which('grub-set-default')
+
+    def tool_paths(self) -> Dict[str, Optional[str]]:
+        return {'efibootmgr': self.efibootmgr, 'grub-reboot': self.grub_reboot,
+                'grub-set-default': self.grub_set_default}
 
+    @traced('LinuxBootManager.available')
     def available(self) -> bool:
-        return self.efibootmgr is not None or self.grub_reboot is not None
+        return (self.efivars.available() or self.efibootmgr is not None
+                or self.grub_reboot is not None or self.grubenv.exists())
+
+    def cache_key(self) -> str:
+        return f'linux|{self.efivars.root}|{self.grub_cfg or ""}|{self.grubenv.path}'
+
+    def fingerprint(self) -> str | None:
+        """Cheap change detector: efivarfs dir mtime, Boot#### inode set, grub.cfg/grubenv stat."""
+        parts: list = []
+        try:
+            parts.append(('efivars', os.stat(self.efivars.root).st_mtime_ns))
+            with os.scandir(self.efivars.root) as it:
+                for de in it:
+                    if not de.name.startswith('Boot'):
+                        continue
+                    if de.name.startswith(('BootNext-', 'BootOrder-', 'BootCurrent-')):
+                        st = de.stat(follow_symlinks=False)
+                        parts.append((de.name, de.inode(), st.st_mtime_ns, st.st_size))
+                    else:
+                        parts.append((de.name, de.inode()))
+        except OSError:
+            parts.append(('efivars', None))
+        for path in (self.grub_cfg or find_grub_cfg(), self.grubenv.path):
+            try:
+                st = os.stat(path) if path else None
+                parts.append((path, st and (st.st_mtime_ns, st.st_size, st.st_ino)))
+            except OSError:
+                parts.append((path, None))
+        parts.sort(key=repr)
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
 
+    def watch_paths(self) -> List[tuple]:
+        """`(directory, name prefixes)` whose changes can alter `list_entries()`.
+
+        Directories rather than files: grub-mkconfig replaces grub.cfg by rename.
+        """
+        out = [(self.efivars.root, ('Boot', 'Timeout-'))]
+        for path in (self.grubenv.path, self.grub_cfg or find_grub_cfg()):
+            if path:
+                out.append((os.path.dirname(path) or '.', (os.path.basename(path),)))
+        return out
+
+    @traced('LinuxBootManager.list_entries')
     def list_entries(self) -> List[BootEntry]:
         entries: List[BootEntry] = []
+        # Native path: read BootCurrent/BootNext/BootOrder/Boot#### from efivarfs
+        if self.efivars.available():
+            try:
+                return self.efivars.read_state().to_entries()
+            except OSError:
+                pass  # unreadable variable; fall back to efibootmgr
         if self.efibootmgr:
-            cp = run([self.efibootmgr])
-            text = cp.stdout
-            # Parse BootCurrent and BootNext
-            current = re.search(r"BootCurrent:\s*(\w+)", text)
-            next_ = re.search(r"BootNext:\s*(\w+)", text)
-            cur = current.group(1) if current else None
-            nxt = next_.group(1) if next_ else None
-            for m in re.finditer(r"Boot(\w+)\*?\s+(.+)", text):
-                bid, desc = m.group(1), m.group(2).strip()
-                entries.append(BootEntry(id=bid, description=desc, is_current=(bid==cur), is_next=(bid==nxt), extra=None))
-            return entries
-        # Fallback grub: list from /boot/grub/grub.cfg is complex; we provide minimal stub
-        if self.grub_reboot:
-            # Try grub-editenv list to get saved_entry
-            ge = which('grub-editenv')
-            if ge:
-                cp = run([ge, 'list'])
-                text = cp.stdout
-                m = re.search(r"saved_entry=(.+)", text)
-                saved = m.group(1) if m else None
-                # Not enumerating actual menuentries; provide generic entries
-                return [
-                    BootEntry(id='0', description='GRUB default entry', is_current=False, is_next=(saved=='0'))
-                ]
+            cp = run(self._efibootmgr_listing_argv(), readonly=True)
+            return parse_efibootmgr(cp.stdout)
+        # Fallback grub: enumerate menu entries from grub.cfg (cached by mtime/size/inode)
+        if self.grub_reboot or self.grubenv.exists():
+            return self._grub_entries()
         return entries
 
+    def _efibootmgr_listing_argv(self) -> List[str]:
+        # -v adds device paths, so `extra` matches the efivarfs path
+        return [self.efibootmgr, '-v']
+
+    def _grub_entries(self) -> List[BootEntry]:
+        # saved_entry/next_entry straight from the grubenv block
+        env = self.grubenv.read()
+        menu = self._grub_menu()
+        if not menu:
+            return [
+                BootEntry(id='0', description='GRUB default entry', is_current=False, is_next=(env.get('next_entry') == '0'))
+            ]
+        return [
+            BootEntry(
+                id=m.path,
+                description=' > '.join(m.titles),
+                is_current=m.matches(env.get('saved_entry')),
+                is_next=m.matches(env.get('next_entry')),
+                extra=m.index_path,
+            ) for m in menu
+        ]
+
+    def _grub_menu(self) -> List[GrubMenuEntry]:
+        cfg = self.grub_cfg or find_grub_cfg()
+        if not cfg:
+            return []
+        try:
+            return self.grub_cache.load(cfg)
+        except OSError:
+            return []
+
+    @traced('LinuxBootManager.set_next')
     def set_next(self, entry_id: str) -> tuple[bool, str]:
-        # Prefer efibootmgr BootNext
+        # Prefer writing BootNext straight to efivarfs
+        if self.efivars.available():
+            if not is_admin():
+                return False, '需要root权限才能写入 BootNext'
+            try:
+                self.efivars.set_boot_next(entry_id)
+                return True, '已设置下次启动项: ' + entry_id
+            except OSError as e:
+                if not self.efibootmgr:
+                    return False, f'写入 BootNext 失败: {e}'
+        # Fall back to efibootmgr BootNext
         if self.efibootmgr:
             if not is_admin():
                 return False, '需要root权限运行 efibootmgr 才能设置 BootNext'
@@ -53,7 +221,15 @@ class LinuxBootManager:
             if cp.returncode == 0:
                 return True, '已设置下次启动项: ' + entry_id
             return False, cp.stderr or cp.stdout
-        # Fallback grub-reboot
+        # Fallback GRUB: write next_entry into grubenv in place
+        if self.grubenv.exists():
+            if not is_admin():
+                return False, '需要root权限才能写入 grubenv'
+            try:
+                self.grubenv.set_next_entry(entry_id)
+                return True, '已设置 GRUB 下次启动项: ' + entry_id
+            except OSError as e:
+                return False, f'写入 grubenv 失败: {e}'
         if self.grub_reboot:
             if not is_admin():
                 return False, '需要root权限运行 grub-reboot 才能设置下次启动项'
@@ -63,6 +239,51 @@ class LinuxBootManager:
             return False, cp.stderr or cp.stdout
         return False, '未找到可用的引导管理工具 (efibootmgr/grub-reboot)'
 
+    @traced('LinuxBootManager.clear_next')
+    def clear_next(self) -> tuple[bool, str]:
+        """Remove a pending one-time BootNext."""
+        if not is_admin():
+            return False, '需要root权限才能清除 BootNext'
+        if self.efivars.available():
+            try:
+                self.efivars.clear_boot_next()
+                return True, '已清除下次启动项'
+            except OSError as e:
+                if not self.efibootmgr:
+                    return False, f'删除 BootNext 失败: {e}'
+        if self.efibootmgr:
+            cp = run([self.efibootmgr, '-N'])
+            if cp.returncode == 0:
+                return True, '已清除下次启动项'
+            return False, cp.stderr or cp.stdout
+        if self.grubenv.exists():
+            try:
+                self.grubenv.clear_next_entry()
+                return True, '已清除 GRUB 下次启动项'
+            except OSError as e:
+                return False, f'写入 grubenv 失败: {e}'
+        return False, '未找到可用的引导管理工具 (efivarfs/efibootmgr/grubenv)'
+
+    @traced('LinuxBootManager.set_order')
+    def set_order(self, order: List[str]) -> tuple[bool, str]:
+        """Rewrite BootOrder (persistent)."""
+        if not is_admin():
+            return False, '需要root权限才能修改 BootOrder'
+        if self.efivars.available():
+            try:
+                self.efivars.set_boot_order(order)
+                return True, '已设置启动顺序: ' + ','.join(order)
+            except OSError as e:
+                if not self.efibootmgr:
+                    return False, f'写入 BootOrder 失败: {e}'
+        if self.efibootmgr:
+            cp = run([self.efibootmgr, '-o', ','.join(order)])
+            if cp.returncode == 0:
+                return True, '已设置启动顺序: ' + ','.join(order)
+            return False, cp.stderr or cp.stdout
+        return False, '未找到可用的 UEFI 变量接口 (efivarfs/efibootmgr)'
+
+    @traced('LinuxBootManager.reboot_now')
     def reboot_now(self) -> tuple[bool, str]:
         if not is_admin():
             return False, '需要root权限才能重启系统'
@@ -0,0 +1,478 @@
+"""Identify the OS behind each boot entry without os-prober.
+
+A probe reads a handful of files from one filesystem: `/etc/os-release`
+(or `/usr/lib/os-release`), the CurrentVersion key of the Windows SOFTWARE
+hive, GRUB's `search --fs-uuid` lines under `EFI/*/grub.cfg`, `root=` from a
+separate /boot's grub.cfg and from systemd-boot loader entries. Mounted
+filesystems are read in place; unmounted ones only with `mount=True` (root),
+through a short read-only mount. Probes of different partitions run
+concurrently on daemon threads within a time budget, and their results are
+cached on disk, keyed by PARTUUID and a filesystem generation.
+
+An entry is labelled from its ESP's facts and the filesystem they point to,
+falling back to what the loader path alone says (`\\EFI\\ubuntu\\...`).
+"""
+from __future__ import annotations
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sys_switch.models import BootEntry
+from .blockdev import BlockDevice, BlockDeviceIndex, default_root, device_index
+from .common import is_admin, run, user_cache_dir
+
+DEFAULT_BUDGET = 3.0  # seconds for all probes of one detect() call
+_CACHE_VERSION = 1
+_CACHE_MAX_AGE = 30 * 86400  # re-probe eventually even if the generation looks unchanged
+_MOUNTABLE = {'ext2', 'ext3', 'ext4', 'xfs', 'btrfs', 'f2fs', 'vfat', 'ntfs', 'ntfs3', 'exfat'}
+_HEADER_BYTES = 4096  # ext superblock, FAT boot sector + FSInfo, NTFS boot sector
+
+_LOADER_RE = re.compile(r'(?:File\()?(\\[^()\t/]*?\.efi)', re.IGNORECASE)
+_GRUB_SEARCH_RE = re.compile(r'^\s*search(?:\.fs_uuid\s+|\s+.*--fs-uuid\s+(?:--set(?:=\w+)?\s+)?)([0-9A-Fa-f-]+)',
+                             re.MULTILINE)
+_ROOT_ARG_RE = re.compile(r'(?:^|\s)root=((?:UUID|PARTUUID)=[0-9A-Fa-f-]+|/dev/[\w/.-]+)')
+_OS_RELEASE_RE = re.compile(r'^([A-Z_]+)=(.*)$', re.MULTILINE)
+# Firmware tools that live next to an OS loader but do not boot that OS
+_TOOL_LOADER_RE = re.compile(r'\\(?:fwupd\w*|mm\w*|fb\w*|shell\w*|memtest\w*)\.efi$', re.IGNORECASE)
+
+# ESP directory -> (os id, name, family) when nothing better is readable
+_LOADER_DIRS = {
+    'microsoft': ('windows', 'Windows', 'windows'),
+    'ubuntu': ('ubuntu', 'Ubuntu', 'linux'),
+    'debian': ('debian', 'Debian GNU/Linux', 'linux'),
+    'fedora': ('fedora', 'Fedora Linux', 'linux'),
+    'centos': ('centos', 'CentOS', 'linux'),
+    'redhat': ('rhel', 'Red Hat Enterprise Linux', 'linux'),
+    'rocky': ('rocky', 'Rocky Linux', 'linux'),
+    'almalinux': ('almalinux', 'AlmaLinux', 'linux'),
+    'opensuse': ('opensuse', 'openSUSE', 'linux'),
+    'sles': ('sles', 'SUSE Linux Enterprise', 'linux'),
+    'arch': ('arch', 'Arch Linux', 'linux'),
+    'manjaro': ('manjaro', 'Manjaro Linux', 'linux'),
+    'pop': ('pop', 'Pop!_OS', 'linux'),
+    'neon': ('neon', 'KDE neon', 'linux'),
+    'nixos': ('nixos', 'NixOS', 'linux'),
+}
+
+
+@dataclass
+class OsInfo:
+    id: str
+    name: str
+    version: Optional[str] = None
+    family: Optional[str] = None  # 'linux' | 'windows'
+    source: str = 'loader'  # 'os-release' | 'registry' | 'loader'
+    device: Optional[str] = None  # kernel name of the filesystem the answer came from
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @property
+    def label(self) -> str:
+        return f'{self.name} {self.version}' if self.version and self.version not in self.name else self.name
+
+
+def loader_path(entry: BootEntry) -> str | None:
+    m = _LOADER_RE.search(entry.extra or '')
+    return m.group(1) if m else None
+
+
+def _loader_dir(path: str | None) -> str | None:
+    if path and _TOOL_LOADER_RE.search(path):
+        return None
+    parts = [p for p in (path or '').split('\\') if p]
+    return parts[1].lower() if len(parts) >= 3 and parts[0].lower() == 'efi' else None
+
+
+# --- reading one filesystem ---
+def _find_ci(base: str, rel: str) -> str | None:
+    """`rel` under `base`, matching each component case-insensitively (NTFS, FAT)."""
+    path = base
+    for part in rel.split('/'):
+        candidate = os.path.join(path, part)
+        if os.path.lexists(candidate):
+            path = candidate
+            continue
+        try:
+            names = os.listdir(path)
+        except OSError:
+            return None
+        want = part.lower()
+        match = next((n for n in names if n.lower() == want), None)
+        if match is None:
+            return None
+        path = os.path.join(path, match)
+    return path
+
+
+def _read_text(path: str | None, limit: int = 1 << 20) -> str | None:
+    if not path:
+        return None
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            return f.read(limit)
+    except OSError:
+        return None
+
+
+def _os_release(base: str) -> dict | None:
+    for rel in ('etc/os-release', 'usr/lib/os-release'):
+        text = _read_text(os.path.join(base, rel))
+        if text:
+            values = {k: v.strip().strip('"\'') for k, v in _OS_RELEASE_RE.findall(text)}
+            keep = {k: values[k] for k in ('ID', 'NAME', 'PRETTY_NAME', 'VERSION_ID') if values.get(k)}
+            if keep:
+                return keep
+    return None
+
+
+def _windows_version(base: str) -> dict | None:
+    hive_path = _find_ci(base, 'Windows/System32/config/SOFTWARE')
+    if not hive_path:
+        return None
+    from .bcdhive import HiveError, RegistryHive
+    out = {'ProductName': 'Windows'}
+    try:
+        with RegistryHive(hive_path) as hive:
+            key = hive.open('Microsoft\\Windows NT\\CurrentVersion')
+            for name in ('ProductName', 'EditionID', 'DisplayVersion', 'ReleaseId', 'CurrentBuild'):
+                v = key.value(name)
+                if v is not None and isinstance(v.data, str) and v.data:
+                    out[name] = v.data
+    except (OSError, HiveError):
+        pass  # a Windows directory without a readable hive is still Windows
+    return out
+
+
+def _esp_facts(base: str) -> Tuple[Dict[str, str], List[str]]:
+    """GRUB `search --fs-uuid` per EFI/<dir>, and systemd-boot entries' root= values."""
+    grub: Dict[str, str] = {}
+    efi = _find_ci(base, 'EFI')
+    for cfg in sorted(glob.glob(os.path.join(glob.escape(efi), '*', '[gG][rR][uU][bB].[cC][fF][gG]'))) if efi else ():
+        m = _GRUB_SEARCH_RE.search(_read_text(cfg) or '')
+        if m:
+            grub[os.path.basename(os.path.dirname(cfg)).lower()] = m.group(1).lower()
+    roots: List[str] = []
+    entries_dir = _find_ci(base, 'loader/entries')
+    for conf in sorted(glob.glob(os.path.join(glob.escape(entries_dir), '*.conf'))) if entries_dir else ():
+        m = _ROOT_ARG_RE.search(_read_text(conf) or '')
+        if m and m.group(1) not in roots:
+            roots.append(m.group(1))
+    return grub, roots
+
+
+def _boot_root(base: str) -> str | None:
+    """root= from the kernel lines of a /boot (or root) filesystem's grub.cfg."""
+    for rel in ('grub/grub.cfg', 'grub2/grub.cfg', 'boot/grub/grub.cfg', 'boot/grub2/grub.cfg'):
+        m = _ROOT_ARG_RE.search(_read_text(os.path.join(base, rel), limit=4 << 20) or '')
+        if m:
+            return m.group(1)
+    return None
+
+
+def probe_path(base: str) -> dict:
+    """Facts about the filesystem mounted at `base` (keys present only when found)."""
+    facts: dict = {}
+    release = _os_release(base)
+    if release:
+        facts['os_release'] = release
+    windows = _windows_version(base)
+    if windows:
+        facts['windows'] = windows
+    grub, roots = _esp_facts(base)
+    if grub:
+        facts['grub'] = grub
+    if roots:
+        facts['loader_roots'] = roots
+    boot_root = None if release else _boot_root(base)
+    if boot_root:
+        facts['boot_root'] = boot_root
+    return facts
+
+
+# Files whose change can change probe_path(); stat'ed to form a mounted filesystem's generation
+_MARKERS = ('etc/os-release', 'usr/lib/os-release', 'Windows/System32/config/SOFTWARE', 'EFI', 'loader/entries',
+            'grub/grub.cfg', 'grub2/grub.cfg', 'boot/grub/grub.cfg', 'boot/grub2/grub.cfg')
+
+
+def _mounted_generation(base: str) -> str:
+    parts = []
+    paths = [_find_ci(base, rel) for rel in _MARKERS]
+    efi = paths[3]
+    if efi:
+        paths += sorted(glob.glob(os.path.join(glob.escape(efi), '*', '*.[cC][fF][gG]')))
+    for path in paths:
+        try:
+            st = os.stat(path) if path else None
+        except OSError:
+            st = None
+        parts.append(st and (st.st_mtime_ns, st.st_size, st.st_ino))
+    return 'm:' + hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+# --- the detector ---
+class OsDetector:
+    def __init__(self, index: BlockDeviceIndex | None = None, root: str | None = None,
+                 cache_path: str | None = None, mount: bool = False, budget: float = DEFAULT_BUDGET,
+                 workers: int = 8) -> None:
+        self.root = root or default_root()
+        self.index = index if index is not None else device_index(self.root)
+        self.cache_path = cache_path if cache_path is not None else os.path.join(user_cache_dir(), 'osdetect.json')
+        # Real mounts only against the real system, never against a fixture tree
+        self.mount = mount and self.root == '/' and is_admin()
+        self.budget = budget
+        self.workers = workers
+        self._cache: dict | None = None
+        self._dirty = False
+        self._facts: Dict[str, dict] = {}  # kernel name -> facts, for this detect() call
+
+    # cache
+    def _load_cache(self) -> dict:
+        if self._cache is None:
+            try:
+                with open(self.cache_path, encoding='utf-8') as f:
+                    data = json.load(f)
+                self._cache = data['filesystems'] if data.get('version') == _CACHE_VERSION else {}
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                self._cache = {}
+        return self._cache
+
+    def _save_cache(self) -> None:
+        if not self._dirty or not self.cache_path:
+            return
+        tmp = f'{self.cache_path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'version': _CACHE_VERSION, 'filesystems': self._cache}, f, ensure_ascii=False)
+            os.replace(tmp, self.cache_path)
+            self._dirty = False
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+
+    @staticmethod
+    def _key(dev: BlockDevice) -> str:
+        return dev.partuuid or dev.uuid or dev.name
+
+    # generation and access
+    def _mounted(self, dev: BlockDevice) -> str | None:
+        for mp in dev.mountpoints:
+            path = os.path.join(self.root, mp.lstrip('/'))
+            if os.path.isdir(path):
+                return path
+        return None
+
+    def _generation(self, dev: BlockDevice) -> str | None:
+        """Changes whenever the filesystem may have; None when it cannot be determined."""
+        base = self._mounted(dev)
+        if base:
+            return _mounted_generation(base)
+        # Unmounted: the on-disk header. ext* superblocks record every mount and write, FAT's
+        # FSInfo its free count; NTFS only changes here on reformat, hence the cache max age.
+        try:
+            with open(os.path.join(self.root, 'dev', dev.name), 'rb') as f:
+                head = f.read(_HEADER_BYTES)
+        except OSError:
+            return None
+        return f'd:{dev.size}:' + hashlib.sha1(head).hexdigest()
+
+    def _readable(self, dev: BlockDevice) -> bool:
+        return self._mounted(dev) is not None or (self.mount and dev.fstype in _MOUNTABLE)
+
+    @contextlib.contextmanager
+    def _access(self, dev: BlockDevice, timeout: float) -> Iterator[str | None]:
+        base = self._mounted(dev)
+        if base or not self.mount or dev.fstype not in _MOUNTABLE:
+            yield base
+            return
+        target = tempfile.mkdtemp(prefix='sys_switch-probe-')
+        opts = 'ro,nosuid,nodev,noexec' + (',noload' if dev.fstype in ('ext3', 'ext4') else '')  # no journal replay
+        try:
+            cp = run(['mount', '-o', opts, dev.path, target], timeout=max(1.0, timeout))
+            if cp.returncode != 0:
+                yield None
+                return
+            try:
+                yield target
+            finally:
+                if run(['umount', target], timeout=10).returncode != 0:
+                    run(['umount', '-l', target], timeout=10)
+        finally:
+            with contextlib.suppress(OSError):
+                os.rmdir(target)
+
+    def _probe(self, dev: BlockDevice, rec: dict | None, now: float,
+               deadline: float) -> Tuple[dict | None, dict | None]:
+        """`(facts, new cache record)`: the cached facts while the generation holds, else a fresh read.
+
+        facts is None when the filesystem could not be read; the record is None when nothing was probed.
+        """
+        fresh = rec is not None and now - rec.get('probed', 0) < _CACHE_MAX_AGE
+        readable = self._readable(dev)
+        if not fresh and not readable:
+            return None, None
+        generation = self._generation(dev)
+        # An unreadable generation (not root, not mounted) trusts the last probe
+        if fresh and (generation is None or generation == rec.get('generation')):
+            return rec.get('facts') or {}, None
+        if not readable:
+            return None, None
+        with self._access(dev, deadline - time.monotonic()) as base:
+            if base is None:
+                return None, None
+            facts = probe_path(base)
+        return facts, {'generation': generation, 'probed': now, 'facts': facts}
+
+    def probe_many(self, devices: Iterable[BlockDevice], deadline: float) -> None:
+        """Fill `_facts` for `devices`, from the cache when their generation is unchanged.
+
+        Even the generation check stats the filesystem, so every device is handled
+        on a daemon thread; one stuck past `deadline` is abandoned and cannot
+        hold up the process exit.
+        """
+        cache = self._load_cache()
+        todo = list({dev.name: dev for dev in devices if dev.name not in self._facts}.values())
+        if not todo:
+            return
+        now = time.time()
+        results = _map_until(lambda dev: self._probe(dev, cache.get(self._key(dev)), now, deadline),
+                             todo, self.workers, deadline)
+        for dev, (facts, rec) in zip(todo, results):
+            if facts is None:
+                continue
+            self._facts[dev.name] = facts
+            if rec is not None:
+                cache[self._key(dev)] = rec
+                self._dirty = True
+
+    # resolution
+    def _resolve_spec(self, spec: str) -> BlockDevice | None:
+        kind, _, value = spec.partition('=')
+        if kind == 'UUID':
+            return self.index.by_fs_uuid(value)
+        if kind == 'PARTUUID':
+            return self.index.by_partuuid(value)
+        return self.index.get(os.path.basename(spec))
+
+    def _targets(self, esp: BlockDevice, loader_dir: str | None) -> List[BlockDevice]:
+        facts = self._facts.get(esp.name) or {}
+        out: List[BlockDevice] = []
+        if loader_dir == 'microsoft':
+            # Windows lives on an NTFS partition, usually on the same disk as its ESP
+            ntfs = [d for d in self.index.devices.values() if d.fstype in ('ntfs', 'ntfs3') and d.partition]
+            out = sorted(ntfs, key=lambda d: (d.disk != esp.disk, d.name))
+        elif loader_dir and loader_dir in facts.get('grub', {}):
+            dev = self.index.by_fs_uuid(facts['grub'][loader_dir])
+            out = [dev] if dev else []
+        elif loader_dir in ('systemd', 'boot'):
+            out = [d for d in map(self._resolve_spec, facts.get('loader_roots', ())) if d]
+        return out
+
+    def _info_from(self, dev: BlockDevice) -> OsInfo | None:
+        facts = self._facts.get(dev.name) or {}
+        rel = facts.get('os_release')
+        if rel:
+            return OsInfo(id=rel.get('ID', 'linux'), name=rel.get('PRETTY_NAME') or rel.get('NAME') or 'Linux',
+                          version=rel.get('VERSION_ID'), family='linux', source='os-release', device=dev.name)
+        win = facts.get('windows')
+        if win:
+            name = win.get('ProductName', 'Windows')
+            build = win.get('CurrentBuild', '')
+            if build.isdigit() and int(build) >= 22000:
+                name = name.replace('Windows 10', 'Windows 11')  # ProductName was never bumped for 11
+            return OsInfo(id='windows', name=name, version=win.get('DisplayVersion') or win.get('ReleaseId'),
+                          family='windows', source='registry', device=dev.name)
+        return None
+
+    def detect(self, entries: Iterable[BootEntry]) -> Dict[str, OsInfo]:
+        """Entry ID -> OsInfo for the entries whose OS could be told at all."""
+        deadline = time.monotonic() + self.budget
+        entries = list(entries)
+        espdev = {e.id: self.index.for_entry(e) for e in entries}
+        loader = {e.id: _loader_dir(loader_path(e)) for e in entries}
+        self.probe_many({d.name: d for d in espdev.values() if d}.values(), deadline)
+        # Up to two hops: ESP -> filesystem GRUB/systemd-boot name -> root named by a separate /boot
+        plans: Dict[str, List[BlockDevice]] = {}
+        for e in entries:
+            esp = espdev[e.id]
+            if esp is not None:
+                plans[e.id] = self._targets(esp, loader[e.id])
+        for _hop in range(2):
+            wanted = {d.name: d for targets in plans.values() for d in targets}
+            self.probe_many(wanted.values(), deadline)
+            for targets in plans.values():
+                for d in list(targets):
+                    spec = (self._facts.get(d.name) or {}).get('boot_root')
+                    nxt = self._resolve_spec(spec) if spec else None
+                    if nxt is not None and nxt not in targets:
+                        targets.append(nxt)
+        self._save_cache()
+
+        out: Dict[str, OsInfo] = {}
+        for e in entries:
+            esp = espdev[e.id]
+            info = None
+            for dev in ([esp] if esp else []) + plans.get(e.id, []):
+                info = self._info_from(dev)
+                if info:
+                    break
+            if info is None:
+                known = _LOADER_DIRS.get(loader[e.id] or '')
+                if known:
+                    info = OsInfo(id=known[0], name=known[1], family=known[2], device=esp.name if esp else None)
+            if info is not None:
+                out[e.id] = info
+        return out
+
+
+def _map_until(fn, items: List, workers: int, deadline: float) -> List[tuple]:
+    """`fn(item)` for each item on at most `workers` daemon threads.
+
+    Returns the results in order; an item that failed, or was not finished by
+    `deadline` (time.monotonic()), gets `(None, None)`.
+    """
+    results: List[tuple] = [(None, None)] * len(items)
+    pending = list(enumerate(items))
+    remaining = [len(items)]
+    cond = threading.Condition()
+
+    def worker() -> None:
+        while True:
+            with cond:
+                if not pending or time.monotonic() >= deadline:
+                    return
+                i, item = pending.pop(0)
+            try:
+                result = fn(item)
+            except Exception:  # one unreadable filesystem must not hide the others
+                result = (None, None)
+            with cond:
+                results[i] = result
+                remaining[0] -= 1
+                cond.notify_all()
+
+    for n in range(min(workers, len(items))):
+        threading.Thread(target=worker, name=f'sys_switch-osprobe-{n}', daemon=True).start()
+    with cond:
+        cond.wait_for(lambda: remaining[0] == 0, timeout=max(0.0, deadline - time.monotonic()))
+        # Probes still running finish in the background; their results are dropped
+        return list(results)
+
+
+_detect_lock = threading.Lock()
+
+
+def detect_os(entries: Iterable[BootEntry], mount: bool = False, budget: float = DEFAULT_BUDGET,
+              root: str | None = None) -> Dict[str, OsInfo]:
+    """Convenience wrapper: one detector over the cached block-device index."""
+    with _detect_lock:  # one writer for the cache file per process
+        return OsDetector(root=root, mount=mount, budget=budget).detect(entries)
@@ -0,0 +1,406 @@
+"""systemd-boot backend: Boot Loader Spec entries and the loader's EFI variables.
+
+Entries come from `loader/entries/*.conf` (type #1) and `EFI/Linux/*.efi`
+unified kernel images (type #2) on the ESP and an XBOOTLDR partition. A .conf
+is a few short `key value` lines; of a UKI only the PE section table and the
+small `.osrel`/`.uname` sections are read, never the kernel or initrd.
+Parsed UKIs are remembered per path and stat, so a daemon re-listing after a
+change does not touch unchanged images again.
+
+"Next boot" is `LoaderEntryOneShot`, the persistent default is
+`LoaderEntryDefault`; both live in efivarfs under the loader vendor GUID as
+NUL-terminated UTF-16LE strings. `LoaderEntrySelected` names the entry this
+boot came from, `LoaderEntries` the ids (in menu order) the loader offered.
+
+`esp_root`/`xbootldr_root` (or SYS_SWITCH_ESP / SYS_SWITCH_XBOOTLDR) and the
+efivarfs root (SYS_SWITCH_EFIVARS) can point at fixture directories.
+"""
+from __future__ import annotations
+import errno
+import hashlib
+import os
+import re
+import struct
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .common import is_admin, run
+from .efivars import EfiVarError, EfiVarStore
+from sys_switch.models import BootEntry
+from sys_switch.trace import traced
+
+
+LOADER_GUID = '4a67b082-0a4c-41cf-b6c7-440b29bb8c4f'
+ESP_ENV = 'SYS_SWITCH_ESP'
+XBOOTLDR_ENV = 'SYS_SWITCH_XBOOTLDR'
+# Where bootctl looks for the ESP and the Extended Boot Loader partition
+ESP_CANDIDATES = ('/efi', '/boot', '/boot/efi')
+XBOOTLDR_CANDIDATES = ('/boot',)
+
+# `linux-6.8+3-1.conf`: boot counting suffix, not part of the entry id
+_BOOT_COUNT_RE = re.compile(r'\+\d+(?:-\d+)?(?=\.(?:conf|efi)$)', re.IGNORECASE)
+_VERSION_TOKEN_RE = re.compile(r'\d+|[A-Za-z]+|~')
+_OS_RELEASE_RE = re.compile(r'^([A-Z_]+)=(.*)$', re.MULTILINE)
+_CONF_KEYS = ('title', 'version', 'machine-id', 'sort-key')
+_PE_HEADER_BYTES = 4096
+_PE_SECTION_LIMIT = 64 * 1024  # .osrel/.uname are a few hundred bytes
+# Entries the loader synthesizes itself; they only show up in LoaderEntries
+_AUTO_TITLES = {
+    'auto-windows': 'Windows Boot Manager',
+    'auto-osx': 'macOS',
+    'auto-efi-shell': 'EFI Shell',
+    'auto-efi-default': 'EFI Default Loader',
+    'auto-reboot-to-firmware-setup': 'Reboot Into Firmware Interface',
+    'auto-poweroff': 'Power Off',
+    'auto-reboot': 'Reboot',
+}
+_LOADER_VARS = ('LoaderEntryOneShot', 'LoaderEntryDefault', 'LoaderEntrySelected', 'LoaderEntries')
+
+
+@dataclass
+class LoaderEntry:
+    """One Boot Loader Spec entry as systemd-boot would show it."""
+    id: str  # file name without the boot counter: `arch.conf`, `fedora-6.8.efi`
+    path: str
+    title: Optional[str] = None
+    version: Optional[str] = None
+    machine_id: Optional[str] = None
+    sort_key: Optional[str] = None
+
+    def sort_tuple(self) -> tuple:
+        # BLS: entries with a sort-key first, by sort-key, machine-id, then newest version
+        return (self.sort_key is None, self.sort_key or '', self.machine_id or '',
+                _Reversed(_version_key(self.version or '')), _Reversed(_version_key(self.id)))
+
+
+def _version_key(text: str) -> tuple:
+    """Rough strverscmp(): digit runs compare numerically, `~` sorts before anything."""
+    out = []
+    for tok in _VERSION_TOKEN_RE.findall(text):
+        if tok == '~':
+            out.append((-1, 0, ''))
+        elif tok.isdigit():
+            out.append((1, int(tok), ''))
+        else:
+            out.append((0, 0, tok))
+    return tuple(out)
+
+
+class _Reversed:
+    __slots__ = ('key',)
+
+    def __init__(self, key: tuple) -> None:
+        self.key = key
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Reversed) and self.key == other.key
+
+    def __lt__(self, other: '_Reversed') -> bool:
+        return other.key < self.key
+
+
+def entry_id(filename: str) -> str:
+    return _BOOT_COUNT_RE.sub('', filename)
+
+
+def parse_conf(text: str) -> Dict[str, str]:
+    """The keys of a type #1 entry that matter for the menu; first occurrence wins."""
+    out: Dict[str, str] = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        key, *value = line.split(None, 1)
+        if key in _CONF_KEYS and key not in out:
+            out[key] = value[0].strip() if value else ''
+    return out
+
+
+def read_pe_sections(path: str, names: Tuple[str, ...] = ('.osrel', '.uname')) -> Dict[str, bytes]:
+    """Contents of the named PE sections, reading only the headers and those sections."""
+    out: Dict[str, bytes] = {}
+    with open(path, 'rb') as f:
+        head = f.read(_PE_HEADER_BYTES)
+        if len(head) < 0x40 or head[:2] != b'MZ':
+            return out
+        pe = struct.unpack_from('<I', head, 0x3c)[0]
+        if pe + 24 > len(head) or head[pe:pe + 4] != b'PE\0\0':
+            return out
+        nsections, opt_size = struct.unpack_from('<H12xH', head, pe + 6)
+        table = pe + 24 + opt_size
+        end = table + 40 * nsections
+        if end > len(head):
+            f.seek(0)
+            head = f.read(end)
+            if len(head) < end:
+                return out
+        wanted = set(names)
+        for i in range(nsections):
+            raw_name, vsize, _vaddr, rsize, offset = struct.unpack_from('<8sIIII', head, table + 40 * i)
+            name = raw_name.rstrip(b'\0').decode('ascii', 'replace')
+            if name not in wanted or name in out:
+                continue
+            size = min(vsize or rsize, rsize, _PE_SECTION_LIMIT)
+            f.seek(offset)
+            out[name] = f.read(size)
+    return out
+
+
+def parse_os_release(text: str) -> Dict[str, str]:
+    return {k: v.strip().strip('"\'') for k, v in _OS_RELEASE_RE.findall(text)}
+
+
+def _ucs2_string(data: bytes) -> str:
+    return data.decode('utf-16-le', errors='replace').split('\0', 1)[0]
+
+
+def _ucs2_list(data: bytes) -> List[str]:
+    return [s for s in data.decode('utf-16-le', errors='replace').split('\0') if s]
+
+
+def _loader_dirs(root: str) -> Tuple[str, str]:
+    return os.path.join(root, 'loader', 'entries'), os.path.join(root, 'EFI', 'Linux')
+
+
+def find_esp() -> str | None:
+    env = os.environ.get(ESP_ENV)
+    if env:
+        return env
+    for path in ESP_CANDIDATES:
+        if os.path.isdir(os.path.join(path, 'loader')) or os.path.isdir(os.path.join(path, 'EFI', 'systemd')):
+            return path
+    return None
+
+
+def find_xbootldr(esp: str | None) -> str | None:
+    env = os.environ.get(XBOOTLDR_ENV)
+    if env:
+        return env
+    for path in XBOOTLDR_CANDIDATES:
+        if path != esp and os.path.isdir(os.path.join(path, 'loader', 'entries')):
+            return path
+    return None
+
+
+def loader_info(efivars_root: str | None = None) -> str | None:
+    """`LoaderInfo` ("systemd-boot 255.4-1") when systemd-boot started this boot."""
+    try:
+        var = EfiVarStore(efivars_root).read('LoaderInfo', LOADER_GUID)
+    except OSError:
+        return None
+    return _ucs2_string(var[1]) if var else None
+
+
+def booted_with_systemd_boot(efivars_root: str | None = None) -> bool:
+    info = loader_info(efivars_root)
+    return bool(info and info.startswith('systemd-boot'))
+
+
+class SystemdBootManager:
+    def __init__(self, esp_root: Optional[str] = None, xbootldr_root: Optional[str] = None,
+                 efivars_root: Optional[str] = None) -> None:
+        self.efivars = EfiVarStore(efivars_root)
+        self.esp = esp_root or find_esp()
+        self.xbootldr = xbootldr_root or find_xbootldr(self.esp)
+        self._uki_cache: Dict[str, Tuple[tuple, LoaderEntry]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def roots(self) -> List[str]:
+        # XBOOTLDR is often the ESP itself (/boot); read each directory once
+        return [r for r in dict.fromkeys((self.esp, self.xbootldr)) if r]
+
+    @traced('SystemdBootManager.available')
+    def available(self) -> bool:
+        if loader_info(self.efivars.root) is not None:
+            return True
+        return any(os.path.isdir(d) for root in self.roots for d in _loader_dirs(root))
+
+    def cache_key(self) -> str:
+        return f'systemd-boot|{self.efivars.root}|{self.esp or ""}|{self.xbootldr or ""}'
+
+    def fingerprint(self) -> str | None:
+        """Loader variables' stat plus name/mtime/size of every entry file."""
+        parts: list = []
+        for name in _LOADER_VARS:
+            try:
+                st = os.stat(self.efivars.path(name, LOADER_GUID))
+                parts.append((name, st.st_ino, st.st_mtime_ns, st.st_size))
+            except OSError:
+                parts.append((name, None))
+        for root in self.roots:
+            for directory in _loader_dirs(root):
+                try:
+                    with os.scandir(directory) as it:
+                        for de in it:
+                            st = de.stat()
+                            parts.append((de.path, st.st_mtime_ns, st.st_size))
+                except OSError:
+                    parts.append((directory, None))
+        parts.sort(key=repr)
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    def watch_paths(self) -> List[tuple]:
+        """`(directory, name prefixes)` whose changes can alter `list_entries()`."""
+        out = [(self.efivars.root, ('LoaderEntr',))]
+        for root in self.roots:
+            out.extend((d, ('',)) for d in _loader_dirs(root))
+        return out
+
+    # --- reading ---
+    def _read_var(self, name: str) -> bytes | None:
+        try:
+            var = self.efivars.read(name, LOADER_GUID)
+        except OSError:
+            return None
+        return var[1] if var else None
+
+    def _var_string(self, name: str) -> str | None:
+        data = self._read_var(name)
+        return (_ucs2_string(data) or None) if data else None
+
+    def _iter_files(self, directory: str, suffix: str) -> Iterator[os.DirEntry]:
+        try:
+            with os.scandir(directory) as it:
+                for de in it:
+                    if de.name.lower().endswith(suffix) and not de.name.startswith('.') and de.is_file():
+                        yield de
+        except OSError:
+            return
+
+    def _conf_entry(self, de: os.DirEntry) -> LoaderEntry | None:
+        try:
+            with open(de.path, encoding='utf-8', errors='replace') as f:
+                keys = parse_conf(f.read(64 * 1024))
+        except OSError:
+            return None
+        return LoaderEntry(id=entry_id(de.name), path=de.path, title=keys.get('title'), version=keys.get('version'),
+                           machine_id=keys.get('machine-id'), sort_key=keys.get('sort-key'))
+
+    def _uki_entry(self, de: os.DirEntry) -> LoaderEntry | None:
+        try:
+            st = de.stat()
+        except OSError:
+            return None
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            hit = self._uki_cache.get(de.path)
+        if hit and hit[0] == key:
+            return hit[1]
+        try:
+            sections = read_pe_sections(de.path)
+        except (OSError, struct.error):
+            return None
+        if '.osrel' not in sections:
+            return None  # not a UKI; systemd-boot skips it as well
+        osrel = parse_os_release(sections['.osrel'].decode('utf-8', 'replace'))
+        uname = sections.get('.uname', b'').rstrip(b'\0').decode('utf-8', 'replace').strip() or None
+        entry = LoaderEntry(
+            id=entry_id(de.name), path=de.path,
+            title=osrel.get('PRETTY_NAME') or osrel.get('NAME') or osrel.get('ID'),
+            version=uname or osrel.get('IMAGE_VERSION') or osrel.get('VERSION_ID'),
+            machine_id=None,
+            sort_key=osrel.get('IMAGE_ID') or osrel.get('ID'),
+        )
+        with self._lock:
+            self._uki_cache[de.path] = (key, entry)
+        return entry
+
+    def loader_entries(self) -> List[LoaderEntry]:
+        """Type #1 and #2 entries from the ESP and XBOOTLDR, in systemd-boot's menu order."""
+        found: Dict[str, LoaderEntry] = {}
+        for root in self.roots:
+            conf_dir, uki_dir = _loader_dirs(root)
+            for de in self._iter_files(conf_dir, '.conf'):
+                e = self._conf_entry(de)
+                if e is not None:
+                    found.setdefault(e.id, e)
+            for de in self._iter_files(uki_dir, '.efi'):
+                e = self._uki_entry(de)
+                if e is not None:
+                    found.setdefault(e.id, e)
+        return sorted(found.values(), key=LoaderEntry.sort_tuple)
+
+    @traced('SystemdBootManager.list_entries')
+    def list_entries(self) -> List[BootEntry]:
+        on_disk = self.loader_entries()
+        by_id = {e.id: e for e in on_disk}
+        seen = _ucs2_list(self._read_var('LoaderEntries') or b'')
+        # The loader's own list is its real menu order; files added since this boot follow it
+        ids = [i for i in seen if i in by_id or i in _AUTO_TITLES or i.startswith('auto-')]
+        ids += [e.id for e in on_disk if e.id not in ids]
+        selected = self._var_string('LoaderEntrySelected')
+        oneshot = self._var_string('LoaderEntryOneShot')
+        titles: Dict[str, int] = {}
+        for e in on_disk:
+            titles[e.title or e.id] = titles.get(e.title or e.id, 0) + 1
+        entries = []
+        for i in ids:
+            e = by_id.get(i)
+            if e is None:
+                desc, extra = _AUTO_TITLES.get(i, i), None
+            else:
+                desc, extra = e.title or e.id, e.path
+                # Same disambiguation as the menu: several entries share a title -> show the version
+                if titles[desc] > 1 and e.version:
+                    desc = f'{desc} ({e.version})'
+            entries.append(BootEntry(id=i, description=desc, is_current=(i == selected), is_next=(i == oneshot),
+                                     extra=extra))
+        return entries
+
+    def default_entry(self) -> str | None:
+        return self._var_string('LoaderEntryDefault')
+
+    # --- writing ---
+    def _known(self, entry_id: str) -> bool:
+        if entry_id in _ucs2_list(self._read_var('LoaderEntries') or b''):
+            return True
+        return any(e.id == entry_id for e in self.loader_entries())
+
+    def _write_string(self, name: str, value: str) -> None:
+        self.efivars.write(name, (value + '\0').encode('utf-16-le'), guid=LOADER_GUID)
+        if self._var_string(name) != value:
+            raise EfiVarError(errno.EIO, f'{name} 回读校验失败（期望 {value}）')
+
+    def _set_var(self, name: str, entry_id: str, label: str) -> tuple[bool, str]:
+        if not is_admin():
+            return False, f'需要root权限才能写入 {name}'
+        if not self._known(entry_id):
+            return False, f'未找到 systemd-boot 引导项: {entry_id}'
+        try:
+            self._write_string(name, entry_id)
+        except OSError as e:
+            return False, f'写入 {name} 失败: {e}'
+        return True, f'已设置{label}: {entry_id}'
+
+    @traced('SystemdBootManager.set_next')
+    def set_next(self, entry_id: str) -> tuple[bool, str]:
+        return self._set_var('LoaderEntryOneShot', entry_id, '下次启动项')
+
+    @traced('SystemdBootManager.set_default')
+    def set_default(self, entry_id: str) -> tuple[bool, str]:
+        """Persistent default (`LoaderEntryDefault`, like `bootctl set-default`)."""
+        return self._set_var('LoaderEntryDefault', entry_id, '默认启动项')
+
+    @traced('SystemdBootManager.clear_next')
+    def clear_next(self) -> tuple[bool, str]:
+        if not is_admin():
+            return False, '需要root权限才能清除 LoaderEntryOneShot'
+        try:
+            self.efivars.delete('LoaderEntryOneShot', LOADER_GUID)
+        except OSError as e:
+            return False, f'删除 LoaderEntryOneShot 失败: {e}'
+        if self._read_var('LoaderEntryOneShot') is not None:
+            return False, 'LoaderEntryOneShot 删除后仍然存在'
+        return True, '已清除下次启动项'
+
+    def set_order(self, order: List[str]) -> tuple[bool, str]:
+        return False, 'systemd-boot 的菜单顺序由引导项的 sort-key 和版本决定，无法直接设置'
+
+    @traced('SystemdBootManager.reboot_now')
+    def reboot_now(self) -> tuple[bool, str]:
+        if not is_admin():
+            return False, '需要root权限才能重启系统'
+        cp = run(['systemctl', 'reboot'])
+        return (cp.returncode == 0, cp.stderr or cp.stdout)
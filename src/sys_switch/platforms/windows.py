@@ -1,241 +1,220 @@
 from __future__ import annotations
-import re
-from typing import List
+import hashlib
+import os
+import tempfile
+import time
+from typing import List, Optional
 
+from .bcd import BOOTMGR_GUID, FWBOOTMGR_GUID, BcdSnapshot, normalize_identifier
+from .bcdhive import HiveError, load_bcd_snapshot
 from .common import run, which, is_admin
 from sys_switch.models import BootEntry
+from sys_switch.trace import traced
 
 
-_GUID_RE = r"\{[0-9a-fA-F-]{36}\}"
-_BRACE_TOKEN_RE = r"\{[^}]+\}"
+# available() and list_entries() are called back to back by both the CLI and
+# the GUI; reuse the capture taken by the former instead of re-running bcdedit.
+_SNAPSHOT_REUSE_SECONDS = 2.0
+
+
+def _bcd_hive_path() -> str | None:
+    """Path of the loaded BCD hive file, from HKLM\\SYSTEM\\...\\hivelist."""
+    try:
+        import winreg
+        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r'SYSTEM\CurrentControlSet\Control\hivelist') as k:
+            dev_path, _ = winreg.QueryValueEx(k, r'\REGISTRY\MACHINE\BCD00000000')
+    except (ImportError, OSError):
+        return None
+    if not dev_path:
+        return None
+    # `\Device\HarddiskVolume1\EFI\...` is reachable through the GLOBALROOT namespace
+    return '\\\\?\\GLOBALROOT' + dev_path
 
 
 class WindowsBootManager:
-    def __init__(self, show_recovery: bool = False) -> None:
+    def __init__(self, show_recovery: bool = False, store: Optional[str] = None) -> None:
         self.bcdedit = 'bcdedit'
         self.show_recovery = show_recovery
+        # Offline BCD hive (or `bcdedit /export` copy) to read instead of the system store
+        self.store = store
+        self._snapshot: BcdSnapshot | None = None
+        self._snapshot_at = 0.0
+
+    def _bcd_argv(self, args: List[str]) -> List[str]:
+        """bcdedit via cmd.exe to avoid PowerShell argument binding/brace issues."""
+        if self.store:
+            args = ['/store', self.store, *args]
+        return ['cmd.exe', '/d', '/c', self.bcdedit, *args]
 
-    def _run_bcd(self, args: List[str]):
-        """Run bcdedit via cmd.exe to avoid PowerShell argument binding/brace issues."""
-        return run(['cmd.exe', '/d', '/c', self.bcdedit, *args], hide_window=True)
+    def _run_bcd(self, args: List[str], readonly: bool = False):
+        return run(self._bcd_argv(args), hide_window=True, readonly=readonly)
 
+    @traced('WindowsBootManager.available')
     def available(self) -> bool:
-        if which(self.bcdedit) is None:
+        if self.store is None and which(self.bcdedit) is None:
             return False
-        cp = self._run_bcd(['/enum', 'firmware'])
-        return cp.returncode == 0 and (cp.stdout or '').strip() != ''
-
-    # --- Unchanged helper methods ---
-    def _find_default_and_bootseq(self, text: str) -> tuple[str | None, List[str]]:
-        current_fw = None
-        # Support both English and Chinese patterns
-        mdef = re.search(r"(?im)^\s*(?:default|默认)\s+(" + _GUID_RE + ")", text)
-        if mdef:
-            current_fw = mdef.group(1)
-        next_seq: List[str] = []
-        # Support both English and Chinese patterns for bootsequence
-        mseq = re.search(r"(?im)^\s*(?:bootsequence|启动序列)\s+((?:" + _GUID_RE + r"\s*)+)", text)
-        if mseq:
-            next_seq = re.findall(_GUID_RE, mseq.group(1))
-        return current_fw, next_seq
-
-    def _is_recovery_environment(self, block: str, description: str) -> bool:
-        """检测是否为 Windows 恢复环境条目"""
-        recovery_indicators = [
-            'Windows Recovery Environment',
-            'Windows 恢复环境',
-            'winre.wim',
-            'recovery',
-            '恢复'
-        ]
-        
-        # 检查描述中是否包含恢复环境的关键词
-        desc_lower = description.lower()
-        for indicator in recovery_indicators:
-            if indicator.lower() in desc_lower:
-                return True
-        
-        # 检查条目详细信息中是否包含恢复环境的关键词
-        block_lower = block.lower()
-        for indicator in recovery_indicators:
-            if indicator.lower() in block_lower:
-                return True
-                
-        return False
-
-    def _parse_description(self, text: str) -> str | None:
-        m = re.search(r"(?im)^(?:description|描述|说明|說明)\s+(.+)$", text)
-        if m:
-            return m.group(1).strip()
-        return None
+        return len(self.snapshot(max_age=0)) > 0
 
-    def _get_firmware_verbose(self) -> str:
-        cp = self._run_bcd(['/v', '/enum', 'firmware'])
-        return cp.stdout or ''
-
-    def _resolve_windows_bootmgr_guid(self) -> str | None:
-        text = self._get_firmware_verbose()
-        blocks = re.split(r"\r?\n\r?\n", text)
-        for b in blocks:
-            if ('Windows Boot Manager' in b) or ('Windows 启动管理器' in b):
-                mg = re.search(_GUID_RE, b)
-                if mg:
-                    return mg.group(0)
-            if '\\EFI\\Microsoft\\Boot\\bootmgfw.efi' in b:
-                mg = re.search(_GUID_RE, b)
-                if mg:
-                    return mg.group(0)
-        return None
+    def _capture_snapshot(self) -> BcdSnapshot:
+        if self.store:
+            try:
+                return load_bcd_snapshot(self.store)
+            except (OSError, HiveError):
+                return BcdSnapshot([])
+        snap = self._export_snapshot()
+        if snap is not None:
+            return snap
+        # Fall back to the localized text output
+        cp = self._run_bcd(['/v', '/enum', 'all'], readonly=True)
+        if cp.returncode != 0:
+            return BcdSnapshot([])
+        return BcdSnapshot.parse(cp.stdout or '')
 
-    def _is_firmware_application(self, gid: str) -> bool:
-        text = self._get_firmware_verbose()
-        blocks = re.split(r"\r?\n\r?\n", text)
-        for b in blocks:
-            if gid in b:
-                if ('固件应用程序' in b) or ('Firmware Application' in b):
-                    return True
-                if ('Windows 启动管理器' in b) or ('Windows Boot Manager' in b):
-                    return False
-                return True
-        return False
-    # --- End of unchanged helpers ---
-
-    def _get_firmware_manager_guid(self) -> str | None:
-        cp = self._run_bcd(['/v', '/enum', 'firmware'])
-        text = cp.stdout or ''
-        blocks = re.split(r"\r?\n\r?\n", text)
-        for b in blocks:
-            if re.search(r'^(Firmware Boot Manager|固件启动管理器)', b, re.MULTILINE):
-                match = re.search(r"(?:identifier|标识符)\s+(" + _GUID_RE + ")", b, re.IGNORECASE)
-                if match:
-                    return match.group(1)
-        return None
+    def _export_snapshot(self) -> BcdSnapshot | None:
+        """Export the system store to a temp hive and parse it without any locale dependence."""
+        with tempfile.TemporaryDirectory(prefix='sys_switch-') as tmp:
+            path = os.path.join(tmp, 'BCD')
+            cp = self._run_bcd(['/export', path])
+            if cp.returncode != 0:
+                return None
+            try:
+                return load_bcd_snapshot(path)
+            except (OSError, HiveError):
+                return None
+
+    def snapshot(self, max_age: float = _SNAPSHOT_REUSE_SECONDS) -> BcdSnapshot:
+        """Return the BCD snapshot, re-running bcdedit only if it is older than `max_age`.
 
-    def _get_fw_displayorder_tokens(self) -> List[str]:
-        cp_fw = self._run_bcd(['/enum', 'firmware'])
-        text_fw = cp_fw.stdout or ''
-        blocks = re.split(r"\r?\n\r?\n", text_fw)
-        for b in blocks:
-            if re.search(r'^(Firmware Boot Manager|固件启动管理器)', b, re.MULTILINE) or '{fwbootmgr}' in b.lower():
-                match = re.search(r'displayorder\s+((?:{[^}]+}\s*)+)', b, re.DOTALL | re.IGNORECASE)
-                if match:
-                    return re.findall(_BRACE_TOKEN_RE, match.group(1))
-        return []
-
-    def _set_fw_displayorder_prepend(self, target_id: str) -> tuple[bool, str]:
+        `available()` followed by `list_entries()` therefore costs a single
+        bcdedit process (`/export`, or `/v /enum all` as a fallback).
+        """
+        now = time.monotonic()
+        if self._snapshot is None or max_age <= 0 or now - self._snapshot_at > max_age:
+            self._snapshot = self._capture_snapshot()
+            self._snapshot_at = now
+        return self._snapshot
+
+    def invalidate(self) -> None:
+        self._snapshot = None
+
+    def cache_key(self) -> str:
+        return f'windows|{self.store or ""}|{int(self.show_recovery)}'
+
+    def fingerprint(self) -> str | None:
+        """Cheap change detector: BCD hive file timestamp plus key write times of the store."""
+        if self.store:
+            try:
+                st = os.stat(self.store)
+            except OSError:
+                return None
+            return f'{st.st_mtime_ns}:{st.st_size}'
+        try:
+            import winreg
+        except ImportError:
+            return None
+        parts: list = []
+        hive_file = _bcd_hive_path()
+        if hive_file:
+            try:
+                st = os.stat(hive_file)
+                parts.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                pass
+        # Registry key timestamps catch changes the lazily flushed hive file has not seen yet.
+        keys = (
+            r'BCD00000000\Objects',
+            rf'BCD00000000\Objects\{FWBOOTMGR_GUID}\Elements',
+            rf'BCD00000000\Objects\{FWBOOTMGR_GUID}\Elements\24000001',
+            rf'BCD00000000\Objects\{FWBOOTMGR_GUID}\Elements\24000002',
+            rf'BCD00000000\Objects\{BOOTMGR_GUID}\Elements',
+        )
+        for sub in keys:
+            try:
+                with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, sub) as k:
+                    parts.append(winreg.QueryInfoKey(k))
+            except OSError:
+                parts.append(None)
+        if not any(parts):
+            return None
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    def _get_firmware_manager_guid(self, snap: BcdSnapshot) -> str | None:
+        fw = snap.firmware_manager()
+        return fw.identifier if fw else None
+
+    def _set_fw_displayorder_prepend(self, fw_manager_guid: str, target_id: str) -> tuple[bool, str]:
         """
         THE ULTIMATE FIX: Use the bcdedit '/addfirst' switch, which is the designated,
         atomic, and simple way to move an entry to the top of an object list.
         This avoids all complex list rebuilding and parameter formatting issues.
         """
-        fw_manager_guid = self._get_firmware_manager_guid()
-        if not fw_manager_guid:
-            return False, '无法找到固件启动管理器的 GUID'
-
         # The command is simple: bcdedit /set {manager} displayorder {target} /addfirst
         cp = self._run_bcd(['/set', fw_manager_guid, 'displayorder', target_id, '/addfirst'])
         return (cp.returncode == 0, cp.stderr or cp.stdout)
 
+    @traced('WindowsBootManager.list_entries')
     def list_entries(self) -> List[BootEntry]:
+        return self._entries_from_snapshot(self.snapshot())
+
+    def _entries_from_snapshot(self, snap: BcdSnapshot) -> List[BootEntry]:
         entries: List[BootEntry] = []
-        
-        # Get firmware entries and their order
-        text_fw = self._run_bcd(['/enum', 'firmware']).stdout or ''
-        fw_mgr_block = ''
-        blocks = re.split(r"\r?\n\r?\n", text_fw)
-        for b in blocks:
-            if re.search(r'^(Firmware Boot Manager|固件启动管理器)', b, re.MULTILINE) or '{fwbootmgr}' in b.lower():
-                fw_mgr_block = b
-                break
-        
-        tokens = self._get_fw_displayorder_tokens()
-        current_fw, next_seq = self._find_default_and_bootseq(fw_mgr_block or text_fw)
-        
-        # Get the actual default from full verbose output for Windows Boot Manager
-        text_verbose = self._get_firmware_verbose()
-        windows_bootmgr_guid = None
-        windows_default_guid = None
-        
-        # Find Windows Boot Manager's GUID and its default
-        blocks_verbose = re.split(r"\r?\n\r?\n", text_verbose)
-        for b in blocks_verbose:
-            if ('Windows Boot Manager' in b or 'Windows 启动管理器' in b) and ('标识符' in b or 'identifier' in b):
-                # Get the GUID of Windows Boot Manager
-                guid_match = re.search(r"(?:identifier|标识符)\s+(" + _GUID_RE + ")", b, re.IGNORECASE)
-                if guid_match:
-                    windows_bootmgr_guid = guid_match.group(1)
-                
-                # Get the default entry
-                default_match = re.search(r"(?im)^\s*(?:default|默认)\s+(" + _GUID_RE + ")", b)
-                if default_match:
-                    windows_default_guid = default_match.group(1)
-                break
-        
+
+        # Firmware entries, their order and the one-time bootsequence
+        tokens = snap.displayorder()
+        next_seq = [normalize_identifier(t) for t in snap.bootsequence()]
+
+        # Windows Boot Manager's GUID and its default loader
+        bootmgr = snap.boot_manager()
+        windows_bootmgr_guid = bootmgr.identifier if bootmgr else None
+        windows_default = normalize_identifier(bootmgr.get('default') or '') if bootmgr else ''
+
         # Since firmware manager doesn't specify a default, assume first in displayorder is current
         # (this is typical UEFI behavior)
-        firmware_current = tokens[0] if tokens else None
-        
-        # Process firmware entries
         for i, tok in enumerate(tokens):
-            q = tok.strip('{}') if tok.lower() in ('{bootmgr}', '{fwbootmgr}') else tok
-            cp = self._run_bcd(['/enum', q])
-            block = cp.stdout or ''
-            desc = self._parse_description(block) or ('Windows Boot Manager' if tok.lower() == '{bootmgr}' else tok)
-            
+            obj = snap.get(tok)
+            is_bootmgr = obj is not None and obj is bootmgr
+            desc = (obj.description if obj else None) or ('Windows Boot Manager' if is_bootmgr else tok)
+
             # 过滤 Windows Recovery Environment 条目（如果设置为隐藏）
-            if not self.show_recovery and self._is_recovery_environment(block, desc):
+            if not self.show_recovery and obj is not None and obj.is_recovery():
                 continue
-            
+
             # Use the actual GUID for Windows Boot Manager if we found it
-            out_id = tok
-            if tok.lower() == '{bootmgr}' and windows_bootmgr_guid:
-                out_id = windows_bootmgr_guid
-                    
-            # First entry in displayorder is typically current (no explicit default in firmware manager)
+            out_id = windows_bootmgr_guid if (is_bootmgr and windows_bootmgr_guid) else tok
             is_current_entry = (i == 0)
-            
+
             entries.append(
                 BootEntry(
                     id=out_id,
                     description=desc,
                     is_current=is_current_entry,
-                    is_next=(len(next_seq) > 0 and (out_id == next_seq[0] or tok == next_seq[0])),
+                    is_next=(len(next_seq) > 0 and normalize_identifier(tok) == next_seq[0]),
                 )
             )
-            
+
             # If this is Windows Boot Manager and it's current, also add Windows entries
-            if tok.lower() == '{bootmgr}' and is_current_entry:
-                cp_win = self._run_bcd(['/enum', 'osloader'])
-                win_blocks = re.split(r"\r?\n\r?\n", cp_win.stdout or '')
-                for win_block in win_blocks:
-                    win_guid_match = re.search(r"(?:identifier|标识符)\s+(" + _GUID_RE + ")", win_block, re.IGNORECASE)
-                    if win_guid_match:
-                        win_guid = win_guid_match.group(1)
-                        win_desc = self._parse_description(win_block) or f"Windows Entry {win_guid}"
-                        
-                        # 过滤 Windows 恢复环境条目
-                        if not self.show_recovery and self._is_recovery_environment(win_block, win_desc):
-                            continue
-                        
-                        # Check if this Windows entry is the current default
-                        is_win_current = (win_guid == windows_default_guid)
-                        
-                        entries.append(
-                            BootEntry(
-                                id=win_guid,
-                                description=win_desc,
-                                is_current=is_win_current,
-                                is_next=False,  # Windows entries don't use firmware-level next boot
-                            )
+            if is_bootmgr and is_current_entry:
+                for loader in snap.osloaders():
+                    # 过滤 Windows 恢复环境条目
+                    if not self.show_recovery and loader.is_recovery():
+                        continue
+                    entries.append(
+                        BootEntry(
+                            id=loader.identifier,
+                            description=loader.description or f"Windows Entry {loader.identifier}",
+                            is_current=(loader.key == windows_default),
+                            is_next=False,  # Windows entries don't use firmware-level next boot
                         )
-        
+                    )
+
         return entries
 
+    @traced('WindowsBootManager.set_next')
     def set_next(self, entry_id: str) -> tuple[bool, str]:
         if not is_admin():
             return False, '需要以管理员身份运行才能修改 BCD'
         
-        fw_manager_guid = self._get_firmware_manager_guid()
+        fw_manager_guid = self._get_firmware_manager_guid(self.snapshot())
         if not fw_manager_guid:
             return False, '无法找到固件启动管理器的 GUID'
 
@@ -244,12 +223,13 @@ class WindowsBootManager:
 
         # First, try the non-permanent 'bootsequence' method.
         cp = self._run_bcd(['/set', fw_manager_guid, 'bootsequence', eid])
+        self.invalidate()
         if cp.returncode == 0:
             return True, '已设置下次启动项: ' + entry_id
             
         # If 'bootsequence' fails (as it does on your system), fall back to the
         # now-corrected permanent 'displayorder' method using '/addfirst'.
-        ok, msg = self._set_fw_displayorder_prepend(eid)
+        ok, msg = self._set_fw_displayorder_prepend(fw_manager_guid, eid)
         if ok:
              # The success message from bcdedit might be empty, so we provide a clear one.
              return True, f'已将 {entry_id} 置顶为默认启动项（持久）。'
@@ -259,6 +239,21 @@ class WindowsBootManager:
         displayorder_error = msg
         return False, f"Bootsequence failed: {bootsequence_error}\nDisplayorder failed: {displayorder_error}"
 
+    @traced('WindowsBootManager.clear_next')
+    def clear_next(self) -> tuple[bool, str]:
+        """Drop a pending one-time bootsequence from {fwbootmgr}."""
+        if not is_admin():
+            return False, '需要以管理员身份运行才能修改 BCD'
+        fw_manager_guid = self._get_firmware_manager_guid(self.snapshot())
+        if not fw_manager_guid:
+            return False, '无法找到固件启动管理器的 GUID'
+        cp = self._run_bcd(['/deletevalue', fw_manager_guid, 'bootsequence'])
+        self.invalidate()
+        if cp.returncode == 0:
+            return True, '已清除下次启动项'
+        return False, cp.stderr or cp.stdout
+
+    @traced('WindowsBootManager.reboot_now')
     def reboot_now(self) -> tuple[bool, str]:
         if not is_admin():
             return False, '需要管理员权限才能重启系统'
@@ -0,0 +1,177 @@
+from __future__ import annotations
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+
+class Span:
+    __slots__ = ('id', 'name', 'parent', 'start_ns', 'end_ns', 'tid', 'args')
+
+    def __init__(self, sid: int, name: str, parent: Optional['Span'], args: Dict[str, Any]) -> None:
+        self.id = sid
+        self.name = name
+        self.parent = parent
+        self.start_ns = 0
+        self.end_ns = 0
+        self.tid = threading.get_ident()
+        self.args = args
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set(self, **args: Any) -> None:
+        self.args.update(args)
+
+
+class _NoopSpan:
+    """Returned when tracing is off: entering, exiting and set() do nothing."""
+    __slots__ = ()
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def set(self, **args: Any) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar('sys_switch_span', default=None)
+
+
+class _ActiveSpan:
+    __slots__ = ('tracer', 'span', 'token')
+
+    def __init__(self, tracer: 'Tracer', span: Span) -> None:
+        self.tracer = tracer
+        self.span = span
+        self.token = None
+
+    def __enter__(self) -> Span:
+        self.token = _current.set(self.span)
+        self.span.start_ns = time.perf_counter_ns()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.span.end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.span.args['error'] = exc_type.__name__
+        _current.reset(self.token)
+        self.tracer._record(self.span)
+
+
+class Tracer:
+    """Collects spans for boot operations; disabled by default and then nearly free."""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._spans: Deque[Span] = deque()
+        self._origin_ns = time.perf_counter_ns()
+
+    def enable(self, max_spans: int | None = None) -> None:
+        with self._lock:
+            self._spans = deque(self._spans, maxlen=max_spans)
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+    def span(self, name: str, **args: Any):
+        if not self.enabled:
+            return _NOOP
+        return _ActiveSpan(self, Span(next(self._ids), name, _current.get(), args))
+
+    def _record(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return sorted(self._spans, key=lambda s: s.start_ns)
+
+    # --- export ---
+    def chrome_trace(self) -> dict:
+        """Chrome trace-event format (load in chrome://tracing or Perfetto)."""
+        pid = os.getpid()
+        events = []
+        for s in self.spans():
+            args = {k: _jsonable(v) for k, v in s.args.items()}
+            if s.parent is not None:
+                args['parent'] = s.parent.name
+            events.append({
+                'name': s.name,
+                'cat': s.name.split('.', 1)[0],
+                'ph': 'X',
+                'ts': (s.start_ns - self._origin_ns) / 1000.0,
+                'dur': (s.end_ns - s.start_ns) / 1000.0,
+                'pid': pid,
+                'tid': s.tid,
+                'args': args,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def summary(self) -> str:
+        """Plain table: count/total/mean/max per operation, external commands keyed by program."""
+        rows: Dict[str, List[float]] = {}
+        for s in self.spans():
+            key = s.name
+            argv = s.args.get('argv')
+            if argv:
+                key = f'{s.name} {os.path.basename(str(argv[0]))}'
+            rows.setdefault(key, []).append(s.duration_ms)
+        width = max([len('OPERATION')] + [len(k) for k in rows])
+        lines = [f"{'OPERATION':<{width}}  {'COUNT':>5}  {'TOTAL(ms)':>10}  {'MEAN(ms)':>9}  {'MAX(ms)':>9}"]
+        for key, durs in sorted(rows.items(), key=lambda kv: -sum(kv[1])):
+            total = sum(durs)
+            lines.append(f'{key:<{width}}  {len(durs):>5}  {total:>10.2f}  {total / len(durs):>9.2f}  {max(durs):>9.2f}')
+        return '\n'.join(lines)
+
+    def dump(self, fmt: str = 'summary') -> str:
+        if fmt == 'chrome':
+            return json.dumps(self.chrome_trace(), ensure_ascii=False)
+        return self.summary()
+
+
+def _jsonable(v: Any) -> Any:
+    if isinstance(v, (str, int, float, bool)) or v is None:
+        return v
+    if isinstance(v, (list, tuple)):
+        return [_jsonable(x) for x in v]
+    return str(v)
+
+
+tracer = Tracer()
+
+
+def span(name: str, **args: Any):
+    return tracer.span(name, **args)
+
+
+def traced(name: str | None = None) -> Callable:
+    """Decorator wrapping a function/method call in a span when tracing is enabled."""
+    def deco(fn: Callable) -> Callable:
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            if not tracer.enabled:
+                return fn(*a, **kw)
+            with tracer.span(span_name):
+                return fn(*a, **kw)
+        return wrapper
+    return deco
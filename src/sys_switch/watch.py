@@ -0,0 +1,302 @@
+from __future__ import annotations
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, Iterator, List, Tuple
+
+from .models import BootEntry
+
+
+# Quiet period that closes a burst of filesystem events (efibootmgr rewrites
+# several variables; grub-mkconfig writes a temp file and renames it).
+DEFAULT_DEBOUNCE = 0.2
+# Adaptive fingerprint poll where inotify is unavailable (Windows)
+DEFAULT_MIN_INTERVAL = 1.0
+DEFAULT_MAX_INTERVAL = 30.0
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+               | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT = struct.Struct('iIII')
+
+
+class Inotify:
+    """Minimal non-blocking inotify(7) binding through libc."""
+
+    def __init__(self) -> None:
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError(errno.ENOSYS, 'libc not found')
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify not available')
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+        self.fd = fd
+        self._wds: Dict[int, str] = {}
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def add_watch(self, path: str, mask: int = _WATCH_MASK) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e), path)
+        self._wds[wd] = path
+        return wd
+
+    def read(self) -> List[Tuple[str, int, str]]:
+        """Pending `(directory, mask, name)` events; empty when none are queued."""
+        out: List[Tuple[str, int, str]] = []
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return out
+            if not buf:
+                return out
+            pos = 0
+            while pos + _EVENT.size <= len(buf):
+                wd, mask, _cookie, length = _EVENT.unpack_from(buf, pos)
+                pos += _EVENT.size
+                name = buf[pos:pos + length].split(b'\0', 1)[0].decode('utf-8', 'surrogateescape')
+                pos += length
+                out.append((self._wds.get(wd, ''), mask, name))
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def diff_entries(old: List[BootEntry], new: List[BootEntry]) -> List[dict]:
+    """Change events between two listings, in a stable order."""
+    events: List[dict] = []
+    old_by = {e.id: e for e in old}
+    new_by = {e.id: e for e in new}
+    for e in new:
+        if e.id not in old_by:
+            events.append({'event': 'entry_added', 'id': e.id, 'description': e.description})
+    for e in old:
+        if e.id not in new_by:
+            events.append({'event': 'entry_removed', 'id': e.id, 'description': e.description})
+    for e in new:
+        prev = old_by.get(e.id)
+        if prev is None:
+            continue
+        changed = {k: getattr(e, k) for k in ('description', 'extra') if getattr(prev, k) != getattr(e, k)}
+        if changed:
+            events.append({'event': 'entry_changed', 'id': e.id, **changed})
+    old_next = next((e.id for e in old if e.is_next), None)
+    new_next = next((e.id for e in new if e.is_next), None)
+    if new_next != old_next:
+        if new_next is None:
+            # Firmware consumed it on boot, or it was cleared explicitly
+            events.append({'event': 'next_cleared', 'previous': old_next})
+        else:
+            events.append({'event': 'next_set', 'id': new_next, 'previous': old_next})
+    # Only relative order of surviving entries; additions/removals are reported above
+    kept_old = [e.id for e in old if e.id in new_by]
+    kept_new = [e.id for e in new if e.id in old_by]
+    if kept_old != kept_new:
+        events.append({'event': 'order_changed', 'order': [e.id for e in new]})
+    return events
+
+
+class Watcher:
+    """Turns filesystem changes under a manager's `watch_paths()` into entry diffs.
+
+    Event-driven through inotify where the manager exposes watch paths and the
+    kernel supports it; otherwise polls `fingerprint()` with an interval that
+    doubles while nothing changes and drops back on a change.
+    """
+
+    def __init__(self, manager, debounce: float = DEFAULT_DEBOUNCE,
+                 min_interval: float = DEFAULT_MIN_INTERVAL, max_interval: float = DEFAULT_MAX_INTERVAL) -> None:
+        self.manager = manager
+        self.debounce = debounce
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.interval = min_interval
+        self.entries: List[BootEntry] = []
+        self._inotify: Inotify | None = None
+        self._filters: Dict[str, tuple] = {}
+        self._fingerprint: str | None = None
+
+    # --- setup ---
+    def arm(self) -> None:
+        """Register watches (or record the polling baseline) without listing."""
+        self._setup_inotify()
+        self._fingerprint = self._current_fingerprint()
+        if self._inotify is None and self._fingerprint is None:
+            self.interval = self.max_interval  # blind re-listing; keep it rare
+
+    def start(self) -> List[BootEntry]:
+        """`arm()` and take the baseline listing that events are diffed against."""
+        self.arm()
+        self.entries = self._list()
+        return self.entries
+
+    def _setup_inotify(self) -> None:
+        paths_fn = getattr(self.manager, 'watch_paths', None)
+        if paths_fn is None:
+            return
+        try:
+            ino = Inotify()
+        except OSError:
+            return
+        for directory, prefixes in paths_fn():
+            try:
+                ino.add_watch(directory)
+            except OSError:
+                continue  # e.g. no /boot/grub on this machine
+            self._filters[directory] = self._filters.get(directory, ()) + tuple(prefixes)
+        if self._filters:
+            self._inotify = ino
+        else:
+            ino.close()
+
+    @property
+    def event_driven(self) -> bool:
+        return self._inotify is not None
+
+    def fileno(self) -> int | None:
+        """inotify descriptor to wait on (select/QSocketNotifier), None when polling."""
+        return self._inotify.fileno() if self._inotify else None
+
+    def close(self) -> None:
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+    # --- change detection ---
+    def drain(self) -> bool:
+        """Consume queued inotify events; True if any can affect the boot entries."""
+        if not self._inotify:
+            return False
+        relevant = False
+        for directory, mask, name in self._inotify.read():
+            if mask & (IN_Q_OVERFLOW | IN_DELETE_SELF | IN_MOVE_SELF):
+                relevant = True
+            elif name.startswith(self._filters.get(directory, ())):
+                relevant = True
+        return relevant
+
+    def _current_fingerprint(self) -> str | None:
+        fp = getattr(self.manager, 'fingerprint', None)
+        return fp() if fp else None
+
+    def poll(self) -> bool:
+        """Fingerprint check for the polling mode; adapts `interval`."""
+        fp = self._current_fingerprint()
+        if fp is None:
+            # Nothing cheap to compare; re-list at the slowest rate
+            self.interval = self.max_interval
+            return True
+        if fp != self._fingerprint:
+            self._fingerprint = fp
+            self.interval = self.min_interval
+            return True
+        self.interval = min(self.interval * 2, self.max_interval)
+        return False
+
+    def fingerprint_changed(self) -> bool:
+        """Query-time check for the polling mode: take a change the next `poll()` would find, now.
+
+        Leaves `interval` alone while nothing changed, and is False when the
+        manager has no fingerprint (re-listing on every query would defeat
+        the purpose; the periodic poll still covers it).
+        """
+        fp = self._current_fingerprint()
+        if fp is None or fp == self._fingerprint:
+            return False
+        self._fingerprint = fp
+        self.interval = self.min_interval
+        return True
+
+    def _list(self) -> List[BootEntry]:
+        # Something changed underneath; do not let a snapshot cache answer
+        invalidate = getattr(self.manager, 'invalidate', None)
+        if invalidate:
+            invalidate()
+        return self.manager.list_entries()
+
+    def check(self) -> List[dict]:
+        """Re-list and return the events since the previous listing (often none)."""
+        new = self._list()
+        events = diff_entries(self.entries, new)
+        self.entries = new
+        if self._inotify is not None:
+            self._fingerprint = self._current_fingerprint()
+        return events
+
+    # --- blocking loop ---
+    def _wait_inotify(self, timeout: float | None) -> bool:
+        fd = self._inotify.fileno()
+        if not select.select([fd], [], [], timeout)[0]:
+            return False
+        relevant = self.drain()
+        # Coalesce the rest of the burst
+        while select.select([fd], [], [], self.debounce)[0]:
+            relevant = self.drain() or relevant
+        return relevant
+
+    def events(self, deadline: float | None = None) -> Iterator[dict]:
+        """Yield change events until `deadline` (time.monotonic()) or forever."""
+        while deadline is None or time.monotonic() < deadline:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if self._inotify is not None:
+                changed = self._wait_inotify(remaining)
+            else:
+                wait = self.interval if remaining is None else min(self.interval, remaining)
+                time.sleep(wait)
+                changed = self.poll()
+            if changed:
+                yield from self.check()
+
+
+def run_watch(manager, debounce: float = DEFAULT_DEBOUNCE, max_interval: float = DEFAULT_MAX_INTERVAL,
+              initial: bool = False, duration: float | None = None, out=None) -> int:
+    """`sys-switch watch`: one JSON object per line, flushed as it happens."""
+    out = out or sys.stdout
+    w = Watcher(manager, debounce=debounce, max_interval=max_interval)
+
+    def emit(ev: dict) -> None:
+        ev = {'time': round(time.time(), 3), **ev}
+        out.write(json.dumps(ev, ensure_ascii=False) + '\n')
+        out.flush()
+
+    try:
+        entries = w.start()
+        if initial:
+            emit({'event': 'snapshot', 'mode': 'inotify' if w.event_driven else 'poll',
+                  'entries': [e.to_dict() for e in entries]})
+        deadline = time.monotonic() + duration if duration else None
+        for ev in w.events(deadline):
+            emit(ev)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        w.close()
+    return 0
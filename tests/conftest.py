@@ -0,0 +1,21 @@
+from __future__ import annotations
+import os
+import stat
+
+import pytest
+
+
+@pytest.fixture
+def fake_bin(tmp_path, monkeypatch):
+    """Directory at the front of PATH; call it with (name, shell body) to add a fake command."""
+    bindir = tmp_path / 'bin'
+    bindir.mkdir()
+    monkeypatch.setenv('PATH', f'{bindir}{os.pathsep}{os.environ.get("PATH", "")}')
+
+    def add(name: str, body: str) -> str:
+        path = bindir / name
+        path.write_text('#!/bin/sh\n' + body)
+        path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+        return str(path)
+
+    return add
@@ -0,0 +1,208 @@
+from __future__ import annotations
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+import fixtures
+from sys_switch.aio import AsyncExecutor, AsyncLinuxBootManager, AsyncSystemdBootManager
+from sys_switch.platforms.efivars import EfiVarStore
+from sys_switch.platforms.linux import LinuxBootManager
+from sys_switch.platforms.executor import TIMEOUT_RETURNCODE
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='fake commands are POSIX shell scripts')
+
+
+def _runs(path) -> int:
+    try:
+        return len(path.read_text().splitlines())
+    except FileNotFoundError:
+        return 0
+
+
+async def _until(pred, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not pred():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.01)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except OSError:
+        return True
+
+
+def test_identical_readonly_commands_share_one_process(fake_bin, tmp_path):
+    runs = tmp_path / 'runs'
+    fake_bin('slow', f'echo run >> {runs}\nsleep 0.3\necho listing\n')
+
+    async def main():
+        ex = AsyncExecutor()
+        return await asyncio.gather(*(ex.run(['slow'], readonly=True) for _ in range(4)))
+
+    results = asyncio.run(main())
+    assert _runs(runs) == 1
+    assert [cp.stdout for cp in results] == ['listing\n'] * 4
+    assert sum(bool(getattr(cp, 'coalesced', False)) for cp in results) == 3
+
+
+def test_mutating_command_invalidates_flight(fake_bin, tmp_path):
+    runs = tmp_path / 'runs'
+    fake_bin('slow', f'echo run >> {runs}\nsleep 0.3\necho listing\n')
+    fake_bin('mutate', 'exit 0\n')
+
+    async def main():
+        ex = AsyncExecutor()
+        first = asyncio.ensure_future(ex.run(['slow'], readonly=True))
+        await _until(lambda: _runs(runs) == 1)
+        assert (await ex.run(['mutate'])).returncode == 0
+        after = await ex.run(['slow'], readonly=True)
+        await first
+        return after
+
+    after = asyncio.run(main())
+    assert _runs(runs) == 2
+    assert not getattr(after, 'coalesced', False)
+
+
+def test_env_is_part_of_the_key(fake_bin, tmp_path):
+    runs = tmp_path / 'runs'
+    fake_bin('slow', f'echo run >> {runs}\nsleep 0.2\necho "$LANG"\n')
+
+    async def main():
+        ex = AsyncExecutor()
+        env_a = dict(os.environ, LANG='C')
+        env_b = dict(os.environ, LANG='zh_CN.UTF-8')
+        return await asyncio.gather(ex.run(['slow'], env=env_a, readonly=True),
+                                    ex.run(['slow'], env=env_b, readonly=True))
+
+    a, b = asyncio.run(main())
+    assert _runs(runs) == 2
+    assert (a.stdout, b.stdout) == ('C\n', 'zh_CN.UTF-8\n')
+
+
+def test_follower_sees_timeout(fake_bin):
+    fake_bin('hang', 'exec sleep 60\n')
+
+    async def main():
+        ex = AsyncExecutor()
+        return await asyncio.gather(*(ex.run(['hang'], timeout=0.3, readonly=True) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert all(cp.returncode == TIMEOUT_RETURNCODE and cp.timed_out for cp in results)
+
+
+def test_cancelling_leader_keeps_result_for_follower(fake_bin, tmp_path):
+    runs = tmp_path / 'runs'
+    fake_bin('slow', f'echo run >> {runs}\nsleep 0.3\necho listing\n')
+
+    async def main():
+        ex = AsyncExecutor()
+        leader = asyncio.ensure_future(ex.run(['slow'], readonly=True))
+        await _until(lambda: _runs(runs) == 1)
+        follower = asyncio.ensure_future(ex.run(['slow'], readonly=True))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    cp = asyncio.run(main())
+    assert cp.stdout == 'listing\n' and cp.coalesced
+    assert _runs(runs) == 1
+
+
+def test_cancelling_last_waiter_kills_process(fake_bin, tmp_path):
+    pidfile = tmp_path / 'grandchild.pid'
+    fake_bin('hang', f'sleep 60 &\necho $! > {pidfile}\nwait\n')
+
+    async def main():
+        ex = AsyncExecutor()
+        task = asyncio.ensure_future(ex.run(['hang'], readonly=True))
+        await _until(pidfile.exists)
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.1)
+        assert not ex._loop_state().inflight
+        return int(pidfile.read_text())
+
+    grandchild = asyncio.run(main())
+    deadline = time.monotonic() + 5
+    while _alive(grandchild) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert not _alive(grandchild)
+
+
+def test_executor_survives_a_second_event_loop(fake_bin):
+    fake_bin('slow', 'sleep 0.1\necho "$1"\n')
+    ex = AsyncExecutor(max_concurrency=1)
+
+    async def main():
+        # Distinct argv so nothing is coalesced and every call waits for the one slot
+        return await asyncio.gather(*(ex.run(['slow', str(i)], readonly=True) for i in range(3)),
+                                    return_exceptions=True)
+
+    for _ in range(2):
+        results = asyncio.run(main())
+        assert [getattr(cp, 'stdout', cp) for cp in results] == ['0\n', '1\n', '2\n']
+
+
+class _ThreadRecorder:
+    def __init__(self) -> None:
+        self.threads = {}
+
+    def __getattr__(self, name):
+        def call(*args):
+            self.threads[name] = threading.get_ident()
+            return True, ''
+        return call
+
+
+def test_systemd_boot_mutations_run_off_the_loop():
+    sync = _ThreadRecorder()
+
+    async def main():
+        mgr = AsyncSystemdBootManager(sync)
+        for coro in (mgr.set_next('a.conf'), mgr.set_default('a.conf'), mgr.clear_next(),
+                     mgr.set_order(['a.conf']), mgr.reboot_now()):
+            assert await coro == (True, '')
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+    assert set(sync.threads) == {'set_next', 'set_default', 'clear_next', 'set_order', 'reboot_now'}
+    assert loop_thread not in sync.threads.values()
+
+
+def _linux_manager(tmp_path, efivars_root: str) -> LinuxBootManager:
+    return LinuxBootManager(efivars_root=efivars_root, grub_cfg=str(tmp_path / 'nogrub/grub.cfg'),
+                            grubenv=str(tmp_path / 'nogrub/grubenv'), cache_dir=str(tmp_path / 'cache'))
+
+
+def test_async_efivars_listing_matches_sync(tmp_path):
+    fw = fixtures.make_firmware(12, seed=3)
+    root = fixtures.write_efivars(fw, str(tmp_path / 'efivars'))
+    mgr = _linux_manager(tmp_path, root)
+    entries = asyncio.run(AsyncLinuxBootManager(mgr, read_concurrency=3).list_entries())
+    assert entries == mgr.list_entries()
+    assert asyncio.run(AsyncLinuxBootManager(mgr)._read_efi_state()) == EfiVarStore(root).read_state()
+
+
+def test_async_efibootmgr_listing_matches_sync(tmp_path, fake_bin):
+    fw = fixtures.make_firmware(6, seed=4)
+    (tmp_path / 'listing').write_text(fixtures.efibootmgr_text(fw, verbose=True))
+    fake_bin('efibootmgr', f'cat {tmp_path / "listing"}\n')
+    mgr = _linux_manager(tmp_path, str(tmp_path / 'no-efivars'))
+    entries = asyncio.run(AsyncLinuxBootManager(mgr, executor=AsyncExecutor()).list_entries())
+    assert entries and entries == mgr.list_entries()
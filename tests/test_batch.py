@@ -0,0 +1,141 @@
+from __future__ import annotations
+import io
+import json
+from types import SimpleNamespace
+
+from sys_switch.batch import run_batch
+from sys_switch.models import BootEntry
+
+ESP = 'HD(1,GPT,6a3c9f0e-1b2d-4c5e-8f70-9a1b2c3d4e5f,0x800,0x100000)'
+
+
+class FakeManager:
+    """Firmware with a BootNext; counts listings so re-reads are visible."""
+
+    def __init__(self) -> None:
+        self.entries = [
+            BootEntry('0000', 'Windows Boot Manager', extra=ESP + '/File(\\EFI\\Microsoft\\Boot\\bootmgfw.efi)'),
+            BootEntry('0001', 'ubuntu', is_current=True, extra=ESP + '/File(\\EFI\\ubuntu\\shimx64.efi)'),
+            BootEntry('0002', 'UEFI: SanDisk', extra='PciRoot(0x0)/USB(1,0)'),
+            BootEntry('0003', 'UEFI: SanDisk  Cruzer', extra='PciRoot(0x0)/USB(2,0)'),
+        ]
+        self.next = None
+        self.listings = 0
+        self.calls = []
+
+    def list_entries(self):
+        self.listings += 1
+        return [BootEntry(e.id, e.description, e.is_current, e.id == self.next, e.extra) for e in self.entries]
+
+    def set_next(self, entry_id):
+        self.calls.append(('set_next', entry_id))
+        if entry_id not in {e.id for e in self.entries}:
+            return False, f'Boot{entry_id} 不存在\n'
+        self.next = entry_id
+        return True, f'已设置下次启动项: {entry_id}\n'
+
+    def clear_next(self):
+        self.calls.append(('clear_next',))
+        self.next = None
+        return True, '已清除下次启动项'
+
+    def reboot_now(self):
+        self.calls.append(('reboot_now',))
+        return True, ''
+
+
+def _run(manager, *requests, stop_on_error=False, raw: str | None = None):
+    text = raw if raw is not None else '\n'.join(json.dumps(r, ensure_ascii=False) for r in requests) + '\n'
+    out = io.StringIO()
+    code = run_batch(manager, SimpleNamespace(stop_on_error=stop_on_error), inp=io.StringIO(text), out=out)
+    replies = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert all(isinstance(r.pop('elapsed_ms'), float) for r in replies)
+    return code, replies
+
+
+def test_read_operations_share_one_listing(capsys):
+    mgr = FakeManager()
+    code, replies = _run(mgr, {'op': 'list'}, {'op': 'get', 'id': '0001', 'tag': 7},
+                         {'op': 'get', 'match': 'windows'}, {'op': 'verify'})
+    assert code == 0
+    assert [r['op'] for r in replies] == ['list', 'get', 'get', 'verify']
+    assert [e['id'] for e in replies[0]['entries']] == ['0000', '0001', '0002', '0003']
+    assert replies[1] == {'op': 'get', 'ok': True, 'entry': mgr.entries[1].to_dict(), 'tag': 7}
+    assert replies[2]['entry']['id'] == '0000'
+    assert replies[3] == {'op': 'verify', 'ok': True, 'next': None}
+    assert mgr.listings == 1
+    assert '4/4' in capsys.readouterr().err
+
+
+def test_verify_sees_the_state_after_set():
+    mgr = FakeManager()
+    code, replies = _run(mgr, {'op': 'verify', 'id': '0001'}, {'op': 'set', 'match': 'ubuntu'},
+                         {'op': 'verify', 'id': '0001'}, {'op': 'verify', 'partuuid': '{6A3C9F0E-1B2D-4C5E-8F70-9A1B2C3D4E5F}'},
+                         {'op': 'clear_next'}, {'op': 'verify'})
+    assert code == 1
+    assert replies[0]['ok'] is False and '0001' in replies[0]['error']
+    assert replies[1] == {'op': 'set', 'ok': True, 'id': '0001', 'message': '已设置下次启动项: 0001'}
+    assert replies[2] == {'op': 'verify', 'ok': True, 'next': '0001'}
+    # Two entries on that partition: a selector must pick exactly one
+    assert replies[3]['ok'] is False and '匹配多个' in replies[3]['error']
+    assert replies[4]['ok'] is True and replies[5] == {'op': 'verify', 'ok': True, 'next': None}
+    assert mgr.calls == [('set_next', '0001'), ('clear_next',)]
+    assert mgr.listings == 3  # initial, after set, after clear_next
+
+
+def test_plain_id_goes_straight_to_the_manager():
+    mgr = FakeManager()
+    _code, replies = _run(mgr, {'op': 'set', 'id': '00AA'}, {'op': 'verify'})
+    assert replies[0] == {'op': 'set', 'ok': False, 'id': '00AA', 'error': 'Boot00AA 不存在'}
+    assert mgr.calls == [('set_next', '00AA')]
+    assert replies[1]['ok']  # a failed mutation still drops the listing
+    assert mgr.listings == 1
+
+
+def test_bad_lines_do_not_stop_the_stream():
+    mgr = FakeManager()
+    raw = ('# comment\n\n{"op": "list"\n[1, 2]\n{"op": "frobnicate", "tag": "x"}\n'
+           '{"op": "set", "default": true, "id": "0001"}\n{"op": "get", "id": "0002"}\n')
+    code, replies = _run(mgr, raw=raw)
+    assert code == 1
+    assert [(r['op'], r['ok']) for r in replies] == [
+        (None, False), (None, False), ('frobnicate', False), ('set', False), ('get', True)]
+    assert replies[0]['error'].startswith('第 3 行不是合法的 JSON')
+    assert replies[1]['error'] == '第 4 行应为 JSON 对象'
+    assert '未知操作' in replies[2]['error'] and replies[2]['tag'] == 'x'
+    assert '不支持设置默认启动项' in replies[3]['error']
+
+
+def test_selector_errors():
+    mgr = FakeManager()
+    _code, replies = _run(mgr, {'op': 'get'}, {'op': 'get', 'id': '0001', 'match': 'ubuntu'},
+                          {'op': 'get', 'id': ''}, {'op': 'get', 'id': 1}, {'op': 'get', 'match': 'sandisk'},
+                          {'op': 'get', 'match': 'macos'}, {'op': 'set', 'partuuid': 'nope'})
+    assert [r['ok'] for r in replies] == [False] * 7
+    for r in replies[:4]:
+        assert '需要且只需要' in r['error']
+    assert '匹配多个' in replies[4]['error'] and '0002' in replies[4]['error'] and '0003' in replies[4]['error']
+    assert '没有与' in replies[5]['error']
+    assert '没有与' in replies[6]['error']
+    assert mgr.calls == []
+
+
+def test_stop_on_error():
+    mgr = FakeManager()
+    code, replies = _run(mgr, {'op': 'list'}, {'op': 'get', 'id': 'zzzz'}, {'op': 'reboot'}, stop_on_error=True)
+    assert code == 1
+    assert [r['op'] for r in replies] == ['list', 'get']
+    assert mgr.calls == []
+
+
+def test_manager_exception_becomes_a_reply():
+    mgr = FakeManager()
+
+    def boom():
+        raise PermissionError('efivarfs is read-only')
+
+    mgr.list_entries = boom
+    code, replies = _run(mgr, {'op': 'list'}, {'op': 'reboot'})
+    assert replies[0] == {'op': 'list', 'ok': False, 'error': 'PermissionError: efivarfs is read-only'}
+    assert replies[1] == {'op': 'reboot', 'ok': True, 'message': ''}
+    assert code == 1
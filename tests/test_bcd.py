@@ -0,0 +1,102 @@
+from __future__ import annotations
+import os
+
+import pytest
+
+from sys_switch.platforms.bcd import BOOTMGR_GUID, FWBOOTMGR_GUID, BcdObject, BcdSnapshot, normalize_identifier
+from sys_switch.platforms.windows import WindowsBootManager
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+UBUNTU = '{3b1d8e6a-52c4-11ee-9b0e-806e6f6e6963}'
+WIN11 = '{c9e0a3b4-52c3-11ee-9b0e-b3a4d5c6e7f8}'
+WINRE = '{c9e0a3b6-52c3-11ee-9b0e-b3a4d5c6e7f8}'
+
+
+def _capture(locale: str) -> str:
+    # Recorded `bcdedit /v /enum all`; the zh-CN capture keeps the console's CRLF line ends
+    with open(os.path.join(DATA, f'bcdedit_v_enum_all_{locale}.txt'), encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+@pytest.fixture(params=['en', 'zh'])
+def snap(request) -> BcdSnapshot:
+    return BcdSnapshot.parse(_capture(request.param))
+
+
+def test_objects_and_managers(snap):
+    assert len(snap) == 17
+    assert snap.firmware_manager().key == FWBOOTMGR_GUID
+    assert snap.boot_manager().key == BOOTMGR_GUID
+    assert snap.displayorder() == [BOOTMGR_GUID, UBUNTU, '{3b1d8e6b-52c4-11ee-9b0e-806e6f6e6963}',
+                                   '{3b1d8e6c-52c4-11ee-9b0e-806e6f6e6963}']
+    assert snap.bootsequence() == [UBUNTU]
+    assert snap.boot_manager().get('default') == WIN11
+    # Continuation rows of a multi-valued element stay with it
+    assert len(snap.get('{7ea2e1ac-2e61-4728-aaa3-896d9d0a9f0e}').tokens('inherit')) == 3
+
+
+def test_osloaders_and_recovery(snap):
+    loaders = {o.key: o for o in snap.osloaders()}
+    assert set(loaders) == {WIN11, WINRE}
+    assert not loaders[WIN11].is_recovery()  # carries recoverysequence/recoveryenabled, still a normal loader
+    assert loaders[WINRE].is_recovery()
+    # winresume.efi is not an OS loader, so it is never listed whatever its description says
+    assert not snap.get('{c9e0a3b3-52c3-11ee-9b0e-b3a4d5c6e7f8}').is_osloader
+
+
+def test_entries_en_and_zh_agree():
+    mgr = WindowsBootManager()
+    en = mgr._entries_from_snapshot(BcdSnapshot.parse(_capture('en')))
+    zh = mgr._entries_from_snapshot(BcdSnapshot.parse(_capture('zh')))
+    assert [e.id for e in en] == [e.id for e in zh] == [
+        BOOTMGR_GUID, WIN11, UBUNTU, '{3b1d8e6b-52c4-11ee-9b0e-806e6f6e6963}', '{3b1d8e6c-52c4-11ee-9b0e-806e6f6e6963}']
+    assert [e.is_next for e in en] == [e.is_next for e in zh] == [False, False, True, False, False]
+    assert [e.is_current for e in en] == [True, True, False, False, False]
+    assert en[1].description == 'Windows 11'
+    assert zh[4].description == 'UEFI: SanDisk Cruzer Blade 1.00，分区 1'
+
+
+def test_show_recovery_lists_winre():
+    entries = WindowsBootManager(show_recovery=True)._entries_from_snapshot(BcdSnapshot.parse(_capture('zh')))
+    winre = [e for e in entries if e.id == WINRE]
+    assert winre and winre[0].description == 'Windows 恢复环境'
+
+
+def test_crlf_and_lf_parse_alike():
+    text = _capture('zh')
+    assert '\r\n' in text
+    a, b = BcdSnapshot.parse(text), BcdSnapshot.parse(text.replace('\r\n', '\n'))
+    assert [(o.key, o.kind, o.elements) for o in a.objects] == [(o.key, o.kind, o.elements) for o in b.objects]
+
+
+@pytest.mark.parametrize('token, expected', [
+    ('{bootmgr}', BOOTMGR_GUID),
+    ('{FWBOOTMGR}', FWBOOTMGR_GUID),
+    ('  {memdiag} ', '{b2721d73-1db4-4c62-bf78-c548a880142d}'),
+    ('{3B1D8E6A-52C4-11EE-9B0E-806E6F6E6963}', UBUNTU),
+    ('{current}', '{current}'),
+])
+def test_normalize_identifier(token, expected):
+    assert normalize_identifier(token) == expected
+
+
+def test_lookup_by_alias(snap):
+    assert snap.get('{bootmgr}') is snap.boot_manager()
+    assert snap.get(WIN11.upper()).description == 'Windows 11'
+
+
+def test_localized_element_names():
+    text = ('Windows 启动加载器\n-------------------\n标识符                  {current}\n'
+            '描述                    Windows 10\n')
+    obj = BcdSnapshot.parse(text).objects[0]
+    assert obj.identifier == '{current}' and obj.description == 'Windows 10'
+
+
+@pytest.mark.parametrize('elements, expected', [
+    ({'winpe': ['是']}, True),
+    ({'description': ['Windows 恢复环境']}, True),
+    ({'osdevice': [r'ramdisk=[C:]\Recovery\WindowsRE\Winre.wim,{x}']}, True),
+    ({'description': ['Windows 10'], 'recoverysequence': ['{x}'], 'recoveryenabled': ['Yes']}, False),
+])
+def test_is_recovery(elements, expected):
+    assert BcdObject(kind='Windows Boot Loader', identifier='{x}', elements=elements).is_recovery() is expected
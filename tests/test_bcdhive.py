@@ -0,0 +1,111 @@
+from __future__ import annotations
+import random
+
+import pytest
+
+import fixtures
+from sys_switch.platforms.bcd import BOOTMGR_GUID, FWBOOTMGR_GUID, BcdSnapshot
+from sys_switch.platforms.bcdhive import HiveError, RegistryHive, load_bcd_snapshot
+from sys_switch.platforms.windows import WindowsBootManager
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / 'BCD'
+    path.write_bytes(fixtures.bcd_hive(12, seed=1))
+    return path
+
+
+def test_snapshot_matches_text_parser(store):
+    hive = load_bcd_snapshot(str(store))
+    text = BcdSnapshot.parse(fixtures.bcdedit_text(12, seed=1))
+    assert [o.key for o in hive.objects] == [o.key for o in text.objects]
+    assert hive.displayorder() == text.displayorder()
+    assert hive.bootsequence() == text.bootsequence()
+    assert hive.firmware_manager().key == FWBOOTMGR_GUID
+    assert hive.boot_manager().key == BOOTMGR_GUID
+    for h in hive.objects:
+        t = text.get(h.identifier)
+        assert h.description == t.description
+        assert h.is_osloader == t.is_osloader
+        assert h.is_recovery() == t.is_recovery()
+
+
+def test_element_names(store):
+    snap = load_bcd_snapshot(str(store))
+    loader = next(o for o in snap.osloaders() if not o.is_recovery())
+    assert loader.get('bootmenupolicy') == '0'
+    assert loader.get('recoveryenabled') == 'Yes'
+    assert not any(name.startswith('custom:') for name in loader.elements)
+    winre = next(o for o in snap.osloaders() if o.is_recovery())
+    assert winre.get('winpe') == 'Yes'
+    assert winre.get('device').startswith('ramdisk=[partition]\\Recovery\\WindowsRE\\Winre.wim,{')
+
+
+def test_store_backend_lists_same_entries_as_text(store):
+    mgr = WindowsBootManager(show_recovery=True, store=str(store))
+    assert mgr.available()
+    from_text = mgr._entries_from_snapshot(BcdSnapshot.parse(fixtures.bcdedit_text(12, seed=1)))
+    assert mgr.list_entries() == from_text
+    assert sum(e.is_next for e in from_text) == 1
+
+
+def test_recovery_hidden_by_default(store):
+    ids = {e.id for e in WindowsBootManager(store=str(store)).list_entries()}
+    winre = next(o for o in load_bcd_snapshot(str(store)).osloaders() if o.is_recovery())
+    assert winre.identifier not in ids
+
+
+def test_registry_values(tmp_path):
+    path = tmp_path / 'SOFTWARE'
+    path.write_bytes(fixtures._hive(['Microsoft', 'Windows NT', 'CurrentVersion'],
+                                    {'ProductName': 'Windows 10 Pro', 'CurrentBuild': '22631'}))
+    with RegistryHive(str(path)) as hive:
+        key = hive.open('microsoft\\WINDOWS NT/CurrentVersion')
+        assert key.value('productname').data == 'Windows 10 Pro'
+        assert {v.name for v in key.values()} == {'ProductName', 'CurrentBuild'}
+        with pytest.raises(HiveError):
+            hive.open('Microsoft/Missing')
+
+
+@pytest.mark.parametrize('data', [b'', b'regf', b'nothive' + bytes(0x2000)])
+def test_not_a_hive(tmp_path, data):
+    path = tmp_path / 'BCD'
+    path.write_bytes(data)
+    with pytest.raises(HiveError):
+        load_bcd_snapshot(str(path))
+
+
+def test_truncated_hive_raises_hive_error(tmp_path):
+    full = fixtures.bcd_hive(12, seed=1)
+    path = tmp_path / 'BCD'
+    for cut in range(0x1000, len(full), 61):
+        path.write_bytes(full[:cut])
+        try:
+            load_bcd_snapshot(str(path))
+        except HiveError:
+            pass
+
+
+def test_corrupt_cells_raise_hive_error(tmp_path):
+    full = fixtures.bcd_hive(6, seed=2)
+    rng = random.Random(0)
+    path = tmp_path / 'BCD'
+    for _ in range(300):
+        data = bytearray(full)
+        for _ in range(8):
+            data[rng.randrange(0x1000, len(data))] = rng.randrange(256)
+        path.write_bytes(bytes(data))
+        try:
+            load_bcd_snapshot(str(path))
+        except HiveError:
+            pass
+
+
+def test_store_backend_survives_truncation(tmp_path):
+    full = fixtures.bcd_hive(12, seed=1)
+    path = tmp_path / 'BCD'
+    path.write_bytes(full[:len(full) // 2])
+    mgr = WindowsBootManager(store=str(path))
+    assert mgr.list_entries() == []
+    assert not mgr.available()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+import os
+import shutil
+import sys
+
+import pytest
+
+import fixtures
+from sys_switch.models import BootEntry
+from sys_switch.platforms import blockdev
+from sys_switch.platforms.blockdev import BlockDeviceCache, BlockDeviceIndex, describe, parse_mountinfo
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='block-device fixtures use symlinks')
+
+
+@pytest.fixture
+def fw():
+    return fixtures.make_firmware(8, seed=1)
+
+
+@pytest.fixture
+def root(fw, tmp_path):
+    return fixtures.write_blockdev(fw, str(tmp_path / 'root'), extra_disks=1)
+
+
+def _entry(fw, bid: str) -> BootEntry:
+    opt = next(o for o in fw.options if o.id == bid)
+    return BootEntry(opt.id, opt.description, extra=opt.path_text)
+
+
+def test_scan_resolves_uuids_labels_and_mounts(root):
+    index = BlockDeviceIndex.scan(root)
+    assert len(index) == 3 + 3 + 4 + 4  # three disks: ESP disk, OS disk, one spare
+    esp = index.get('nvme0n1p1')
+    assert (esp.disk, esp.partition, esp.fstype, esp.label) == ('nvme0n1', 1, 'vfat', 'ESP')
+    assert esp.mountpoints == ['/boot/efi'] and esp.size == 2097152 * 512
+    assert index.by_partuuid(esp.partuuid.upper()) is esp
+    assert index.by_partuuid('{' + esp.partuuid + '}') is esp
+    assert index.by_fs_uuid(esp.uuid.lower()) is esp
+    # Partitions inherit their disk's partition-table GUID; only the disk itself is found by it
+    disk = index.get('nvme0n1')
+    assert disk.partition is None and disk.disk_guid == esp.disk_guid
+    assert index.by_disk_guid(disk.disk_guid.upper()) is disk
+    # udev's \xNN escaping (UTF-8 and the blank) and mountinfo's \040
+    spare = index.get('nvme2n1p2')
+    assert spare.label == '数据 2-2'
+    assert spare.mountpoints == ['/srv/disk 2']
+    assert index.get('nvme1n1p3').fstype == 'btrfs'
+    assert describe(esp) == '/dev/nvme0n1p1 (nvme0n1 分区 1) vfat "ESP" 1.0 GiB 挂载于 /boot/efi'
+
+
+def test_load_option_partuuid_matches_a_device(fw, root):
+    index = BlockDeviceIndex.scan(root)
+    assert index.for_entry(_entry(fw, '0000')).name == 'nvme0n1p1'  # Windows Boot Manager on the ESP
+    assert index.for_entry(_entry(fw, '0005')).name == 'nvme0n1p3'  # systemd-boot on its own partition
+    assert index.for_entry(_entry(fw, '0003')).name == 'nvme0n1p2'  # USB stick: HD() after Pci/USB nodes
+    assert index.for_entry(_entry(fw, '0004')) is None  # PXE: no partition at all
+    mbr = BootEntry('0009', 'old disk', extra='PciRoot(0x0)/Pci(0x1f,0x2)/Sata(0,0,0)/HD(1,MBR,0xa1b2c3d4,0x800,0x1000)')
+    assert index.for_entry(mbr) is None
+
+
+def test_entries_whose_disk_is_missing(fw, root):
+    shutil.rmtree(os.path.join(root, 'sys/devices/pci0000:00/nvme/nvme0n1'))
+    for name in ('nvme0n1', 'nvme0n1p1', 'nvme0n1p2', 'nvme0n1p3'):
+        os.unlink(os.path.join(root, 'sys/class/block', name))
+    index = BlockDeviceIndex.scan(root)
+    assert index.get('nvme0n1p1') is None
+    assert all(index.for_entry(_entry(fw, bid)) is None for bid in ('0000', '0003', '0005'))
+    assert index.get('nvme1n1p1').mountpoints == ['/']
+
+
+def test_by_partuuid_links_without_udev_database(fw, root):
+    shutil.rmtree(os.path.join(root, 'run/udev/data'))
+    # An MBR disk: `<signature>-<partition>`, as entry_partuuid() spells it
+    os.symlink('../../nvme2n1p1', os.path.join(root, 'dev/disk/by-partuuid', 'a1b2c3d4-01'))
+    index = BlockDeviceIndex.scan(root)
+    esp = index.for_entry(_entry(fw, '0000'))
+    assert esp.name == 'nvme0n1p1'
+    assert esp.label is None and esp.uuid is None and esp.fstype == 'vfat'  # fstype from mountinfo
+    mbr = BootEntry('0009', 'old disk', extra='HD(1,MBR,0xa1b2c3d4,0x800,0x1000)/File(\\EFI\\BOOT\\BOOTX64.EFI)')
+    assert index.for_entry(mbr).name == 'nvme2n1p1'
+
+
+def test_missing_root_is_an_empty_index(tmp_path):
+    assert len(BlockDeviceIndex.scan(str(tmp_path / 'nothing'))) == 0
+
+
+def test_parse_mountinfo_keeps_every_mountpoint():
+    text = ('29 1 259:2 / / rw - ext4 /dev/nvme0n1p2 rw\n'
+            '30 29 259:2 /home /home rw - ext4 /dev/nvme0n1p2 rw\n'
+            '31 29 259:1 / /boot/my\\040efi rw,relatime shared:5 - vfat /dev/nvme0n1p1 rw\n'
+            'garbage line\n')
+    assert parse_mountinfo(text) == {'259:2': (['/', '/home'], 'ext4'), '259:1': (['/boot/my efi'], 'vfat')}
+
+
+def test_cache_follows_udev_and_mount_changes(root, monkeypatch):
+    cache = BlockDeviceCache(root)
+    calls = []
+    real = BlockDeviceIndex.scan
+    monkeypatch.setattr(BlockDeviceIndex, 'scan', classmethod(lambda cls, r=None: calls.append(r) or real(r)))
+    first = cache.get()
+    assert cache.get() is first and len(calls) == 1
+
+    mountinfo = os.path.join(root, 'proc/self/mountinfo')
+    with open(mountinfo, 'a') as f:
+        f.write('99 1 259:3 / /mnt/data rw - ext4 /dev/nvme0n1p3 rw\n')
+    assert cache.get() is first and len(calls) == 1  # mounts re-applied without a rescan
+    assert first.get('nvme0n1p3').mountpoints == ['/mnt/data']
+
+    udev = os.path.join(root, 'run/udev/data')
+    os.utime(udev, ns=(0, os.stat(udev).st_mtime_ns + 10**9))
+    assert cache.get() is not first and len(calls) == 2
+
+
+def test_root_from_environment(root, monkeypatch):
+    monkeypatch.setenv(blockdev.BLOCKDEV_ROOT_ENV, root)
+    monkeypatch.setattr(blockdev, '_caches', {})
+    assert blockdev.device_index().get('nvme0n1p1').label == 'ESP'
@@ -0,0 +1,113 @@
+from __future__ import annotations
+import os
+import stat
+import sys
+
+import pytest
+
+import fixtures
+from sys_switch import broker
+from sys_switch.broker import BrokerError, RemoteBootManager
+from sys_switch.platforms.linux import LinuxBootManager
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='the helper listens on a unix socket')
+
+
+@pytest.fixture
+def fw():
+    return fixtures.make_firmware(6, seed=3)
+
+
+@pytest.fixture
+def helper(fw, tmp_path, monkeypatch):
+    """An unelevated helper on an efivars fixture; yields (manager, launches)."""
+    run = tmp_path / 'run'
+    monkeypatch.setattr(broker, 'runtime_dir', lambda: str(run))
+    monkeypatch.setenv('SYS_SWITCH_EFIVARS', fixtures.write_efivars(fw, str(tmp_path / 'efivars')))
+    monkeypatch.setenv('PYTHONPATH', SRC)
+    launches = []
+    real = broker._launch
+
+    def spy(argv, elevate):
+        key_file = argv[argv.index('--key-file') + 1]
+        launches.append((elevate, stat.S_IMODE(os.stat(key_file).st_mode),
+                         stat.S_IMODE(os.stat(os.path.dirname(key_file)).st_mode)))
+        return real(argv, elevate)
+
+    monkeypatch.setattr(broker, '_launch', spy)
+    mgr = RemoteBootManager(mode='local', idle_timeout=30)
+    yield mgr, launches
+    try:
+        mgr.shutdown()
+    except BrokerError:
+        pass
+
+
+def test_round_trip_through_the_helper(fw, helper):
+    mgr, launches = helper
+    entries = mgr.list_entries()
+    # The helper lists exactly what an in-process manager sees
+    assert entries == LinuxBootManager().list_entries()
+    assert [e.id for e in entries] == fw.order
+    assert mgr.ping()['pid'] != os.getpid()
+    # One helper, started without elevation, read its key from a private 0600 file
+    assert launches == [(False, 0o600, 0o700)]
+
+    if os.geteuid() == 0:
+        target = next(e.id for e in entries if not e.is_next)
+        ok, msg = mgr.set_next(target)
+        assert ok, msg
+        assert [e.id for e in mgr.list_entries() if e.is_next] == [target]
+        ok, msg = mgr.clear_next()
+        assert ok, msg
+        assert not any(e.is_next for e in mgr.list_entries())
+    else:
+        ok, msg = mgr.set_next(entries[-1].id)
+        assert not ok and msg
+    assert len(launches) == 1
+
+
+def test_key_and_state_are_private(helper):
+    mgr, _launches = helper
+    mgr.ping()
+    state = broker._read_state()
+    path = broker._state_path()
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    address = state['address']
+    assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+    # The helper deletes the key file once it has read it
+    assert os.listdir(os.path.dirname(address)) == ['broker.sock']
+
+
+def test_wrong_key_is_rejected(helper):
+    mgr, _launches = helper
+    mgr.ping()
+    state = broker._read_state()
+    with pytest.raises(BrokerError):
+        broker._connect(state['address'], bytes(32))
+    # The helper keeps serving the right key
+    conn = broker._connect(state['address'], bytes.fromhex(state['authkey']))
+    conn.close()
+    assert mgr.list_entries()
+
+
+def test_second_client_reuses_the_running_helper(helper):
+    mgr, launches = helper
+    pid = mgr.ping()['pid']
+    other = RemoteBootManager(mode='local')
+    try:
+        assert other.ping()['pid'] == pid
+    finally:
+        other.close()
+    assert len(launches) == 1
+
+
+def test_helper_errors_reach_the_client(helper):
+    mgr, _launches = helper
+    with pytest.raises(BrokerError):
+        mgr._call('frobnicate')
+    ok, msg = mgr.set_next('')
+    assert not ok and 'ValueError' in msg
+    assert mgr.ping()  # the same connection keeps working
@@ -0,0 +1,135 @@
+from __future__ import annotations
+import json
+import os
+
+import pytest
+
+from sys_switch import cache
+from sys_switch.cache import CachedBootManager
+from sys_switch.models import BootEntry
+
+
+class FakeManager:
+    """A backend whose fingerprint the test controls; counts enumerations."""
+
+    def __init__(self) -> None:
+        self.fp = 'fp-1'
+        self.entries = [BootEntry('0000', 'Windows Boot Manager'), BootEntry('0001', 'ubuntu', is_current=True)]
+        self.listings = 0
+        self.invalidations = 0
+
+    def cache_key(self) -> str:
+        return 'fake|/sys/firmware/efi/efivars'
+
+    def fingerprint(self):
+        return self.fp
+
+    def list_entries(self):
+        self.listings += 1
+        return [BootEntry.from_dict(e.to_dict()) for e in self.entries]
+
+    def set_next(self, entry_id):
+        if entry_id == 'ffff':
+            return False, 'Bootffff 不存在'
+        self.fp = f'{self.fp}+next'
+        return True, f'已设置下次启动项: {entry_id}'
+
+    def invalidate(self):
+        self.invalidations += 1
+
+
+@pytest.fixture
+def disk(tmp_path):
+    return str(tmp_path / 'snapshots')
+
+
+def test_memory_hit_while_fingerprint_is_unchanged(disk):
+    mgr = FakeManager()
+    cached = CachedBootManager(mgr, disk_dir=disk)
+    first = cached.list_entries()
+    assert cached.list_entries() == first
+    assert mgr.listings == 1
+    assert (cached.stats.misses, cached.stats.hits) == (1, 1)
+    # Callers get copies
+    first[0].description = 'changed'
+    assert cached.list_entries()[0].description == 'Windows Boot Manager'
+
+
+def test_disk_tier_survives_a_new_process(disk):
+    mgr = FakeManager()
+    CachedBootManager(mgr, disk_dir=disk).list_entries()
+    files = os.listdir(disk)
+    assert len(files) == 1 and files[0].startswith('entries-')
+
+    again = CachedBootManager(mgr, disk_dir=disk)
+    assert [e.id for e in again.list_entries()] == ['0000', '0001']
+    assert mgr.listings == 1 and again.stats.disk_hits == 1
+    assert again.list_entries() and again.stats.hits == 1
+
+
+def test_changed_fingerprint_is_a_miss(disk):
+    mgr = FakeManager()
+    CachedBootManager(mgr, disk_dir=disk).list_entries()
+    mgr.fp = 'fp-2'
+    mgr.entries.append(BootEntry('0002', 'Fedora'))
+    again = CachedBootManager(mgr, disk_dir=disk)
+    assert [e.id for e in again.list_entries()] == ['0000', '0001', '0002']
+    assert mgr.listings == 2 and again.stats.disk_hits == 0 and again.stats.misses == 1
+
+
+def test_snapshot_from_another_boot_is_ignored(disk, monkeypatch):
+    mgr = FakeManager()
+    CachedBootManager(mgr, disk_dir=disk).list_entries()
+    monkeypatch.setattr(cache, 'boot_id', lambda: 'another-boot')
+    again = CachedBootManager(mgr, disk_dir=disk)
+    again.list_entries()
+    assert mgr.listings == 2 and again.stats.disk_hits == 0
+
+
+def test_corrupt_snapshot_is_a_miss(disk):
+    mgr = FakeManager()
+    cached = CachedBootManager(mgr, disk_dir=disk)
+    cached.list_entries()
+    path = cached._disk_path()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"version": ')
+    assert CachedBootManager(mgr, disk_dir=disk).list_entries()
+    assert mgr.listings == 2
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f)['fingerprint'] == 'fp-1'  # rewritten
+
+
+def test_mutations_drop_both_tiers(disk):
+    mgr = FakeManager()
+    cached = CachedBootManager(mgr, disk_dir=disk)
+    cached.list_entries()
+    assert not cached.set_next('ffff')[0]
+    assert cached.stats.invalidations == 0 and os.listdir(disk)
+    assert cached.set_next('0000')[0]
+    assert cached.stats.invalidations == 1 and mgr.invalidations == 1
+    assert os.listdir(disk) == []
+    cached.list_entries()
+    assert mgr.listings == 2
+
+
+def test_max_age(disk, monkeypatch):
+    mgr = FakeManager()
+    cached = CachedBootManager(mgr, max_age=5, disk_dir=disk)
+    cached.list_entries()
+    now = cache.time.time()
+    monkeypatch.setattr(cache.time, 'time', lambda: now + 6)
+    cached.list_entries()
+    assert mgr.listings == 2
+    # max_age 0 disables both tiers but still keeps a snapshot for others
+    off = CachedBootManager(mgr, max_age=0, disk_dir=disk)
+    off.list_entries()
+    off.list_entries()
+    assert mgr.listings == 4 and off.stats.hits == off.stats.disk_hits == 0
+
+
+def test_no_disk_tier():
+    mgr = FakeManager()
+    cached = CachedBootManager(mgr, disk=False)
+    cached.list_entries()
+    cached.list_entries()
+    assert mgr.listings == 1 and cached._disk_path() is None
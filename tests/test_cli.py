@@ -0,0 +1,85 @@
+from __future__ import annotations
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import fixtures
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+DEFAULT_KEYS = ['id', 'description', 'is_current', 'is_next']
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux'), reason='efivarfs fixtures are a Linux backend')
+
+
+@pytest.fixture
+def firmware_env(tmp_path):
+    fw = fixtures.make_firmware(6, seed=0)
+    env = dict(os.environ,
+               PYTHONPATH=SRC,
+               SYS_SWITCH_EFIVARS=fixtures.write_efivars(fw, str(tmp_path / 'efivars')),
+               SYS_SWITCH_BLOCKDEV_ROOT=fixtures.write_blockdev(fw, str(tmp_path / 'blockdev')),
+               SYS_SWITCH_CACHE_DIR=str(tmp_path / 'cache'),
+               XDG_RUNTIME_DIR=str(tmp_path / 'run'))
+    return env
+
+
+def cli(env, *args, code: str | None = None) -> subprocess.CompletedProcess:
+    argv = [sys.executable, '-c', code, *args] if code else [sys.executable, '-m', 'sys_switch', *args]
+    return subprocess.run(argv, env=env, capture_output=True, text=True, timeout=60)
+
+
+def test_json_schema_unchanged_without_fields(firmware_env):
+    cp = cli(firmware_env, '--cli', '--no-daemon', 'list', '-o', 'json')
+    assert cp.returncode == 0, cp.stderr
+    rows = json.loads(cp.stdout)
+    assert rows and all(list(r) == DEFAULT_KEYS for r in rows)
+
+    cp = cli(firmware_env, '--cli', '--no-daemon', 'list', '-o', 'ndjson')
+    assert [list(json.loads(line)) for line in cp.stdout.splitlines()] == [DEFAULT_KEYS] * len(rows)
+
+    cp = cli(firmware_env, '--cli', '--no-daemon', 'get', rows[0]['id'])
+    assert cp.returncode == 0, cp.stderr
+    assert set(json.loads(cp.stdout)) == {'id', 'description', 'is_current', 'is_next', 'extra'}
+
+
+def test_joins_only_when_requested(firmware_env):
+    cp = cli(firmware_env, '--cli', '--no-daemon', 'list', '-o', 'ndjson', '--fields', 'id,device,os')
+    assert cp.returncode == 0, cp.stderr
+    rows = [json.loads(line) for line in cp.stdout.splitlines()]
+    assert all(list(r) == ['id', 'device', 'os'] for r in rows)
+    assert any(r['device'] for r in rows)
+
+    cp = cli(firmware_env, '--cli', '--no-daemon', 'get', rows[0]['id'], '--fields', 'id,device')
+    assert cp.returncode == 0, cp.stderr
+    entry = json.loads(cp.stdout)
+    assert list(entry) == ['id', 'device'] and entry['device']['path'].startswith('/dev/')
+
+
+def test_default_listing_skips_device_scan(firmware_env):
+    code = ('import sys; sys.argv[1:] = ["--cli", "--no-daemon", "list", "-o", "json"]\n'
+            'from sys_switch.main import main\n'
+            'try:\n    main()\nexcept SystemExit:\n    pass\n'
+            'print(sorted(m for m in ("sys_switch.platforms.blockdev", "sys_switch.platforms.osdetect") '
+            'if m in sys.modules), file=sys.stderr)')
+    cp = cli(firmware_env, code=code)
+    assert cp.stderr.strip().splitlines()[-1] == '[]'
+
+
+def test_unknown_field(firmware_env):
+    cp = cli(firmware_env, '--cli', '--no-daemon', 'get', '0000', '--fields', 'id,bogus')
+    assert cp.returncode == 2
+    assert 'bogus' in cp.stderr
+
+
+def test_cli_startup_imports_no_gui_or_foreign_backend(firmware_env):
+    code = ('import sys; sys.argv[1:] = ["--cli", "--no-daemon", "list", "-o", "json"]\n'
+            'from sys_switch.main import main\n'
+            'try:\n    main()\nexcept SystemExit:\n    pass\n'
+            'print(sorted(m for m in sys.modules if m.split(".")[0] == "PySide6" or m.startswith('
+            '("sys_switch.gui", "sys_switch.platforms.windows", "sys_switch.platforms.bcd"))), file=sys.stderr)')
+    cp = cli(firmware_env, code=code)
+    assert json.loads(cp.stdout)
+    assert cp.stderr.strip().splitlines()[-1] == '[]'
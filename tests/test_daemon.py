@@ -0,0 +1,143 @@
+from __future__ import annotations
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from sys_switch import daemon
+from sys_switch.daemon import StateDaemon, query
+from sys_switch.models import BootEntry
+
+
+class PollingManager:
+    """No watch_paths, so the daemon polls `fingerprint()`."""
+
+    def __init__(self) -> None:
+        self.entries = [BootEntry('{9DEA862C-5CDD-4E70-ACC1-F32B344D4795}', 'Windows Boot Manager', True),
+                        BootEntry('000A', 'ubuntu')]
+        self.version = 1
+        self.listings = 0
+
+    def fingerprint(self) -> str:
+        return str(self.version)
+
+    def list_entries(self):
+        self.listings += 1
+        return list(self.entries)
+
+
+def _daemon(manager, tmp_path) -> StateDaemon:
+    d = StateDaemon(manager, str(tmp_path / 'daemon.sock'), debounce=0)
+    d._publish(d.watcher.start())
+    return d
+
+
+def _reply(d: StateDaemon, req: dict, refresh: bool = True) -> dict:
+    return json.loads(d.handle(req, refresh=refresh))
+
+
+def test_get_is_case_insensitive(tmp_path):
+    d = _daemon(PollingManager(), tmp_path)
+    assert _reply(d, {'op': 'get', 'id': '000a'})['entry']['description'] == 'ubuntu'
+    assert _reply(d, {'op': 'get', 'id': '{9dea862c-5cdd-4e70-acc1-f32b344d4795}'})['ok']
+    missing = _reply(d, {'op': 'get', 'id': '000B'})
+    assert not missing['ok'] and '000B' in missing['error']
+    assert not _reply(d, {'op': 'get', 'id': 7})['ok']
+    assert not _reply(d, {'op': 'get'})['ok']
+
+
+def test_poll_mode_query_sees_change_before_next_poll(tmp_path):
+    mgr = PollingManager()
+    d = _daemon(mgr, tmp_path)
+    assert not d.watcher.event_driven
+    assert _reply(d, {'op': 'list'})['generation'] == 1
+    listings = mgr.listings
+    # Unchanged fingerprint: answered from the snapshot
+    _reply(d, {'op': 'list'})
+    assert mgr.listings == listings
+
+    mgr.entries = mgr.entries + [BootEntry('000B', 'Fedora', is_next=True)]
+    mgr.version += 1
+    reply = _reply(d, {'op': 'list'})
+    assert reply['generation'] == 2
+    assert [e['id'] for e in reply['entries']][-1] == '000B'
+    assert _reply(d, {'op': 'get', 'id': '000b'})['entry']['is_next']
+    # The change was consumed; the periodic poll does not re-list it again
+    assert not d.watcher.poll()
+
+
+def test_unprivileged_peer_is_answered_from_the_snapshot(tmp_path, monkeypatch):
+    mgr = PollingManager()
+    d = _daemon(mgr, tmp_path)
+    d._shared = True
+    monkeypatch.setattr(daemon, '_peer_uid', lambda conn: os.geteuid() + 1)
+    assert not d.may_refresh(None)
+    mgr.entries = mgr.entries + [BootEntry('000B', 'Fedora')]
+    mgr.version += 1
+    listings = mgr.listings
+    assert _reply(d, {'op': 'list'}, refresh=False)['generation'] == 1
+    assert mgr.listings == listings
+    monkeypatch.setattr(daemon, '_peer_uid', lambda conn: os.geteuid())
+    assert d.may_refresh(None)
+    assert _reply(d, {'op': 'list'})['generation'] == 2
+
+
+@pytest.mark.skipif(not hasattr(socket, 'SO_PEERCRED'), reason='SO_PEERCRED is Linux-only')
+def test_peer_uid():
+    a, b = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    with a, b:
+        assert daemon._peer_uid(a) == os.getuid()
+
+
+def _serve(d: StateDaemon) -> threading.Thread:
+    t = threading.Thread(target=d.serve_forever, daemon=True)
+    t.start()
+    deadline = time.monotonic() + 5
+    while query({'op': 'status'}, path=d.path) is None and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return t
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Unix sockets only')
+def test_failing_query_keeps_the_connection(tmp_path):
+    class FailingManager(PollingManager):
+        def fingerprint(self) -> str:
+            if self.version > 1:
+                raise PermissionError('efivarfs went away')
+            return super().fingerprint()
+
+    mgr = FailingManager()
+    d = StateDaemon(mgr, str(tmp_path / 'daemon.sock'), debounce=0)
+    t = _serve(d)
+    try:
+        mgr.version += 1
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(5)
+            s.connect(d.path)
+            f = s.makefile('rwb')
+            f.write(b'{"op": "list"}\n{"op": "status"}\n')
+            f.flush()
+            failed = json.loads(f.readline())
+            assert not failed['ok'] and 'PermissionError' in failed['error']
+            assert json.loads(f.readline())['ok']
+    finally:
+        d.shutdown()
+        t.join(5)
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Unix sockets only')
+def test_socket_round_trip(tmp_path):
+    mgr = PollingManager()
+    d = StateDaemon(mgr, str(tmp_path / 'daemon.sock'), debounce=0)
+    t = _serve(d)
+    try:
+        assert query({'op': 'status'}, path=d.path)['mode'] == 'poll'
+        assert query({'op': 'get', 'id': '000a'}, path=d.path)['entry']['id'] == '000A'
+        assert query({'op': 'nope'}, path=d.path)['ok'] is False
+    finally:
+        d.shutdown()
+        t.join(5)
+    assert not os.path.exists(d.path)
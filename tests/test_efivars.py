@@ -0,0 +1,183 @@
+from __future__ import annotations
+import errno
+import os
+import shutil
+import struct
+import tempfile
+
+import pytest
+
+import fixtures
+from sys_switch.platforms import efivars
+from sys_switch.platforms.efivars import (DEFAULT_ATTRIBUTES, EFI_GLOBAL_GUID, FS_IMMUTABLE_FL, EfiVarError,
+                                          EfiVarStore)
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason='efivarfs is Linux-only; fixtures need POSIX ioctls')
+
+
+@pytest.fixture
+def fw():
+    return fixtures.make_firmware(12, seed=4)
+
+
+@pytest.fixture
+def store(fw):
+    # tmpfs, like efivarfs a RAM filesystem; fall back to the regular temp dir elsewhere
+    base = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else None
+    root = tempfile.mkdtemp(prefix='efivars-', dir=base)
+    try:
+        yield EfiVarStore(fixtures.write_efivars(fw, root))
+    finally:
+        _clear_immutable(root)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def _raw(store: EfiVarStore, name: str) -> bytes:
+    with open(store.path(name), 'rb') as f:
+        return f.read()
+
+
+def _flags(path: str) -> int | None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return efivars._get_flags(fd)
+    finally:
+        os.close(fd)
+
+
+def _make_immutable(path: str) -> None:
+    """Set FS_IMMUTABLE_FL like efivarfs does, or skip where the filesystem/privileges do not allow it."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        flags = efivars._get_flags(fd)
+        if flags is None:
+            pytest.skip('filesystem has no inode flags')
+        try:
+            efivars._set_flags(fd, flags | FS_IMMUTABLE_FL)
+        except OSError as e:
+            if e.errno in (errno.EPERM, errno.EACCES) + efivars._NO_FLAGS_ERRNOS:
+                pytest.skip(f'cannot set the immutable flag here: {e}')
+            raise
+    finally:
+        os.close(fd)
+
+
+def _clear_immutable(root: str) -> None:
+    for name in os.listdir(root):
+        try:
+            fd = os.open(os.path.join(root, name), os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            flags = efivars._get_flags(fd)
+            if flags is not None and flags & FS_IMMUTABLE_FL:
+                efivars._set_flags(fd, flags & ~FS_IMMUTABLE_FL)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+def test_read_state_matches_firmware(store, fw):
+    state = store.read_state()
+    assert state.current == fw.current
+    assert state.next == fw.next
+    assert state.order == fw.order
+    assert state.timeout == fw.timeout
+    assert {bid: o.description for bid, o in state.options.items()} == {o.id: o.description for o in fw.options}
+    assert [e.id for e in state.to_entries()][:len(fw.order)] == fw.order
+
+
+def test_write_prepends_attribute_header(store):
+    store.write('BootNext', struct.pack('<H', 3))
+    assert _raw(store, 'BootNext') == struct.pack('<IH', DEFAULT_ATTRIBUTES, 3)
+    store.write('Custom', b'abc', attributes=0x6)
+    assert store.read('Custom') == (0x6, b'abc')
+
+
+def test_write_replaces_longer_value(store):
+    store.write('BootOrder', struct.pack('<H', 1))
+    assert _raw(store, 'BootOrder') == struct.pack('<IH', DEFAULT_ATTRIBUTES, 1)
+
+
+def test_truncated_variable(store):
+    with open(store.path('BootCurrent'), 'wb') as f:
+        f.write(b'\x07\x00')
+    with pytest.raises(EfiVarError):
+        store.read('BootCurrent')
+
+
+def test_set_boot_next_reads_back(store, fw):
+    target = fw.options[5].id
+    store.set_boot_next(target.lower())
+    assert store.read_u16('BootNext') == target
+    assert store.read_state().next == target
+
+
+def test_set_boot_next_rejects_missing_and_invalid(store):
+    with pytest.raises(EfiVarError) as e:
+        store.set_boot_next('0FFF')
+    assert e.value.errno == errno.ENOENT
+    with pytest.raises(EfiVarError) as e:
+        store.set_boot_next('zz')
+    assert e.value.errno == errno.EINVAL
+
+
+def test_set_boot_next_verification_failure(store, fw, monkeypatch):
+    monkeypatch.setattr(store, 'read_u16', lambda name: '0000')
+    with pytest.raises(EfiVarError) as e:
+        store.set_boot_next(fw.options[5].id)
+    assert e.value.errno == errno.EIO
+
+
+def test_set_boot_order_reads_back(store, fw):
+    order = list(reversed(fw.order))
+    store.set_boot_order(order)
+    assert store.read_boot_order() == order
+
+
+def test_set_boot_order_verification_failure(store, fw, monkeypatch):
+    monkeypatch.setattr(store, 'read_boot_order', lambda: [])
+    with pytest.raises(EfiVarError) as e:
+        store.set_boot_order(fw.order)
+    assert e.value.errno == errno.EIO
+
+
+def test_clear_boot_next(store):
+    assert store.clear_boot_next()
+    assert store.read('BootNext') is None
+    assert not store.clear_boot_next()
+
+
+def test_write_clears_and_restores_immutable(store, fw):
+    path = store.path('BootNext')
+    _make_immutable(path)
+    target = fw.options[2].id
+    store.set_boot_next(target)
+    assert store.read_u16('BootNext') == target
+    assert _flags(path) & FS_IMMUTABLE_FL
+
+
+def test_delete_leaves_no_immutable_file(store):
+    _make_immutable(store.path('BootNext'))
+    assert store.clear_boot_next()
+    assert not os.path.exists(store.path('BootNext'))
+
+
+def test_write_without_inode_flags(store, fw, monkeypatch):
+    # tmpfs before Linux 6.0, FUSE: the flag ioctls fail with ENOTTY and writes go ahead
+    import fcntl
+    fcntl_ioctl = fcntl.ioctl
+
+    def no_flags(fd, request, arg=0, *rest):
+        if request in (efivars.FS_IOC_GETFLAGS, efivars.FS_IOC_SETFLAGS):
+            raise OSError(errno.ENOTTY, os.strerror(errno.ENOTTY))
+        return fcntl_ioctl(fd, request, arg, *rest)
+
+    monkeypatch.setattr(fcntl, 'ioctl', no_flags)
+    store.set_boot_next(fw.options[1].id)
+    assert store.read_u16('BootNext') == fw.options[1].id
+
+
+def test_variable_names_use_global_guid(store):
+    assert os.path.basename(store.path('BootNext')) == f'BootNext-{EFI_GLOBAL_GUID}'
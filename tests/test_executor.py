@@ -0,0 +1,137 @@
+from __future__ import annotations
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from sys_switch.platforms import executor
+from sys_switch.platforms.executor import TIMEOUT_RETURNCODE, Executor
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='fake commands are POSIX shell scripts')
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A zombie still answers signal 0; it is dead as far as we care
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except OSError:
+        return True
+
+
+def _wait_for(pred, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if pred():
+            return True
+        time.sleep(0.02)
+    return pred()
+
+
+def _counter(path) -> int:
+    try:
+        return len(path.read_text().splitlines())
+    except FileNotFoundError:
+        return 0
+
+
+def test_timeout_kills_process_group(fake_bin, tmp_path):
+    pidfile = tmp_path / 'grandchild.pid'
+    fake_bin('hang', f'sleep 60 &\necho $! > {pidfile}\nwait\n')
+    t0 = time.monotonic()
+    cp = Executor().run(['hang'], timeout=0.5)
+    assert time.monotonic() - t0 < 5
+    assert cp.returncode == TIMEOUT_RETURNCODE
+    assert cp.timed_out
+    assert '命令超时' in cp.stderr
+    grandchild = int(pidfile.read_text())
+    assert _wait_for(lambda: not _alive(grandchild))
+
+
+def test_timeout_with_check_raises(fake_bin):
+    fake_bin('hang', 'exec sleep 60\n')
+    with pytest.raises(subprocess.TimeoutExpired):
+        Executor().run(['hang'], timeout=0.3, check=True)
+
+
+def test_identical_readonly_commands_share_one_process(fake_bin, tmp_path):
+    runs = tmp_path / 'runs'
+    fake_bin('slow', f'echo run >> {runs}\nsleep 0.5\necho listing\n')
+    ex = Executor()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(ex.run(['slow'], readonly=True)))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert _counter(runs) == 1
+    assert [cp.stdout for cp in results] == ['listing\n'] * 4
+    assert sum(bool(getattr(cp, 'coalesced', False)) for cp in results) == 3
+
+
+def test_coalesced_follower_sees_timeout(fake_bin):
+    fake_bin('hang', 'exec sleep 60\n')
+    ex = Executor()
+    results = []
+
+    def call():
+        try:
+            results.append(ex.run(['hang'], readonly=True, timeout=0.5, check=True))
+        except subprocess.TimeoutExpired as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(results) == 3
+    assert all(isinstance(r, subprocess.TimeoutExpired) for r in results)
+
+
+def test_mutating_command_invalidates_readonly_flight(fake_bin, tmp_path):
+    runs = tmp_path / 'runs'
+    fake_bin('slow', f'echo run >> {runs}\nsleep 0.5\necho listing\n')
+    fake_bin('mutate', 'exit 0\n')
+    ex = Executor()
+    first = threading.Thread(target=ex.run, args=(['slow'],), kwargs={'readonly': True})
+    first.start()
+    assert _wait_for(lambda: _counter(runs) == 1)
+    assert ex.run(['mutate']).returncode == 0
+    # Started after the mutation: must not reuse output captured before it
+    cp = ex.run(['slow'], readonly=True)
+    first.join()
+    assert _counter(runs) == 2
+    assert not getattr(cp, 'coalesced', False)
+
+
+def test_slot_wait_counts_against_deadline(fake_bin):
+    fake_bin('hang', 'exec sleep 60\n')
+    fake_bin('quick', 'echo ok\n')
+    ex = Executor(max_concurrency=1)
+    blocker = threading.Thread(target=ex.run, args=(['hang'],), kwargs={'timeout': 2.0})
+    blocker.start()
+    time.sleep(0.2)
+    t0 = time.monotonic()
+    cp = ex.run(['quick'], timeout=0.3)
+    assert time.monotonic() - t0 < 1.5
+    assert cp.returncode == TIMEOUT_RETURNCODE
+    assert cp.timed_out
+    blocker.join()
+    assert ex.run(['quick'], timeout=2.0).stdout == 'ok\n'
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('12.5', 12.5), ('', 30.0), ('abc', 30.0), ('-1', 30.0), ('0', 30.0), ('nan', 30.0), ('inf', 30.0),
+])
+def test_env_timeout(monkeypatch, raw, expected):
+    monkeypatch.setenv('SYS_SWITCH_CMD_TIMEOUT', raw)
+    assert executor._env_timeout('SYS_SWITCH_CMD_TIMEOUT', 30.0) == expected
@@ -0,0 +1,151 @@
+from __future__ import annotations
+import io
+import json
+import os
+import shlex
+import sys
+import threading
+
+import pytest
+
+import fixtures
+from sys_switch.cli import build_parser
+from sys_switch.fleet import FleetRunner, Host, LocalTransport, parse_inventory, run_fleet
+from sys_switch.platforms.executor import Executor
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='fake hosts are POSIX shell scripts')
+
+
+class RecordingStop(threading.Event):
+    """Stands in for FleetRunner._stop and records the backoff waits instead of sleeping."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.waits = []
+
+    def wait(self, timeout=None):
+        self.waits.append(timeout)
+        return False
+
+
+def _host(fake_bin, tmp_path, name: str, entries: list, fail: str = '') -> str:
+    """A fake `sys-switch` for one host; returns its inventory line."""
+    listing = tmp_path / f'{name}.json'
+    listing.write_text(json.dumps(entries, ensure_ascii=False))
+    log = tmp_path / f'{name}.log'
+    script = fake_bin(f'host-{name}', f'''echo "$*" >> {log}
+{fail}
+case "$2" in
+  list) cat {listing} ;;
+  set) echo "已设置下次启动项: $3" ;;
+  reboot) echo "正在重启" ;;
+  *) echo "unknown $2" >&2; exit 2 ;;
+esac
+''')
+    return f'{name} command={shlex.quote(script)}'
+
+
+def _calls(tmp_path, name: str) -> list:
+    log = tmp_path / f'{name}.log'
+    return log.read_text().splitlines() if log.exists() else []
+
+
+def _entries(*rows) -> list:
+    return [{'id': i, 'description': d, 'is_current': False, 'is_next': False} for i, d in rows]
+
+
+def _fleet(tmp_path, inventory: list, *argv) -> tuple:
+    path = tmp_path / 'hosts.txt'
+    path.write_text('# lab\n' + '\n'.join(inventory) + '\n')
+    args = build_parser().parse_args(['fleet', *argv, '-i', str(path), '--transport', 'local'])
+    out = io.StringIO()
+    code = run_fleet(args, out=out)
+    return code, {r['host']: r for r in map(json.loads, out.getvalue().splitlines())}
+
+
+def test_list_on_fixture_hosts(tmp_path, monkeypatch):
+    monkeypatch.setenv('PYTHONPATH', SRC)
+    inventory = []
+    for i in range(3):
+        efivars = fixtures.write_efivars(fixtures.make_firmware(4 + i, seed=i), str(tmp_path / f'efivars{i}'))
+        inventory.append(f'h{i} env.SYS_SWITCH_EFIVARS={efivars} env.SYS_SWITCH_CACHE_DIR={tmp_path / "cache"}')
+    code, results = _fleet(tmp_path, inventory, 'list', '--timeout', '60')
+    assert code == 0
+    assert sorted(results) == ['h0', 'h1', 'h2']
+    for i in range(3):
+        r = results[f'h{i}']
+        assert list(r) == ['action', 'host', 'ok', 'entries', 'elapsed_ms']
+        assert r['action'] == 'list' and r['ok'] is True
+        assert len(r['entries']) == 4 + i
+        assert set(r['entries'][0]) == {'id', 'description', 'is_current', 'is_next'}
+
+
+def test_set_resolves_match_per_host(tmp_path, fake_bin, capsys):
+    inventory = [
+        _host(fake_bin, tmp_path, 'a', _entries(('0000', 'Windows Boot Manager'), ('0003', 'ubuntu'))),
+        _host(fake_bin, tmp_path, 'b', _entries(('0001', 'Ubuntu'), ('0002', 'Fedora'))),
+        _host(fake_bin, tmp_path, 'c', _entries(('0000', 'ubuntu'), ('0001', 'ubuntu  '))),
+        _host(fake_bin, tmp_path, 'd', _entries(('0000', 'Windows Boot Manager'))),
+    ]
+    code, results = _fleet(tmp_path, inventory, 'set', '--match', 'ubuntu', '--reboot')
+    assert code == 1
+    assert (results['a']['id'], results['a']['description']) == ('0003', 'ubuntu')
+    assert results['a']['message'] == '已设置下次启动项: 0003'
+    assert results['a']['rebooted'] is True and results['a']['reboot_message'] == '正在重启'
+    assert results['b']['id'] == '0001'
+    assert _calls(tmp_path, 'b') == ['--cli list -o json', '--cli set 0001', '--cli reboot']
+    # Ambiguous or missing matches fail that host only, before anything is written
+    assert not results['c']['ok'] and '匹配多个' in results['c']['error']
+    assert not results['d']['ok'] and '没有与' in results['d']['error']
+    assert _calls(tmp_path, 'c') == _calls(tmp_path, 'd') == ['--cli list -o json']
+    assert capsys.readouterr().err.startswith('2/4 台主机成功')
+
+
+def test_timeouts_are_retried_with_backoff(tmp_path, fake_bin):
+    count = tmp_path / 'attempts'
+    # The first two attempts hang past the deadline, the third answers
+    line = _host(fake_bin, tmp_path, 'slow', _entries(('0000', 'ubuntu')),
+                 fail=f'echo x >> {count}\n[ "$(wc -l < {count})" -ge 3 ] || exec sleep 30')
+    host = parse_inventory([line])[0]
+    runner = FleetRunner(LocalTransport(Executor()), timeout=0.5, retries=2, backoff=0.1)
+    runner._stop = RecordingStop()
+    assert runner.host_list(host)['entries'][0]['id'] == '0000'
+    assert len(_calls(tmp_path, 'slow')) == 3
+    assert runner._stop.waits == [0.1, 0.2]
+
+
+def test_retries_give_up_and_report_attempts(tmp_path, fake_bin):
+    line = _host(fake_bin, tmp_path, 'dead', [], fail='exec sleep 30')
+    code, results = _fleet(tmp_path, [line], 'list', '--timeout', '0.3', '--retries', '1')
+    assert code == 1
+    r = results['dead']
+    assert r['ok'] is False and r['attempts'] == 2 and '超时' in r['error']
+
+
+def test_host_errors_are_not_retried(tmp_path, fake_bin):
+    line = _host(fake_bin, tmp_path, 'broken', [], fail='echo "需要root权限" >&2; exit 1')
+    runner = FleetRunner(LocalTransport(Executor()), timeout=5, retries=3)
+    runner._stop = RecordingStop()
+    out = []
+    failed = runner.run(parse_inventory([line]), runner.host_list, workers=2, emit=out.append)
+    assert failed == 1
+    assert out[0]['error'] == '需要root权限' and out[0]['attempts'] == 1
+    assert runner._stop.waits == []
+
+
+def test_reboot_is_never_retried(tmp_path, fake_bin):
+    line = _host(fake_bin, tmp_path, 'r', [], fail='exec sleep 30')
+    runner = FleetRunner(LocalTransport(Executor()), timeout=0.3, retries=3)
+    out = []
+    assert runner.run(parse_inventory([line]), runner.host_reboot, workers=1, emit=out.append) == 1
+    assert out[0]['attempts'] == 1
+    assert len(_calls(tmp_path, 'r')) == 1
+
+
+def test_inventory_env_reaches_the_host_command(tmp_path, fake_bin):
+    script = fake_bin('host-env', 'printf \'[{"id": "%s", "description": "%s"}]\' "$SYS_SWITCH_DAEMON" "$LAB_TAG"\n')
+    host = Host('e', {'command': script, 'env.LAB_TAG': 'rack 4'})
+    runner = FleetRunner(LocalTransport(Executor()))
+    assert runner.host_list(host)['entries'] == [{'id': '0', 'description': 'rack 4'}]
@@ -0,0 +1,275 @@
+from __future__ import annotations
+import os
+
+import pytest
+
+from sys_switch.platforms import grub
+from sys_switch.platforms.grub import (GRUBENV_HEADER, GRUBENV_SIZE, GrubEnv, GrubEnvError, GrubMenuCache,
+                                       _logical_lines, iter_menu_entries, parse_grub_cfg, parse_grubenv,
+                                       render_grubenv)
+
+
+def _mountinfo(tmp_path, *mounts) -> str:
+    """A mountinfo file with `/` on ext4 plus `(mountpoint, fstype, source)` rows."""
+    rows = ['22 1 259:2 / / rw,relatime shared:1 - ext4 /dev/nvme0n1p2 rw']
+    for i, (point, fstype, source) in enumerate(mounts, 30):
+        rows.append(f'{i} 22 0:{i} / {str(point).replace(" ", chr(92) + "040")} rw,relatime - {fstype} {source} rw')
+    path = tmp_path / 'mountinfo'
+    path.write_text('\n'.join(rows) + '\n')
+    return str(path)
+
+
+@pytest.fixture
+def grubenv(tmp_path):
+    boot = tmp_path / 'boot grub'
+    boot.mkdir()
+    path = boot / 'grubenv'
+    path.write_bytes(render_grubenv({'saved_entry': 'gnulinux-simple-0d7c', 'boot_success': '1'}))
+    return path
+
+
+def test_round_trip_keeps_the_block_in_place(grubenv, tmp_path):
+    env = GrubEnv(str(grubenv), mountinfo=_mountinfo(tmp_path, (grubenv.parent, 'ext4', '/dev/nvme0n1p1')))
+    inode = os.stat(grubenv).st_ino
+    env.set_next_entry('gnulinux-advanced-0d7c>gnulinux-6.8.0-45-generic-advanced-0d7c')
+    data = grubenv.read_bytes()
+    assert len(data) == GRUBENV_SIZE and data.startswith(GRUBENV_HEADER)
+    body = data.rstrip(b'#')
+    assert body.endswith(b'\n') and set(data[len(body):]) == {ord('#')}
+    assert os.stat(grubenv).st_ino == inode
+    assert env.read() == {'saved_entry': 'gnulinux-simple-0d7c', 'boot_success': '1',
+                          'next_entry': 'gnulinux-advanced-0d7c>gnulinux-6.8.0-45-generic-advanced-0d7c'}
+
+    # Backslashes and newlines use GRUB's escaping and survive the trip
+    env.update({'note': 'a\\b\nc'})
+    assert b'note=a\\\\b\\\nc\n' in grubenv.read_bytes()
+    assert env.read()['note'] == 'a\\b\nc'
+
+    env.clear_next_entry()
+    env.update({'note': None})
+    assert grubenv.read_bytes() == render_grubenv({'saved_entry': 'gnulinux-simple-0d7c', 'boot_success': '1'})
+    assert os.stat(grubenv).st_ino == inode
+
+
+def test_oversize_payload_is_refused_untouched(grubenv, tmp_path):
+    env = GrubEnv(str(grubenv), mountinfo=_mountinfo(tmp_path))
+    before = grubenv.read_bytes()
+    with pytest.raises(GrubEnvError, match=str(GRUBENV_SIZE)):
+        env.set_next_entry('x' * GRUBENV_SIZE)
+    assert grubenv.read_bytes() == before
+
+    # Exactly full still fits: no padding left, nothing cut off
+    room = GRUBENV_SIZE - len(render_grubenv({'saved_entry': 'gnulinux-simple-0d7c', 'boot_success': '1'})
+                              .rstrip(b'#')) - len('next_entry=\n')
+    env.set_next_entry('y' * room)
+    data = grubenv.read_bytes()
+    assert len(data) == GRUBENV_SIZE and data.endswith(b'y\n')
+    with pytest.raises(GrubEnvError):
+        env.set_next_entry('y' * (room + 1))
+    assert grubenv.read_bytes() == data
+
+
+@pytest.mark.parametrize('fstype, source', [
+    ('btrfs', '/dev/nvme0n1p3'),
+    ('zfs', 'rpool/ROOT/ubuntu'),
+    ('ext4', '/dev/mapper/vg0-boot'),
+    ('xfs', '/dev/dm-2'),
+    ('ext4', '/dev/md127'),
+])
+def test_refuses_filesystems_grub_cannot_write(grubenv, tmp_path, fstype, source):
+    env = GrubEnv(str(grubenv), mountinfo=_mountinfo(tmp_path, (grubenv.parent, fstype, source)))
+    before = grubenv.read_bytes()
+    reason = env.check_writable()
+    assert reason and (fstype in reason or source in reason)
+    with pytest.raises(GrubEnvError, match='无法写入'):
+        env.set_next_entry('1')
+    with pytest.raises(GrubEnvError):
+        env.clear_next_entry()
+    assert grubenv.read_bytes() == before
+
+
+def test_most_specific_mount_decides(grubenv, tmp_path):
+    # btrfs root, but /boot is its own ext4 partition
+    mountinfo = _mountinfo(tmp_path, (tmp_path, 'btrfs', '/dev/nvme0n1p3'),
+                           (grubenv.parent, 'ext4', '/dev/nvme0n1p1'))
+    assert GrubEnv(str(grubenv), mountinfo=mountinfo).check_writable() is None
+    mountinfo = _mountinfo(tmp_path, (grubenv.parent, 'ext4', '/dev/nvme0n1p1'),
+                           (tmp_path, 'btrfs', '/dev/nvme0n1p3'))
+    assert GrubEnv(str(grubenv), mountinfo=mountinfo).check_writable() is None
+    assert GrubEnv(str(grubenv), mountinfo=_mountinfo(tmp_path, (tmp_path, 'btrfs', '/dev/sda2'))).check_writable()
+
+
+def test_refuses_a_block_that_is_not_grubenv(grubenv, tmp_path):
+    env = GrubEnv(str(grubenv), mountinfo=_mountinfo(tmp_path))
+    for data in (b'saved_entry=0\n', render_grubenv({}) + b'#', b'# not a header\n'.ljust(GRUBENV_SIZE, b'#')):
+        grubenv.write_bytes(data)
+        with pytest.raises(GrubEnvError, match='不是有效的 grubenv'):
+            env.set_next_entry('0')
+        assert grubenv.read_bytes() == data
+
+
+def test_parse_ignores_padding_and_comments():
+    block = render_grubenv({'saved_entry': '2', 'next_entry': ''})
+    assert parse_grubenv(block) == {'saved_entry': '2', 'next_entry': ''}
+    assert parse_grubenv(GRUBENV_HEADER + b'# comment\nfoo=bar=baz\nnoequals\n') == {'foo': 'bar=baz'}
+
+
+GRUB_CFG = r'''#
+# DO NOT EDIT THIS FILE
+#
+if [ x"${feature_menuentry_id}" = xy ]; then
+  menuentry_id_option="--id"
+else
+  menuentry_id_option=""
+fi
+export menuentry_id_option
+# menuentry 'Commented out' {
+menuentry 'Ubuntu' --class ubuntu --class gnu-linux --class os $menuentry_id_option 'gnulinux-simple-0d7c' {
+	recordfail
+	echo 'menuentry "not an entry" {'
+	linux	/boot/vmlinuz root=UUID=0d7c ro quiet splash $vt_handoff
+}
+submenu 'Advanced options for Ubuntu' $menuentry_id_option 'gnulinux-advanced-0d7c' {
+	menuentry 'Ubuntu, with Linux 6.8.0-45-generic' --class ubuntu $menuentry_id_option 'gnulinux-6.8.0-45-generic-advanced-0d7c' {
+		if [ x$grub_platform = xxen ]; then insmod xzio; fi
+		linux /boot/vmlinuz-6.8.0-45-generic
+	}
+	menuentry 'Ubuntu, with Linux 6.8.0-45-generic (recovery mode)' --class ubuntu $menuentry_id_option 'gnulinux-6.8.0-45-generic-recovery-0d7c' {
+		linux /boot/vmlinuz-6.8.0-45-generic single
+	}
+}
+menuentry "Windows \"11\" on \$disk\\C:" --class windows --id=ignored --id win {
+	chainloader /EFI/Microsoft/Boot/bootmgfw.efi
+}
+menuentry 'It'\''s mine' {
+	true
+}
+menuentry Line\ continued \
+	--class custom \
+	--id cont {
+	true
+}
+menuentry 'Two
+lines' --hotkey=t { true; }
+if [ "$grub_platform" = "efi" ]; then
+	menuentry 'UEFI Firmware Settings' $menuentry_id_option 'uefi-firmware' {
+		fwsetup
+	}
+fi
+menuentry "half-#-hash" {
+	true
+}
+'''
+
+
+@pytest.fixture
+def grub_cfg(tmp_path):
+    path = tmp_path / 'grub.cfg'
+    path.write_text(GRUB_CFG)
+    return path
+
+
+def test_menu_entries_from_mkconfig_style_cfg():
+    entries = list(iter_menu_entries(GRUB_CFG.splitlines(True)))
+    assert [(e.title_path, e.index_path) for e in entries] == [
+        ('Ubuntu', '0'),
+        ('Advanced options for Ubuntu>Ubuntu, with Linux 6.8.0-45-generic', '1>0'),
+        ('Advanced options for Ubuntu>Ubuntu, with Linux 6.8.0-45-generic (recovery mode)', '1>1'),
+        ('Windows "11" on $disk\\C:', '2'),
+        ("It's mine", '3'),
+        ('Line continued', '4'),
+        ('Two\nlines', '5'),
+        ('UEFI Firmware Settings', '6'),
+        ('half-#-hash', '7'),
+    ]
+    assert [e.path for e in entries] == [
+        'gnulinux-simple-0d7c',
+        'gnulinux-advanced-0d7c>gnulinux-6.8.0-45-generic-advanced-0d7c',
+        'gnulinux-advanced-0d7c>gnulinux-6.8.0-45-generic-recovery-0d7c',
+        'win',
+        "It's mine",
+        'cont',
+        'Two\nlines',
+        'uefi-firmware',
+        'half-#-hash',
+    ]
+    sub = entries[1]
+    assert sub.ids == ('gnulinux-advanced-0d7c', 'gnulinux-6.8.0-45-generic-advanced-0d7c')
+    # grub-reboot and saved_entry may use any of the three spellings
+    for ref in (sub.path, sub.title_path, sub.index_path):
+        assert sub.matches(ref)
+    assert not sub.matches('1') and not sub.matches(None)
+
+
+def test_lexer_quotes_escapes_and_continuations():
+    lines = list(_logical_lines([
+        "a 'single \\ $x \"q\"' \"double \\\" \\\\ \\$ \\n\" b\\ c\n",
+        'x \\\n',
+        '  y; z # comment\n',
+        "'' w#not-comment\n",
+    ]))
+    assert lines == [
+        [('a', False), ('single \\ $x "q"', True), ('double " \\ $ \\n', True), ('b c', False)],
+        [('x', False), ('y', False)],
+        [('z', False)],
+        [('', True), ('w#not-comment', False)],
+    ]
+
+
+def test_parse_grub_cfg_handles_crlf(tmp_path):
+    path = tmp_path / 'grub.cfg'
+    path.write_bytes(GRUB_CFG.replace('\n', '\r\n').encode('utf-8'))
+    assert parse_grub_cfg(str(path)) == list(iter_menu_entries(GRUB_CFG.splitlines(True)))
+
+
+def _counting_parser(monkeypatch) -> list:
+    calls = []
+    real = grub.parse_grub_cfg
+    monkeypatch.setattr(grub, 'parse_grub_cfg', lambda path: calls.append(path) or real(path))
+    return calls
+
+
+def test_menu_cache_hit_and_misses(grub_cfg, tmp_path, monkeypatch):
+    cache = GrubMenuCache(str(tmp_path / 'cache'))
+    calls = _counting_parser(monkeypatch)
+    first = cache.load(str(grub_cfg))
+    assert len(first) == 9 and len(calls) == 1
+    assert GrubMenuCache(str(tmp_path / 'cache')).load(str(grub_cfg)) == first
+    assert len(calls) == 1
+
+    # mtime only
+    st = os.stat(grub_cfg)
+    os.utime(grub_cfg, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert cache.load(str(grub_cfg)) == first
+    assert len(calls) == 2
+
+    # size only (mtime put back)
+    st = os.stat(grub_cfg)
+    with open(grub_cfg, 'a') as f:
+        f.write("menuentry 'Memtest86+' {\n\ttrue\n}\n")
+    os.utime(grub_cfg, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert [e.title_path for e in cache.load(str(grub_cfg))][-1] == 'Memtest86+'
+    assert len(calls) == 3
+
+    # inode only: grub-mkconfig writes a new file and renames it over the old one
+    st = os.stat(grub_cfg)
+    new = tmp_path / 'grub.cfg.new'
+    new.write_bytes(grub_cfg.read_bytes().replace(b'Memtest86+', b'Memtest86-'))
+    os.utime(new, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(new, grub_cfg)
+    assert os.stat(grub_cfg).st_ino != st.st_ino
+    assert [e.title_path for e in cache.load(str(grub_cfg))][-1] == 'Memtest86-'
+    assert len(calls) == 4
+
+
+def test_menu_cache_survives_a_corrupt_or_unwritable_cache(grub_cfg, tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    cache = GrubMenuCache(str(cache_dir))
+    first = cache.load(str(grub_cfg))
+    for f in cache_dir.iterdir():
+        f.write_text('{"key": [')
+    calls = _counting_parser(monkeypatch)
+    assert cache.load(str(grub_cfg)) == first and len(calls) == 1
+    blocked = tmp_path / 'not-a-dir'
+    blocked.write_text('')
+    assert GrubMenuCache(str(blocked)).load(str(grub_cfg)) == first
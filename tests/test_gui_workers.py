@@ -0,0 +1,127 @@
+from __future__ import annotations
+import os
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+QtWidgets = pytest.importorskip('PySide6.QtWidgets')
+from PySide6.QtCore import QTimer  # noqa: E402
+
+from sys_switch.gui.workers import TaskRunner  # noqa: E402
+from sys_switch.models import BootEntry  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def qapp():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def _pump(qapp, until, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        qapp.processEvents()
+        if until():
+            return True
+        time.sleep(0.005)
+    return until()
+
+
+class SleepyManager:
+    """Every listing takes `delay` seconds and is labelled with its call number."""
+
+    def __init__(self, delay: float = 0.3) -> None:
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def available(self) -> bool:
+        return True
+
+    def list_entries(self):
+        with self.lock:
+            self.calls += 1
+            n = self.calls
+        time.sleep(self.delay)
+        return [BootEntry('0000', f'listing {n}', True), BootEntry('0001', 'ubuntu')]
+
+    def set_next(self, entry_id):
+        time.sleep(self.delay)
+        return True, f'已设置下次启动项: {entry_id}'
+
+    def reboot_now(self):
+        return False, 'not in tests'
+
+
+def test_submit_does_not_block_event_loop(qapp):
+    runner = TaskRunner()
+    ticks = []
+    timer = QTimer()
+    timer.timeout.connect(lambda: ticks.append(time.monotonic()))
+    timer.start(10)
+    results = []
+    t0 = time.monotonic()
+    runner.submit(time.sleep, 0.4, on_done=results.append)
+    assert time.monotonic() - t0 < 0.1
+    assert runner.busy
+    assert _pump(qapp, lambda: results)
+    timer.stop()
+    # The GUI thread kept running its timers while the worker slept
+    assert len([t for t in ticks if t < t0 + 0.35]) >= 5
+    assert not runner.busy
+    runner.shutdown()
+
+
+def test_cancelled_results_are_discarded(qapp):
+    runner = TaskRunner()
+    started = threading.Event()
+    done, busy = [], []
+    runner.busy_changed.connect(busy.append)
+
+    def slow(tag):
+        started.set()
+        time.sleep(0.3)
+        return tag
+
+    running = runner.submit(slow, 'stale', on_done=done.append)
+    queued = runner.submit(slow, 'never run', on_done=done.append)
+    assert started.wait(2)
+    runner.cancel(running)  # already running: result ignored
+    runner.cancel(queued)   # still queued: dropped
+    runner.submit(slow, 'fresh', on_done=done.append)
+    assert _pump(qapp, lambda: done)
+    assert _pump(qapp, lambda: not runner.busy)
+    assert done == ['fresh']
+    assert busy == [True, False]
+    runner.shutdown()
+
+
+def test_errors_reach_on_error(qapp):
+    runner = TaskRunner()
+    errors = []
+    runner.submit(lambda: 1 / 0, on_done=lambda r: errors.append('done'), on_error=errors.append)
+    assert _pump(qapp, lambda: errors)
+    assert errors[0].startswith('ZeroDivisionError')
+    runner.shutdown()
+
+
+def test_app_keeps_only_latest_refresh(qapp):
+    from sys_switch.gui.app import BootSwitchApp
+    mgr = SleepyManager()
+    t0 = time.monotonic()
+    w = BootSwitchApp(manager_factory=lambda show_recovery=False: mgr)
+    assert time.monotonic() - t0 < mgr.delay  # the first listing runs on the worker
+    try:
+        assert not w.btn_apply.isEnabled()
+        w.refresh()
+        w.refresh()  # supersedes the previous one before it started
+        assert _pump(qapp, lambda: w._refresh_token is None and w.model.rowCount() == 2)
+        assert _pump(qapp, lambda: w.btn_apply.isEnabled())
+        descriptions = {w.model.index(i).data() for i in range(w.model.rowCount())}
+        assert f'listing {mgr.calls}' in ' '.join(map(str, descriptions))
+        # Superseded listings never reached the model or the log
+        assert w.log.toPlainText().count('检测到 2 个引导项') == 1
+        assert mgr.calls <= 2
+    finally:
+        w.close()
@@ -0,0 +1,143 @@
+from __future__ import annotations
+import json
+import os
+import sys
+import time
+
+import pytest
+
+import fixtures
+from sys_switch import cache, handoff
+from sys_switch.cache import CachedBootManager
+from sys_switch.cli import get_manager
+from sys_switch.platforms.linux import LinuxBootManager
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='ownership checks are POSIX-only')
+
+
+@pytest.fixture
+def efivars(tmp_path, monkeypatch):
+    root = fixtures.write_efivars(fixtures.make_firmware(6, seed=4), str(tmp_path / 'efivars'))
+    monkeypatch.setenv('SYS_SWITCH_EFIVARS', root)
+    monkeypatch.setattr(handoff, 'runtime_dir', lambda: str(tmp_path / 'run'))
+    monkeypatch.setattr(cache, 'runtime_dir', lambda: str(tmp_path / 'snapshots'))
+    return root
+
+
+def _cached(tmp_path, inner=None) -> CachedBootManager:
+    return CachedBootManager(inner or LinuxBootManager(), disk_dir=str(tmp_path / 'snapshots'))
+
+
+def _publish(tmp_path, **overrides) -> str:
+    """Reserve, then write the parent's handoff; `overrides` tamper with the blob."""
+    path = handoff.reserve()
+    assert handoff.publish(path, lambda show_recovery: _cached(tmp_path), show_recovery=False)
+    if overrides:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        data.update(overrides)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+    return path
+
+
+def test_reserve_publish_load_adopt(efivars, tmp_path):
+    path = _publish(tmp_path)
+    directory = os.path.dirname(path)
+    assert directory.startswith(str(tmp_path / 'run'))
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+    blob = handoff.load(path)
+    assert not os.path.exists(directory)  # read once, then gone
+    assert blob.backend == 'LinuxBootManager' and blob.boot_id
+    assert handoff.load(path) is None
+
+    inner = LinuxBootManager()
+    calls = []
+    listing = inner.list_entries
+    inner.list_entries = lambda: calls.append(1) or listing()
+    child = _cached(tmp_path / 'child', inner)
+    assert blob.adopt(child)
+    # The first listing comes from the parent; nothing is enumerated again
+    assert [e.to_dict() for e in child.list_entries()] == blob.entries
+    assert calls == []
+
+
+def test_adopt_refuses_a_changed_system(efivars, tmp_path):
+    blob = handoff.load(_publish(tmp_path))
+    assert not blob.adopt(_cached(tmp_path), show_recovery=True)
+    assert not blob.adopt(LinuxBootManager())  # no cache to seed
+    assert not blob.adopt(_cached(tmp_path, LinuxBootManager(efivars_root=str(tmp_path))))  # other cache key
+    # A BootNext written between the parent's listing and the child's start
+    with open(os.path.join(efivars, 'BootNext-8be4df61-93ca-11d2-aa0d-00e098032b8c'), 'wb') as f:
+        f.write(b'\x07\x00\x00\x00\x03\x00')
+    os.utime(efivars, ns=(0, os.stat(efivars).st_mtime_ns + 10**9))
+    assert not blob.adopt(_cached(tmp_path))
+
+
+@pytest.mark.parametrize('overrides', [
+    {'boot_id': 'another-boot'},
+    {'created': 0.0},
+    {'created': time.time() + 3600},
+    {'version': handoff.HANDOFF_VERSION + 1},
+    {'unknown_field': 1},
+])
+def test_foreign_or_stale_blobs_are_ignored(efivars, tmp_path, overrides):
+    path = _publish(tmp_path, **overrides)
+    assert handoff.load(path) is None
+    assert not os.path.exists(path)
+
+
+def test_loose_permissions_are_ignored(efivars, tmp_path):
+    path = _publish(tmp_path)
+    os.chmod(path, 0o644)
+    assert handoff.load(path) is None
+    path = _publish(tmp_path)
+    os.chmod(os.path.dirname(path), 0o755)
+    assert handoff.load(path) is None
+
+
+def test_publish_without_entries_writes_nothing(efivars, tmp_path):
+    path = handoff.reserve()
+    empty = LinuxBootManager(efivars_root=str(tmp_path / 'missing'))
+    assert not handoff.publish(path, lambda show_recovery: _cached(tmp_path, empty))
+    assert not os.path.exists(path)
+    handoff.discard(path)
+    assert not os.path.exists(os.path.dirname(path))
+
+
+@pytest.mark.skipif(not hasattr(os, 'geteuid') or os.geteuid() != 0, reason='needs root to chown')
+def test_trusted_tools(tmp_path):
+    tools = tmp_path / 'sbin'
+    tools.mkdir()
+    os.chmod(tools, 0o755)
+
+    def tool(name: str, mode: int = 0o755, uid: int = 0) -> str:
+        path = tools / name
+        path.write_text('#!/bin/sh\n')
+        os.chmod(path, mode)
+        os.chown(path, uid, -1)
+        return str(path)
+
+    blob = handoff.Handoff('LinuxBootManager', '', '', [], tools={
+        'efibootmgr': tool('efibootmgr'),
+        'grub-reboot': tool('grub-reboot', uid=1000),
+        'grub-set-default': tool('grub-set-default', mode=0o775),
+        'not-executable': tool('not-executable', mode=0o644),
+        'relative': 'sbin/efibootmgr',
+        'missing': str(tools / 'missing'),
+    })
+    assert blob.trusted_tools() == {'efibootmgr': str(tools / 'efibootmgr')}
+    # A group-writable directory taints every tool in it
+    os.chmod(tools, 0o775)
+    assert blob.trusted_tools() == {}
+
+
+def test_get_manager_adopts_the_handoff(efivars, tmp_path):
+    blob = handoff.load(_publish(tmp_path))
+    mgr = get_manager(handoff=blob)
+    assert mgr.stats.hits == 0
+    assert [e.to_dict() for e in mgr.list_entries()] == blob.entries
+    assert mgr.stats.hits == 1 and mgr.stats.misses == 0
+    assert blob.fingerprint == mgr.manager.fingerprint()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import pytest
+
+import fixtures
+from sys_switch.platforms.efivars import EfiVarStore
+from sys_switch.platforms.linux import parse_efibootmgr, scan_efibootmgr
+
+ESP = 'HD(1,GPT,6a3c9f0e-1b2d-4c5e-8f70-9a1b2c3d4e5f,0x800,0x100000)'
+
+LISTING = '''BootCurrent: 0001
+BootNext: 0004
+Timeout: 2 seconds
+BootOrder: 0001,0000,0003,0004
+Boot0000* Windows Boot Manager\tHD(1,GPT,6a3c9f0e-1b2d-4c5e-8f70-9a1b2c3d4e5f,0x800,0x100000)/File(\\EFI\\Microsoft\\Boot\\bootmgfw.efi)WINDOWS.........
+Boot0001* ubuntu (6.8.0-31)\tHD(1,GPT,6a3c9f0e-1b2d-4c5e-8f70-9a1b2c3d4e5f,0x800,0x100000)/File(\\EFI\\ubuntu\\shimx64.efi)
+Boot0003  UEFI: SanDisk\tPartition 1\tPciRoot(0x0)/Pci(0x14,0x0)/USB(16,0)/HD(1,MBR,0xa1b2c3d4,0x800,0x1000)
+Boot0004* Network\tPciRoot(0x0)/Pci(0x1c,0x0)/Pci(0x0,0x0)/MAC(001122334455,0)/IPv4(0.0.0.0,0,DHCP,0.0.0.0,0.0.0.0,0.0.0.0)
+'''
+
+
+def test_header_lines_are_not_entries():
+    state = scan_efibootmgr(LISTING)
+    assert sorted(state.options) == ['0000', '0001', '0003', '0004']
+    assert (state.current, state.next, state.timeout) == ('0001', '0004', 2)
+    assert state.order == ['0001', '0000', '0003', '0004']
+    assert [state.options[b].order_index for b in ('0000', '0001', '0003', '0004')] == [1, 0, 2, 3]
+
+
+def test_descriptions_keep_parentheses_and_tabs():
+    opts = scan_efibootmgr(LISTING).options
+    assert opts['0001'].description == 'ubuntu (6.8.0-31)'
+    assert opts['0001'].device_path == ESP + '/File(\\EFI\\ubuntu\\shimx64.efi)'
+    # Split at the last tab that starts a device path, not the first one
+    assert opts['0003'].description == 'UEFI: SanDisk\tPartition 1'
+    assert opts['0003'].device_path.endswith('/HD(1,MBR,0xa1b2c3d4,0x800,0x1000)')
+    # Nested parentheses inside a node's arguments
+    assert opts['0004'].device_path.endswith('/IPv4(0.0.0.0,0,DHCP,0.0.0.0,0.0.0.0,0.0.0.0)')
+    assert opts['0000'].optional_data == b'WINDOWS.........'
+
+
+def test_inactive_entries():
+    text = 'BootOrder: 0003,0002\nBoot0002* ubuntu\nBoot0003  UEFI: PXE\nBoot0005 Old\n'
+    opts = scan_efibootmgr(text).options
+    assert opts['0002'].active and not opts['0003'].active and not opts['0005'].active
+    assert opts['0003'].description == 'UEFI: PXE' and opts['0005'].description == 'Old'
+    assert opts['0003'].device_path == ''  # no -v: nothing after the description
+    assert [e.id for e in parse_efibootmgr(text)][:2] == ['0003', '0002']
+
+
+def test_efibootmgr_18_layout():
+    text = ('BootCurrent: 000a\nBootOrder: 000A\n'
+            'Boot000A* debian\tHD(2,GPT,0f0e0d0c-0b0a-0908-0706-050403020100,0x1000,0x2000)/\\EFI\\debian\\grubx64.efi\n'
+            '      dp: 04 01 2a 00\n      data: 01 02 0a ff\n'
+            'Boot000B* Shell\tFv(7cb8bdc9-f8eb-4f34-aaea-3ee4af6516a1)/FvFile(7c04a583-9e3e-4f1c-ad65-e05268d0b4d1)6869\r\n')
+    state = scan_efibootmgr(text)
+    assert state.current == '000A' and list(state.options) == ['000A', '000B']
+    debian = state.options['000A']
+    assert debian.device_path.endswith('/\\EFI\\debian\\grubx64.efi')
+    assert debian.optional_data == b'\x01\x02\x0a\xff'
+    assert state.options['000B'].optional_data == b'hi'
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_fixture_listing_matches_efivarfs(tmp_path, seed):
+    fw = fixtures.make_firmware(12, seed=seed)
+    state = scan_efibootmgr(fixtures.efibootmgr_text(fw, verbose=True))
+    assert (state.current, state.next, state.order, state.timeout) == (fw.current, fw.next, fw.order, fw.timeout)
+    for opt in fw.options:
+        got = state.options[opt.id]
+        assert (got.description, got.device_path, got.active) == (opt.description, opt.path_text, opt.active)
+    # Both sources produce the same entries in the same order
+    store = EfiVarStore(fixtures.write_efivars(fw, str(tmp_path / 'efivars')))
+    assert state.to_entries() == store.read_state().to_entries()
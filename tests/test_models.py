@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import pytest
+
+from sys_switch.models import BootEntry, EntryIndex, EntryLookupError, entry_partuuid, normalize_description
+
+ESP = 'HD(1,GPT,6A3C9F0E-1B2D-4C5E-8F70-9A1B2C3D4E5F,0x800,0x100000)'
+ROOT = 'HD(2,GPT,0f0e0d0c-0b0a-0908-0706-050403020100,0x100800,0x4000000)'
+
+
+@pytest.fixture
+def index():
+    return EntryIndex([
+        BootEntry('0000', 'Windows Boot Manager', extra=ESP + '/File(\\EFI\\Microsoft\\Boot\\bootmgfw.efi)'),
+        BootEntry('0001', 'ubuntu', is_current=True, extra=ESP + '/File(\\EFI\\ubuntu\\shimx64.efi)'),
+        BootEntry('000A', 'Fedora\t Linux', extra=ROOT + '/File(\\EFI\\fedora\\shimx64.efi)'),
+        BootEntry('0003', 'UEFI: SanDisk', extra='PciRoot(0x0)/USB(1,0)/HD(1,MBR,0xA1B2C3D4,0x800,0x1000)'),
+        BootEntry('0004', 'UEFI: SanDisk  Cruzer', extra='PciRoot(0x0)/USB(2,0)'),
+        BootEntry('0005', 'C++ (debug)', extra=None),
+    ])
+
+
+def test_ids_are_case_insensitive(index):
+    assert index.resolve('000a').id == '000A'
+    assert index.get('000A') is index.resolve(entry_id='000a')
+    with pytest.raises(EntryLookupError, match='未找到引导项: 0009'):
+        index.resolve('0009')
+
+
+def test_match_prefers_an_exact_description(index):
+    # Case-insensitive; an exact description beats the regex search
+    assert index.resolve(match='UBUNTU').id == '0001'
+    assert index.resolve(match='fedora linux').id == '000A'  # tabs and runs of blanks collapse
+    assert index.resolve(match='windows').id == '0000'
+    assert index.resolve(match='^uefi: sandisk$').id == '0003'
+    assert index.resolve(match='++ (deb').id == '0005'  # not a valid regex: substring
+    assert index.resolve(match='c++ (debug)').id == '0005'
+
+
+def test_ambiguous_and_missing_matches(index):
+    with pytest.raises(EntryLookupError) as err:
+        index.resolve(match='sandisk')
+    assert '匹配多个引导项' in str(err.value) and '0003 (UEFI: SanDisk)' in str(err.value)
+    assert '0004 (UEFI: SanDisk  Cruzer)' in str(err.value)
+    with pytest.raises(EntryLookupError, match='没有与'):
+        index.resolve(match='macOS')
+    with pytest.raises(EntryLookupError, match='需要引导项 ID'):
+        index.resolve()
+
+
+def test_by_partuuid(index):
+    with pytest.raises(EntryLookupError, match='匹配多个'):
+        index.resolve(partuuid='6a3c9f0e-1b2d-4c5e-8f70-9a1b2c3d4e5f')  # two loaders on the ESP
+    assert index.resolve(partuuid='{0F0E0D0C-0B0A-0908-0706-050403020100}').id == '000A'
+    assert index.resolve(partuuid='a1b2c3d4-01').id == '0003'
+    with pytest.raises(EntryLookupError, match='没有与分区 GUID'):
+        index.resolve(partuuid='00000000-0000-0000-0000-000000000000')
+
+
+def test_entry_id_wins_over_other_selectors(index):
+    assert index.resolve('0004', match='ubuntu').id == '0004'
+
+
+def test_sequence_protocol(index):
+    assert len(index) == 6 and index[2].id == '000A'
+    assert [e.id for e in index] == ['0000', '0001', '000A', '0003', '0004', '0005']
+    # Later duplicates of an id never shadow the first one
+    dup = EntryIndex([BootEntry('0001', 'first'), BootEntry('0001', 'second')])
+    assert dup.get('0001').description == 'first' and len(dup) == 2
+
+
+def test_helpers():
+    assert normalize_description('  Windows\tBoot   Manager ') == 'windows boot manager'
+    assert entry_partuuid(BootEntry('0', '', extra=ESP)) == '6a3c9f0e-1b2d-4c5e-8f70-9a1b2c3d4e5f'
+    assert entry_partuuid(BootEntry('0', '', extra='HD(3,MBR,0x1f,0x800,0x1000)')) == '0000001f-03'
+    assert entry_partuuid(BootEntry('0', '')) is None
+
+
+def test_boot_entry_round_trip():
+    e = BootEntry('{bootmgr}', 'Windows Boot Manager', is_current=True, extra='\\EFI\\Microsoft')
+    assert BootEntry.from_dict(e.to_dict()) == e
+    assert list(e.to_dict()) == list(BootEntry.FIELDS)
+    assert BootEntry.from_dict({'id': '1', 'description': 'x'}) == BootEntry('1', 'x')
+    assert e != BootEntry('{bootmgr}', 'Windows Boot Manager')
+    with pytest.raises(AttributeError):
+        e.os = 'Windows'  # slotted
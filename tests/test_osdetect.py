@@ -0,0 +1,115 @@
+from __future__ import annotations
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import fixtures
+from sys_switch.models import BootEntry
+from sys_switch.platforms import osdetect
+from sys_switch.platforms.blockdev import BlockDeviceIndex
+from sys_switch.platforms.osdetect import OsDetector
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='block-device fixtures use symlinks')
+
+
+@pytest.fixture
+def machine(tmp_path):
+    fw = fixtures.make_firmware(8, seed=1)
+    root = fixtures.write_blockdev(fw, str(tmp_path / 'root'), extra_disks=2)
+    entries = [BootEntry(o.id, o.description, extra=o.path_text) for o in fw.options]
+    return root, entries
+
+
+def _detector(root: str, tmp_path, **kwargs) -> OsDetector:
+    return OsDetector(root=root, index=BlockDeviceIndex.scan(root), cache_path=str(tmp_path / 'osdetect.json'),
+                      **kwargs)
+
+
+def _counting_probe(monkeypatch) -> list:
+    calls: list = []
+    real = osdetect.probe_path
+
+    def probe(base):
+        calls.append(base)
+        return real(base)
+
+    monkeypatch.setattr(osdetect, 'probe_path', probe)
+    return calls
+
+
+def test_os_release_and_windows_registry(machine, tmp_path):
+    root, entries = machine
+    found = _detector(root, tmp_path).detect(entries)
+    assert found['0000'].name == 'Windows 11 Pro'  # build 22631 behind a "Windows 10" ProductName
+    assert (found['0000'].version, found['0000'].source) == ('23H2', 'registry')
+    assert (found['0001'].id, found['0001'].label) == ('ubuntu', 'Ubuntu 24.04.1 LTS')
+    assert found['0001'].source == 'os-release'
+    # ESP -> separate /boot (GRUB search) -> root= on the btrfs root
+    assert (found['0002'].id, found['0002'].version) == ('fedora', '40')
+    assert found['0002'].device.endswith('p3')
+
+
+def test_loader_directory_fallback(machine, tmp_path):
+    root, entries = machine
+    esp_path = entries[1].extra.replace('ubuntu\\shimx64.efi', 'debian\\grubx64.efi')
+    found = _detector(root, tmp_path).detect([BootEntry('0042', 'debian', extra=esp_path)])
+    assert (found['0042'].id, found['0042'].source) == ('debian', 'loader')
+
+
+def test_cache_reused_while_generation_unchanged(machine, tmp_path, monkeypatch):
+    root, entries = machine
+    first = _detector(root, tmp_path).detect(entries)
+    calls = _counting_probe(monkeypatch)
+    assert _detector(root, tmp_path).detect(entries) == first
+    assert calls == []
+
+    release = os.path.join(root, 'etc/os-release')
+    with open(release, 'w') as f:
+        f.write('PRETTY_NAME="Ubuntu 24.10"\nNAME="Ubuntu"\nVERSION_ID="24.10"\nID=ubuntu\n')
+    st = os.stat(release)
+    os.utime(release, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    again = _detector(root, tmp_path).detect(entries)
+    assert again['0001'].version == '24.10'
+    assert [os.path.normpath(c) for c in calls] == [root]  # only the filesystem that changed
+
+
+def test_budget_abandons_a_hung_probe(machine, tmp_path, monkeypatch):
+    root, entries = machine
+    release = threading.Event()
+    monkeypatch.setattr(osdetect, 'probe_path', lambda base: release.wait(30) and {})
+    try:
+        t0 = time.monotonic()
+        found = _detector(root, tmp_path, budget=0.3).detect(entries)
+        assert time.monotonic() - t0 < 2
+        # Nothing could be read in time; the loader paths still say something
+        assert found['0001'].source == 'loader' and found['0000'].id == 'windows'
+        probes = [t for t in threading.enumerate() if t.name.startswith('sys_switch-osprobe')]
+        assert probes and all(t.daemon for t in probes)
+    finally:
+        release.set()
+    assert not os.path.exists(tmp_path / 'osdetect.json')  # nothing probed, nothing cached
+
+
+def test_hung_probe_does_not_block_exit(machine, tmp_path):
+    root, _entries = machine
+    code = (
+        'import sys, time\n'
+        'from sys_switch.models import BootEntry\n'
+        'from sys_switch.platforms import osdetect\n'
+        'osdetect.probe_path = lambda base: time.sleep(60)\n'
+        'entries = [BootEntry("0001", "ubuntu", extra=sys.argv[2])]\n'
+        'print(osdetect.detect_os(entries, budget=0.3, root=sys.argv[1])["0001"].source)\n'
+    )
+    env = dict(os.environ, PYTHONPATH=SRC, SYS_SWITCH_CACHE_DIR=str(tmp_path / 'cache'))
+    t0 = time.monotonic()
+    cp = subprocess.run([sys.executable, '-c', code, root, machine[1][1].extra],
+                        env=env, capture_output=True, text=True, timeout=30)
+    assert cp.returncode == 0, cp.stderr
+    assert cp.stdout.strip() == 'loader'
+    assert time.monotonic() - t0 < 15
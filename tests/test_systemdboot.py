@@ -0,0 +1,156 @@
+from __future__ import annotations
+import os
+import struct
+
+import pytest
+
+import fixtures
+from sys_switch.platforms import systemdboot
+from sys_switch.platforms.efivars import DEFAULT_ATTRIBUTES
+from sys_switch.platforms.systemdboot import LOADER_GUID, SystemdBootManager, entry_id
+
+VOLATILE = struct.pack('<I', 0x6)
+
+
+def _conf(esp, name: str, text: str) -> None:
+    path = esp / 'loader' / 'entries' / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def _var_path(efivars, name: str) -> str:
+    return os.path.join(efivars, f'{name}-{LOADER_GUID}')
+
+
+def _put_var(efivars, name: str, values, attrs: bytes = VOLATILE) -> None:
+    with open(_var_path(efivars, name), 'wb') as f:
+        f.write(attrs + ''.join(v + '\0' for v in values).encode('utf-16-le'))
+
+
+@pytest.fixture
+def esp(tmp_path):
+    esp = tmp_path / 'esp'
+    _conf(esp, 'fedora-6.8.conf', 'title Fedora Linux\nversion 6.8.1\nsort-key fedora\nlinux /vmlinuz-6.8\n')
+    # Boot counting: two tries left, one failed; the id drops the suffix
+    _conf(esp, 'fedora-6.9+2-1.conf', '# newest kernel\ntitle Fedora Linux\nversion 6.9.0\nsort-key fedora\n')
+    _conf(esp, 'arch.conf', 'title   Arch Linux\nsort-key arch\nmachine-id 0123\n')
+    _conf(esp, 'legacy.conf', 'title Legacy\n')
+    uki_dir = esp / 'EFI' / 'Linux'
+    uki_dir.mkdir(parents=True)
+    fixtures._uki(str(uki_dir / 'debian-12+3.efi'),
+                  'NAME="Debian GNU/Linux"\nPRETTY_NAME="Debian GNU/Linux 12 (bookworm)"\nID=debian\n', '6.1.0-18')
+    (uki_dir / 'not-a-uki.efi').write_bytes(b'MZ' + bytes(200))
+    return esp
+
+
+@pytest.fixture
+def efivars(tmp_path):
+    root = tmp_path / 'efivars'
+    root.mkdir()
+    _put_var(root, 'LoaderInfo', ['systemd-boot 256.4'])
+    return root
+
+
+@pytest.fixture
+def manager(esp, efivars, monkeypatch):
+    monkeypatch.setattr(systemdboot, 'is_admin', lambda: True)
+    return SystemdBootManager(esp_root=str(esp), xbootldr_root=str(esp), efivars_root=str(efivars))
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('linux-6.8+3-1.conf', 'linux-6.8.conf'),
+    ('linux-6.8+3.conf', 'linux-6.8.conf'),
+    ('fedora+0-3.EFI', 'fedora.EFI'),
+    ('plain.conf', 'plain.conf'),
+    ('c++.conf', 'c++.conf'),
+])
+def test_boot_counter_is_not_part_of_the_id(name, expected):
+    assert entry_id(name) == expected
+
+
+def test_listing_in_menu_order(manager):
+    entries = manager.list_entries()
+    assert [e.id for e in entries] == ['arch.conf', 'debian-12.efi', 'fedora-6.9.conf', 'fedora-6.8.conf',
+                                       'legacy.conf']
+    by_id = {e.id: e for e in entries}
+    assert by_id['debian-12.efi'].description == 'Debian GNU/Linux 12 (bookworm)'
+    assert by_id['debian-12.efi'].extra.endswith('debian-12+3.efi')
+    # Titles shared by several entries get their version, as in the menu
+    assert by_id['fedora-6.9.conf'].description == 'Fedora Linux (6.9.0)'
+    assert by_id['arch.conf'].description == 'Arch Linux'
+    assert not any(e.is_current or e.is_next for e in entries)
+
+
+def test_loader_entries_variable_sets_the_order(manager, efivars):
+    _put_var(efivars, 'LoaderEntries', ['fedora-6.8.conf', 'auto-windows', 'gone.conf', 'arch.conf'])
+    _put_var(efivars, 'LoaderEntrySelected', ['fedora-6.8.conf'])
+    entries = manager.list_entries()
+    assert [e.id for e in entries] == ['fedora-6.8.conf', 'auto-windows', 'arch.conf', 'debian-12.efi',
+                                       'fedora-6.9.conf', 'legacy.conf']
+    assert entries[0].is_current
+    assert entries[1].description == 'Windows Boot Manager' and entries[1].extra is None
+
+
+def test_uki_headers_are_read_once(manager, monkeypatch):
+    first = manager.list_entries()
+    calls = []
+    real = systemdboot.read_pe_sections
+    monkeypatch.setattr(systemdboot, 'read_pe_sections', lambda path: calls.append(path) or real(path))
+    assert manager.list_entries() == first
+    # Only the image that is not a UKI is looked at again; it has no cached entry
+    assert [os.path.basename(p) for p in calls] == ['not-a-uki.efi']
+
+
+def test_set_next_and_default_write_utf16_with_attributes(manager, efivars):
+    ok, msg = manager.set_next('fedora-6.9.conf')
+    assert ok, msg
+    with open(_var_path(efivars, 'LoaderEntryOneShot'), 'rb') as f:
+        assert f.read() == struct.pack('<I', DEFAULT_ATTRIBUTES) + 'fedora-6.9.conf\0'.encode('utf-16-le')
+    assert [e.id for e in manager.list_entries() if e.is_next] == ['fedora-6.9.conf']
+
+    ok, msg = manager.set_default('debian-12.efi')
+    assert ok, msg
+    with open(_var_path(efivars, 'LoaderEntryDefault'), 'rb') as f:
+        assert f.read()[4:] == 'debian-12.efi\0'.encode('utf-16-le')
+    assert manager.default_entry() == 'debian-12.efi'
+
+    # A shorter value must not leave the tail of the old one behind
+    assert manager.set_next('arch.conf')[0]
+    assert manager._var_string('LoaderEntryOneShot') == 'arch.conf'
+    assert os.path.getsize(_var_path(efivars, 'LoaderEntryOneShot')) == 4 + len('arch.conf\0') * 2
+
+
+def test_set_next_refuses_unknown_entries(manager, efivars):
+    ok, msg = manager.set_next('windows.conf')
+    assert not ok and 'windows.conf' in msg
+    assert not os.path.exists(_var_path(efivars, 'LoaderEntryOneShot'))
+    # Ids the loader itself offered are fine even without a file
+    _put_var(efivars, 'LoaderEntries', ['auto-windows'])
+    assert manager.set_next('auto-windows')[0]
+
+
+def test_writes_need_root(manager, efivars, monkeypatch):
+    monkeypatch.setattr(systemdboot, 'is_admin', lambda: False)
+    for ok, _msg in (manager.set_next('arch.conf'), manager.set_default('arch.conf'), manager.clear_next()):
+        assert not ok
+    assert not os.path.exists(_var_path(efivars, 'LoaderEntryOneShot'))
+
+
+def test_clear_next(manager, efivars):
+    assert manager.set_next('arch.conf')[0]
+    ok, msg = manager.clear_next()
+    assert ok, msg
+    assert not os.path.exists(_var_path(efivars, 'LoaderEntryOneShot'))
+    assert not any(e.is_next for e in manager.list_entries())
+    # Nothing pending is not an error
+    assert manager.clear_next()[0]
+
+
+def test_generated_fixture_matches_its_variables(tmp_path):
+    esp, efivars = fixtures.write_systemd_boot(10, str(tmp_path))
+    mgr = SystemdBootManager(esp_root=esp, xbootldr_root=esp, efivars_root=efivars)
+    entries = mgr.list_entries()
+    assert len(entries) == 12  # plus the two auto- entries the loader reported
+    assert all('+' not in e.id for e in entries)
+    assert sum(e.is_current for e in entries) == sum(e.is_next for e in entries) == 1
+    assert systemdboot.booted_with_systemd_boot(efivars)
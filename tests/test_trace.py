@@ -0,0 +1,133 @@
+from __future__ import annotations
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import PurePosixPath
+
+import pytest
+
+import fixtures
+from sys_switch import trace
+from sys_switch.trace import Tracer
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+
+@pytest.fixture
+def tracer(monkeypatch):
+    t = Tracer()
+    t.enable()
+    monkeypatch.setattr(trace, 'tracer', t)  # what @traced looks up
+    return t
+
+
+def test_disabled_tracer_records_nothing():
+    t = Tracer()
+    with t.span('outer') as sp:
+        sp.set(n=1)
+    assert t.spans() == []
+
+
+def test_nested_spans(tracer):
+    with tracer.span('cli.list') as outer:
+        time.sleep(0.01)
+        with tracer.span('exec', argv=['efibootmgr', '-v']) as inner:
+            time.sleep(0.02)
+            inner.set(returncode=0)
+    spans = tracer.spans()
+    assert [s.name for s in spans] == ['cli.list', 'exec']
+    assert inner.parent is outer and outer.parent is None
+    assert inner.duration_ms >= 20 and outer.duration_ms >= inner.duration_ms + 10
+    assert outer.start_ns <= inner.start_ns and inner.end_ns <= outer.end_ns
+    assert inner.args == {'argv': ['efibootmgr', '-v'], 'returncode': 0}
+
+
+def test_failing_span_records_the_error(tracer):
+    with pytest.raises(PermissionError):
+        with tracer.span('write'):
+            raise PermissionError
+    assert tracer.spans()[0].args == {'error': 'PermissionError'}
+    # The context is restored: the next span has no parent
+    with tracer.span('after') as sp:
+        pass
+    assert sp.parent is None
+
+
+def test_traced_decorator(tracer):
+    @trace.traced('Manager.list_entries')
+    def listing(n):
+        with trace.span('inner'):
+            return list(range(n))
+
+    assert listing(3) == [0, 1, 2]
+    inner, outer = sorted(tracer.spans(), key=lambda s: s.end_ns)
+    assert (outer.name, inner.name) == ('Manager.list_entries', 'inner') and inner.parent is outer
+    tracer.disable()
+    assert listing(1) == [0] and len(tracer.spans()) == 2
+
+
+def test_chrome_trace_is_valid_json(tracer):
+    def worker():
+        with tracer.span('osdetect.probe', mount=PurePosixPath('/mnt/fedora'), dev='nvme0n1p2'):
+            pass
+
+    with tracer.span('cli.list'):
+        t = threading.Thread(target=worker)
+        t.start()
+        t.join()
+        with tracer.span('exec', argv=('bcdedit', '/enum'), readonly=True):
+            pass
+    data = json.loads(tracer.dump('chrome'))
+    assert data['displayTimeUnit'] == 'ms'
+    events = data['traceEvents']
+    assert [e['name'] for e in events] == ['cli.list', 'osdetect.probe', 'exec']
+    for e in events:
+        assert e['ph'] == 'X' and e['pid'] == os.getpid()
+        assert e['ts'] >= 0 and e['dur'] >= 0
+    cli, probe, ex = events
+    assert ex['cat'] == 'exec' and ex['args'] == {'argv': ['bcdedit', '/enum'], 'readonly': True, 'parent': 'cli.list'}
+    assert ex['ts'] >= cli['ts'] and ex['ts'] + ex['dur'] <= cli['ts'] + cli['dur']
+    # Threads do not inherit the context: a worker's span is a root on its own track
+    assert 'parent' not in probe['args'] and probe['tid'] != cli['tid']
+    assert probe['args']['mount'] == '/mnt/fedora'  # anything else is stringified
+
+
+def test_summary_groups_commands_by_program(tracer):
+    for argv in (['/usr/bin/efibootmgr', '-v'], ['efibootmgr'], ['grub-reboot', '2']):
+        with tracer.span('exec', argv=argv):
+            pass
+    lines = tracer.summary().splitlines()
+    assert lines[0].split() == ['OPERATION', 'COUNT', 'TOTAL(ms)', 'MEAN(ms)', 'MAX(ms)']
+    rows = {line.rsplit(None, 4)[0]: int(line.split()[-4]) for line in lines[1:]}
+    assert rows == {'exec efibootmgr': 2, 'exec grub-reboot': 1}
+
+
+def test_max_spans_keeps_the_latest(tracer):
+    tracer.enable(max_spans=2)
+    for i in range(5):
+        with tracer.span(f's{i}'):
+            pass
+    assert [s.name for s in tracer.spans()] == ['s3', 's4']
+    tracer.clear()
+    assert tracer.spans() == []
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='efivarfs fixtures are a Linux backend')
+def test_profile_flag_writes_a_chrome_trace(tmp_path):
+    fw = fixtures.make_firmware(6, seed=0)
+    env = dict(os.environ, PYTHONPATH=SRC,
+               SYS_SWITCH_EFIVARS=fixtures.write_efivars(fw, str(tmp_path / 'efivars')),
+               SYS_SWITCH_CACHE_DIR=str(tmp_path / 'cache'), XDG_RUNTIME_DIR=str(tmp_path / 'run'))
+    out = tmp_path / 'trace.json'
+    cp = subprocess.run([sys.executable, '-m', 'sys_switch', '--cli', '--no-daemon', '--profile',
+                         '--profile-format', 'chrome', '--profile-output', str(out), 'list', '-o', 'json'],
+                        env=env, capture_output=True, text=True, timeout=60)
+    assert cp.returncode == 0, cp.stderr
+    assert len(json.loads(cp.stdout)) == 6  # the report does not go to stdout
+    events = json.loads(out.read_text(encoding='utf-8'))['traceEvents']
+    names = [e['name'] for e in events]
+    assert names[0] == 'cli.list'
+    assert 'LinuxBootManager.list_entries' in names
@@ -0,0 +1,138 @@
+from __future__ import annotations
+import io
+import json
+import os
+import struct
+import threading
+import time
+
+import pytest
+
+import fixtures
+from sys_switch import watch
+from sys_switch.models import BootEntry
+from sys_switch.platforms.efivars import EfiVarStore
+from sys_switch.platforms.linux import LinuxBootManager
+from sys_switch.watch import Watcher, diff_entries, run_watch
+
+pytestmark = pytest.mark.skipif(not os.path.isdir('/proc'), reason='inotify/efivarfs fixtures are Linux-only')
+
+
+def _no_inotify():
+    raise OSError('inotify disabled for this test')
+
+
+@pytest.fixture
+def fw():
+    return fixtures.make_firmware(8, seed=5)
+
+
+@pytest.fixture
+def manager(tmp_path, fw):
+    root = fixtures.write_efivars(fw, str(tmp_path / 'efivars'))
+    return LinuxBootManager(efivars_root=root, grub_cfg=str(tmp_path / 'nogrub/grub.cfg'),
+                            grubenv=str(tmp_path / 'nogrub/grubenv'), cache_dir=str(tmp_path / 'cache'))
+
+
+@pytest.fixture(params=['inotify', 'poll'])
+def watcher(request, manager, monkeypatch):
+    if request.param == 'poll':
+        monkeypatch.setattr(watch, 'Inotify', _no_inotify)
+    w = Watcher(manager, debounce=0.05, min_interval=0.05, max_interval=0.2)
+    w.start()
+    if request.param == 'inotify' and not w.event_driven:
+        pytest.skip('inotify unavailable')
+    assert w.event_driven == (request.param == 'inotify')
+    yield w
+    w.close()
+
+
+def _first_events(w: Watcher, timeout: float = 2.0) -> list:
+    """Events of the first re-listing that finds any (empty after `timeout`)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if w.event_driven:
+            changed = w._wait_inotify(max(0.0, deadline - time.monotonic()))
+        else:
+            time.sleep(w.interval)
+            changed = w.poll()
+        if changed:
+            events = w.check()
+            if events:
+                return events
+    return []
+
+
+def _other_option(fw, *exclude) -> str:
+    return next(o.id for o in fw.options if o.id not in exclude and o.id != fw.next)
+
+
+def test_next_set_and_cleared(watcher, manager, fw):
+    target = _other_option(fw)
+    manager.efivars.set_boot_next(target)
+    assert _first_events(watcher) == [{'event': 'next_set', 'id': target, 'previous': fw.next}]
+    manager.efivars.clear_boot_next()
+    assert _first_events(watcher) == [{'event': 'next_cleared', 'previous': target}]
+
+
+def test_order_changed(watcher, manager, fw):
+    order = list(reversed(fw.order))
+    manager.efivars.set_boot_order(order)
+    events = _first_events(watcher)
+    assert events and events[-1]['event'] == 'order_changed'
+    assert events[-1]['order'][:len(order)] == order
+
+
+def test_entry_added_and_removed(watcher, manager, fw):
+    store: EfiVarStore = manager.efivars
+    victim = fw.options[-1].id
+    os.unlink(store.path(f'Boot{victim}'))
+    assert {'event': 'entry_removed', 'id': victim, 'description': fw.options[-1].description} in _first_events(watcher)
+
+    desc = 'Added Loader'
+    data = struct.pack('<IH', 1, 4) + (desc + '\0').encode('utf-16-le') + b'\x7f\xff\x04\x00'
+    store.write('Boot00A0', data)
+    assert {'event': 'entry_added', 'id': '00A0', 'description': desc} in _first_events(watcher)
+
+
+def test_unrelated_variable_is_ignored(watcher, manager):
+    manager.efivars.write('ConIn', b'\x01' * 32)
+    assert _first_events(watcher, timeout=0.5) == []
+
+
+def test_poll_interval_backs_off(manager, monkeypatch):
+    monkeypatch.setattr(watch, 'Inotify', _no_inotify)
+    w = Watcher(manager, min_interval=0.05, max_interval=0.2)
+    w.start()
+    assert not w.poll() and w.interval == 0.1
+    assert not w.poll() and w.interval == 0.2
+    assert not w.poll() and w.interval == 0.2
+    manager.efivars.set_boot_order(list(reversed(manager.efivars.read_boot_order())))
+    assert w.poll() and w.interval == 0.05
+
+
+def test_run_watch_streams_json(manager, fw):
+    out = io.StringIO()
+    target = _other_option(fw)
+
+    def change():
+        time.sleep(0.3)
+        manager.efivars.set_boot_next(target)
+
+    t = threading.Thread(target=change)
+    t.start()
+    run_watch(manager, debounce=0.05, max_interval=0.2, initial=True, duration=1.5, out=out)
+    t.join()
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert lines[0]['event'] == 'snapshot' and len(lines[0]['entries']) == len(fw.options)
+    assert {'event': 'next_set', 'id': target, 'previous': fw.next}.items() <= lines[1].items()
+
+
+def test_diff_entries_changed_fields():
+    old = [BootEntry('0001', 'ubuntu', extra='HD(1)'), BootEntry('0002', 'Windows', is_next=True)]
+    new = [BootEntry('0001', 'Ubuntu 24.04', extra='HD(1)'), BootEntry('0002', 'Windows')]
+    assert diff_entries(old, new) == [
+        {'event': 'entry_changed', 'id': '0001', 'description': 'Ubuntu 24.04'},
+        {'event': 'next_cleared', 'previous': '0002'},
+    ]
+    assert diff_entries(new, new) == []